@@ -0,0 +1,196 @@
+'''
+Author: dkl
+Date: 2026-10-19 23:20:47
+Description: 本地的tushare接口替身. 与ts.pro_api的调用方式一致, 返回确定性的合成数据,
+可以设置每次调用的延迟和额度报错, 用于基准测试, 不访问真实的tushare
+'''
+import functools
+import threading
+import time
+import zlib
+import numpy as np
+import pandas as pd
+
+# 没有传入fields时各接口默认返回的字段
+default_fields_dct = {
+    "adj_factor": ["ts_code", "trade_date", "adj_factor"],
+    "trade_cal": ["exchange", "cal_date", "is_open", "pretrade_date"],
+    "stock_basic": ["ts_code", "name", "area", "market", "exchange",
+                    "list_date", "delist_date"],
+}
+# 字段值为固定字符串的字段
+const_field_dct = {
+    "exchange": "SSE",
+    "market": "主板",
+    "area": "深圳",
+    "comp_type": "1",
+    "end_type": "1",
+    "report_type": "1",
+    "update_flag": "1",
+    "is_open": "1",
+}
+# tushare的额度报错信息
+quota_error_msg = "抱歉，您每分钟最多访问该接口500次，权限的具体详情访问：https://tushare.pro"
+
+
+def get_code_lst(n_stocks):
+    """
+    生成股票代码, 如['000001.SZ', '600001.SH']
+
+    Parameters
+    ----------
+    n_stocks: int. 股票数量
+    """
+    code_lst = []
+    for i in range(n_stocks):
+        if i % 2 == 0:
+            code_lst.append(f"{i // 2 + 1:06d}.SZ")
+        else:
+            code_lst.append(f"{600000 + i // 2 + 1:06d}.SH")
+    return code_lst
+
+
+def get_period_lst(end_date, n_periods):
+    """
+    截至end_date的最近n_periods个报告期
+
+    Parameters
+    ----------
+    end_date: str. 截止日期, 如'20231018'
+    n_periods: int. 报告期数量
+    """
+    period_lst = []
+    year = int(end_date[0:4])
+    while len(period_lst) < n_periods:
+        for md in ["1231", "0930", "0630", "0331"]:
+            period = f"{year}{md}"
+            if (period <= end_date) and (len(period_lst) < n_periods):
+                period_lst.append(period)
+        year -= 1
+    return sorted(period_lst)
+
+
+def make_frame(fields, code_lst, date_lst, seed=0):
+    """
+    生成合成数据. 每个股票代码与每个日期组合成一行
+
+    Parameters
+    ----------
+    fields: List[str]. 字段列表
+    code_lst: List[str]. 股票代码列表
+    date_lst: List[str]. 日期列表, 日期类字段(*_date, period)取该日期
+    seed: int. 随机数种子, 相同参数生成相同的数据
+
+    Returns
+    -------
+    pandas.DataFrame
+    """
+    n_rows = len(code_lst) * len(date_lst)
+    code_arr = np.tile(np.array(code_lst, dtype=object), len(date_lst))
+    date_arr = np.repeat(np.array(date_lst, dtype=object), len(code_lst))
+    rng = np.random.RandomState(seed)
+    data = {}
+    for field in fields:
+        if field in ["ts_code", "stock_code", "con_code"]:
+            data[field] = code_arr
+        elif field.endswith("_date") or (field == "period"):
+            data[field] = date_arr
+        elif field in const_field_dct:
+            data[field] = np.full(n_rows, const_field_dct[field], dtype=object)
+        elif field == "name":
+            data[field] = np.array([f"股票{code[0:6]}" for code in code_arr], dtype=object)
+        else:
+            data[field] = np.round(rng.uniform(1, 100, n_rows), 4)
+    ohlc_lst = ["open", "high", "low", "close"]
+    if set(ohlc_lst) <= set(fields):
+        # 最高价和最低价取四个价格的最大值和最小值, 使数据通过入库校验
+        price_arr = np.column_stack([data[field] for field in ohlc_lst])
+        data["high"] = price_arr.max(axis=1)
+        data["low"] = price_arr.min(axis=1)
+    return pd.DataFrame(data, columns=fields)
+
+
+class FakeProApi(object):
+    """
+    ts.pro_api的替身. pro.daily(...)等调用返回functools.partial(query, 'daily'),
+    与tushare相同, 所以下载器可以用func.args[0]获取接口名
+
+    使用方法:
+        pro = FakeProApi(n_stocks=5000, latency=0.05, error_every=100)
+        df = pro.daily(trade_date='20230103', fields='ts_code,trade_date,close')
+    """
+
+    def __init__(self, n_stocks=5000, n_periods=8, latency=0.0, error_every=0, seed=0):
+        """
+        构造函数
+
+        Parameters
+        ----------
+        n_stocks: int. 每个交易日或报告期返回的股票数量
+        n_periods: int. 按股票代码查询时返回的报告期数量
+        latency: float. 每次调用的延迟(秒), 模拟网络耗时
+        error_every: int. 每调用多少次返回一次额度报错, 为0时不报错
+        seed: int. 随机数种子
+        """
+        self.code_lst = get_code_lst(n_stocks)
+        self.n_periods = n_periods
+        self.latency = latency
+        self.error_every = error_every
+        self.seed = seed
+        self.calls = 0
+        self.errors = 0
+        self.rows = 0
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return functools.partial(self.query, name)
+
+    def reset(self):
+        """
+        清空调用计数
+        """
+        with self._lock:
+            self.calls = 0
+            self.errors = 0
+            self.rows = 0
+
+    def query(self, api_name, fields="", **kwargs):
+        """
+        返回合成数据. 相同的接口和参数总是返回相同的数据
+
+        Parameters
+        ----------
+        api_name: str. 接口名
+        fields: str. 逗号分隔的字段, 为空时使用接口的默认字段
+        kwargs: 查询参数, 支持trade_date, period, ts_code, start_date, end_date
+        """
+        with self._lock:
+            self.calls += 1
+            flag_error = (self.error_every > 0) and (self.calls % self.error_every == 0)
+            if flag_error:
+                self.errors += 1
+        if self.latency > 0:
+            time.sleep(self.latency)
+        if flag_error:
+            raise Exception(quota_error_msg)
+        if fields:
+            field_lst = fields.replace(" ", "").split(",")
+        else:
+            field_lst = default_fields_dct.get(api_name, ["ts_code", "trade_date"])
+        # 按股票代码查询财务数据时, 返回该股票最近的若干个报告期
+        if "ts_code" in kwargs:
+            code_lst = [kwargs["ts_code"]]
+            end_date = kwargs.get("end_date", time.strftime(r"%Y%m%d"))
+            date_lst = get_period_lst(end_date, self.n_periods)
+        else:
+            code_lst = self.code_lst
+            date = kwargs.get("trade_date", kwargs.get("period", kwargs.get("end_date")))
+            date_lst = [date if date is not None else time.strftime(r"%Y%m%d")]
+        key = api_name + repr(sorted(kwargs.items()))
+        seed = (zlib.crc32(key.encode("utf-8")) + self.seed) % (2 ** 32)
+        df = make_frame(field_lst, code_lst, date_lst, seed=seed)
+        with self._lock:
+            self.rows += len(df)
+        return df
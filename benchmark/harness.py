@@ -0,0 +1,439 @@
+'''
+Author: dkl
+Date: 2026-10-19 23:41:06
+Description: 下载入库基准测试. 用本地的tushare替身和一次性数据库运行固定的场景,
+统计每秒写入行数、每秒接口调用次数、峰值内存和流水线各阶段用时, 结果追加到csv中,
+便于比较不同提交之间的性能变化
+'''
+import datetime
+import multiprocessing
+import os
+import subprocess
+import time
+import pandas as pd
+from sqlalchemy import create_engine
+from benchmark.fakepro import FakeProApi, get_code_lst, make_frame
+from database.catalog import build_embedded_create_table_sql, get_catalog
+from database.database import DataBase
+from database.engine import create_mysql_engine, dispose_engines, register_engine
+from download import (
+    tradecal,
+    asharedaily,
+    asharemonthly,
+    asharefinance,
+    asharesw2021daily,
+    ashareindex,
+    futdaily
+)
+from download.pipeline import stats_history
+from utils.conf import env_prefix, get_settings, reload_settings
+from utils.logger import Logger, logger_decorator
+
+try:
+    import resource
+except ImportError:
+    # Windows下没有resource模块, 不统计峰值内存
+    resource = None
+
+# 获取日志记录器
+logger = Logger("benchmark")
+# 需要替换pro和downloader的下载模块
+download_module_lst = [
+    tradecal,
+    asharedaily,
+    asharemonthly,
+    asharefinance,
+    asharesw2021daily,
+    ashareindex,
+    futdaily,
+]
+# 场景及其写入的数据表
+scenario_table_dct = {
+    "daily": ["asharedailyprices", "asharedailybasic"],
+    "backfill": ["asharedailyprices", "asharedailybasic"],
+    "finance_period": ["ashareincome", "asharebalancesheet", "asharecashflow"],
+    "finance_code": ["ashareincome", "asharebalancesheet", "asharecashflow"],
+}
+# 只能在MySQL上运行的场景(全量刷新使用RENAME TABLE)
+mysql_only_scenario_lst = ["finance_code"]
+# 结果文件的字段
+result_columns = [
+    "run_time",
+    "commit",
+    "backend",
+    "scenario",
+    "seconds",
+    "rows",
+    "rows_per_s",
+    "api_calls",
+    "api_errors",
+    "calls_per_s",
+    "peak_rss_mb",
+    "fetch_s",
+    "transform_s",
+    "store_s",
+]
+# 基准测试使用的数据库
+bench_database = "stk_data"
+# 基准测试期间覆盖的配置: 不更新面板缓存, 避免合成数据写入真实的缓存目录
+bench_environ_dct = {
+    env_prefix + "CACHE_BUILD_PANEL": "False",
+}
+
+
+def get_weekday_lst(n_days, end_date=None):
+    """
+    截至end_date(默认为昨天)的最近n_days个工作日, 作为合成的交易日历
+
+    Parameters
+    ----------
+    n_days: int. 交易日数量
+    end_date: datetime.date. 截止日期
+    """
+    if end_date is None:
+        end_date = datetime.date.today() - datetime.timedelta(days=1)
+    date_lst = []
+    date = end_date
+    while len(date_lst) < n_days:
+        if date.weekday() < 5:
+            date_lst.append(date.strftime(r"%Y%m%d"))
+        date = date - datetime.timedelta(days=1)
+    return sorted(date_lst)
+
+
+def get_peak_rss_mb():
+    """
+    当前进程及已结束子进程的峰值内存(MB). Linux下ru_maxrss的单位为KB
+    """
+    if resource is None:
+        return float("nan")
+    rss_self = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rss_children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return (rss_self + rss_children) / 1024
+
+
+def get_commit():
+    """
+    当前的git提交, 获取失败时为空
+    """
+    try:
+        res = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, timeout=10,
+        )
+        return res.stdout.strip()
+    except Exception:
+        return ""
+
+
+class Benchmark(object):
+    """
+    下载入库基准测试. 替换下载模块的pro为FakeProApi, 数据库为一次性的测试库,
+    测试结束后删除测试库
+
+    使用方法:
+        bench = Benchmark(backend="sqlite")
+        result_df = bench.run(["daily", "backfill"])
+    """
+
+    def __init__(self, backend=None, n_stocks=None, backfill_days=None,
+                 finance_periods=None, finance_code_stocks=None, latency=None,
+                 error_every=None, isolate=None):
+        """
+        构造函数. 参数为None时读取config.ini中[benchmark]的对应配置
+
+        Parameters
+        ----------
+        backend: str. 一次性数据库的类型, 'mysql'或'sqlite'.
+            mysql在配置的服务器上创建带前缀的测试库, sqlite在本地目录创建数据库文件
+        n_stocks: int. 每个交易日或报告期的股票数量
+        backfill_days: int. 追数据场景的交易日数量
+        finance_periods: int. 按报告期下载财务数据的报告期数量
+        finance_code_stocks: int. 按股票代码下载财务数据的股票数量
+        latency: float. 每次接口调用的延迟(秒)
+        error_every: int. 每调用多少次接口返回一次额度报错, 为0时不报错
+        isolate: bool. 是否每个场景在单独的子进程中运行, 使峰值内存互不影响
+        """
+        self.conf = get_settings().benchmark
+
+        def _get(value, option):
+            if value is None:
+                return getattr(self.conf, option)
+            return value
+
+        self.backend = _get(backend, "backend").lower()
+        if self.backend not in ["mysql", "sqlite"]:
+            raise ValueError(f"不支持的数据库类型: {self.backend}")
+        self.n_stocks = _get(n_stocks, "n_stocks")
+        self.backfill_days = _get(backfill_days, "backfill_days")
+        self.finance_periods = _get(finance_periods, "finance_periods")
+        self.finance_code_stocks = _get(finance_code_stocks, "finance_code_stocks")
+        self.latency = _get(latency, "latency")
+        self.error_every = _get(error_every, "error_every")
+        self.isolate = _get(isolate, "isolate")
+        self.retry_sleep = self.conf.retry_sleep
+        self.result_path = self.conf.result_path
+        self.pro = None
+        self.engine = None
+        self._origin_lst = []
+        self._environ_dct = {}
+
+    def _get_kwargs(self):
+        return {
+            "backend": self.backend,
+            "n_stocks": self.n_stocks,
+            "backfill_days": self.backfill_days,
+            "finance_periods": self.finance_periods,
+            "finance_code_stocks": self.finance_code_stocks,
+            "latency": self.latency,
+            "error_every": self.error_every,
+            "isolate": False,
+        }
+
+    # #############################################################
+    # 一次性数据库和tushare替身
+    # #############################################################
+    def _get_bench_name(self):
+        return self.conf.mysql_prefix + bench_database
+
+    def _get_sqlite_path(self):
+        sqlite_dir = self.conf.sqlite_dir
+        os.makedirs(sqlite_dir, exist_ok=True)
+        return os.path.join(sqlite_dir, bench_database + ".db")
+
+    def setup(self):
+        """
+        创建一次性数据库并注册为stk_data的engine, 替换下载模块的pro和downloader
+        """
+        if self.backend == "mysql":
+            bench_name = self._get_bench_name()
+            admin = DataBase("information_schema")
+            admin.execute_sql(f"DROP DATABASE IF EXISTS {bench_name};")
+            admin.create_database(bench_name)
+            self.engine = create_mysql_engine(bench_name)
+        else:
+            sqlite_path = self._get_sqlite_path()
+            if os.path.exists(sqlite_path):
+                os.remove(sqlite_path)
+            self.engine = create_engine(
+                "sqlite:///" + sqlite_path, connect_args={"timeout": 60}
+            )
+        register_engine(bench_database, self.engine)
+        self._environ_dct = {key: os.environ.get(key) for key in bench_environ_dct}
+        os.environ.update(bench_environ_dct)
+        reload_settings()
+        self.pro = FakeProApi(
+            n_stocks=self.n_stocks,
+            n_periods=self.finance_periods,
+            latency=self.latency,
+            error_every=self.error_every,
+        )
+        self._origin_lst = []
+        for module in download_module_lst:
+            dl = module.downloader
+            self._origin_lst.append((module, module.pro, dl._sleeptime, dl._maxreqs))
+            module.pro = self.pro
+            # 额度报错后只短暂休眠, 不按真实tushare的60s等待
+            dl._sleeptime = self.retry_sleep
+            dl._maxreqs = float("inf")
+
+    def teardown(self):
+        """
+        恢复下载模块, 删除一次性数据库
+        """
+        for module, pro, sleeptime, maxreqs in self._origin_lst:
+            module.pro = pro
+            module.downloader._sleeptime = sleeptime
+            module.downloader._maxreqs = maxreqs
+        self._origin_lst = []
+        for key, value in self._environ_dct.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        self._environ_dct = {}
+        reload_settings()
+        dispose_engines()
+        self.engine = None
+        if self.backend == "mysql":
+            DataBase("information_schema").execute_sql(
+                f"DROP DATABASE IF EXISTS {self._get_bench_name()};"
+            )
+        else:
+            sqlite_path = self._get_sqlite_path()
+            if os.path.exists(sqlite_path):
+                os.remove(sqlite_path)
+
+    def _reset_tables(self, table_lst):
+        """
+        重建数据表, 每个场景都从空表开始
+        """
+        catalog = get_catalog()
+        with self.engine.connect() as conn:
+            for table_name in table_lst:
+                conn.execute(f"DROP TABLE IF EXISTS {table_name};")
+                table_schema = catalog.get_table(bench_database, table_name)
+                if self.backend == "mysql":
+                    sql_lst = [table_schema.get_create_table_sql()]
+                else:
+                    sql_lst = build_embedded_create_table_sql(table_schema)
+                for sql in sql_lst:
+                    conn.execute(sql)
+
+    def _seed_tradecal(self, n_days):
+        date_lst = get_weekday_lst(n_days)
+        df = pd.DataFrame({"cal_date": [int(i) for i in date_lst], "is_open": 1})
+        df.to_sql("asharetradecal", self.engine, index=False, if_exists="append")
+
+    def _seed_stockbasic(self, n_stocks):
+        columns = get_catalog().get_columns(bench_database, "asharestockbasic")
+        df = make_frame(columns, get_code_lst(n_stocks), ["20000104"])
+        df["delist_date"] = None
+        df.to_sql("asharestockbasic", self.engine, index=False, if_exists="append")
+
+    # #############################################################
+    # 场景
+    # #############################################################
+    def _run_daily(self, n_days):
+        self._reset_tables(["asharetradecal"] + scenario_table_dct["daily"])
+        self._seed_tradecal(n_days)
+        dl = asharedaily.AshareDailyDownload()
+        dl.download_dailyprices()
+        dl.download_dailybasic()
+
+    def _scenario_daily(self):
+        # 每晚的增量更新: 一个交易日
+        self._run_daily(1)
+
+    def _scenario_backfill(self):
+        # 追数据: 约一年的交易日
+        self._run_daily(self.backfill_days)
+
+    def _scenario_finance_period(self):
+        self._reset_tables(scenario_table_dct["finance_period"])
+        dl = asharefinance.AshareFinanceDownload()
+        # 只下载最近的若干个报告期, 而不是1991年至今
+        period_lst = dl._get_all_period_lst()[-self.finance_periods:]
+        dl._get_all_period_lst = lambda: period_lst
+        dl.download_main()
+
+    def _scenario_finance_code(self):
+        self._reset_tables(["asharestockbasic"] + scenario_table_dct["finance_code"])
+        self._seed_stockbasic(self.finance_code_stocks)
+        dl = asharefinance.AshareFinanceDownload()
+        dl.download_main_code()
+
+    def _count_rows(self, table_lst):
+        n_rows = 0
+        with self.engine.connect() as conn:
+            for table_name in table_lst:
+                n_rows += conn.execute(f"select count(*) from {table_name};").fetchall()[0][0]
+        return n_rows
+
+    def _run_scenario(self, scenario):
+        """
+        在当前进程中运行单个场景
+
+        Returns
+        -------
+        dict. 场景结果, 字段见result_columns
+        """
+        self.setup()
+        try:
+            self.pro.reset()
+            stats_history.clear()
+            start_time = time.time()
+            getattr(self, "_scenario_" + scenario)()
+            seconds = time.time() - start_time
+            n_rows = self._count_rows(scenario_table_dct[scenario])
+        finally:
+            self.teardown()
+        stage_dct = {"fetch": 0.0, "transform": 0.0, "store": 0.0}
+        for _, stats, _ in stats_history:
+            for stage in stage_dct.keys():
+                stage_dct[stage] += stats[stage].seconds
+        result = {
+            "run_time": datetime.datetime.now().strftime(r"%Y-%m-%d %H:%M:%S"),
+            "commit": get_commit(),
+            "backend": self.backend,
+            "scenario": scenario,
+            "seconds": round(seconds, 3),
+            "rows": n_rows,
+            "rows_per_s": round(n_rows / seconds, 1),
+            "api_calls": self.pro.calls,
+            "api_errors": self.pro.errors,
+            "calls_per_s": round(self.pro.calls / seconds, 2),
+            "peak_rss_mb": round(get_peak_rss_mb(), 1),
+            "fetch_s": round(stage_dct["fetch"], 3),
+            "transform_s": round(stage_dct["transform"], 3),
+            "store_s": round(stage_dct["store"], 3),
+        }
+        return result
+
+    def _run_isolated(self, scenario):
+        # 每个场景在新的子进程中运行, 峰值内存只包含该场景
+        ctx = multiprocessing.get_context("spawn")
+        res_q = ctx.Queue()
+        process = ctx.Process(
+            target=_run_scenario_process, args=(self._get_kwargs(), scenario, res_q)
+        )
+        process.start()
+        result = res_q.get()
+        process.join()
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    @logger_decorator(logger)
+    def run(self, scenario_lst=None):
+        """
+        依次运行场景, 结果追加到config.ini中result_path指定的csv
+
+        Parameters
+        ----------
+        scenario_lst: List[str]. 场景列表, 默认读取config.ini中的scenario_lst.
+            可选daily, backfill, finance_period, finance_code
+
+        Returns
+        -------
+        pandas.DataFrame. 各场景的结果
+        """
+        if scenario_lst is None:
+            scenario_lst = list(self.conf.scenario_lst)
+        result_lst = []
+        for scenario in scenario_lst:
+            if scenario not in scenario_table_dct:
+                raise ValueError(f"不支持的场景: {scenario}")
+            if (scenario in mysql_only_scenario_lst) and (self.backend != "mysql"):
+                logger.warning(f"场景{scenario}只能在mysql上运行, 跳过")
+                continue
+            logger.info(f"开始运行场景{scenario}")
+            if self.isolate:
+                result = self._run_isolated(scenario)
+            else:
+                result = self._run_scenario(scenario)
+            logger.info(
+                f"场景{scenario}: 共用时{result['seconds']}s, 写入{result['rows']}行, "
+                f"{result['rows_per_s']}行/s, 接口调用{result['api_calls']}次, "
+                f"{result['calls_per_s']}次/s, 峰值内存{result['peak_rss_mb']}MB, "
+                f"fetch {result['fetch_s']}s, transform {result['transform_s']}s, "
+                f"store {result['store_s']}s"
+            )
+            result_lst.append(result)
+        result_df = pd.DataFrame(result_lst, columns=result_columns)
+        if len(result_df) > 0:
+            flag_header = not os.path.exists(self.result_path)
+            result_df.to_csv(
+                self.result_path, mode="a", header=flag_header, index=False
+            )
+        return result_df
+
+
+def _run_scenario_process(kwargs, scenario, res_q):
+    """
+    子进程入口. 结果或异常通过队列返回
+    """
+    try:
+        res_q.put(Benchmark(**kwargs)._run_scenario(scenario))
+    except Exception as e:
+        res_q.put(e)
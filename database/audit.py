@@ -0,0 +1,424 @@
+'''
+Author: dkl
+Date: 2026-10-20 17:05:48
+Description: 数据缺口检查. 每个数据库用一条分组SQL统计所有数据表每个日期的行数,
+与交易日历和上市股票数对比, 找出缺失的日期和行数异常少的日期, 并可只重新下载这些日期
+'''
+import datetime
+import importlib
+from typing import NamedTuple
+import numpy as np
+import pandas as pd
+from sqlalchemy import inspect
+from database.database import DataBase
+from download.plan import get_window, set_window
+from utils.conf import get_settings
+from utils.logger import Logger, logger_decorator
+
+# 获取日志记录器
+logger = Logger("audit")
+# 检查结果的字段
+audit_columns = ["TABLE_SCHEMA", "TABLE_NAME", "DATE", "ROWS", "EXPECTED", "ISSUE"]
+
+
+class AuditSpec(NamedTuple):
+    """
+    一张数据表的检查规则
+
+    database: 数据库名
+    table_name: 数据表名
+    date_col: 日期字段
+    freq: 日期频率, daily为每个交易日, monthly为每月最后一个交易日, period为报告期
+    check: 行数的检查方式, universe为与当天上市股票数对比, peer为与前后各期行数的中位数对比
+    repair: 修复时运行的(模块, 下载类, 方法)或(模块, 下载类, 方法, 参数字典),
+        方法按下载窗口中的日期下载, 只能写入该数据表
+    """
+    database: str
+    table_name: str
+    date_col: str
+    freq: str
+    check: str
+    repair: tuple
+
+
+# 需要检查的数据表
+audit_spec_lst = [
+    AuditSpec("stk_data", "asharedailyprices", "trade_date", "daily", "universe",
+              ("download.asharedaily", "AshareDailyDownload", "download_dailyprices")),
+    AuditSpec("stk_data", "asharedailybasic", "trade_date", "daily", "universe",
+              ("download.asharedaily", "AshareDailyDownload", "download_dailybasic")),
+    AuditSpec("stk_data", "asharemonthlyprices", "trade_date", "monthly", "universe",
+              ("download.asharemonthly", "AshareMonthlyDownload", "download_monthlyprices")),
+    AuditSpec("stk_data", "ashareindexdaily", "trade_date", "daily", "peer",
+              ("download.ashareindex", "AshareIndexDownload", "download_daily")),
+    AuditSpec("stk_data", "ashareindexmonthly", "trade_date", "monthly", "peer",
+              ("download.ashareindex", "AshareIndexDownload", "download_monthly")),
+    AuditSpec("stk_data", "ashareindexweight", "trade_date", "monthly", "peer",
+              ("download.ashareindex", "AshareIndexDownload", "download_weight")),
+    AuditSpec("stk_data", "asharesw2021daily", "trade_date", "daily", "peer",
+              ("download.asharesw2021daily", "AshareSW2021DailyDownload", "download_dailyprices")),
+    AuditSpec("stk_data", "ashareincome", "end_date", "period", "peer",
+              ("download.asharefinance", "AshareFinanceDownload", "download_income")),
+    AuditSpec("stk_data", "asharebalancesheet", "end_date", "period", "peer",
+              ("download.asharefinance", "AshareFinanceDownload", "download_balancesheet")),
+    AuditSpec("stk_data", "asharecashflow", "end_date", "period", "peer",
+              ("download.asharefinance", "AshareFinanceDownload", "download_cashflow")),
+    AuditSpec("fut_data", "futdailyprices", "trade_date", "daily", "peer",
+              ("download.futdaily", "FutDailyDownload", "download_dailyprices")),
+    AuditSpec("fut_data", "futwsr", "trade_date", "daily", "peer",
+              ("download.futdaily", "FutDailyDownload", "download_futwsr")),
+] + [
+    AuditSpec("fut_data", "futholding" + exchange.lower(), "trade_date", "daily", "peer",
+              ("download.futdaily", "FutDailyDownload", "download_futholding",
+               {"exchange_lst": [exchange]}))
+    for exchange in ["CFFEX", "CZCE", "DCE", "SHFE"]
+]
+
+
+def run_repair(spec):
+    """
+    运行数据表的下载方法, 只下载下载窗口中的日期
+
+    Parameters
+    ----------
+    spec: AuditSpec. 数据表
+    """
+    module_name, class_name, method = spec.repair[:3]
+    kwargs = spec.repair[3] if len(spec.repair) > 3 else {}
+    module = importlib.import_module(module_name)
+    getattr(getattr(module, class_name)(), method)(**kwargs)
+
+
+def select_spec_lst(module_lst, spec_lst=None):
+    """
+    筛选由指定下载模块修复的数据表, 用于只检查部分任务下载的数据表
+
+    Parameters
+    ----------
+    module_lst: List[str]. 下载模块, 如['download.asharedaily']
+    spec_lst: List[AuditSpec]. 数据表, 默认为None, 即audit_spec_lst
+
+    Returns
+    -------
+    List[AuditSpec]
+    """
+    spec_lst = audit_spec_lst if spec_lst is None else spec_lst
+    return [spec for spec in spec_lst if spec.repair[0] in set(module_lst)]
+
+
+def get_count_sql(spec_lst):
+    """
+    统计多张数据表每个日期行数的SQL, 各表的分组统计用UNION ALL合并为一条语句
+
+    Parameters
+    ----------
+    spec_lst: List[AuditSpec]. 同一个数据库中的数据表
+
+    Returns
+    -------
+    str
+    """
+    sql_lst = [
+        f"select '{spec.table_name}' as table_name, {spec.date_col} as date, "
+        f"count(*) as n_rows from {spec.table_name} group by {spec.date_col}"
+        for spec in spec_lst
+    ]
+    return "\nunion all\n".join(sql_lst) + ";"
+
+
+def get_calendar_dct(trade_date_lst, yes_date):
+    """
+    根据交易日列表生成各频率的日期列表
+
+    Parameters
+    ----------
+    trade_date_lst: List[str]. 截至昨天的交易日列表
+    yes_date: str. 昨天的日期
+
+    Returns
+    -------
+    dict. {freq: List[str]}
+    """
+    trade_date_lst = sorted(trade_date_lst)
+    # 每月最后一个交易日, 不含本月
+    this_month = yes_date[:6]
+    month_dct = {}
+    for trade_date in trade_date_lst:
+        if trade_date[:6] < this_month:
+            month_dct[trade_date[:6]] = trade_date
+    # 1991年以来截至昨天的报告期
+    period_lst = []
+    for year in range(1991, int(yes_date[:4]) + 1):
+        for md in ["0331", "0630", "0930", "1231"]:
+            if str(year) + md <= yes_date:
+                period_lst.append(str(year) + md)
+    return {
+        "daily": trade_date_lst,
+        "monthly": sorted(month_dct.values()),
+        "period": period_lst,
+    }
+
+
+def get_active_count(date_arr, list_date_arr, delist_date_arr):
+    """
+    每个日期的上市股票数: 上市日期不晚于该日且退市日期晚于该日(或未退市)的股票数
+
+    Parameters
+    ----------
+    date_arr: numpy.ndarray. 日期, 格式为YYYYMMDD的整数
+    list_date_arr: numpy.ndarray. 上市日期
+    delist_date_arr: numpy.ndarray. 退市日期, 未退市的不包含在内
+
+    Returns
+    -------
+    numpy.ndarray
+    """
+    list_date_arr = np.sort(list_date_arr)
+    delist_date_arr = np.sort(delist_date_arr)
+    n_list = np.searchsorted(list_date_arr, date_arr, side="right")
+    n_delist = np.searchsorted(delist_date_arr, date_arr, side="right")
+    return n_list - n_delist
+
+
+def audit_table(count_df, calendar_lst, check, active_arr=None, min_coverage=0.8,
+                min_peer_ratio=0.5, peer_window=21, skip_last=0):
+    """
+    检查单张数据表. 检查范围为表中最早的日期至日历中最后一个日期
+
+    Parameters
+    ----------
+    count_df: pandas.DataFrame. 每个日期的行数, 字段为date和n_rows
+    calendar_lst: List[str]. 应有的日期列表
+    check: str. 行数的检查方式, 'universe'或'peer'
+    active_arr: numpy.ndarray. check为universe时, calendar_lst中每个日期的上市股票数
+    min_coverage: float. universe检查中行数不低于上市股票数的比例
+    min_peer_ratio: float. peer检查中行数不低于前后各期行数中位数的比例
+    peer_window: int. peer检查的期数
+    skip_last: int. 最后几期不检查行数, 只检查是否缺失
+
+    Returns
+    -------
+    pandas.DataFrame. 异常的日期, 字段为DATE, ROWS, EXPECTED, ISSUE
+    """
+    empty_df = pd.DataFrame(columns=["DATE", "ROWS", "EXPECTED", "ISSUE"])
+    if len(count_df) == 0 or len(calendar_lst) == 0:
+        return empty_df
+    df = pd.DataFrame({"DATE": calendar_lst})
+    if active_arr is not None:
+        df["ACTIVE"] = active_arr
+    df = df[df["DATE"] >= count_df["date"].min()].reset_index(drop=True)
+    if len(df) == 0:
+        return empty_df
+    n_rows = count_df.set_index("date")["n_rows"]
+    df["ROWS"] = df["DATE"].map(n_rows).fillna(0).astype(int)
+    peer = (
+        df["ROWS"].replace(0, np.nan)
+        .rolling(peer_window, center=True, min_periods=1).median()
+    )
+    if check == "universe":
+        # 没有股票基本信息时退化为peer检查
+        flag_active = df["ACTIVE"] > 0
+        df["EXPECTED"] = df["ACTIVE"].astype(float).where(flag_active, peer)
+        ratio = np.where(flag_active, min_coverage, min_peer_ratio)
+    elif check == "peer":
+        df["EXPECTED"] = peer
+        ratio = min_peer_ratio
+    else:
+        raise ValueError("check must be universe or peer.")
+    flag_missing = df["ROWS"] == 0
+    flag_low = (~flag_missing) & (df["ROWS"] < ratio * df["EXPECTED"])
+    if skip_last > 0:
+        flag_low.iloc[-skip_last:] = False
+    df["ISSUE"] = np.where(flag_missing, "missing", "low_rows")
+    df = df[flag_missing | flag_low]
+    return df[["DATE", "ROWS", "EXPECTED", "ISSUE"]].reset_index(drop=True)
+
+
+class DataAudit(DataBase):
+    """
+    数据缺口检查和修复
+
+    使用方法:
+        audit = DataAudit()
+        audit_df = audit.audit()
+        audit.repair(audit_df)
+    """
+
+    def __init__(self, spec_lst=None, start_date=None, end_date=None):
+        """
+        构造函数
+
+        Parameters
+        ----------
+        spec_lst: List[AuditSpec]. 需要检查的数据表, 默认为None, 即audit_spec_lst
+        start_date: str. 只报告不早于该日期的异常, 如'20230101'. 默认为None, 即不限制
+        end_date: str. 只报告不晚于该日期的异常, 如'20231231'. 默认为None, 即不限制
+        """
+        super().__init__("stk_data")
+        self.spec_lst = audit_spec_lst if spec_lst is None else spec_lst
+        self.start_date = start_date
+        self.end_date = end_date
+        self.conf = get_settings().audit
+
+    def _get_count_df(self):
+        """
+        每个数据库执行一条分组SQL, 统计所有数据表每个日期的行数
+        """
+        df_lst = []
+        database_lst = sorted(set(spec.database for spec in self.spec_lst))
+        for database in database_lst:
+            spec_lst = [spec for spec in self.spec_lst if spec.database == database]
+            engine = self.engine if database == self.database else DataBase(database).engine
+            temp_df = pd.read_sql(get_count_sql(spec_lst), con=engine)
+            temp_df["database"] = database
+            df_lst.append(temp_df)
+        count_df = pd.concat(df_lst, axis=0, ignore_index=True)
+        count_df["date"] = count_df["date"].astype(str)
+        return count_df
+
+    def _get_calendar_dct(self):
+        yes_date = (datetime.datetime.now() - datetime.timedelta(days=1)).strftime(r"%Y%m%d")
+        sql = f"""select a.cal_date as trade_date from asharetradecal a
+                  where a.cal_date<='{yes_date}' and a.is_open=1;"""
+        trade_date_lst = pd.read_sql(sql=sql, con=self.engine)["trade_date"].astype(str).tolist()
+        return get_calendar_dct(trade_date_lst, yes_date)
+
+    def _get_active_count(self, date_lst):
+        sql = "select list_date, delist_date from asharestockbasic;"
+        df = pd.read_sql(sql=sql, con=self.engine)
+        list_date_arr = pd.to_numeric(df["list_date"], errors="coerce").dropna().values
+        delist_date_arr = pd.to_numeric(df["delist_date"], errors="coerce").dropna().values
+        date_arr = np.array(date_lst, dtype=np.int64)
+        return get_active_count(date_arr, list_date_arr, delist_date_arr)
+
+    @logger_decorator(logger)
+    def audit(self):
+        """
+        检查所有数据表, 返回检查范围内缺失的日期和行数异常少的日期
+
+        Returns
+        -------
+        pandas.DataFrame. 字段见audit_columns. ISSUE为missing(缺失)或low_rows(行数过少)
+        """
+        count_df = self._get_count_df()
+        calendar_dct = self._get_calendar_dct()
+        active_dct = {}
+        df_lst = []
+        for spec in self.spec_lst:
+            calendar_lst = calendar_dct[spec.freq]
+            active_arr = None
+            if spec.check == "universe":
+                if spec.freq not in active_dct:
+                    active_dct[spec.freq] = self._get_active_count(calendar_lst)
+                active_arr = active_dct[spec.freq]
+            flag = (count_df["database"] == spec.database) & (count_df["table_name"] == spec.table_name)
+            temp_df = audit_table(
+                count_df.loc[flag, ["date", "n_rows"]],
+                calendar_lst,
+                spec.check,
+                active_arr=active_arr,
+                min_coverage=self.conf.min_coverage,
+                min_peer_ratio=self.conf.min_peer_ratio,
+                peer_window=self.conf.peer_window,
+                skip_last=self.conf.skip_last_periods if spec.freq == "period" else 0,
+            )
+            temp_df.insert(0, "TABLE_NAME", spec.table_name)
+            temp_df.insert(0, "TABLE_SCHEMA", spec.database)
+            df_lst.append(temp_df)
+        audit_df = pd.concat(df_lst, axis=0, ignore_index=True)[audit_columns]
+        # 前后各期的行数仍按全部日期统计, 只筛选报告的日期
+        if self.start_date is not None:
+            audit_df = audit_df[audit_df["DATE"] >= str(self.start_date)]
+        if self.end_date is not None:
+            audit_df = audit_df[audit_df["DATE"] <= str(self.end_date)]
+        audit_df = audit_df.reset_index(drop=True)
+        for (database, table_name, issue), temp_df in audit_df.groupby(
+            ["TABLE_SCHEMA", "TABLE_NAME", "ISSUE"]
+        ):
+            date_lst = temp_df["DATE"].tolist()
+            logger.warning(
+                f"{database}.{table_name}有{len(date_lst)}个日期{issue}: "
+                f"{date_lst[0]}-{date_lst[-1]}"
+            )
+        return audit_df
+
+    def _get_engine(self, database):
+        return self.engine if database == self.database else DataBase(database).engine
+
+    def _hold_rows(self, engine, spec, date_lst):
+        """
+        将行数过少的日期中已有的数据移到暂存表(表名加_repair), 下载方法才会重新下载这些日期
+        """
+        hold_table_name = spec.table_name + "_repair"
+        string = ",".join(f"'{date}'" for date in date_lst)
+        where_sql = f"{spec.date_col} in ({string})"
+        with engine.connect() as conn:
+            conn.execute(f"DROP TABLE IF EXISTS {hold_table_name};")
+            conn.execute(f"create table {hold_table_name} as select * from {spec.table_name} "
+                         f"where {where_sql};")
+        try:
+            with engine.begin() as conn:
+                conn.execute(f"delete from {spec.table_name} where {where_sql};")
+        except Exception:
+            with engine.connect() as conn:
+                conn.execute(f"DROP TABLE IF EXISTS {hold_table_name};")
+            raise
+        logger.info(f"{spec.database}.{spec.table_name}中{len(date_lst)}个日期的数据已移到{hold_table_name}")
+
+    def _restore_rows(self, engine, spec):
+        """
+        下载之后, 将没有重新下载到数据的日期从暂存表放回原表, 再删除暂存表.
+        在一个事务中放回, 下载失败或中途退出时不会丢失原有的数据
+        """
+        hold_table_name = spec.table_name + "_repair"
+        if not inspect(engine).has_table(hold_table_name):
+            return
+        with engine.begin() as conn:
+            sql = f"select distinct {spec.date_col} from {hold_table_name};"
+            hold_lst = [str(row[0]) for row in conn.execute(sql).fetchall()]
+            restore_lst = []
+            if len(hold_lst) > 0:
+                string = ",".join(f"'{date}'" for date in hold_lst)
+                sql = f"""select distinct {spec.date_col} from {spec.table_name}
+                          where {spec.date_col} in ({string});"""
+                exist_set = {str(row[0]) for row in conn.execute(sql).fetchall()}
+                restore_lst = [date for date in hold_lst if date not in exist_set]
+            if len(restore_lst) > 0:
+                string = ",".join(f"'{date}'" for date in restore_lst)
+                conn.execute(f"""insert into {spec.table_name} select * from {hold_table_name}
+                                 where {spec.date_col} in ({string});""")
+                logger.warning(f"{spec.database}.{spec.table_name}中{len(restore_lst)}个日期"
+                               f"没有重新下载到数据, 已放回原有的数据")
+        with engine.connect() as conn:
+            conn.execute(f"DROP TABLE IF EXISTS {hold_table_name};")
+
+    @logger_decorator(logger)
+    def repair(self, audit_df):
+        """
+        只重新下载检查发现异常的日期. 行数过少的日期中已有的数据先移到暂存表,
+        再将下载窗口设为这些日期, 运行数据表对应的下载方法.
+        下载之后, 没有重新下载到数据的日期在一个事务中放回原有的数据, 缺失的日期下次运行时仍会下载
+
+        Parameters
+        ----------
+        audit_df: pandas.DataFrame. audit的结果
+        """
+        spec_dct = {(spec.database, spec.table_name): spec for spec in self.spec_lst}
+        origin_window = get_window()
+        try:
+            for (database, table_name), temp_df in audit_df.groupby(["TABLE_SCHEMA", "TABLE_NAME"]):
+                spec = spec_dct[(database, table_name)]
+                engine = self._get_engine(database)
+                # 上次修复中途退出时留下的暂存数据先放回
+                self._restore_rows(engine, spec)
+                low_lst = temp_df.loc[temp_df["ISSUE"] == "low_rows", "DATE"].tolist()
+                if len(low_lst) > 0:
+                    self._hold_rows(engine, spec, low_lst)
+                set_window(date_lst=temp_df["DATE"].tolist())
+                logger.info(f"重新下载{database}.{table_name}的{len(temp_df)}个日期")
+                try:
+                    run_repair(spec)
+                finally:
+                    self._restore_rows(engine, spec)
+        finally:
+            set_window(*origin_window)
@@ -0,0 +1,367 @@
+'''
+Author: dkl
+Date: 2026-10-19 21:32:08
+Description: 表结构目录. 本地表结构文件在进程内只读取一次, 按(数据库, 表名)建立索引,
+提供字段列表、SQLAlchemy字段类型和建表语句
+'''
+import re
+import threading
+import pandas as pd
+from sqlalchemy import types
+from sqlalchemy.dialects.mysql import DOUBLE
+from database.partition import get_partition_clause
+from utils.conf import get_settings
+
+# 字段类型与SQLAlchemy类型的对应关系. 值为(类型, 是否使用括号中的参数)
+_sql_type_dct = {
+    "tinyint": (types.SMALLINT, False),
+    "smallint": (types.SMALLINT, False),
+    "int": (types.INT, False),
+    "bigint": (types.BIGINT, False),
+    "float": (types.FLOAT, False),
+    "double": (DOUBLE, False),
+    "decimal": (types.DECIMAL, True),
+    "char": (types.CHAR, True),
+    "varchar": (types.VARCHAR, True),
+    "text": (types.TEXT, False),
+    "date": (types.DATE, False),
+    "datetime": (types.DATETIME, False),
+}
+_sql_type_pattern = re.compile(r"^\s*(\w+)\s*(?:\(([\d,\s]+)\))?")
+# 进程内共享的表结构目录
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def parse_sql_type(column_type):
+    """
+    将information_schema中的COLUMN_TYPE转为SQLAlchemy类型
+
+    Parameters
+    ----------
+    column_type: str. 字段类型, 如'decimal(20,4)', 'char(9)', 'int(11) unsigned'
+
+    Returns
+    -------
+    sqlalchemy类型实例
+    """
+    match = _sql_type_pattern.match(column_type.lower())
+    if (match is None) or (match.group(1) not in _sql_type_dct):
+        raise ValueError(f"不支持的字段类型: {column_type}")
+    sql_type, use_args = _sql_type_dct[match.group(1)]
+    if use_args and (match.group(2) is not None):
+        args = [int(i) for i in match.group(2).split(",")]
+        return sql_type(*args)
+    return sql_type()
+
+
+def _escape_percent(string):
+    # 语句中的%需要转义, 否则会被当成参数占位符
+    return "%%".join(string.split("%"))
+
+
+class TableSchema(object):
+    """
+    单个表的表结构
+    """
+
+    def __init__(self, schema, table_name, tb_df, ind_df, tb_comm, part_df):
+        """
+        构造函数
+
+        Parameters
+        ----------
+        schema: str. 数据库名字
+        table_name: str. 表名
+        tb_df: pandas.DataFrame. 字段信息, 按ORDINAL_POSITION排序
+        ind_df: pandas.DataFrame. 索引信息, 按INDEX_NAME, SEQ_IN_INDEX排序
+        tb_comm: str. 表注释, 已转义%
+        part_df: pandas.DataFrame. 分区配置, 没有分区时为空
+        """
+        self.schema = schema
+        self.table_name = table_name
+        self.tb_df = tb_df
+        self.ind_df = ind_df
+        self.tb_comm = tb_comm
+        self.part_df = part_df
+        self.columns = tb_df["COLUMN_NAME"].tolist()
+        self._sql_dtype = None
+        self._create_table_sql = None
+
+    def get_sql_dtype(self):
+        """
+        获取字段类型, 按字段顺序排列
+
+        Returns
+        -------
+        dict. {columns_name: sql_type}
+        """
+        if self._sql_dtype is None:
+            self._sql_dtype = {
+                col: parse_sql_type(col_type)
+                for col, col_type in zip(self.columns, self.tb_df["COLUMN_TYPE"])
+            }
+        return dict(self._sql_dtype)
+
+    def get_create_table_sql(self, table_name=None):
+        """
+        获取建表语句
+
+        Parameters
+        ----------
+        table_name: str. 建表使用的表名, 默认为None, 即原表名. 可用于创建影子表
+
+        Returns
+        -------
+        str. 建表语句
+        """
+        if table_name is not None:
+            return build_create_table_sql(
+                table_name, self.tb_df, self.ind_df, self.tb_comm, self.part_df
+            )
+        if self._create_table_sql is None:
+            self._create_table_sql = build_create_table_sql(
+                self.table_name, self.tb_df, self.ind_df, self.tb_comm, self.part_df
+            )
+        return self._create_table_sql
+
+
+def get_column_sql(col_name, col_type, is_nullable, col_comment):
+    """
+    字段定义, 如"trade_date int NOT NULL  COMMENT '交易日期' "
+
+    Parameters
+    ----------
+    col_name: str. 字段名
+    col_type: str. 字段类型
+    is_nullable: str. 是否可以为空, 'YES'或'NO'
+    col_comment: str. 字段注释, 可以为空
+    """
+    col_null = "" if is_nullable == "YES" else "NOT NULL"
+    if pd.isna(col_comment) or (col_comment == ""):
+        col_comment = ""
+    else:
+        col_comment = " COMMENT '" + _escape_percent(col_comment) + "'"
+    return " ".join([col_name, col_type, col_null, col_comment, ""])
+
+
+def get_index_sql(ind_name, col_lst, non_unique, ind_type):
+    """
+    主键或索引定义, 如"KEY code_ind (stock_code) USING BTREE"
+
+    Parameters
+    ----------
+    ind_name: str. 索引名, 主键为'PRIMARY'
+    col_lst: List[str]. 索引字段
+    non_unique: int. 是否为非唯一索引, 0或1
+    ind_type: str. 索引类型, 如'BTREE'
+    """
+    col_str = "(" + (", ".join(col_lst)) + ") "
+    if ind_name == "PRIMARY":
+        return "PRIMARY KEY " + col_str
+    elif non_unique == 0:
+        return f"UNIQUE KEY {ind_name} {col_str}USING {ind_type}"
+    return f"KEY {ind_name} {col_str}USING {ind_type}"
+
+
+def build_create_table_sql(table_name, tb_df, ind_df, tb_comm, part_df=None):
+    """
+    根据表结构生成建表语句
+
+    Parameters
+    ----------
+    table_name: str. 表名
+    tb_df: pandas.DataFrame. 字段信息
+    ind_df: pandas.DataFrame. 索引信息
+    tb_comm: str. 表注释
+    part_df: pandas.DataFrame. 分区配置, 默认为None
+
+    Returns
+    -------
+    str. 建表语句
+    """
+    # 字段
+    line_lst = [
+        get_column_sql(col_name, col_type, is_nullable, col_comment)
+        for col_name, col_type, is_nullable, col_comment in zip(
+            tb_df["COLUMN_NAME"],
+            tb_df["COLUMN_TYPE"],
+            tb_df["IS_NULLABLE"],
+            tb_df["COLUMN_COMMENT"],
+        )
+    ]
+    # 主键约束和索引
+    for ind_name, temp_ind_df in ind_df.groupby("INDEX_NAME", sort=True):
+        line_lst.append(get_index_sql(
+            ind_name,
+            temp_ind_df["COLUMN_NAME"].tolist(),
+            int(temp_ind_df["NON_UNIQUE"].values[0]),
+            temp_ind_df["INDEX_TYPE"].values[0],
+        ))
+    tb_sql = f"CREATE TABLE {table_name} (\n" + ",\n".join(line_lst) + "\n)"
+    tb_sql = tb_sql + "ENGINE=InnoDB DEFAULT CHARSET=utf8mb4"
+    if not pd.isna(tb_comm):
+        tb_sql = tb_sql + f" COMMENT='{tb_comm}'"
+    # 分区子句. 分区字段必须包含在主键中
+    if (part_df is not None) and (len(part_df) > 0):
+        tb_sql = tb_sql + get_partition_clause(part_df.iloc[0])
+    return tb_sql + ";"
+
+
+def build_embedded_create_table_sql(table_schema, with_index=True):
+    """
+    根据表结构生成SQLite或DuckDB等嵌入式数据库的建表语句.
+    保留字段类型和非空约束, 不含注释和分区
+
+    Parameters
+    ----------
+    table_schema: TableSchema. 表结构
+    with_index: bool. 是否包括主键和索引, 默认为True. DuckDB等列式数据库不需要索引
+
+    Returns
+    -------
+    List[str]. 建表和建索引语句
+    """
+    table_name = table_schema.table_name
+    line_lst = []
+    for col_name, col_type, is_nullable in zip(
+        table_schema.tb_df["COLUMN_NAME"],
+        table_schema.tb_df["COLUMN_TYPE"],
+        table_schema.tb_df["IS_NULLABLE"],
+    ):
+        col_null = "" if is_nullable == "YES" else " NOT NULL"
+        line_lst.append(f"{col_name} {col_type}{col_null}")
+    sql_lst = []
+    if with_index:
+        for ind_name, temp_ind_df in table_schema.ind_df.groupby("INDEX_NAME", sort=True):
+            col_str = ", ".join(temp_ind_df["COLUMN_NAME"].tolist())
+            if ind_name == "PRIMARY":
+                line_lst.append(f"PRIMARY KEY ({col_str})")
+                continue
+            unique = "UNIQUE " if int(temp_ind_df["NON_UNIQUE"].values[0]) == 0 else ""
+            # SQLite中索引名在整个库内唯一
+            sql_lst.append(
+                f"CREATE {unique}INDEX {table_name}_{ind_name} ON {table_name} ({col_str});"
+            )
+    tb_sql = f"CREATE TABLE {table_name} (\n" + ",\n".join(line_lst) + "\n);"
+    return [tb_sql] + sql_lst
+
+
+class Catalog(object):
+    """
+    表结构目录. 读取table_structure, table_index, table_comment和table_partition
+    四个文件, 按(数据库, 表名)索引
+    """
+
+    def __init__(self):
+        table_conf = get_settings().table_structure
+        self.table_struct_df = pd.read_csv(table_conf.table_structure_path)
+        self.table_ind_df = pd.read_csv(table_conf.table_index_path)
+        self.table_comment_df = pd.read_csv(table_conf.table_comment_path)
+        self.table_part_df = pd.read_csv(table_conf.table_partition_path)
+        self._table_dct = self._build_table_dct()
+
+    def _build_table_dct(self):
+        key = ["TABLE_SCHEMA", "TABLE_NAME"]
+        tb_df = self.table_struct_df.sort_values(key + ["ORDINAL_POSITION"])
+        ind_df = self.table_ind_df.sort_values(key + ["INDEX_NAME", "SEQ_IN_INDEX"])
+        tb_dct = {k: v.reset_index(drop=True) for k, v in tb_df.groupby(key, sort=False)}
+        ind_dct = {k: v.reset_index(drop=True) for k, v in ind_df.groupby(key, sort=False)}
+        part_dct = {
+            k: v.reset_index(drop=True)
+            for k, v in self.table_part_df.groupby(key, sort=False)
+        }
+        comm_dct = dict(zip(
+            zip(self.table_comment_df["TABLE_SCHEMA"], self.table_comment_df["TABLE_NAME"]),
+            self.table_comment_df["TABLE_COMMENT"],
+        ))
+        empty_ind_df = self.table_ind_df.iloc[0:0]
+        empty_part_df = self.table_part_df.iloc[0:0]
+        table_dct = {}
+        for (schema, table_name), temp_tb_df in tb_dct.items():
+            tb_comm = comm_dct.get((schema, table_name))
+            if not pd.isna(tb_comm):
+                tb_comm = _escape_percent(tb_comm)
+            table_dct[(schema, table_name)] = TableSchema(
+                schema,
+                table_name,
+                temp_tb_df,
+                ind_dct.get((schema, table_name), empty_ind_df),
+                tb_comm,
+                part_dct.get((schema, table_name), empty_part_df),
+            )
+        return table_dct
+
+    def get_table(self, schema, table_name):
+        """
+        获取表结构
+
+        Parameters
+        ----------
+        schema: str. 数据库名字
+        table_name: str. 表名
+
+        Returns
+        -------
+        TableSchema. 表结构
+        """
+        table_schema = self._table_dct.get((schema, table_name))
+        if table_schema is None:
+            raise ValueError(f"本地存入表格中没有{table_name}.")
+        return table_schema
+
+    def get_columns(self, schema, table_name):
+        """
+        获取表的字段列表
+        """
+        return list(self.get_table(schema, table_name).columns)
+
+    def get_sql_dtype(self, schema, table_name):
+        """
+        获取表的字段类型. {columns_name: sql_type}
+        """
+        return self.get_table(schema, table_name).get_sql_dtype()
+
+    def get_table_lst(self, schema=None):
+        """
+        获取目录中的(数据库, 表名)列表, 按表注释文件中的顺序排列
+
+        Parameters
+        ----------
+        schema: str. 数据库名字, 默认为None, 即所有数据库
+        """
+        key_lst = list(zip(
+            self.table_comment_df["TABLE_SCHEMA"], self.table_comment_df["TABLE_NAME"]
+        ))
+        if schema is not None:
+            key_lst = [key for key in key_lst if key[0] == schema]
+        return key_lst
+
+
+def get_catalog():
+    """
+    获取进程内共享的表结构目录, 第一次调用时读取本地表结构文件
+
+    Returns
+    -------
+    Catalog. 表结构目录
+    """
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            _catalog = Catalog()
+        return _catalog
+
+
+def reload_catalog():
+    """
+    重新读取本地表结构文件, 用于拉取表结构之后
+
+    Returns
+    -------
+    Catalog. 表结构目录
+    """
+    global _catalog
+    with _catalog_lock:
+        _catalog = Catalog()
+        return _catalog
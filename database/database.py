@@ -3,10 +3,16 @@ Author: dkl
 Date: 2022-10-09 23:24:58
 Descripttion: 数据库操作
 '''
-import numpy as np
-import pandas as pd
-from sqlalchemy import create_engine
-from utils.conf import Config
+import functools
+import os
+import time
+from utils import metrics
+from utils.conf import get_settings
+from database.catalog import build_create_table_sql, get_catalog
+from database.engine import get_engine
+from database.reader import prefetch_iter, stream_query, to_arrow_batches
+from database.validation import get_quarantine_df, get_rule_lst, quarantine_table_name, validate_df
+from database.writer import BufferedWriter
 from utils.downloader import TushareDownloader
 from utils.logger import Logger, logger_decorator
 
@@ -14,63 +20,41 @@ from utils.logger import Logger, logger_decorator
 downloader = TushareDownloader()
 # 获取日志记录器
 logger = Logger("database")
-# 数据库连接模板
-template_url = (
-    "mysql+pymysql://{user}:{passwd}@{host}:{port}/{database}?charset=UTF8MB4"
-)
 
 
 class DataBase(object):
     @logger_decorator(logger)
     def __init__(self, database):
         """
-        调用相应的数据库
+        调用相应的数据库. 同一个数据库的连接池在进程内共享
 
         Parameters
         -------
         database : str. 数据库名字.
         """
-        # mysql配置信息
-        mysql_conf = Config("mysql")
-        user = mysql_conf.get_config("user")
-        passwd = mysql_conf.get_config("password")
-        host = mysql_conf.get_config("host")
-        port = mysql_conf.get_config("port")
         self.database = database
         # 表结构文件设置为空
         self.table_struct_df = None
         self.table_ind_df = None
         self.table_comment_df = None
-
+        self.table_part_df = None
         # 连接数据库
-        engine_url = template_url.format(
-            user=user, passwd=passwd, host=host, port=port, database=self.database
-        )
-        engine = create_engine(engine_url)
-        try:
-            conn = engine.connect()
-            conn.execute("select 1")
-            conn.close()
-        except ConnectionError as e:
-            raise ConnectionError(e)
-        else:
-            self.engine = engine
+        self.engine = get_engine(self.database)
 
     @logger_decorator(logger)
     def create_database(self, database_name):
-        conn = self.engine.connect()
         if self._check_database_exists(database_name):
             logger.info(f"数据库{database_name}已经存在!")
             return False
-        conn.execute(f"create database {database_name};")
+        with self.engine.connect() as conn:
+            conn.execute(f"create database {database_name};")
         logger.info(f"数据库{database_name}创建成功!")
         return True
 
     def _check_database_exists(self, database_name):
-        conn = self.engine.connect()
-        lst = conn.execute("show databases;").fetchall()
+        with self.engine.connect() as conn:
+            lst = conn.execute("show databases;").fetchall()
         lst = [element[0] for element in lst]
-        conn.close()
         return database_name in lst
 
     @logger_decorator(logger)
@@ -78,133 +62,84 @@ class DataBase(object):
         if self._check_table_exists(table_name):
             logger.info(f"数据库{self.database}中表格{table_name}已经存在!")
             return False
-        self._read_local_table_struct_df()
         logger.info(f"数据库{self.database}中表格{table_name}不存在，开始创建")
-        # Step1: 读取数据库表结构
-        create_table_struct = self._read_create_table_struct(table_name)
-        tb_df = create_table_struct["tb_df"]
-        ind_df = create_table_struct["ind_df"]
-        tb_comm = create_table_struct["tb_comm"]
-        # Step2: 创建表的SQL
-        tb_sql = self._get_create_table_sql(table_name, tb_df, ind_df, tb_comm)
-        # Step3: SQL连接,执行sql语句
-        conn = self.engine.connect()
+        # Step1: 从表结构目录中获取建表的SQL
+        tb_sql = get_catalog().get_table(self.database, table_name).get_create_table_sql()
+        # Step2: SQL连接,执行sql语句
         try:
-            conn.execute(tb_sql)
+            with self.engine.connect() as conn:
+                conn.execute(tb_sql)
         except Exception as e:
             err_string = "网络连接中断，或是SQL语句可能存在错误, 语句如下:" + tb_sql
-            err_string = err_string + "报错内容如下:\n" + e
+            err_string = err_string + "报错内容如下:\n" + str(e)
             raise Exception(err_string)
-        conn.close()
         logger.info(f"数据库{self.database}中表格{table_name}创建成功!")
         return True
 
+    def get_columns(self, table_name):
+        """
+        从表结构目录中获取表的字段列表
+
+        Parameters
+        ----------
+        table_name: str. 表名
+
+        Returns
+        -------
+        List[str]. 字段列表
+        """
+        return get_catalog().get_columns(self.database, table_name)
+
+    def get_sql_dtype(self, table_name):
+        """
+        从表结构目录中获取表的字段类型, 用于store_data等函数的dtype参数
+
+        Parameters
+        ----------
+        table_name: str. 表名
+
+        Returns
+        -------
+        dict. {columns_name: sql_type}
+        """
+        return get_catalog().get_sql_dtype(self.database, table_name)
+
     def _read_local_table_struct_df(self):
         if not self._check_table_struct_df():
             return
-        # table_structure配置信息读取
-        table_conf = Config("table_structure")
-        table_structure_path = table_conf.get_config("table_structure_path")
-        table_index_path = table_conf.get_config("table_index_path")
-        table_comment_path = table_conf.get_config("table_comment_path")
-        # 读取csv
-        self.table_struct_df = pd.read_csv(table_structure_path)
-        self.table_ind_df = pd.read_csv(table_index_path)
-        self.table_comment_df = pd.read_csv(table_comment_path)
+        # 表结构文件在进程内只读取一次
+        catalog = get_catalog()
+        self.table_struct_df = catalog.table_struct_df
+        self.table_ind_df = catalog.table_ind_df
+        self.table_comment_df = catalog.table_comment_df
+        self.table_part_df = catalog.table_part_df
 
     def _check_table_struct_df(self):
         flag1 = self.table_struct_df is None
         flag2 = self.table_ind_df is None
         flag3 = self.table_comment_df is None
-        flag = flag1 | flag2 | flag3
+        flag4 = self.table_part_df is None
+        flag = flag1 | flag2 | flag3 | flag4
         return flag
 
     def _check_table_exists(self, table_name):
-        conn = self.engine.connect()
-        lst = conn.execute("show tables;").fetchall()
+        with self.engine.connect() as conn:
+            lst = conn.execute("show tables;").fetchall()
         lst = [element[0] for element in lst]
-        conn.close()
         return table_name in lst
 
     def _read_create_table_struct(self, table_name):
-        # 表格结构
-        tb_df = self.table_struct_df.copy()
-        tb_df = tb_df.loc[
-            (tb_df["TABLE_SCHEMA"] == self.database)
-            & (tb_df["TABLE_NAME"] == table_name),
-            :,
-        ].copy()
-        tb_df = tb_df.sort_values("ORDINAL_POSITION")
-        tb_df = tb_df.reset_index(drop=True)
-        # 检查数据中是否存在table_name
-        if len(tb_df) == 0:
-            raise ValueError(f"本地存入表格中没有{table_name}.")
-        # 索引
-        ind_df = self.table_ind_df.copy()
-        ind_df = ind_df.loc[
-            (ind_df["TABLE_SCHEMA"] == self.database)
-            & (ind_df["TABLE_NAME"] == table_name),
-            :,
-        ].copy()
-        ind_df = ind_df.sort_values(["INDEX_NAME", "SEQ_IN_INDEX"])
-        ind_df = ind_df.reset_index(drop=True)
-        # 表注释
-        tb_comm_df = self.table_comment_df.copy()
-        tb_comm = tb_comm_df.loc[
-            (tb_comm_df["TABLE_SCHEMA"] == self.database)
-            & (tb_comm_df["TABLE_NAME"] == table_name),
-            :,
-        ]
-        tb_comm = tb_comm["TABLE_COMMENT"].values[0]
-        tb_comm = "%%".join(tb_comm.split("%"))
-        result = {"tb_df": tb_df, "ind_df": ind_df, "tb_comm": tb_comm}
+        table_schema = get_catalog().get_table(self.database, table_name)
+        result = {
+            "tb_df": table_schema.tb_df,
+            "ind_df": table_schema.ind_df,
+            "tb_comm": table_schema.tb_comm,
+            "part_df": table_schema.part_df,
+        }
         return result
 
-    def _get_create_table_sql(self, table_name, tb_df, ind_df, tb_comm):
-        tb_sql = f"CREATE TABLE {table_name} (\n"
-        for i in range(len(tb_df.index)):
-            # 字段名
-            col_name = tb_df.loc[i, "COLUMN_NAME"]
-            # 字段类型
-            col_type = tb_df.loc[i, "COLUMN_TYPE"]
-            # 字段是否为空
-            col_null = "NOT NULL"
-            if tb_df.loc[i, "IS_NULLABLE"] == "YES":
-                col_null = ""
-            # 字段注释
-            col_comment = tb_df.loc[i, "COLUMN_COMMENT"]
-            if col_comment is np.nan:
-                col_comment = ""
-            else:
-                col_comment = "%%".join(col_comment.split("%"))
-                col_comment = " COMMENT " + "'" + col_comment + "'"
-            col_string = " ".join([col_name, col_type, col_null, col_comment, ",\n"])
-            tb_sql = tb_sql + col_string
-        # 加入主键约束和索引
-        for temp_ind_name, temp_ind_df in ind_df.groupby("INDEX_NAME"):
-            temp_col_lst = temp_ind_df["COLUMN_NAME"].tolist()
-            temp_ind_type = temp_ind_df["INDEX_TYPE"].values[0]
-            temp_non_unique = int(temp_ind_df["NON_UNIQUE"].values[0])
-            string2 = "(" + (", ".join(temp_col_lst)) + ") "
-            if temp_ind_name == "PRIMARY":
-                string1 = "PRIMARY KEY "
-                string3 = ""
-            elif temp_non_unique == 0:
-                string1 = "UNIQUE KEY " + temp_ind_name + " "
-                string3 = "USING " + temp_ind_type
-            else:
-                string1 = "KEY " + temp_ind_name + " "
-                string3 = "USING " + temp_ind_type
-            string4 = ",\n"
-            string = string1 + string2 + string3 + string4
-            tb_sql = tb_sql + string
-        # 需要把末尾的',\n'换成'\n)'否则会报错
-        tb_sql = tb_sql[:-2] + "\n)"
-        comm_string = "ENGINE=InnoDB DEFAULT CHARSET=utf8mb4"
-        if tb_comm is not np.nan:
-            comm_string = comm_string + f" COMMENT='{tb_comm}'"
-        tb_sql = tb_sql + comm_string + ";"
-        return tb_sql
+    def _get_create_table_sql(self, table_name, tb_df, ind_df, tb_comm, part_df=None):
+        return build_create_table_sql(table_name, tb_df, ind_df, tb_comm, part_df)
 
     @logger_decorator(logger)
     def store_data(
@@ -224,11 +159,15 @@ class DataBase(object):
         if (len(data) == 0) or (data is None):
             logger.warning('数据为空, 取消存储')
             return
+        data = self.validate_data(data, data_name, table_name)
+        if len(data) == 0:
+            return
         # 慎重使用pandas.DataFrame.to_sql中的if_exists=replace
         # 因为pandas的to_sql代码里没有rollback，执行失败就直接把表删了TAT
         # 我们使用engine.begin()作为一个上下文管理器，它相当于包装了个事务，可以回滚~~
         for i in range(retries):
             try:
+                start_time = time.perf_counter()
                 with self.engine.begin() as conn:
                     if flag_replace:
                         conn.execute(f"delete from {table_name};")
@@ -239,20 +178,225 @@ class DataBase(object):
                         if_exists="append",
                         dtype=dtype,
                     )
+                self._observe_store(table_name, "store_data", len(data), start_time)
                 logger.info(data_name + "已经存入" + table_name + "!")
                 return
             except Exception as e:
+                metrics.store_failures.inc(table=table_name, method="store_data")
                 logger.warning(e)
                 logger.warning(data_name + "数据存储失败，重试%d次" % (i + 1))
         logger.error("数据存储失败，重试结束")
 
+    @logger_decorator(logger)
+    def refresh_data(self, data, data_name, table_name, dtype=None, retries=5):
+        """
+        全量刷新数据表: 先将数据批量写入影子表, 再用RENAME TABLE原子替换原表.
+        与store_data(flag_replace=True)相比, 不会在一个大事务中先delete再insert,
+        写入期间读者始终可以读到完整的旧表, 切换之后读到完整的新表
+
+        Parameters
+        ----------
+        data : pd.DataFrame. 存入的数据
+        data_name : str. 数据名称
+        table_name : str. 要替换的数据表名称.
+        dtype: dict. 指定存入sql的数据类型. {columns_name: sql_type}
+        retries: int.重试次数，默认为5
+        """
+        if (data is None) or (len(data) == 0):
+            logger.warning('数据为空, 取消存储')
+            return
+        data = self.validate_data(data, data_name, table_name)
+        if len(data) == 0:
+            return
+        if not self._check_table_exists(table_name):
+            self.create_table(table_name)
+        shadow_table_name = table_name + "_shadow"
+        swap_table_name = table_name + "_swap"
+        chunksize = get_settings().writer.chunksize
+        for i in range(retries):
+            try:
+                start_time = time.perf_counter()
+                with self.engine.connect() as conn:
+                    conn.execute(f"DROP TABLE IF EXISTS {shadow_table_name};")
+                    conn.execute(f"DROP TABLE IF EXISTS {swap_table_name};")
+                    conn.execute(f"CREATE TABLE {shadow_table_name} LIKE {table_name};")
+                # 影子表对读者不可见, 写入期间不会锁住原表, 可以用多行insert批量写入
+                data.to_sql(
+                    name=shadow_table_name,
+                    con=self.engine,
+                    index=False,
+                    if_exists="append",
+                    dtype=dtype,
+                    method="multi",
+                    chunksize=chunksize,
+                )
+                # RENAME TABLE同时重命名多张表是原子操作, 失败时原表不变
+                with self.engine.connect() as conn:
+                    conn.execute(
+                        f"RENAME TABLE {table_name} TO {swap_table_name}, "
+                        f"{shadow_table_name} TO {table_name};"
+                    )
+                break
+            except Exception as e:
+                metrics.store_failures.inc(table=table_name, method="refresh_data")
+                logger.warning(e)
+                logger.warning(data_name + "数据存储失败，重试%d次" % (i + 1))
+        else:
+            # 删除残留的影子表和换下的旧表
+            for temp_table_name in [shadow_table_name, swap_table_name]:
+                self.execute_sql(f"DROP TABLE IF EXISTS {temp_table_name};")
+            logger.error("数据存储失败，重试结束")
+            return
+        # 原表已经替换, 换下的旧表删除失败时下次刷新前会再删除
+        self.execute_sql(f"DROP TABLE IF EXISTS {swap_table_name};")
+        self._observe_store(table_name, "refresh_data", len(data), start_time)
+        logger.info(data_name + "已经全量替换" + table_name + "!")
+
+    def validate_data(self, data, data_name, table_name):
+        """
+        入库前校验数据, 规则见database.validation. 不合格的行不写入table_name,
+        而是写入隔离表dataquarantine. 隔离表写入失败只记录警告, 不影响合格数据的存储
+
+        Parameters
+        ----------
+        data : pd.DataFrame. 待存入的数据
+        data_name : str. 数据名称
+        table_name : str. 要存入的数据表名称.
+
+        Returns
+        -------
+        pd.DataFrame. 合格的数据
+        """
+        settings = get_settings().validation
+        if (not settings.enabled) or (table_name == quarantine_table_name):
+            return data
+        start_time = time.perf_counter()
+        good_df, bad_df = validate_df(data, get_rule_lst(self.database, table_name))
+        metrics.validation_seconds.observe(time.perf_counter() - start_time, table=table_name)
+        if len(bad_df) == 0:
+            return good_df
+        rule_count = bad_df["rule_name"].str.split(",").explode().value_counts()
+        for rule_name, n_rows in rule_count.items():
+            metrics.validation_rejected.inc(int(n_rows), table=table_name, rule=rule_name)
+        rule_str = ", ".join([f"{i}({j}行)" for i, j in rule_count.items()])
+        logger.warning(f"{data_name}中{len(bad_df)}行未通过校验, 不存入{table_name}: {rule_str}")
+        if settings.quarantine:
+            try:
+                quarantine_df = get_quarantine_df(bad_df, table_name, data_name)
+                with self.engine.begin() as conn:
+                    quarantine_df.to_sql(
+                        name=quarantine_table_name,
+                        con=conn,
+                        index=False,
+                        if_exists="append",
+                        dtype=self.get_sql_dtype(quarantine_table_name),
+                    )
+            except Exception as e:
+                logger.warning(f"{data_name}不合格数据写入{quarantine_table_name}失败: {e}")
+        return good_df
+
+    def _observe_store(self, table_name, method, n_rows, start_time):
+        """
+        记录一次写入的行数和提交耗时
+        """
+        labels = {"table": table_name, "method": method}
+        metrics.store_rows.inc(n_rows, **labels)
+        metrics.store_batch_rows.observe(n_rows, **labels)
+        metrics.store_commit.observe(time.perf_counter() - start_time, **labels)
+
+    def buffered_writer(self, table_name, dtype=None, **kwargs):
+        """
+        获取缓冲写入器. 多次写入的数据会合并成一个大事务批量存入table_name
+        适用于按交易日循环下载、每次只存几千行的情况
+
+        Parameters
+        ----------
+        table_name : str. 要存入的数据表名称.
+        dtype: dict. 指定存入sql的数据类型. {columns_name: sql_type}
+        kwargs: 其他参数, 见database.writer.BufferedWriter
+
+        Returns
+        -------
+        BufferedWriter. 缓冲写入器
+        """
+        validator = functools.partial(self.validate_data, table_name=table_name)
+        return BufferedWriter(self.engine, table_name, dtype=dtype, validator=validator, **kwargs)
+
+    def read_sql_chunks(self, sql, chunksize=None, prefetch=None):
+        """
+        流式读取查询结果. MySQL使用服务端游标, 每次从服务器读取chunksize行,
+        内存占用与结果行数无关. 遍历结束之前连接一直被占用
+
+        Parameters
+        ----------
+        sql: str. 查询语句
+        chunksize: int. 每批的行数, 默认为None, 即config.ini中[reader]的chunksize
+        prefetch: int. 后台线程提前读取的批数, 默认为None, 即config.ini中[reader]的prefetch.
+            为0时不预取
+
+        Returns
+        -------
+        Iterator[pd.DataFrame]. 每批的数据, 结果为空时返回一个只有列名的空表
+        """
+        if prefetch is None:
+            prefetch = get_settings().reader.prefetch
+        return prefetch_iter(stream_query(self.engine, sql, chunksize), prefetch)
+
+    def read_sql_arrow(self, sql, chunksize=None, prefetch=None):
+        """
+        流式读取查询结果, 每批转为pyarrow.RecordBatch, 需要安装pyarrow. 参数见read_sql_chunks
+
+        Returns
+        -------
+        Iterator[pyarrow.RecordBatch]
+        """
+        return to_arrow_batches(self.read_sql_chunks(sql, chunksize, prefetch))
+
+    def read_sql_lst(self, sql, chunksize=None):
+        """
+        流式读取单列的查询结果, 如数据表中已有的日期
+
+        Parameters
+        ----------
+        sql: str. 查询语句, 只取第一列
+        chunksize: int. 每批的行数, 默认为None, 即config.ini中[reader]的chunksize
+
+        Returns
+        -------
+        List. 第一列的值
+        """
+        value_lst = []
+        for df in self.read_sql_chunks(sql, chunksize, prefetch=0):
+            value_lst.extend(df.iloc[:, 0].tolist())
+        return value_lst
+
+    def read_sql_to_csv(self, sql, path, chunksize=None):
+        """
+        流式读取查询结果并逐批追加写入csv文件. 先写入path.tmp, 全部写完后再替换path,
+        读取中途失败时原文件不变
+
+        Parameters
+        ----------
+        sql: str. 查询语句
+        path: str. csv文件路径
+        chunksize: int. 每批的行数, 默认为None, 即config.ini中[reader]的chunksize
+        """
+        tmp_path = path + ".tmp"
+        try:
+            for i, df in enumerate(self.read_sql_chunks(sql, chunksize)):
+                df.to_csv(tmp_path, index=False, header=(i == 0), mode="w" if i == 0 else "a")
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        os.replace(tmp_path, path)
+
     @logger_decorator(logger)
     def clear_table(self, table_name, retries=5):
         for i in range(retries):
             try:
-                conn = self.engine.connect()
-                conn.execute(f"delete from {table_name};")
-                conn.close()
+                with self.engine.connect() as conn:
+                    conn.execute(f"delete from {table_name};")
                 return
             except Exception as e:
                 logger.warning(e)
@@ -271,14 +415,13 @@ class DataBase(object):
         """
         for i in range(retries):
             try:
-                conn = self.engine.connect()
-                res = conn.execute(sql)
-                conn.close()
-                # 如果没有返回结果就跳过
-                if not res.returns_rows:
-                    return
-                else:
-                    return res.fetchall()
+                with self.engine.connect() as conn:
+                    res = conn.execute(sql)
+                    # 如果没有返回结果就跳过
+                    if not res.returns_rows:
+                        return
+                    else:
+                        return res.fetchall()
             except Exception as e:
                 logger.warning(e)
                 logger.warning(f"sql语句{sql}执行失败，重试%d次" % (i + 1))
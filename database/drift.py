@@ -0,0 +1,280 @@
+'''
+Author: dkl
+Date: 2026-10-19 22:48:30
+Description: 表结构漂移检测. 对比本地表结构文件与数据库information_schema中的字段、
+索引和注释, 生成最少的ALTER语句, 可选择在线执行或分块重写
+'''
+import re
+import pandas as pd
+from database.catalog import get_catalog, get_column_sql, get_index_sql
+from database.database import DataBase
+from database.migration import SchemaMigration
+from utils.conf import get_settings
+from utils.logger import Logger, logger_decorator
+
+# 获取日志记录器
+logger = Logger("drift")
+# 漂移结果的字段
+drift_columns = [
+    "TABLE_SCHEMA",
+    "TABLE_NAME",
+    "OBJECT_TYPE",
+    "OBJECT_NAME",
+    "ACTION",
+    "LIVE",
+    "LOCAL",
+    "CLAUSE",
+]
+_int_width_pattern = re.compile(r"^(tinyint|smallint|mediumint|int|bigint)\(\d+\)")
+
+
+def _norm_type(column_type):
+    # MySQL 8.0.19之前整数类型带有显示宽度, 如int(11), 不算作漂移
+    return _int_width_pattern.sub(r"\1", str(column_type))
+
+
+def _norm_comment(comment):
+    if pd.isna(comment):
+        return ""
+    return str(comment)
+
+
+def _get_index_dct(ind_df):
+    """
+    索引信息转为{索引名: (字段元组, 是否非唯一, 索引类型)}
+    """
+    ind_dct = {}
+    ind_df = ind_df.sort_values(["INDEX_NAME", "SEQ_IN_INDEX"])
+    for ind_name, temp_ind_df in ind_df.groupby("INDEX_NAME", sort=True):
+        ind_dct[ind_name] = (
+            tuple(temp_ind_df["COLUMN_NAME"]),
+            int(temp_ind_df["NON_UNIQUE"].values[0]),
+            temp_ind_df["INDEX_TYPE"].values[0],
+        )
+    return ind_dct
+
+
+def _get_drop_index_clause(ind_name):
+    if ind_name == "PRIMARY":
+        return "DROP PRIMARY KEY"
+    return f"DROP INDEX {ind_name}"
+
+
+def diff_table(table_schema, live_tb_df, live_ind_df, live_comm, drop_extra=False):
+    """
+    对比单个表的本地表结构和数据库中的表结构
+
+    Parameters
+    ----------
+    table_schema: database.catalog.TableSchema. 本地表结构
+    live_tb_df: pandas.DataFrame. 数据库中的字段信息, 格式同table_structure.csv
+    live_ind_df: pandas.DataFrame. 数据库中的索引信息, 格式同table_index.csv
+    live_comm: str. 数据库中的表注释
+    drop_extra: bool. 是否删除数据库中多出的字段和索引, 默认为False, 只报告不删除
+
+    Returns
+    -------
+    List[dict]. 漂移结果, 字段见drift_columns. CLAUSE为ALTER TABLE中的子句, 为空时不执行
+    """
+    drift_lst = []
+
+    def add(object_type, object_name, action, live, local, clause):
+        drift_lst.append({
+            "TABLE_SCHEMA": table_schema.schema,
+            "TABLE_NAME": table_schema.table_name,
+            "OBJECT_TYPE": object_type,
+            "OBJECT_NAME": object_name,
+            "ACTION": action,
+            "LIVE": live,
+            "LOCAL": local,
+            "CLAUSE": clause,
+        })
+
+    # Step1: 字段
+    live_tb_df = live_tb_df.sort_values("ORDINAL_POSITION")
+    live_col_dct = {
+        row["COLUMN_NAME"]: row for _, row in live_tb_df.iterrows()
+    }
+    prev_col = None
+    for _, row in table_schema.tb_df.iterrows():
+        col_name = row["COLUMN_NAME"]
+        col_sql = get_column_sql(
+            col_name, row["COLUMN_TYPE"], row["IS_NULLABLE"], row["COLUMN_COMMENT"]
+        )
+        position = "FIRST" if prev_col is None else f"AFTER {prev_col}"
+        prev_col = col_name
+        local = (f"{_norm_type(row['COLUMN_TYPE'])} {row['IS_NULLABLE']} "
+                 f"{_norm_comment(row['COLUMN_COMMENT'])}")
+        if col_name not in live_col_dct:
+            add("COLUMN", col_name, "ADD", "", local, f"ADD COLUMN {col_sql}{position}")
+            continue
+        live_row = live_col_dct[col_name]
+        live = (f"{_norm_type(live_row['COLUMN_TYPE'])} {live_row['IS_NULLABLE']} "
+                f"{_norm_comment(live_row['COLUMN_COMMENT'])}")
+        if live != local:
+            add("COLUMN", col_name, "MODIFY", live, local, f"MODIFY COLUMN {col_sql}")
+    for col_name in live_col_dct.keys():
+        if col_name not in table_schema.columns:
+            clause = f"DROP COLUMN {col_name}" if drop_extra else ""
+            add("COLUMN", col_name, "EXTRA", live_col_dct[col_name]["COLUMN_TYPE"], "", clause)
+    # Step2: 索引
+    local_ind_dct = _get_index_dct(table_schema.ind_df)
+    live_ind_dct = _get_index_dct(live_ind_df)
+    for ind_name, (col_tuple, non_unique, ind_type) in local_ind_dct.items():
+        ind_sql = "ADD " + get_index_sql(ind_name, list(col_tuple), non_unique, ind_type)
+        local = f"{col_tuple} non_unique={non_unique}"
+        if ind_name not in live_ind_dct:
+            add("INDEX", ind_name, "ADD", "", local, ind_sql)
+            continue
+        live_col_tuple, live_non_unique, _ = live_ind_dct[ind_name]
+        if (live_col_tuple != col_tuple) or (live_non_unique != non_unique):
+            live = f"{live_col_tuple} non_unique={live_non_unique}"
+            clause = _get_drop_index_clause(ind_name) + ", " + ind_sql
+            add("INDEX", ind_name, "MODIFY", live, local, clause)
+    for ind_name, (live_col_tuple, live_non_unique, _) in live_ind_dct.items():
+        if ind_name not in local_ind_dct:
+            clause = _get_drop_index_clause(ind_name) if drop_extra else ""
+            add("INDEX", ind_name, "EXTRA", f"{live_col_tuple} non_unique={live_non_unique}",
+                "", clause)
+    # Step3: 表注释, 本地表注释已转义%
+    local_comm = _norm_comment(table_schema.tb_comm).replace("%%", "%")
+    if _norm_comment(live_comm) != local_comm:
+        clause = f"COMMENT='{_norm_comment(table_schema.tb_comm)}'"
+        add("TABLE", table_schema.table_name, "MODIFY", _norm_comment(live_comm),
+            local_comm, clause)
+    return drift_lst
+
+
+def get_alter_sql_dct(drift_df):
+    """
+    将漂移结果合并为每个表一条ALTER TABLE语句
+
+    Parameters
+    ----------
+    drift_df: pandas.DataFrame. 漂移结果
+
+    Returns
+    -------
+    dict. {(数据库, 表名): ALTER TABLE语句}
+    """
+    alter_sql_dct = {}
+    drift_df = drift_df.loc[drift_df["CLAUSE"] != "", :]
+    for (schema, table_name), temp_df in drift_df.groupby(
+        ["TABLE_SCHEMA", "TABLE_NAME"], sort=False
+    ):
+        clause_str = ",\n".join(temp_df["CLAUSE"].tolist())
+        alter_sql_dct[(schema, table_name)] = f"ALTER TABLE {table_name}\n{clause_str};"
+    return alter_sql_dct
+
+
+class SchemaDrift(DataBase):
+    """
+    表结构漂移检测
+
+    使用方法:
+        drift = SchemaDrift()
+        drift_df = drift.diff()
+        drift.apply(drift_df, online=True)
+    """
+
+    def __init__(self):
+        super().__init__("information_schema")
+        database_lst = get_settings().table_structure.database_lst
+        self.db_string = ",".join(['"' + i + '"' for i in database_lst])
+
+    def _pull_live_structure(self):
+        # 三张系统表各读取一次
+        sql = f"""select TABLE_SCHEMA, TABLE_NAME, COLUMN_NAME, ORDINAL_POSITION,
+                  IS_NULLABLE, COLUMN_TYPE, COLUMN_COMMENT
+                  from COLUMNS where TABLE_SCHEMA in ({self.db_string});"""
+        live_tb_df = pd.read_sql(sql=sql, con=self.engine)
+        sql = f"""select TABLE_SCHEMA, TABLE_NAME, NON_UNIQUE, INDEX_NAME,
+                  COLUMN_NAME, SEQ_IN_INDEX, INDEX_TYPE
+                  from STATISTICS where TABLE_SCHEMA in ({self.db_string});"""
+        live_ind_df = pd.read_sql(sql=sql, con=self.engine)
+        sql = f"""select TABLE_SCHEMA, TABLE_NAME, TABLE_COMMENT
+                  from TABLES where TABLE_SCHEMA in ({self.db_string});"""
+        live_comm_df = pd.read_sql(sql=sql, con=self.engine)
+        return live_tb_df, live_ind_df, live_comm_df
+
+    @logger_decorator(logger)
+    def diff(self, drop_extra=False):
+        """
+        对比本地表结构目录和数据库中所有已存在的表
+
+        Parameters
+        ----------
+        drop_extra: bool. 是否删除数据库中多出的字段和索引, 默认为False
+
+        Returns
+        -------
+        pandas.DataFrame. 漂移结果, 字段见drift_columns
+        """
+        catalog = get_catalog()
+        live_tb_df, live_ind_df, live_comm_df = self._pull_live_structure()
+        key = ["TABLE_SCHEMA", "TABLE_NAME"]
+        live_tb_dct = dict(list(live_tb_df.groupby(key)))
+        live_ind_dct = dict(list(live_ind_df.groupby(key)))
+        empty_ind_df = live_ind_df.iloc[0:0]
+        live_comm_dct = dict(zip(
+            zip(live_comm_df["TABLE_SCHEMA"], live_comm_df["TABLE_NAME"]),
+            live_comm_df["TABLE_COMMENT"],
+        ))
+        drift_lst = []
+        for schema, table_name in catalog.get_table_lst():
+            # 缺失的表由初始化程序创建
+            if (schema, table_name) not in live_tb_dct:
+                continue
+            drift_lst.extend(diff_table(
+                catalog.get_table(schema, table_name),
+                live_tb_dct[(schema, table_name)],
+                live_ind_dct.get((schema, table_name), empty_ind_df),
+                live_comm_dct.get((schema, table_name)),
+                drop_extra=drop_extra,
+            ))
+        drift_df = pd.DataFrame(drift_lst, columns=drift_columns)
+        logger.info(f"共发现{len(drift_df)}处表结构漂移, 涉及"
+                    f"{drift_df[key].drop_duplicates().shape[0]}个表")
+        for _, row in drift_df.iterrows():
+            logger.info(f"{row['TABLE_SCHEMA']}.{row['TABLE_NAME']} {row['OBJECT_TYPE']} "
+                        f"{row['OBJECT_NAME']} {row['ACTION']}: "
+                        f"[{row['LIVE']}] -> [{row['LOCAL']}]")
+        return drift_df
+
+    @logger_decorator(logger)
+    def apply(self, drift_df, online=True, dry_run=False):
+        """
+        执行漂移结果中的ALTER语句
+
+        online=True时, 先使用ALGORITHM=INPLACE, LOCK=NONE在线执行(如加索引、改注释);
+        MySQL不支持在线执行时(如修改字段类型), 使用SchemaMigration按本地表结构
+        分块重写后原子切换, 重写后的表与本地表结构完全一致.
+        online=False时直接执行ALTER TABLE, 执行期间可能锁表
+
+        Parameters
+        ----------
+        drift_df: pandas.DataFrame. diff()的结果
+        online: bool. 是否在线执行, 默认为True
+        dry_run: bool. 为True时只输出语句, 不执行. 默认为False
+
+        Returns
+        -------
+        dict. {(数据库, 表名): ALTER TABLE语句}
+        """
+        alter_sql_dct = get_alter_sql_dct(drift_df)
+        for (schema, table_name), alter_sql in alter_sql_dct.items():
+            logger.info(f"{schema}.{table_name}:\n{alter_sql}")
+            if dry_run:
+                continue
+            db = DataBase(schema)
+            if not online:
+                db.execute_sql(alter_sql)
+                continue
+            try:
+                with db.engine.connect() as conn:
+                    conn.execute(alter_sql[:-1] + ",\nALGORITHM=INPLACE, LOCK=NONE;")
+                continue
+            except Exception as e:
+                logger.warning(f"{schema}.{table_name}无法在线执行, 改为分块重写: {e}")
+            SchemaMigration(schema).migrate_table(table_name, force=True)
+        return alter_sql_dct
@@ -0,0 +1,134 @@
+'''
+Author: dkl
+Date: 2026-10-19 17:31:05
+Description: 全进程共享的数据库连接注册表. 同一个(host, port, database)只创建一次engine
+和连接池, 避免每次实例化DataBase都重新建立连接
+'''
+import threading
+from sqlalchemy import create_engine
+from utils.conf import get_settings
+from utils.logger import Logger
+
+# 获取日志记录器
+logger = Logger("engine")
+# 数据库连接模板
+template_url = (
+    "mysql+pymysql://{user}:{passwd}@{host}:{port}/{database}?charset=UTF8MB4"
+)
+# 已创建的engine, 键为(host, port, database)
+_engine_dct = {}
+_engine_lock = threading.Lock()
+
+
+def _get_mysql_conf():
+    """
+    读取mysql配置信息
+
+    Returns
+    -------
+    dict. 连接信息和连接池参数
+    """
+    mysql_conf = get_settings().mysql
+    conf_dct = {
+        "user": mysql_conf.user,
+        "passwd": mysql_conf.password,
+        "host": mysql_conf.host,
+        "port": mysql_conf.port,
+        "pool_size": mysql_conf.pool_size,
+        "max_overflow": mysql_conf.max_overflow,
+        "pool_recycle": mysql_conf.pool_recycle,
+        "pool_pre_ping": mysql_conf.pool_pre_ping,
+    }
+    return conf_dct
+
+
+def create_mysql_engine(database, conf_dct=None):
+    """
+    按config.ini中的mysql配置创建一个新的engine, 不注册到进程内共享的连接注册表
+
+    Parameters
+    ----------
+    database: str. 数据库名字
+    conf_dct: dict. mysql配置, 默认为None, 即读取config.ini
+
+    Returns
+    -------
+    sqlalchemy.engine.Engine
+    """
+    if conf_dct is None:
+        conf_dct = _get_mysql_conf()
+    engine_url = template_url.format(
+        user=conf_dct["user"],
+        passwd=conf_dct["passwd"],
+        host=conf_dct["host"],
+        port=conf_dct["port"],
+        database=database,
+    )
+    engine = create_engine(
+        engine_url,
+        pool_size=conf_dct["pool_size"],
+        max_overflow=conf_dct["max_overflow"],
+        pool_recycle=conf_dct["pool_recycle"],
+        pool_pre_ping=conf_dct["pool_pre_ping"],
+    )
+    return engine
+
+
+def get_engine(database):
+    """
+    获取指定数据库的engine. 第一次获取时创建engine并用select 1检查连接,
+    之后直接返回同一个engine
+
+    Parameters
+    ----------
+    database: str. 数据库名字
+
+    Returns
+    -------
+    sqlalchemy.engine.Engine
+    """
+    conf_dct = _get_mysql_conf()
+    key = (conf_dct["host"], conf_dct["port"], database)
+    with _engine_lock:
+        engine = _engine_dct.get(key)
+        if engine is not None:
+            return engine
+        engine = create_mysql_engine(database, conf_dct)
+        try:
+            with engine.connect() as conn:
+                conn.execute("select 1")
+        except ConnectionError as e:
+            engine.dispose()
+            raise ConnectionError(e)
+        logger.info(f"创建数据库{database}的连接池")
+        _engine_dct[key] = engine
+        return engine
+
+
+def dispose_engines():
+    """
+    关闭所有连接池. 在fork出的子进程中使用数据库前需要调用, 避免共用父进程的连接
+    """
+    with _engine_lock:
+        for engine in _engine_dct.values():
+            engine.dispose()
+        _engine_dct.clear()
+
+
+def register_engine(database, engine):
+    """
+    为指定数据库注册engine, 之后get_engine(database)直接返回该engine.
+    用于基准测试等场景, 将数据库替换为一次性的测试库
+
+    Parameters
+    ----------
+    database: str. 数据库名字
+    engine: sqlalchemy.engine.Engine
+    """
+    conf_dct = _get_mysql_conf()
+    key = (conf_dct["host"], conf_dct["port"], database)
+    with _engine_lock:
+        old_engine = _engine_dct.get(key)
+        if (old_engine is not None) and (old_engine is not engine):
+            old_engine.dispose()
+        _engine_dct[key] = engine
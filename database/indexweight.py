@@ -0,0 +1,193 @@
+'''
+Author: dkl
+Date: 2026-10-20 21:36:08
+Description: 指数成分股日频权重. ashareindexweight只有每月最后一个交易日的权重,
+按交易日向前填充后物化为ashareindexweightdaily, 每天只计算新增的交易日和新增月份之后的交易日,
+回测取任意区间的日频基准权重时不需要再逐个指数做merge_asof
+'''
+import datetime
+import numpy as np
+import pandas as pd
+from database.database import DataBase
+from utils.logger import Logger, logger_decorator
+
+# 获取日志记录器
+logger = Logger("indexweight")
+# 日频权重表
+weight_daily_table_name = "ashareindexweightdaily"
+# 每批展开的交易日个数, 避免上证综指等成分股多的指数一次展开过多行
+expand_chunk_days = 60
+
+
+def expand_weight(weight_df, trade_date_arr):
+    """
+    将成分股权重按交易日向前填充: 每个交易日取不晚于该日的最近一期权重. 对每个指数用二分查找
+    得到每个交易日对应的权重日期, 再一次性按行号取出对应的成分股, 不需要逐日合并
+
+    Parameters
+    ----------
+    weight_df: pandas.DataFrame. 成分股权重, 包括index_code, con_code, trade_date, weight,
+        日期为YYYYMMDD的整数
+    trade_date_arr: numpy.ndarray. 需要展开的交易日, YYYYMMDD的整数
+
+    Returns
+    -------
+    pandas.DataFrame. 包括index_code, con_code, trade_date, weight, weight_date(使用的权重日期).
+    早于最早一期权重的交易日没有数据
+    """
+    trade_date_arr = np.sort(np.asarray(trade_date_arr, dtype=np.int64))
+    df_lst = []
+    for index_code, df in weight_df.groupby("index_code", sort=True):
+        df = df.sort_values(["trade_date", "con_code"]).reset_index(drop=True)
+        weight_date_arr, start_arr = np.unique(df["trade_date"].values.astype(np.int64),
+                                               return_index=True)
+        count_arr = np.diff(np.append(start_arr, len(df)))
+        pos_arr = np.searchsorted(weight_date_arr, trade_date_arr, side="right") - 1
+        date_arr = trade_date_arr[pos_arr >= 0]
+        pos_arr = pos_arr[pos_arr >= 0]
+        if len(pos_arr) == 0:
+            continue
+        n_arr = count_arr[pos_arr]
+        # 每个交易日对应的成分股在df中的行号
+        offset_arr = np.repeat(start_arr[pos_arr] - (np.cumsum(n_arr) - n_arr), n_arr)
+        row_arr = offset_arr + np.arange(n_arr.sum())
+        df_lst.append(pd.DataFrame({
+            "index_code": index_code,
+            "con_code": df["con_code"].values[row_arr],
+            "trade_date": np.repeat(date_arr, n_arr),
+            "weight": df["weight"].values[row_arr],
+            "weight_date": np.repeat(weight_date_arr[pos_arr], n_arr),
+        }))
+    if len(df_lst) == 0:
+        return pd.DataFrame(
+            columns=["index_code", "con_code", "trade_date", "weight", "weight_date"])
+    return pd.concat(df_lst, axis=0, ignore_index=True)
+
+
+class IndexWeightDaily(DataBase):
+    """
+    指数成分股日频权重的物化和查询
+
+    使用方法:
+        weight_daily = IndexWeightDaily()
+        weight_daily.update()
+        df = weight_daily.get_weight('000300.SH', '20230101', '20231231')
+    """
+
+    def __init__(self):
+        super().__init__("stk_data")
+
+    def _get_trade_date_arr(self):
+        # 截至今天的交易日, 当天的权重即上个月末的权重
+        today_dt = datetime.datetime.now().strftime(r"%Y%m%d")
+        sql = f"select cal_date from asharetradecal where is_open=1 and cal_date<={today_dt};"
+        df = pd.read_sql(sql=sql, con=self.engine)
+        return np.unique(pd.to_numeric(df["cal_date"]).values.astype(np.int64))
+
+    def get_update_dct(self, index_code_lst=None):
+        """
+        计算每个指数需要重新展开的交易日: 日频表最新日期之后的交易日, 以及新增的权重日期
+        (如补下载的历史月份)之后的交易日
+
+        Parameters
+        ----------
+        index_code_lst: List[str]. 指数列表, 默认为None, 即ashareindexweight中的全部指数
+
+        Returns
+        -------
+        dict. {index_code: numpy.ndarray}, 值为需要展开的交易日
+        """
+        sql = """select index_code, trade_date from ashareindexweight
+                 group by index_code, trade_date;"""
+        weight_date_df = pd.read_sql(sql=sql, con=self.engine)
+        sql = f"""select index_code, max(trade_date) as last_date from {weight_daily_table_name}
+                  group by index_code;"""
+        last_date_df = pd.read_sql(sql=sql, con=self.engine)
+        last_date_dct = dict(zip(last_date_df["index_code"], last_date_df["last_date"]))
+        sql = f"select distinct index_code, weight_date from {weight_daily_table_name};"
+        used_df = pd.read_sql(sql=sql, con=self.engine)
+        trade_date_arr = self._get_trade_date_arr()
+        if index_code_lst is None:
+            index_code_lst = sorted(weight_date_df["index_code"].unique())
+        update_dct = {}
+        for index_code in index_code_lst:
+            flag = weight_date_df["index_code"] == index_code
+            weight_date_arr = np.sort(weight_date_df.loc[flag, "trade_date"].values.astype(np.int64))
+            if len(weight_date_arr) == 0:
+                continue
+            flag = used_df["index_code"] == index_code
+            used_arr = used_df.loc[flag, "weight_date"].values.astype(np.int64)
+            new_arr = np.setdiff1d(weight_date_arr, used_arr)
+            start_date = int(last_date_dct.get(index_code, 0)) + 1
+            if len(new_arr) > 0:
+                start_date = min(start_date, int(new_arr[0]))
+            start_date = max(start_date, int(weight_date_arr[0]))
+            date_arr = trade_date_arr[trade_date_arr >= start_date]
+            if len(date_arr) > 0:
+                update_dct[index_code] = date_arr
+        return update_dct
+
+    @logger_decorator(logger)
+    def update(self, index_code_lst=None):
+        """
+        增量更新日频权重表. 每个指数先删除需要重新展开的交易日, 再按批写入
+
+        Parameters
+        ----------
+        index_code_lst: List[str]. 指数列表, 默认为None, 即ashareindexweight中的全部指数
+        """
+        if not self._check_table_exists(weight_daily_table_name):
+            self.create_table(weight_daily_table_name)
+        update_dct = self.get_update_dct(index_code_lst)
+        sql_dtype = self.get_sql_dtype(weight_daily_table_name)
+        for index_code, date_arr in update_dct.items():
+            # 只读取展开用到的权重: 第一个交易日对应的那一期及之后
+            sql = f"""select index_code, con_code, trade_date, weight from ashareindexweight
+                      where index_code='{index_code}' and trade_date>=(
+                      select max(trade_date) from ashareindexweight
+                      where index_code='{index_code}' and trade_date<={date_arr[0]});"""
+            weight_df = pd.read_sql(sql=sql, con=self.engine)
+            self.execute_sql(f"""delete from {weight_daily_table_name}
+                                 where index_code='{index_code}' and trade_date>={date_arr[0]};""")
+            with self.buffered_writer(weight_daily_table_name, dtype=sql_dtype) as writer:
+                for i in range(0, len(date_arr), expand_chunk_days):
+                    chunk_arr = date_arr[i:i + expand_chunk_days]
+                    df = expand_weight(weight_df, chunk_arr)
+                    writer.write(df[list(sql_dtype.keys())],
+                                 f"指数{index_code}日频权重_{chunk_arr[0]}_{chunk_arr[-1]}")
+            if len(writer.failed_lst) > 0:
+                # 删除已写入的部分, 下次运行时从同一日期重新展开
+                self.execute_sql(f"""delete from {weight_daily_table_name}
+                                     where index_code='{index_code}' and trade_date>={date_arr[0]};""")
+                logger.error(f"指数{index_code}日频权重写入失败, 下次运行时重新计算")
+                continue
+            logger.info(f"指数{index_code}日频权重已更新: {date_arr[0]}-{date_arr[-1]}, "
+                        f"共{len(date_arr)}个交易日")
+
+    def get_weight(self, index_code, start_date=None, end_date=None, pivot=False):
+        """
+        读取日频权重
+
+        Parameters
+        ----------
+        index_code: str. 指数代码, 如'000300.SH'
+        start_date: str. 开始日期(含), 如'20230101'. 默认为None, 即不限制
+        end_date: str. 结束日期(含). 默认为None, 即不限制
+        pivot: bool. 是否转为交易日×成分股的宽表, 默认为False
+
+        Returns
+        -------
+        pandas.DataFrame. pivot为False时为index_code, con_code, trade_date, weight, weight_date;
+        否则索引为交易日, 列为成分股代码, 值为权重, 不是成分股的为nan
+        """
+        sql = f"""select index_code, con_code, trade_date, weight, weight_date
+                  from {weight_daily_table_name} where index_code='{index_code}'"""
+        if start_date is not None:
+            sql += f" and trade_date>={start_date}"
+        if end_date is not None:
+            sql += f" and trade_date<={end_date}"
+        df = pd.read_sql(sql=sql + " order by trade_date, con_code;", con=self.engine)
+        if not pivot:
+            return df
+        df["trade_date"] = df["trade_date"].astype(str)
+        return df.pivot(index="trade_date", columns="con_code", values="weight")
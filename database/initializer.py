@@ -0,0 +1,117 @@
+'''
+Author: dkl
+Date: 2026-10-19 22:14:51
+Description: 批量初始化. 一次性读取information_schema得到已有的数据库和表,
+计算缺失的部分, 并发执行建表语句
+'''
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import pandas as pd
+from database.catalog import get_catalog
+from database.database import DataBase
+from database.engine import get_engine
+from utils.conf import get_settings
+from utils.logger import Logger, logger_decorator
+
+# 获取日志记录器
+logger = Logger("initializer")
+
+
+class BulkInitializer(DataBase):
+    """
+    按表结构目录批量创建缺失的数据库和数据表
+
+    使用方法:
+        initializer = BulkInitializer()
+        initializer.run()
+    """
+
+    def __init__(self, n_workers=None):
+        """
+        构造函数
+
+        Parameters
+        ----------
+        n_workers: int. 并发建表的线程数, 默认读取config.ini中的init_workers
+        """
+        super().__init__("information_schema")
+        if n_workers is None:
+            n_workers = get_settings().table_structure.init_workers
+        self.n_workers = max(n_workers, 1)
+
+    def get_plan(self):
+        """
+        对比表结构目录与information_schema, 获取需要创建的数据库和数据表
+
+        Returns
+        -------
+        dict. {"database_lst": 缺失的数据库列表, "table_lst": 缺失的(数据库, 表名)列表}
+        """
+        table_lst = get_catalog().get_table_lst()
+        schema_lst = list(dict.fromkeys([schema for schema, _ in table_lst]))
+        schema_str = ",".join([f"'{schema}'" for schema in schema_lst])
+        # 已有的数据库和表, 各读一次
+        sql = f"""select SCHEMA_NAME from SCHEMATA
+                  where SCHEMA_NAME in ({schema_str});"""
+        exist_schema_set = set(pd.read_sql(sql=sql, con=self.engine)["SCHEMA_NAME"])
+        sql = f"""select TABLE_SCHEMA, TABLE_NAME from TABLES
+                  where TABLE_SCHEMA in ({schema_str});"""
+        exist_df = pd.read_sql(sql=sql, con=self.engine)
+        exist_table_set = set(zip(exist_df["TABLE_SCHEMA"], exist_df["TABLE_NAME"]))
+        plan = {
+            "database_lst": [i for i in schema_lst if i not in exist_schema_set],
+            "table_lst": [i for i in table_lst if i not in exist_table_set],
+        }
+        return plan
+
+    def _create_table(self, schema, table_name):
+        start_time = time.time()
+        tb_sql = get_catalog().get_table(schema, table_name).get_create_table_sql()
+        with get_engine(schema).connect() as conn:
+            conn.execute(tb_sql)
+        return time.time() - start_time
+
+    @logger_decorator(logger)
+    def run(self, dry_run=False):
+        """
+        创建缺失的数据库和数据表. 数据库依次创建, 数据表并发创建
+
+        Parameters
+        ----------
+        dry_run: bool. 为True时只输出计划, 不执行. 默认为False
+
+        Returns
+        -------
+        dict. 计划, 以及每个表的建表用时{(数据库, 表名): 秒}
+        """
+        start_time = time.time()
+        plan = self.get_plan()
+        logger.info(f"初始化计划: 创建数据库{len(plan['database_lst'])}个: "
+                    f"{plan['database_lst']}")
+        logger.info(f"初始化计划: 创建数据表{len(plan['table_lst'])}个: "
+                    + ", ".join([f"{i}.{j}" for i, j in plan["table_lst"]]))
+        plan["cost_dct"] = {}
+        if dry_run or (len(plan["database_lst"]) + len(plan["table_lst"]) == 0):
+            return plan
+        for db_name in plan["database_lst"]:
+            self.create_database(db_name)
+        error_lst = []
+        with ThreadPoolExecutor(max_workers=self.n_workers) as executor:
+            future_dct = {
+                executor.submit(self._create_table, schema, table_name): (schema, table_name)
+                for schema, table_name in plan["table_lst"]
+            }
+            for future in as_completed(future_dct):
+                key = future_dct[future]
+                try:
+                    plan["cost_dct"][key] = future.result()
+                except Exception as e:
+                    logger.error(f"数据表{key[0]}.{key[1]}创建失败: {e}")
+                    error_lst.append(key)
+        cost_time = time.time() - start_time
+        logger.info(f"初始化完成, 共创建数据表{len(plan['cost_dct'])}个, "
+                    f"失败{len(error_lst)}个, 共用时: {cost_time:.2f}s")
+        if len(plan["cost_dct"]) > 0:
+            slowest = max(plan["cost_dct"].items(), key=lambda x: x[1])
+            logger.info(f"建表最慢的是{slowest[0][0]}.{slowest[0][1]}, 用时: {slowest[1]:.2f}s")
+        return plan
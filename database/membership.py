@@ -0,0 +1,364 @@
+'''
+Author: dkl
+Date: 2026-10-20 20:12:36
+Description: 股票池和申万行业成分的时点索引. asharestockbasic的上市/退市日期和asharesw2021member的
+纳入/剔除日期都是区间, 逐日查询时需要区间连接. 每日运行后将其展开为交易日×证券的矩阵,
+以.npy文件保存在缓存目录中, 查询时用内存映射读取, 任意日期或日期区间的查询不再访问数据库
+'''
+import json
+import os
+import threading
+import numpy as np
+import pandas as pd
+from database.database import DataBase
+from utils.conf import get_settings
+from utils.logger import Logger, logger_decorator
+
+# 获取日志记录器
+logger = Logger("membership")
+# 缓存目录下的子目录
+membership_dir_name = "membership"
+# 索引文件, 元数据文件最后写入
+membership_file_lst = ["dates", "codes", "industry_codes", "universe", "industry"]
+meta_file_name = "meta.json"
+# 进程内共享的索引
+_membership = None
+_membership_lock = threading.Lock()
+
+
+def get_membership_dir():
+    """
+    索引所在的目录, 为config.ini中[cache]的cache_dir下的membership
+    """
+    return os.path.join(get_settings().cache.cache_dir, membership_dir_name)
+
+
+def get_interval_rows(date_arr, start_arr, end_arr):
+    """
+    将区间[start, end)转为日期序列上的行号区间. end为空时表示至今
+
+    Parameters
+    ----------
+    date_arr: numpy.ndarray. 排序后的日期, 格式为YYYYMMDD的整数
+    start_arr: numpy.ndarray. 区间开始日期(含)
+    end_arr: numpy.ndarray. 区间结束日期(不含), 空值为nan
+
+    Returns
+    -------
+    (numpy.ndarray, numpy.ndarray). 开始行号(含)和结束行号(不含)
+    """
+    start_arr = np.asarray(start_arr, dtype=float)
+    end_arr = np.where(np.isnan(np.asarray(end_arr, dtype=float)), np.inf, end_arr)
+    start_row_arr = np.searchsorted(date_arr, start_arr, side="left")
+    end_row_arr = np.searchsorted(date_arr, end_arr, side="left")
+    return start_row_arr, end_row_arr
+
+
+def get_universe_matrix(n_dates, n_codes, col_arr, start_row_arr, end_row_arr):
+    """
+    展开区间得到每个日期每只证券是否在区间内. 用差分数组累加, 与区间个数无关地一次完成
+
+    Parameters
+    ----------
+    n_dates: int. 日期个数
+    n_codes: int. 证券个数
+    col_arr: numpy.ndarray. 每个区间所属证券的列号
+    start_row_arr: numpy.ndarray. 开始行号(含)
+    end_row_arr: numpy.ndarray. 结束行号(不含)
+
+    Returns
+    -------
+    numpy.ndarray. bool矩阵, 形状为(n_dates, n_codes)
+    """
+    diff = np.zeros((n_dates + 1, n_codes), dtype=np.int32)
+    np.add.at(diff, (start_row_arr, col_arr), 1)
+    np.add.at(diff, (end_row_arr, col_arr), -1)
+    return np.cumsum(diff[:-1], axis=0) > 0
+
+
+def get_industry_matrix(n_dates, n_codes, col_arr, value_arr, start_row_arr, end_row_arr):
+    """
+    展开区间得到每个日期每只证券所属的行业序号, 不属于任何行业为-1.
+    区间按开始日期依次填入, 同一证券的区间重叠时以较晚纳入的为准
+
+    Parameters
+    ----------
+    n_dates: int. 日期个数
+    n_codes: int. 证券个数
+    col_arr: numpy.ndarray. 每个区间所属证券的列号
+    value_arr: numpy.ndarray. 每个区间的行业序号
+    start_row_arr: numpy.ndarray. 开始行号(含), 已按开始日期排序
+    end_row_arr: numpy.ndarray. 结束行号(不含)
+
+    Returns
+    -------
+    numpy.ndarray. int8矩阵, 形状为(n_dates, n_codes)
+    """
+    mat = np.full((n_dates, n_codes), -1, dtype=np.int8)
+    for col, value, start_row, end_row in zip(col_arr, value_arr, start_row_arr, end_row_arr):
+        mat[start_row:end_row, col] = value
+    return mat
+
+
+def _to_int_date(trade_date):
+    return int(str(trade_date).replace("-", ""))
+
+
+class MembershipIndex(object):
+    """
+    只读的时点索引. 日期不是交易日时取该日之前最近的交易日
+
+    使用方法:
+        membership = get_membership()
+        code_lst = membership.get_universe('20230103')
+        member_lst = membership.get_industry('20230103', '801010.SI')
+        universe_df = membership.get_universe_panel('20230101', '20231231')
+    """
+
+    def __init__(self, index_dir=None):
+        """
+        构造函数. 矩阵以内存映射方式读取, 只有查询到的行才会读入内存
+
+        Parameters
+        ----------
+        index_dir: str. 索引目录, 默认为None, 即get_membership_dir()
+        """
+        if index_dir is None:
+            index_dir = get_membership_dir()
+        meta_path = os.path.join(index_dir, meta_file_name)
+        if not os.path.exists(meta_path):
+            raise FileNotFoundError(
+                f"{index_dir}中没有成分索引, 请先运行MembershipBuilder().build()")
+        with open(meta_path, "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        arr_dct = {
+            name: np.load(os.path.join(index_dir, name + ".npy"), mmap_mode="r")
+            for name in membership_file_lst
+        }
+        self.dates = np.asarray(arr_dct["dates"])
+        self.codes = np.asarray(arr_dct["codes"]).astype(object)
+        self.industry_codes = np.asarray(arr_dct["industry_codes"]).astype(object)
+        self._universe = arr_dct["universe"]
+        self._industry = arr_dct["industry"]
+        self._industry_dct = {code: i for i, code in enumerate(self.industry_codes)}
+
+    def _get_row(self, trade_date):
+        row = int(np.searchsorted(self.dates, _to_int_date(trade_date), side="right")) - 1
+        if row < 0:
+            raise ValueError(f"{trade_date}早于索引中最早的交易日{self.dates[0]}")
+        return row
+
+    def _get_row_slice(self, start_date=None, end_date=None):
+        start_row = 0
+        end_row = len(self.dates)
+        if start_date is not None:
+            start_row = int(np.searchsorted(self.dates, _to_int_date(start_date), side="left"))
+        if end_date is not None:
+            end_row = int(np.searchsorted(self.dates, _to_int_date(end_date), side="right"))
+        return slice(start_row, end_row)
+
+    def _get_industry_value(self, index_code):
+        if index_code not in self._industry_dct:
+            raise ValueError(f"索引中没有行业{index_code}")
+        return self._industry_dct[index_code]
+
+    def _unpack(self, packed):
+        return np.unpackbits(packed, axis=-1, count=len(self.codes)).astype(bool)
+
+    def get_universe(self, trade_date):
+        """
+        某一日上市的股票
+
+        Parameters
+        ----------
+        trade_date: str. 日期, 如'20230103'
+
+        Returns
+        -------
+        List[str]. 股票代码
+        """
+        mask = self._unpack(self._universe[self._get_row(trade_date)])
+        return self.codes[mask].tolist()
+
+    def get_industry(self, trade_date, index_code=None):
+        """
+        某一日的申万一级行业成分
+
+        Parameters
+        ----------
+        trade_date: str. 日期, 如'20230103'
+        index_code: str. 行业指数代码, 如'801010.SI'. 默认为None, 即全部行业
+
+        Returns
+        -------
+        index_code为None时返回pandas.Series, 索引为股票代码, 值为所属行业指数代码;
+        否则返回List[str], 为该行业的成分股代码
+        """
+        row_arr = np.asarray(self._industry[self._get_row(trade_date)])
+        if index_code is not None:
+            return self.codes[row_arr == self._get_industry_value(index_code)].tolist()
+        mask = row_arr >= 0
+        return pd.Series(self.industry_codes[row_arr[mask]], index=self.codes[mask],
+                         name="index_code")
+
+    def get_universe_panel(self, start_date=None, end_date=None):
+        """
+        日期区间内每个交易日上市的股票
+
+        Parameters
+        ----------
+        start_date: str. 开始日期(含), 默认为None, 即索引中最早的交易日
+        end_date: str. 结束日期(含), 默认为None, 即索引中最晚的交易日
+
+        Returns
+        -------
+        pandas.DataFrame. bool矩阵, 索引为交易日, 列为股票代码
+        """
+        row_slice = self._get_row_slice(start_date, end_date)
+        return pd.DataFrame(self._unpack(self._universe[row_slice]),
+                            index=self.dates[row_slice].astype(str), columns=self.codes)
+
+    def get_industry_panel(self, start_date=None, end_date=None, index_code=None):
+        """
+        日期区间内每个交易日的申万一级行业成分
+
+        Parameters
+        ----------
+        start_date: str. 开始日期(含), 默认为None, 即索引中最早的交易日
+        end_date: str. 结束日期(含), 默认为None, 即索引中最晚的交易日
+        index_code: str. 行业指数代码. 默认为None, 即全部行业
+
+        Returns
+        -------
+        pandas.DataFrame. 索引为交易日, 列为股票代码. index_code为None时值为行业序号
+        (对应industry_codes中的位置, 不属于任何行业为-1); 否则为是否属于该行业的bool矩阵
+        """
+        row_slice = self._get_row_slice(start_date, end_date)
+        mat = np.asarray(self._industry[row_slice])
+        if index_code is not None:
+            mat = mat == self._get_industry_value(index_code)
+        return pd.DataFrame(mat, index=self.dates[row_slice].astype(str), columns=self.codes)
+
+
+class MembershipBuilder(DataBase):
+    """
+    从数据库读取交易日历、股票基本信息和申万行业成分, 生成时点索引
+
+    使用方法:
+        MembershipBuilder().build()
+    """
+
+    def __init__(self, index_dir=None):
+        """
+        构造函数
+
+        Parameters
+        ----------
+        index_dir: str. 索引目录, 默认为None, 即get_membership_dir()
+        """
+        super().__init__("stk_data")
+        self.index_dir = get_membership_dir() if index_dir is None else index_dir
+
+    def _read_data(self):
+        sql = "select cal_date from asharetradecal where is_open=1;"
+        date_df = pd.read_sql(sql=sql, con=self.engine)
+        date_arr = np.unique(pd.to_numeric(date_df["cal_date"]).values.astype(np.int32))
+        stock_df = pd.read_sql(
+            "select stock_code, list_date, delist_date from asharestockbasic;", con=self.engine
+        )
+        member_df = pd.read_sql(
+            "select index_code, con_code, in_date, out_date from asharesw2021member;",
+            con=self.engine,
+        )
+        for df, col_lst in [(stock_df, ["list_date", "delist_date"]),
+                            (member_df, ["in_date", "out_date"])]:
+            for col in col_lst:
+                df[col] = pd.to_numeric(df[col], errors="coerce")
+        return date_arr, stock_df, member_df
+
+    @logger_decorator(logger)
+    def build(self):
+        """
+        生成索引并写入索引目录. 先写入临时文件再替换, 查询中的进程仍读取旧文件
+
+        Returns
+        -------
+        dict. 索引的元数据
+        """
+        date_arr, stock_df, member_df = self._read_data()
+        stock_df = stock_df.dropna(subset=["list_date"])
+        code_arr = np.array(sorted(set(stock_df["stock_code"]) | set(member_df["con_code"])))
+        code_dct = {code: i for i, code in enumerate(code_arr)}
+        # 股票池
+        start_row_arr, end_row_arr = get_interval_rows(
+            date_arr, stock_df["list_date"].values, stock_df["delist_date"].values
+        )
+        universe = get_universe_matrix(
+            len(date_arr), len(code_arr), stock_df["stock_code"].map(code_dct).values,
+            start_row_arr, end_row_arr,
+        )
+        # 申万一级行业
+        member_df = member_df.dropna(subset=["in_date"]).sort_values("in_date")
+        industry_code_arr = np.array(sorted(member_df["index_code"].unique()))
+        industry_dct = {code: i for i, code in enumerate(industry_code_arr)}
+        start_row_arr, end_row_arr = get_interval_rows(
+            date_arr, member_df["in_date"].values, member_df["out_date"].values
+        )
+        industry = get_industry_matrix(
+            len(date_arr), len(code_arr), member_df["con_code"].map(code_dct).values,
+            member_df["index_code"].map(industry_dct).values, start_row_arr, end_row_arr,
+        )
+        meta = {
+            "n_dates": len(date_arr),
+            "n_codes": len(code_arr),
+            "n_industries": len(industry_code_arr),
+            "start_date": int(date_arr[0]) if len(date_arr) > 0 else None,
+            "end_date": int(date_arr[-1]) if len(date_arr) > 0 else None,
+            "build_time": pd.Timestamp.now().strftime(r"%Y-%m-%d %H:%M:%S"),
+        }
+        arr_dct = {
+            "dates": date_arr,
+            "codes": code_arr.astype("U16"),
+            "industry_codes": industry_code_arr.astype("U16"),
+            "universe": np.packbits(universe, axis=1),
+            "industry": industry,
+        }
+        self._save(arr_dct, meta)
+        logger.info(f"成分索引已写入{self.index_dir}: {meta['n_dates']}个交易日, "
+                    f"{meta['n_codes']}只证券, {meta['n_industries']}个行业")
+        reload_membership()
+        return meta
+
+    def _save(self, arr_dct, meta):
+        os.makedirs(self.index_dir, exist_ok=True)
+        for name in membership_file_lst:
+            path = os.path.join(self.index_dir, name + ".npy")
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                np.save(f, arr_dct[name])
+            os.replace(tmp_path, path)
+        meta_path = os.path.join(self.index_dir, meta_file_name)
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(meta_path + ".tmp", meta_path)
+
+
+def get_membership():
+    """
+    获取进程内共享的时点索引, 第一次调用时读取
+    """
+    global _membership
+    if _membership is None:
+        with _membership_lock:
+            if _membership is None:
+                _membership = MembershipIndex()
+    return _membership
+
+
+def reload_membership():
+    """
+    索引重新生成后, 下次get_membership()时重新读取
+    """
+    global _membership
+    with _membership_lock:
+        _membership = None
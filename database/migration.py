@@ -0,0 +1,351 @@
+'''
+Author: dkl
+Date: 2026-10-19 18:40:26
+Description: 紧凑表结构迁移. 日期字段改为INT(yyyymmdd), 证券代码改为定长CHAR(9)等短字段,
+行情类事实表的DECIMAL(20,4)改为DOUBLE. 旧格式的表按块在线重写, 最后原子切换
+'''
+from contextlib import nullcontext
+import pandas as pd
+from database.catalog import get_catalog
+from database.database import DataBase
+from utils.logger import Logger, logger_decorator
+
+# 获取日志记录器
+logger = Logger("migration")
+# 日期字段, 统一存为INT(yyyymmdd)
+date_column_lst = [
+    "trade_date",
+    "cal_date",
+    "end_date",
+    "ann_date",
+    "list_date",
+    "delist_date",
+    "in_date",
+    "out_date",
+    "last_ddate",
+]
+# 代码字段
+code_column_type_dct = {
+    "stock_code": "char(9)",
+    "con_code": "char(9)",
+    "index_code": "varchar(12)",
+    "fut_code": "varchar(16)",
+}
+# 行情类事实表, 数值字段由decimal改为double
+double_table_lst = [
+    "asharedailyprices",
+    "asharedailybasic",
+    "asharemonthlyprices",
+    "ashareindexdaily",
+    "ashareindexmonthly",
+    "ashareindexweight",
+    "asharesw2021daily",
+    "futdailyprices",
+    "futwsr",
+    "futholdingcffex",
+    "futholdingczce",
+    "futholdingdce",
+    "futholdingshfe",
+]
+# 分块重写时依次尝试的分块字段
+chunk_column_lst = ["trade_date", "end_date", "cal_date"]
+
+
+def compact_column_type(table_name, column_name, column_type):
+    """
+    获取字段的紧凑类型
+
+    Parameters
+    ----------
+    table_name: str. 表名
+    column_name: str. 字段名
+    column_type: str. 原字段类型, 如'varchar(255)'
+
+    Returns
+    -------
+    str. 紧凑类型. 不需要修改时返回原类型
+    """
+    if column_name in date_column_lst:
+        return "int"
+    if column_name in code_column_type_dct:
+        return code_column_type_dct[column_name]
+    if (table_name in double_table_lst) and column_type.startswith("decimal"):
+        return "double"
+    return column_type
+
+
+def compact_structure_df(tb_struct_df):
+    """
+    将表结构(table_structure.csv格式)中的字段类型转为紧凑类型
+
+    Parameters
+    ----------
+    tb_struct_df: pandas.DataFrame. 表结构
+
+    Returns
+    -------
+    pandas.DataFrame. 紧凑类型的表结构
+    """
+    tb_struct_df = tb_struct_df.copy()
+    tb_struct_df["COLUMN_TYPE"] = [
+        compact_column_type(table_name, column_name, column_type)
+        for table_name, column_name, column_type in zip(
+            tb_struct_df["TABLE_NAME"],
+            tb_struct_df["COLUMN_NAME"],
+            tb_struct_df["COLUMN_TYPE"],
+        )
+    ]
+    return tb_struct_df
+
+
+class SchemaMigration(DataBase):
+    """
+    将数据库中的旧格式表迁移为本地表结构文件中的紧凑格式
+    """
+
+    def __init__(self, database, chunk_size=20):
+        """
+        构造函数
+
+        Parameters
+        ----------
+        database: str. 数据库名字
+        chunk_size: int. 每次复制多少个分块字段取值(如20个交易日)
+        """
+        super().__init__(database)
+        self.chunk_size = chunk_size
+
+    def _get_live_struct_df(self, table_name):
+        sql = f"""select COLUMN_NAME, COLUMN_TYPE from information_schema.COLUMNS
+                  where TABLE_SCHEMA='{self.database}' and TABLE_NAME='{table_name}'
+                  order by ORDINAL_POSITION;"""
+        return pd.read_sql(sql=sql, con=self.engine)
+
+    def plan_table(self, table_name):
+        """
+        对比数据库中的字段类型、分区与本地表结构文件, 获取需要修改的字段
+
+        Parameters
+        ----------
+        table_name: str. 表名
+
+        Returns
+        -------
+        List[tuple]. (字段名, 数据库中的类型, 目标类型). 分区的字段名为'PARTITION'
+        """
+        table_schema = get_catalog().get_table(self.database, table_name)
+        tb_df = table_schema.tb_df
+        part_df = table_schema.part_df
+        live_df = self._get_live_struct_df(table_name)
+        live_type_dct = dict(zip(live_df["COLUMN_NAME"], live_df["COLUMN_TYPE"]))
+        plan_lst = []
+        for column_name, column_type in zip(tb_df["COLUMN_NAME"], tb_df["COLUMN_TYPE"]):
+            live_type = live_type_dct.get(column_name)
+            if (live_type is not None) and (live_type != column_type):
+                plan_lst.append((column_name, live_type, column_type))
+        # 本地配置了分区但数据库中的表未分区, 同样需要重写
+        if (len(part_df) > 0) and (not self._check_table_partitioned(table_name)):
+            part_spec = part_df.iloc[0]
+            part_str = f"{part_spec['PARTITION_METHOD']}({part_spec['PARTITION_EXPRESSION']})"
+            plan_lst.append(("PARTITION", "无", part_str))
+        return plan_lst
+
+    def _check_table_partitioned(self, table_name):
+        sql = f"""select count(*) from information_schema.PARTITIONS
+                  where TABLE_SCHEMA='{self.database}' and TABLE_NAME='{table_name}'
+                  and PARTITION_NAME is not null;"""
+        return self.execute_sql(sql)[0][0] > 0
+
+    def _get_chunk_column(self, column_lst):
+        for column_name in chunk_column_lst:
+            if column_name in column_lst:
+                return column_name
+        return None
+
+    def _get_select_expr(self, column_name, target_type):
+        # 日期字段中的空字符串无法转为INT, 先置为NULL
+        if target_type == "int" and column_name in date_column_lst:
+            return f"NULLIF({column_name}, '')"
+        return column_name
+
+    def _get_chunk_where(self, chunk_column, bound_lst, i):
+        """
+        第i块的筛选条件. 第i块为[bound_lst[i], bound_lst[i + 1]), 第一块和最后一块不设下界和上界,
+        复制期间新写入的分块字段取值总会落在某一块中
+        """
+        cond_lst = []
+        if i > 0:
+            cond_lst.append(f"{chunk_column}>='{bound_lst[i]}'")
+        if i < len(bound_lst) - 1:
+            cond = f"{chunk_column}<'{bound_lst[i + 1]}'"
+            if i == 0:
+                # 空字符串的日期在新表中为NULL
+                cond = f"({cond} or {chunk_column} is null)"
+            cond_lst.append(cond)
+        return ("where " + " and ".join(cond_lst)) if len(cond_lst) > 0 else ""
+
+    def _get_checksum_sql(self, table_name, column_lst, where, lock=False):
+        # 行数和各行CRC32之和, 与行的顺序无关; isnull区分NULL和空字符串
+        value_str = ", ".join(f"isnull({col}), {col}" for col in column_lst)
+        lock_str = " lock in share mode" if lock else ""
+        return f"""select count(*), sum(crc32(concat_ws('#', {value_str})))
+                   from {table_name} {where}{lock_str};"""
+
+    def _copy_chunk(self, conn, table_name, new_table_name, column_lst, select_lst,
+                    where, lock=True):
+        """
+        在conn的事务中(重新)复制一块数据, 返回复制时原表中该块的行数和校验和.
+        lock为True时对原表的这些行加共享锁, 复制和计算校验和之间不会被其他连接修改
+        """
+        column_str = ", ".join(column_lst)
+        select_str = ", ".join(select_lst)
+        conn.execute(f"delete from {new_table_name} {where};")
+        conn.execute(f"""INSERT INTO {new_table_name} ({column_str})
+                         SELECT {select_str} FROM {table_name} {where};""")
+        sql = self._get_checksum_sql(table_name, column_lst, where, lock)
+        return tuple(conn.execute(sql).fetchone())
+
+    def _sync_chunks(self, table_name, new_table_name, column_lst, select_lst,
+                     chunk_column, bound_lst, checksum_lst, conn=None):
+        """
+        对比原表各块当前的行数和校验和与复制时是否一致, 重新复制不一致的块,
+        即复制期间有插入、修改或删除的块. conn为None时每块一个事务, 否则在conn(已锁表)中执行
+
+        Returns
+        -------
+        int. 重新复制的块数
+        """
+        n_chunks = 0
+        for i in range(len(bound_lst)):
+            where = self._get_chunk_where(chunk_column, bound_lst, i)
+            with (self.engine.begin() if conn is None else nullcontext(conn)) as chunk_conn:
+                sql = self._get_checksum_sql(table_name, column_lst, where)
+                if tuple(chunk_conn.execute(sql).fetchone()) == checksum_lst[i]:
+                    continue
+                checksum_lst[i] = self._copy_chunk(chunk_conn, table_name, new_table_name,
+                                                   column_lst, select_lst, where, conn is None)
+            n_chunks += 1
+        return n_chunks
+
+    def _check_locked_rename(self, conn):
+        """
+        锁表的会话能否RENAME TABLE加了写锁的表, 需要MySQL 8.0.13及以上(不含MariaDB)
+        """
+        if conn.dialect.is_mariadb:
+            return False
+        version_info = conn.dialect.server_version_info or ()
+        return tuple(version_info[:3]) >= (8, 0, 13)
+
+    @logger_decorator(logger)
+    def migrate_table(self, table_name, drop_old=False, force=False):
+        """
+        在线分块重写一张表:
+        1. 按本地表结构(含分区)创建影子表
+        2. 按分块字段(如trade_date)分块复制数据, 每块一个小事务, 不长时间锁表,
+           同时记录复制时原表中每块的行数和校验和
+        3. 对比各块的行数和校验和, 重新复制复制期间有插入、修改或删除的块
+        4. SET autocommit=0后LOCK TABLES冻结写入, 再对比一次并重新复制不一致的块, COMMIT之后
+           在锁表期间RENAME TABLE原子切换, 最后UNLOCK TABLES. 原表保留为{table_name}_old.
+           锁表期间需要扫描一遍原表. 锁表期间RENAME需要MySQL 8.0.13及以上,
+           更低的版本(及MariaDB)先UNLOCK再RENAME, 两步之间写入原表的数据会丢失
+
+        Parameters
+        ----------
+        table_name: str. 表名
+        drop_old: bool. 切换后是否删除原表, 默认为False
+        force: bool. 字段类型和分区一致时是否也重写, 默认为False.
+            用于修改索引、增删字段等无法在线执行的变更
+
+        Returns
+        -------
+        bool. 是否进行了迁移
+        """
+        plan_lst = self.plan_table(table_name)
+        if (len(plan_lst) == 0) and (not force):
+            logger.info(f"{self.database}.{table_name}已经是紧凑格式, 无需迁移")
+            return False
+        for column_name, live_type, column_type in plan_lst:
+            logger.info(f"{table_name}.{column_name}: {live_type} -> {column_type}")
+        # Step1: 创建影子表
+        new_table_name = table_name + "_compact"
+        old_table_name = table_name + "_old"
+        table_schema = get_catalog().get_table(self.database, table_name)
+        tb_df = table_schema.tb_df
+        tb_sql = table_schema.get_create_table_sql(new_table_name)
+        self.execute_sql(f"DROP TABLE IF EXISTS {new_table_name};")
+        with self.engine.connect() as conn:
+            conn.execute(tb_sql)
+        # Step2: 分块复制
+        live_column_lst = self._get_live_struct_df(table_name)["COLUMN_NAME"].tolist()
+        column_lst = [col for col in tb_df["COLUMN_NAME"] if col in live_column_lst]
+        type_dct = dict(zip(tb_df["COLUMN_NAME"], tb_df["COLUMN_TYPE"]))
+        select_lst = [self._get_select_expr(col, type_dct[col]) for col in column_lst]
+        chunk_column = self._get_chunk_column(column_lst)
+        key_lst = []
+        if chunk_column is not None:
+            sql = f"select distinct {chunk_column} from {table_name} order by {chunk_column};"
+            with self.engine.connect() as conn:
+                key_lst = [row[0] for row in conn.execute(sql).fetchall()]
+        # 每块的起始取值. 没有分块字段或表为空时整张表为一块
+        bound_lst = key_lst[::self.chunk_size] if len(key_lst) > 0 else [None]
+        checksum_lst = []
+        for i in range(len(bound_lst)):
+            where = self._get_chunk_where(chunk_column, bound_lst, i)
+            with self.engine.begin() as conn:
+                checksum_lst.append(self._copy_chunk(
+                    conn, table_name, new_table_name, column_lst, select_lst, where))
+            if chunk_column is not None:
+                logger.info(f"{table_name}已复制第{i + 1}/{len(bound_lst)}块")
+        args = (table_name, new_table_name, column_lst, select_lst, chunk_column,
+                bound_lst, checksum_lst)
+        # Step3: 不锁表时先补上复制期间修改过的块, 缩短下一步锁表的时间
+        n_chunks = self._sync_chunks(*args)
+        logger.info(f"{table_name}重新复制了{n_chunks}个复制期间有修改的块")
+        # Step4: 冻结写入, 最后对比一次后原子切换
+        self.execute_sql(f"DROP TABLE IF EXISTS {old_table_name};")
+        rename_sql = (f"RENAME TABLE {table_name} TO {old_table_name}, "
+                      f"{new_table_name} TO {table_name};")
+        with self.engine.connect() as conn:
+            # 语句由下面的COMMIT统一提交, 不由SQLAlchemy逐条自动提交
+            conn = conn.execution_options(autocommit=False)
+            flag_locked_rename = self._check_locked_rename(conn)
+            origin_autocommit = conn.execute("select @@autocommit;").fetchone()[0]
+            # LOCK TABLES会提交当前的事务, 按MySQL文档先关闭自动提交再锁表, 不用BEGIN
+            conn.execute("SET autocommit=0;")
+            try:
+                conn.execute(f"LOCK TABLES {table_name} WRITE, {new_table_name} WRITE;")
+                n_chunks = self._sync_chunks(*args, conn=conn)
+                conn.execute("COMMIT;")
+                if flag_locked_rename:
+                    # 锁表的会话可以重命名加了写锁的表
+                    conn.execute(rename_sql)
+            except Exception:
+                conn.execute("ROLLBACK;")
+                raise
+            finally:
+                conn.execute("UNLOCK TABLES;")
+                conn.execute(f"SET autocommit={int(origin_autocommit)};")
+            if not flag_locked_rename:
+                logger.warning(f"MySQL版本低于8.0.13, 解锁后才能切换{table_name}, "
+                               f"解锁与切换之间写入原表的数据不会出现在新表中")
+                conn.execute(rename_sql)
+        logger.info(f"{table_name}锁表期间重新复制了{n_chunks}个块")
+        if drop_old:
+            self.execute_sql(f"DROP TABLE {old_table_name};")
+        logger.info(f"{self.database}.{table_name}迁移完成!")
+        return True
+
+    @logger_decorator(logger)
+    def migrate_all(self, drop_old=False):
+        """
+        迁移本地表结构文件中该数据库下所有旧格式的表
+
+        Parameters
+        ----------
+        drop_old: bool. 切换后是否删除原表, 默认为False
+        """
+        for _, table_name in get_catalog().get_table_lst(self.database):
+            if not self._check_table_exists(table_name):
+                continue
+            self.migrate_table(table_name, drop_old=drop_old)
+        return
@@ -0,0 +1,417 @@
+'''
+Author: dkl
+Date: 2026-10-20 22:41:27
+Description: 常用日频字段的面板缓存. 将asharedailyprices和asharedailybasic中的常用字段
+保存为交易日×股票的.npy矩阵, 日期和股票代码另存为索引数组. 研究进程以内存映射方式读取,
+多个进程通过操作系统的页缓存共享同一份数据, 不需要各自执行数GB的read_sql.
+每次下载日频数据后只写入行数有变化的交易日, 包括回填和修复的历史交易日
+'''
+import json
+import os
+import threading
+from typing import NamedTuple
+import numpy as np
+import pandas as pd
+from numpy.lib.format import open_memmap
+from database.database import DataBase
+from utils.conf import get_settings
+from utils.logger import Logger, logger_decorator
+
+# 获取日志记录器
+logger = Logger("panel")
+# 缓存目录下的子目录
+panel_dir_name = "panel"
+meta_file_name = "meta.json"
+# 新增股票时预留的列数, 用完后扩容
+code_slack = 512
+# 扩容时每批复制的行数
+resize_chunk_rows = 250
+# 每条查询读取的年数, 首次生成时按年分批查询
+read_chunk_years = 1
+# 各数据表每个交易日已写入行数的文件名前缀
+count_prefix = "rows_"
+# 进程内共享的面板缓存
+_panel = None
+_panel_lock = threading.Lock()
+
+
+class PanelField(NamedTuple):
+    """
+    面板缓存的字段
+
+    table_name: 数据表名
+    field: 字段名
+    dtype: 矩阵的数据类型
+    """
+    table_name: str
+    field: str
+    dtype: str = "float32"
+
+
+# 缓存的字段. 价格和复权因子用float64, 避免复权计算的精度损失
+panel_field_lst = [
+    PanelField("asharedailyprices", "close", "float64"),
+    PanelField("asharedailyprices", "adj_factor", "float64"),
+    PanelField("asharedailyprices", "vol"),
+    PanelField("asharedailyprices", "amount"),
+    PanelField("asharedailybasic", "total_mv"),
+    PanelField("asharedailybasic", "turnover_rate"),
+]
+
+
+def get_panel_dir():
+    """
+    面板缓存所在的目录, 为config.ini中[cache]的cache_dir下的panel
+    """
+    return os.path.join(get_settings().cache.cache_dir, panel_dir_name)
+
+
+def _read_meta(panel_dir):
+    meta_path = os.path.join(panel_dir, meta_file_name)
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_array(panel_dir, name, arr):
+    path = os.path.join(panel_dir, name + ".npy")
+    with open(path + ".tmp", "wb") as f:
+        np.save(f, arr)
+    os.replace(path + ".tmp", path)
+
+
+def _to_int_date(trade_date):
+    return int(str(trade_date).replace("-", ""))
+
+
+class PanelCache(object):
+    """
+    只读的面板缓存. get_panel返回的DataFrame直接引用内存映射的矩阵, 不复制数据
+
+    使用方法:
+        panel = get_panel()
+        close_df = panel.get_panel('close', '20230101', '20231231')
+    """
+
+    def __init__(self, panel_dir=None):
+        """
+        构造函数
+
+        Parameters
+        ----------
+        panel_dir: str. 缓存目录, 默认为None, 即get_panel_dir()
+        """
+        self.panel_dir = get_panel_dir() if panel_dir is None else panel_dir
+        self.meta = _read_meta(self.panel_dir)
+        if self.meta is None:
+            raise FileNotFoundError(
+                f"{self.panel_dir}中没有面板缓存, 请先运行PanelCacheBuilder().update()")
+        self.dates = np.load(os.path.join(self.panel_dir, "dates.npy"))
+        n_codes = self.meta["n_codes"]
+        self.codes = np.load(os.path.join(self.panel_dir, "codes.npy"))[:n_codes].astype(object)
+        self.field_dct = {
+            item.field: item for item in panel_field_lst if item.field in self.meta["fields"]
+        }
+        self._arr_dct = {}
+
+    def get_array(self, field):
+        """
+        字段的内存映射矩阵, 形状为(交易日个数, 预留的股票列数), 只有前len(codes)列有效
+
+        Parameters
+        ----------
+        field: str. 字段名, 见panel_field_lst
+
+        Returns
+        -------
+        numpy.memmap
+        """
+        if field not in self.field_dct:
+            raise ValueError(
+                f"面板缓存中没有字段{field}, 可选字段: {list(self.field_dct.keys())}")
+        if field not in self._arr_dct:
+            arr = np.load(os.path.join(self.panel_dir, field + ".npy"), mmap_mode="r")
+            if arr.shape != (self.meta["n_dates"], self.meta["capacity"]):
+                raise ValueError(
+                    f"面板缓存{field}的形状与元数据不一致, 可能正在扩容, 请重新读取")
+            self._arr_dct[field] = arr
+        return self._arr_dct[field]
+
+    def get_panel(self, field, start_date=None, end_date=None):
+        """
+        读取字段的面板. 只包括已写入的交易日
+
+        Parameters
+        ----------
+        field: str. 字段名, 如'close'
+        start_date: str. 开始日期(含), 默认为None, 即缓存中最早的交易日
+        end_date: str. 结束日期(含), 默认为None, 即已写入的最新交易日
+
+        Returns
+        -------
+        pandas.DataFrame. 索引为交易日, 列为股票代码, 没有数据的为nan
+        """
+        arr = self.get_array(field)
+        last_date = self.meta["filled_dct"].get(self.field_dct[field].table_name, 0)
+        end_row = int(np.searchsorted(self.dates, last_date, side="right"))
+        if end_date is not None:
+            end_row = min(
+                end_row, int(np.searchsorted(self.dates, _to_int_date(end_date), side="right")))
+        start_row = 0
+        if start_date is not None:
+            start_row = int(np.searchsorted(self.dates, _to_int_date(start_date), side="left"))
+        start_row = min(start_row, end_row)
+        return pd.DataFrame(arr[start_row:end_row, :len(self.codes)],
+                            index=self.dates[start_row:end_row].astype(str),
+                            columns=self.codes, copy=False)
+
+
+class PanelCacheBuilder(DataBase):
+    """
+    生成和增量更新面板缓存. 第一次运行时按年分批读取全部历史数据,
+    之后每次按交易日统计各数据表的行数, 只读取行数与已写入行数不一致的交易日, 原地写入内存映射的矩阵
+
+    使用方法:
+        PanelCacheBuilder().update(["asharedailyprices"])
+    """
+
+    def __init__(self, panel_dir=None):
+        """
+        构造函数
+
+        Parameters
+        ----------
+        panel_dir: str. 缓存目录, 默认为None, 即get_panel_dir()
+        """
+        super().__init__("stk_data")
+        self.panel_dir = get_panel_dir() if panel_dir is None else panel_dir
+        self.start_date = int(get_settings().cache.panel_start_date)
+        self.meta = None
+        self.dates = None
+        self.codes = None
+        self.code_dct = None
+        self._arr_dct = {}
+        self._count_dct = {}
+
+    def _get_table_name_lst(self):
+        return list(dict.fromkeys(item.table_name for item in panel_field_lst))
+
+    def _load_count_dct(self):
+        """
+        各数据表每个交易日已写入的行数, 与dates对齐. 没有文件时为0, 即全部重新写入
+        """
+        self._count_dct = {}
+        for table_name in self._get_table_name_lst():
+            path = os.path.join(self.panel_dir, count_prefix + table_name + ".npy")
+            if os.path.exists(path):
+                count_arr = np.load(path)
+            else:
+                count_arr = np.zeros(0, dtype=np.int64)
+            if len(count_arr) != len(self.dates):
+                count_arr = np.zeros(len(self.dates), dtype=np.int64)
+            self._count_dct[table_name] = count_arr
+
+    def _get_calendar_arr(self):
+        sql = f"""select cal_date from asharetradecal
+                  where is_open=1 and cal_date>={self.start_date};"""
+        df = pd.read_sql(sql=sql, con=self.engine)
+        return np.unique(pd.to_numeric(df["cal_date"]).values.astype(np.int32))
+
+    def _load(self, rebuild=False):
+        """
+        读取已有的缓存. 没有缓存、字段有变化或rebuild为True时, 生成空的缓存
+        """
+        field_lst = [item.field for item in panel_field_lst]
+        meta = None if rebuild else _read_meta(self.panel_dir)
+        if (meta is None) or (meta["fields"] != field_lst):
+            os.makedirs(self.panel_dir, exist_ok=True)
+            meta = {"n_dates": 0, "n_codes": 0, "capacity": 0, "fields": field_lst,
+                    "filled_dct": {}}
+            self.meta = meta
+            self.dates = np.array([], dtype=np.int32)
+            self.codes = np.array([], dtype="U16")
+            self._resize(self._get_calendar_arr(), code_slack, new=True)
+            return
+        self.meta = meta
+        self.dates = np.load(os.path.join(self.panel_dir, "dates.npy"))
+        self.codes = np.load(os.path.join(self.panel_dir, "codes.npy"))
+        self.code_dct = {code: i for i, code in enumerate(self.codes[:meta["n_codes"]])}
+        self._arr_dct = {
+            item.field: np.load(os.path.join(self.panel_dir, item.field + ".npy"), mmap_mode="r+")
+            for item in panel_field_lst
+        }
+        self._load_count_dct()
+        # 交易日历延长(如新的一年)时扩容
+        calendar_arr = self._get_calendar_arr()
+        last_date = self.dates[-1] if len(self.dates) > 0 else 0
+        if len(calendar_arr) > 0 and calendar_arr[-1] > last_date:
+            self._resize(calendar_arr, self.meta["capacity"])
+
+    def _resize(self, date_arr, capacity, new=False):
+        """
+        扩大矩阵: 写入更大的新文件, 复制已有的数据后替换旧文件. 正在读取旧文件的进程不受影响
+        """
+        date_arr = np.union1d(self.dates, date_arr).astype(np.int32)
+        row_arr = np.searchsorted(date_arr, self.dates)
+        n_cols = self.meta["capacity"]
+        count_dct = {}
+        for table_name in self._get_table_name_lst():
+            count_arr = np.zeros(len(date_arr), dtype=np.int64)
+            if not new:
+                count_arr[row_arr] = self._count_dct[table_name]
+            count_dct[table_name] = count_arr
+        for item in panel_field_lst:
+            path = os.path.join(self.panel_dir, item.field + ".npy")
+            arr = open_memmap(path + ".tmp", mode="w+", dtype=item.dtype,
+                              shape=(len(date_arr), capacity))
+            arr[:] = np.nan
+            if not new:
+                # 分批复制, 内存占用与矩阵大小无关
+                old_arr = self._arr_dct[item.field]
+                for i in range(0, len(row_arr), resize_chunk_rows):
+                    arr[row_arr[i:i + resize_chunk_rows], :n_cols] = \
+                        old_arr[i:i + resize_chunk_rows, :n_cols]
+            arr.flush()
+            del arr
+            os.replace(path + ".tmp", path)
+        codes = np.full(capacity, "", dtype="U16")
+        codes[:self.meta["n_codes"]] = self.codes[:self.meta["n_codes"]]
+        self.dates = date_arr
+        self.codes = codes
+        self.code_dct = {code: i for i, code in enumerate(codes[:self.meta["n_codes"]])}
+        self.meta["n_dates"] = len(date_arr)
+        self.meta["capacity"] = capacity
+        self._count_dct = count_dct
+        _save_array(self.panel_dir, "dates", self.dates)
+        _save_array(self.panel_dir, "codes", self.codes)
+        for table_name, count_arr in self._count_dct.items():
+            _save_array(self.panel_dir, count_prefix + table_name, count_arr)
+        self._arr_dct = {
+            item.field: np.load(os.path.join(self.panel_dir, item.field + ".npy"), mmap_mode="r+")
+            for item in panel_field_lst
+        }
+        self._save_meta()
+        logger.info(f"面板缓存扩容为{len(date_arr)}个交易日×{capacity}列")
+
+    def _save_meta(self):
+        meta_path = os.path.join(self.panel_dir, meta_file_name)
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(self.meta, f, ensure_ascii=False)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    def _get_col_arr(self, code_arr):
+        """
+        股票代码对应的列号, 新股票依次使用预留的列, 不够时扩容
+        """
+        new_lst = sorted(set(code_arr) - set(self.code_dct.keys()))
+        if len(new_lst) > 0:
+            n_codes = self.meta["n_codes"]
+            if n_codes + len(new_lst) > self.meta["capacity"]:
+                self._resize(self.dates, n_codes + len(new_lst) + code_slack)
+            self.codes[n_codes:n_codes + len(new_lst)] = new_lst
+            for i, code in enumerate(new_lst):
+                self.code_dct[code] = n_codes + i
+            self.meta["n_codes"] = n_codes + len(new_lst)
+        return pd.Series(code_arr).map(self.code_dct).values
+
+    def _write_df(self, df, field_lst):
+        date_arr = df["trade_date"].values.astype(np.int64)
+        row_arr = np.searchsorted(self.dates, date_arr)
+        row_arr = np.minimum(row_arr, len(self.dates) - 1)
+        flag = self.dates[row_arr] == date_arr
+        if not flag.all():
+            logger.warning(f"{(~flag).sum()}行数据的日期不是交易日, 不写入面板缓存")
+            df = df[flag]
+            row_arr = row_arr[flag]
+        col_arr = self._get_col_arr(df["stock_code"].values)
+        for field in field_lst:
+            value_arr = pd.to_numeric(df[field], errors="coerce").values
+            self._arr_dct[field][row_arr, col_arr] = value_arr
+
+    def _get_stale_rows(self, table_name):
+        """
+        表中行数与已写入行数不一致的交易日所在的行, 以及这些交易日在表中的行数.
+        包括新增的交易日, 以及回填、修复或删除了数据的历史交易日
+        """
+        sql = f"""select trade_date, count(*) as n_rows from {table_name}
+                  where trade_date>={self.start_date} and trade_date<={int(self.dates[-1])}
+                  group by trade_date;"""
+        count_df = pd.read_sql(sql=sql, con=self.engine)
+        date_arr = pd.to_numeric(count_df["trade_date"]).values.astype(np.int64)
+        row_arr = np.minimum(np.searchsorted(self.dates, date_arr), len(self.dates) - 1)
+        flag = self.dates[row_arr] == date_arr
+        count_arr = np.zeros(len(self.dates), dtype=np.int64)
+        count_arr[row_arr[flag]] = count_df["n_rows"].values[flag]
+        stale_arr = np.flatnonzero(count_arr != self._count_dct[table_name])
+        return stale_arr, count_arr
+
+    @logger_decorator(logger)
+    def update(self, table_name_lst=None, rebuild=False):
+        """
+        将数据表中尚未写入或行数有变化的交易日写入面板缓存. 这些交易日先清空再写入
+
+        Parameters
+        ----------
+        table_name_lst: List[str]. 数据表列表, 默认为None, 即panel_field_lst中的全部数据表
+        rebuild: bool. 是否重新生成全部缓存, 如字段的历史数据被修改之后. 默认为False
+        """
+        self._load(rebuild)
+        if len(self.dates) == 0:
+            logger.warning("交易日历为空, 不生成面板缓存")
+            return
+        if table_name_lst is None:
+            table_name_lst = self._get_table_name_lst()
+        for table_name in table_name_lst:
+            field_lst = [item.field for item in panel_field_lst if item.table_name == table_name]
+            stale_arr, count_arr = self._get_stale_rows(table_name)
+            if len(stale_arr) == 0:
+                continue
+            for field in field_lst:
+                self._arr_dct[field][stale_arr, :] = np.nan
+            # 只读取需要写入的交易日, 按年分批读取
+            n_rows = 0
+            stale_date_arr = self.dates[stale_arr[count_arr[stale_arr] > 0]].astype(np.int64)
+            year_arr = stale_date_arr // 10000 // read_chunk_years
+            for year in np.unique(year_arr):
+                string = ",".join(str(i) for i in stale_date_arr[year_arr == year])
+                sql = f"""select trade_date, stock_code, {", ".join(field_lst)} from {table_name}
+                          where trade_date in ({string});"""
+                # 流式读取, 写入当前批次时下一批已经在传输
+                for df in self.read_sql_chunks(sql):
+                    if len(df) > 0:
+                        self._write_df(df, field_lst)
+                        n_rows += len(df)
+            for field in field_lst:
+                self._arr_dct[field].flush()
+            # 数据写完后才更新股票代码和已写入的行数, 中途失败时下次重新写入
+            _save_array(self.panel_dir, "codes", self.codes)
+            self._count_dct[table_name] = count_arr
+            _save_array(self.panel_dir, count_prefix + table_name, count_arr)
+            filled_arr = np.flatnonzero(count_arr > 0)
+            self.meta["filled_dct"][table_name] = \
+                int(self.dates[filled_arr[-1]]) if len(filled_arr) > 0 else 0
+            self._save_meta()
+            logger.info(f"{table_name}已写入面板缓存: {len(stale_arr)}个交易日, 共{n_rows}行")
+        reload_panel()
+
+
+def get_panel():
+    """
+    获取进程内共享的面板缓存, 第一次调用时读取
+    """
+    global _panel
+    if _panel is None:
+        with _panel_lock:
+            if _panel is None:
+                _panel = PanelCache()
+    return _panel
+
+
+def reload_panel():
+    """
+    面板缓存更新后, 下次get_panel()时重新读取
+    """
+    global _panel
+    with _panel_lock:
+        _panel = None
@@ -0,0 +1,59 @@
+'''
+Author: dkl
+Date: 2026-10-19 20:05:11
+Description: 分区表. 按年对trade_date做RANGE分区, 生成建表语句中的分区子句
+'''
+import datetime
+from utils.conf import get_settings
+
+# 兜底分区名称
+max_partition_name = "pmax"
+
+
+def get_partition_name(year):
+    """
+    年份对应的分区名称, 如2023->'p2023'
+    """
+    return f"p{year}"
+
+
+def get_year_partition_sql(year):
+    """
+    年份对应的分区定义, 如2023->'PARTITION p2023 VALUES LESS THAN (20240101)'
+    """
+    return f"PARTITION {get_partition_name(year)} VALUES LESS THAN ({year + 1}0101)"
+
+
+def get_partition_clause(part_spec, end_year=None):
+    """
+    根据分区配置生成建表语句中的分区子句
+
+    Parameters
+    ----------
+    part_spec: dict或pandas.Series. 分区配置, 包含PARTITION_METHOD,
+        PARTITION_EXPRESSION, START_YEAR
+    end_year: int. 最后一个按年分区的年份, 默认为今年加上配置中的future_years
+
+    Returns
+    -------
+    str. 分区子句
+    """
+    method = str(part_spec["PARTITION_METHOD"]).upper()
+    if method != "RANGE":
+        raise ValueError(f"暂不支持{method}分区, 只支持RANGE分区.")
+    if end_year is None:
+        end_year = datetime.datetime.now().year + get_future_years()
+    start_year = int(part_spec["START_YEAR"])
+    part_lst = [get_year_partition_sql(year) for year in range(start_year, end_year + 1)]
+    part_lst.append(f"PARTITION {max_partition_name} VALUES LESS THAN MAXVALUE")
+    clause = f"\nPARTITION BY RANGE ({part_spec['PARTITION_EXPRESSION']}) (\n"
+    clause = clause + ",\n".join(part_lst) + "\n)"
+    return clause
+
+
+def get_future_years():
+    """
+    读取需要提前创建多少年的分区
+    """
+    return get_settings().table_structure.partition_future_years
+
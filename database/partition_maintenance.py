@@ -0,0 +1,150 @@
+'''
+Author: dkl
+Date: 2026-10-19 20:21:36
+Description: 分区维护. 追加未来分区, 删除或归档历史分区
+'''
+import datetime
+import pandas as pd
+from database.catalog import get_catalog
+from database.database import DataBase
+from database.partition import (
+    get_future_years,
+    get_partition_name,
+    get_year_partition_sql,
+    max_partition_name,
+)
+from utils.logger import Logger, logger_decorator
+
+# 获取日志记录器
+logger = Logger("partition")
+
+
+class PartitionMaintenance(DataBase):
+    """
+    分区维护. 追加未来分区, 删除或归档历史分区.
+    历史数据按分区整体删除或交换出去, 避免大批量DELETE
+    """
+
+    def get_live_partition_df(self, table_name):
+        """
+        获取数据库中表的分区信息
+
+        Parameters
+        ----------
+        table_name: str. 表名
+
+        Returns
+        -------
+        pandas.DataFrame. 分区名称, 分区上界和估计行数. 未分区时为空
+        """
+        sql = f"""select PARTITION_NAME, PARTITION_DESCRIPTION, TABLE_ROWS
+                  from information_schema.PARTITIONS
+                  where TABLE_SCHEMA='{self.database}' and TABLE_NAME='{table_name}'
+                  and PARTITION_NAME is not null
+                  order by PARTITION_ORDINAL_POSITION;"""
+        return pd.read_sql(sql=sql, con=self.engine)
+
+    def _get_live_year_lst(self, table_name):
+        part_name_lst = self.get_live_partition_df(table_name)["PARTITION_NAME"].tolist()
+        return [int(name[1:]) for name in part_name_lst if name != max_partition_name]
+
+    @logger_decorator(logger)
+    def add_future_partitions(self, table_name, future_years=None):
+        """
+        从pmax中拆分出未来的年份分区. pmax中通常没有数据, 拆分代价很小
+
+        Parameters
+        ----------
+        table_name: str. 表名
+        future_years: int. 提前创建多少年的分区, 默认读取配置中的partition_future_years
+
+        Returns
+        -------
+        List[int]. 新增分区的年份
+        """
+        if future_years is None:
+            future_years = get_future_years()
+        year_lst = self._get_live_year_lst(table_name)
+        if len(year_lst) == 0:
+            logger.warning(f"{self.database}.{table_name}没有分区, 跳过")
+            return []
+        end_year = datetime.datetime.now().year + future_years
+        new_year_lst = list(range(max(year_lst) + 1, end_year + 1))
+        if len(new_year_lst) == 0:
+            return []
+        part_lst = [get_year_partition_sql(year) for year in new_year_lst]
+        part_lst.append(f"PARTITION {max_partition_name} VALUES LESS THAN MAXVALUE")
+        sql = (f"ALTER TABLE {table_name} REORGANIZE PARTITION {max_partition_name} "
+               f"INTO ({', '.join(part_lst)});")
+        self.execute_sql(sql)
+        logger.info(f"{self.database}.{table_name}新增分区: {new_year_lst}")
+        return new_year_lst
+
+    @logger_decorator(logger)
+    def drop_partitions_before(self, table_name, year):
+        """
+        删除year(不含)之前的年份分区
+
+        Parameters
+        ----------
+        table_name: str. 表名
+        year: int. 年份
+
+        Returns
+        -------
+        List[int]. 删除的分区年份
+        """
+        drop_year_lst = [i for i in self._get_live_year_lst(table_name) if i < year]
+        if len(drop_year_lst) == 0:
+            return []
+        part_str = ", ".join([get_partition_name(i) for i in drop_year_lst])
+        self.execute_sql(f"ALTER TABLE {table_name} DROP PARTITION {part_str};")
+        logger.info(f"{self.database}.{table_name}删除分区: {drop_year_lst}")
+        return drop_year_lst
+
+    @logger_decorator(logger)
+    def archive_partition(self, table_name, year):
+        """
+        将某一年的分区交换到归档表{table_name}_p{year}中, 原分区变为空分区.
+        交换只修改元数据, 不需要逐行复制和删除
+
+        Parameters
+        ----------
+        table_name: str. 表名
+        year: int. 年份
+
+        Returns
+        -------
+        str. 归档表名
+        """
+        part_name = get_partition_name(year)
+        archive_table_name = f"{table_name}_{part_name}"
+        if self._check_table_exists(archive_table_name):
+            raise ValueError(f"归档表{archive_table_name}已经存在.")
+        self.execute_sql(f"CREATE TABLE {archive_table_name} LIKE {table_name};")
+        self.execute_sql(f"ALTER TABLE {archive_table_name} REMOVE PARTITIONING;")
+        self.execute_sql(
+            f"ALTER TABLE {table_name} EXCHANGE PARTITION {part_name} "
+            f"WITH TABLE {archive_table_name};"
+        )
+        logger.info(f"{self.database}.{table_name}的分区{part_name}已归档至{archive_table_name}")
+        return archive_table_name
+
+    @logger_decorator(logger)
+    def maintain_all(self, future_years=None):
+        """
+        对本地分区配置中该数据库下所有已分区的表追加未来分区
+
+        Parameters
+        ----------
+        future_years: int. 提前创建多少年的分区, 默认读取配置中的partition_future_years
+        """
+        part_df = get_catalog().table_part_df
+        table_lst = part_df.loc[
+            part_df["TABLE_SCHEMA"] == self.database, "TABLE_NAME"
+        ].tolist()
+        for table_name in table_lst:
+            if not self._check_table_exists(table_name):
+                continue
+            self.add_future_partitions(table_name, future_years=future_years)
+        return
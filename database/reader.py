@@ -0,0 +1,129 @@
+'''
+Author: dkl
+Date: 2026-10-21 09:12:40
+Description: 流式读取. MySQL使用服务端游标(SSCursor), 查询结果按批从服务器读取,
+内存占用与结果行数无关; 可选后台线程预取下一批, 使处理与传输同时进行; 也可输出Arrow批次
+'''
+import queue
+import threading
+import pandas as pd
+from utils.conf import get_settings
+
+try:
+    import pyarrow
+except ImportError:
+    # 没有安装pyarrow时不能输出Arrow批次, 其余功能不受影响
+    pyarrow = None
+
+# 队列结束标记
+_STOP = object()
+
+
+def stream_query(engine, sql, chunksize=None):
+    """
+    用服务端游标流式执行查询, 每次从服务器读取chunksize行.
+    遍历结束或关闭生成器之前, 连接一直被占用
+
+    Parameters
+    ----------
+    engine: sqlalchemy.engine.Engine. 数据库连接
+    sql: str. 查询语句
+    chunksize: int. 每批的行数, 默认为None, 即config.ini中[reader]的chunksize
+
+    Yields
+    ------
+    pandas.DataFrame. 每批的数据. 结果为空时返回一个只有列名的空表
+    """
+    if chunksize is None:
+        chunksize = get_settings().reader.chunksize
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True).execute(sql)
+        try:
+            columns = list(result.keys())
+            n_chunks = 0
+            while True:
+                rows = result.fetchmany(chunksize)
+                if len(rows) == 0:
+                    break
+                n_chunks += 1
+                yield pd.DataFrame.from_records(rows, columns=columns, coerce_float=True)
+            if n_chunks == 0:
+                yield pd.DataFrame(columns=columns)
+        finally:
+            # 提前结束遍历时, 服务端游标中剩余的结果需要丢弃后连接才能复用
+            result.close()
+
+
+def prefetch_iter(iterator, prefetch):
+    """
+    在后台线程中提前读取iterator的下prefetch个元素, 调用方处理当前批次时, 下一批已经在传输
+
+    Parameters
+    ----------
+    iterator: Iterator. 如stream_query返回的生成器
+    prefetch: int. 最多提前读取的个数, 为0时不使用后台线程
+
+    Yields
+    ------
+    iterator中的元素
+    """
+    if prefetch <= 0:
+        yield from iterator
+        return
+    item_q = queue.Queue(maxsize=prefetch)
+    stop_event = threading.Event()
+
+    def _put(item):
+        # 调用方提前结束遍历时不再阻塞
+        while not stop_event.is_set():
+            try:
+                item_q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _worker():
+        try:
+            for item in iterator:
+                if not _put(item):
+                    return
+            _put(_STOP)
+        except Exception as e:
+            _put(e)
+        finally:
+            # 生成器在后台线程中创建的连接也在后台线程中关闭
+            if hasattr(iterator, "close"):
+                iterator.close()
+
+    thread = threading.Thread(target=_worker, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = item_q.get()
+            if item is _STOP:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop_event.set()
+        thread.join()
+
+
+def to_arrow_batches(df_iter):
+    """
+    将DataFrame批次转为pyarrow.RecordBatch, 需要安装pyarrow
+
+    Parameters
+    ----------
+    df_iter: Iterator[pandas.DataFrame]. 如stream_query返回的生成器
+
+    Yields
+    ------
+    pyarrow.RecordBatch
+    """
+    if pyarrow is None:
+        raise ImportError("输出Arrow批次需要安装pyarrow: pip install pyarrow")
+    for df in df_iter:
+        yield pyarrow.RecordBatch.from_pandas(df, preserve_index=False)
@@ -0,0 +1,523 @@
+'''
+Author: dkl
+Date: 2026-10-21 14:20:37
+Description: 嵌入式分析副本. 按日期水位将MySQL中选定的数据表增量复制到本地的DuckDB或SQLite文件,
+离线研究和CI不需要运行MySQL. DuckDB按列存储, 对全部历史行情的聚合查询比MySQL的行存储快数倍
+'''
+import contextlib
+import datetime
+import os
+import time
+from typing import NamedTuple
+import pandas as pd
+from sqlalchemy import create_engine
+from database.catalog import build_embedded_create_table_sql, get_catalog
+from database.database import DataBase
+from utils.conf import get_settings
+from utils.logger import Logger, logger_decorator
+
+try:
+    import duckdb
+except ImportError:
+    # 没有安装duckdb时只能使用SQLite副本
+    duckdb = None
+
+# 获取日志记录器
+logger = Logger("replica")
+# 副本中记录各表同步状态的表
+meta_table_name = "replicameta"
+meta_columns = ["table_name", "watermark", "n_rows", "sync_time"]
+
+
+class ReplicaSpec(NamedTuple):
+    """
+    一张数据表的复制规则
+
+    database: 数据库名
+    table_name: 数据表名
+    watermark_col: 水位字段. 每次只复制不早于副本中该字段最新值的行, 为None时每次全量复制
+    lookback: 每次重新复制副本中最近几个水位值, 如财务数据最近几期每天都会重新下载
+    """
+    database: str
+    table_name: str
+    watermark_col: str = None
+    lookback: int = 1
+
+
+# 需要复制的数据表. 基础信息表行数少, 每次全量复制
+replica_spec_lst = [
+    ReplicaSpec("stk_data", "asharetradecal"),
+    ReplicaSpec("stk_data", "asharestockbasic"),
+    ReplicaSpec("stk_data", "ashareindexbasic"),
+    ReplicaSpec("stk_data", "asharesw2021basic"),
+    ReplicaSpec("stk_data", "asharesw2021member"),
+    ReplicaSpec("stk_data", "asharedailyprices", "trade_date"),
+    ReplicaSpec("stk_data", "asharedailybasic", "trade_date"),
+    ReplicaSpec("stk_data", "asharemonthlyprices", "trade_date"),
+    ReplicaSpec("stk_data", "ashareindexdaily", "trade_date"),
+    ReplicaSpec("stk_data", "ashareindexmonthly", "trade_date"),
+    ReplicaSpec("stk_data", "ashareindexweight", "trade_date"),
+    ReplicaSpec("stk_data", "ashareindexweightdaily", "trade_date"),
+    ReplicaSpec("stk_data", "asharesw2021daily", "trade_date"),
+    ReplicaSpec("stk_data", "ashareincome", "end_date", 8),
+    ReplicaSpec("stk_data", "asharebalancesheet", "end_date", 8),
+    ReplicaSpec("stk_data", "asharecashflow", "end_date", 8),
+    ReplicaSpec("fut_data", "futbasic"),
+    ReplicaSpec("fut_data", "futdailyprices", "trade_date"),
+    ReplicaSpec("fut_data", "futwsr", "trade_date"),
+] + [
+    ReplicaSpec("fut_data", "futholding" + exchange, "trade_date")
+    for exchange in ["cffex", "czce", "dce", "shfe"]
+]
+replica_spec_dct = {(spec.database, spec.table_name): spec for spec in replica_spec_lst}
+
+
+def get_backend(backend=None):
+    """
+    确定副本的类型
+
+    Parameters
+    ----------
+    backend: str. 'duckdb', 'sqlite'或'auto', 默认为None, 即config.ini中[replica]的backend.
+        auto在安装了duckdb时使用duckdb, 否则使用sqlite
+
+    Returns
+    -------
+    str. 'duckdb'或'sqlite'
+    """
+    if backend is None:
+        backend = get_settings().replica.backend
+    if backend == "auto":
+        backend = "sqlite" if duckdb is None else "duckdb"
+    if backend not in ["duckdb", "sqlite"]:
+        raise ValueError(f"副本类型应为duckdb, sqlite或auto, 而不是{backend}")
+    if (backend == "duckdb") and (duckdb is None):
+        raise ImportError("使用DuckDB副本需要安装duckdb: pip install duckdb")
+    return backend
+
+
+def get_replica_path(database, backend=None, replica_dir=None):
+    """
+    副本文件的位置, 每个数据库一个文件, 如./tmp/replica/stk_data.duckdb
+
+    Parameters
+    ----------
+    database: str. 数据库名
+    backend: str. 副本类型, 见get_backend
+    replica_dir: str. 副本目录, 默认为None, 即config.ini中[replica]的replica_dir
+
+    Returns
+    -------
+    str
+    """
+    if replica_dir is None:
+        replica_dir = get_settings().replica.replica_dir
+    return os.path.join(replica_dir, f"{database}.{get_backend(backend)}")
+
+
+class SQLiteStore(object):
+    """
+    SQLite副本文件的读写
+    """
+
+    def __init__(self, path, read_only=False):
+        self.path = path
+        self.engine = create_engine("sqlite:///" + path, connect_args={"timeout": 60})
+        # 事务中的连接, 为None时每条语句单独提交
+        self._conn = None
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """
+        事务. 其中的execute和append在退出时一起提交, 出错时一起回滚
+        """
+        with self.engine.begin() as conn:
+            self._conn = conn
+            try:
+                yield self
+            finally:
+                self._conn = None
+
+    def execute(self, sql):
+        if self._conn is not None:
+            self._conn.execute(sql)
+            return
+        with self.engine.begin() as conn:
+            conn.execute(sql)
+
+    def query(self, sql):
+        return pd.read_sql(sql, self._conn if self._conn is not None else self.engine)
+
+    def append(self, table_name, df):
+        if self._conn is not None:
+            df.to_sql(table_name, self._conn, index=False, if_exists="append")
+            return
+        with self.engine.begin() as conn:
+            df.to_sql(table_name, conn, index=False, if_exists="append")
+
+    def table_exists(self, table_name):
+        sql = f"select name from sqlite_master where type='table' and name='{table_name}';"
+        return len(self.query(sql)) > 0
+
+    def get_table_lst(self):
+        df = self.query("select name from sqlite_master where type='table' order by name;")
+        return df["name"].tolist()
+
+    def create_table(self, table_schema):
+        for sql in build_embedded_create_table_sql(table_schema):
+            self.execute(sql)
+
+    def close(self):
+        self.engine.dispose()
+
+
+class DuckDBStore(object):
+    """
+    DuckDB副本文件的读写. 同一时间只能有一个进程以读写方式打开, 只读方式可以多个进程同时打开
+    """
+
+    def __init__(self, path, read_only=False):
+        self.path = path
+        self.conn = duckdb.connect(path, read_only=read_only)
+
+    @contextlib.contextmanager
+    def transaction(self):
+        self.conn.begin()
+        try:
+            yield self
+        except Exception:
+            self.conn.rollback()
+            raise
+        self.conn.commit()
+
+    def execute(self, sql):
+        self.conn.execute(sql)
+
+    def query(self, sql):
+        return self.conn.execute(sql).df()
+
+    def append(self, table_name, df):
+        # 按字段名插入, 不依赖DataFrame的字段顺序
+        col_str = ", ".join(df.columns)
+        self.conn.register("replica_df", df)
+        try:
+            self.conn.execute(
+                f"insert into {table_name} ({col_str}) select {col_str} from replica_df;")
+        finally:
+            self.conn.unregister("replica_df")
+
+    def table_exists(self, table_name):
+        return table_name in self.get_table_lst()
+
+    def get_table_lst(self):
+        df = self.query("select table_name from information_schema.tables order by table_name;")
+        return df["table_name"].tolist()
+
+    def create_table(self, table_schema):
+        # 列式存储按数据块的最大最小值跳过不需要的数据, 不建主键和索引, 写入更快
+        for sql in build_embedded_create_table_sql(table_schema, with_index=False):
+            self.execute(sql)
+
+    def close(self):
+        self.conn.close()
+
+
+def open_store(path, backend=None, read_only=False):
+    """
+    打开副本文件
+
+    Parameters
+    ----------
+    path: str. 副本文件位置
+    backend: str. 副本类型, 见get_backend
+    read_only: bool. 是否只读, 默认为False
+
+    Returns
+    -------
+    SQLiteStore或DuckDBStore
+    """
+    if get_backend(backend) == "duckdb":
+        return DuckDBStore(path, read_only)
+    return SQLiteStore(path, read_only)
+
+
+def _format_date_lst(date_lst):
+    return ", ".join(str(int(i)) for i in date_lst)
+
+
+class ReplicaSync(DataBase):
+    """
+    将一个MySQL数据库中的数据表增量复制到嵌入式副本
+
+    使用方法:
+        ReplicaSync('stk_data').sync()
+    """
+
+    def __init__(self, database, backend=None, replica_dir=None):
+        """
+        构造函数
+
+        Parameters
+        ----------
+        database: str. 数据库名
+        backend: str. 副本类型, 见get_backend
+        replica_dir: str. 副本目录, 默认为None, 即config.ini中[replica]的replica_dir
+        """
+        super().__init__(database)
+        self.backend = get_backend(backend)
+        if replica_dir is None:
+            replica_dir = get_settings().replica.replica_dir
+        os.makedirs(replica_dir, exist_ok=True)
+        self.path = get_replica_path(database, self.backend, replica_dir)
+
+    def get_spec_lst(self, table_lst=None):
+        """
+        需要复制的数据表. 没有登记在replica_spec_lst中的数据表每次全量复制
+
+        Parameters
+        ----------
+        table_lst: List[str]. 数据表, 默认为None, 即config.ini中[replica]的table_lst,
+            为空时为replica_spec_lst中该数据库的全部数据表. 不属于该数据库的表名会被忽略
+
+        Returns
+        -------
+        List[ReplicaSpec]
+        """
+        if table_lst is None:
+            table_lst = get_settings().replica.table_lst
+        if len(table_lst) == 0:
+            return [spec for spec in replica_spec_lst if spec.database == self.database]
+        catalog_table_lst = [i[1] for i in get_catalog().get_table_lst(self.database)]
+        return [
+            replica_spec_dct.get((self.database, table_name),
+                                 ReplicaSpec(self.database, table_name))
+            for table_name in table_lst if table_name in catalog_table_lst
+        ]
+
+    def _get_date_count_df(self, spec, store=None, end_date=None):
+        """
+        每个水位值的行数. store为None时统计MySQL中的数据表
+        """
+        col = spec.watermark_col
+        sql = f"select {col} as date, count(*) as n_rows from {spec.table_name}"
+        if end_date is not None:
+            sql += f" where {col}<{end_date}"
+        sql += f" group by {col};"
+        df = pd.read_sql(sql, self.engine) if store is None else store.query(sql)
+        df["date"] = pd.to_numeric(df["date"])
+        return df.sort_values("date").reset_index(drop=True)
+
+    def get_sync_where(self, store, spec, verify=False):
+        """
+        计算需要重新复制的行的条件: 副本中最近lookback个水位值及之后的日期;
+        verify为True时, 还包括水位之前MySQL与副本行数不一致的日期(如缺口修复后补下载的日期)
+
+        Parameters
+        ----------
+        store: SQLiteStore或DuckDBStore. 副本
+        spec: ReplicaSpec. 复制规则
+        verify: bool. 是否比较水位之前各日期的行数, 默认为False
+
+        Returns
+        -------
+        str. where条件, 为None时全量复制
+        """
+        if (spec.watermark_col is None) or (not store.table_exists(spec.table_name)):
+            return None
+        local_df = self._get_date_count_df(spec, store)
+        if len(local_df) == 0:
+            return None
+        col = spec.watermark_col
+        start_date = int(local_df["date"].values[max(len(local_df) - spec.lookback, 0)])
+        cond_lst = [f"{col}>={start_date}"]
+        if verify:
+            local_df = local_df[local_df["date"] < start_date]
+            source_df = self._get_date_count_df(spec, end_date=start_date)
+            df = pd.merge(local_df, source_df, on="date", how="outer",
+                          suffixes=("_local", "_source")).fillna(0)
+            date_lst = df.loc[df["n_rows_local"] != df["n_rows_source"], "date"].tolist()
+            if len(date_lst) > 0:
+                logger.info(f"{spec.table_name}中{len(date_lst)}个日期的行数与MySQL不一致, "
+                            "重新复制")
+                cond_lst.append(f"{col} in ({_format_date_lst(date_lst)})")
+        return " or ".join(cond_lst)
+
+    def sync_table(self, store, spec, verify=False, rebuild=False):
+        """
+        复制一张数据表. 删除副本中需要重新复制的行, 再从MySQL流式读取写入,
+        整个过程在一个事务中, 出错时副本保持复制之前的状态
+
+        Parameters
+        ----------
+        store: SQLiteStore或DuckDBStore. 副本
+        spec: ReplicaSpec. 复制规则
+        verify: bool. 是否比较水位之前各日期的行数, 默认为False
+        rebuild: bool. 是否删除副本中的表后全量复制, 默认为False
+
+        Returns
+        -------
+        dict. 同步状态, 字段见meta_columns
+        """
+        table_name = spec.table_name
+        table_schema = get_catalog().get_table(self.database, table_name)
+        col_str = ", ".join(table_schema.columns)
+        if rebuild and store.table_exists(table_name):
+            store.execute(f"DROP TABLE {table_name};")
+        where = self.get_sync_where(store, spec, verify)
+        sql = f"select {col_str} from {table_name}"
+        if where is not None:
+            sql += f" where {where}"
+        n_rows = 0
+        with store.transaction():
+            if not store.table_exists(table_name):
+                store.create_table(table_schema)
+            store.execute(f"delete from {table_name}" + (f" where {where};" if where else ";"))
+            for df in self.read_sql_chunks(sql + ";"):
+                if len(df) == 0:
+                    continue
+                store.append(table_name, df)
+                n_rows += len(df)
+            watermark = None
+            if spec.watermark_col is not None:
+                df = store.query(f"select max({spec.watermark_col}) as watermark from {table_name};")
+                watermark = df["watermark"].values[0]
+            meta = {
+                "table_name": table_name,
+                "watermark": None if pd.isna(watermark) else str(int(watermark)),
+                "n_rows": n_rows,
+                "sync_time": datetime.datetime.now().strftime(r"%Y-%m-%d %H:%M:%S"),
+            }
+            store.execute(f"delete from {meta_table_name} where table_name='{table_name}';")
+            store.append(meta_table_name, pd.DataFrame([meta], columns=meta_columns))
+        return meta
+
+    @logger_decorator(logger)
+    def sync(self, table_lst=None, verify=None, rebuild=False):
+        """
+        同步副本. 单张表复制失败时输出ERROR日志, 继续复制其他表
+
+        Parameters
+        ----------
+        table_lst: List[str]. 数据表, 见get_spec_lst
+        verify: bool. 是否比较水位之前各日期的行数, 默认为None, 即config.ini中[replica]的verify
+        rebuild: bool. 是否全量重新复制, 默认为False
+
+        Returns
+        -------
+        pandas.DataFrame. 本次复制的各表状态, 字段见meta_columns
+        """
+        if verify is None:
+            verify = get_settings().replica.verify
+        store = open_store(self.path, self.backend)
+        meta_lst = []
+        try:
+            if not store.table_exists(meta_table_name):
+                store.execute(f"""CREATE TABLE {meta_table_name} (
+                                  table_name varchar(64) NOT NULL, watermark varchar(16),
+                                  n_rows bigint, sync_time varchar(19));""")
+            for spec in self.get_spec_lst(table_lst):
+                start_time = time.perf_counter()
+                try:
+                    meta = self.sync_table(store, spec, verify, rebuild)
+                except Exception as e:
+                    logger.error(f"{self.database}.{spec.table_name}复制到副本失败: {e}")
+                    continue
+                logger.info(f"{self.database}.{spec.table_name}已复制到副本: {meta['n_rows']}行, "
+                            f"水位{meta['watermark']}, 用时{time.perf_counter() - start_time:.1f}秒")
+                meta_lst.append(meta)
+        finally:
+            store.close()
+        return pd.DataFrame(meta_lst, columns=meta_columns)
+
+
+class ReplicaReader(object):
+    """
+    只读访问嵌入式副本, 不需要MySQL
+
+    使用方法:
+        with ReplicaReader('stk_data') as reader:
+            df = reader.read_table('asharedailyprices', ['trade_date', 'stock_code', 'close'],
+                                   start_date='20230101')
+            df = reader.query('select trade_date, avg(pct_chg) from asharedailyprices '
+                              'group by trade_date')
+    """
+
+    def __init__(self, database, backend=None, replica_dir=None):
+        """
+        构造函数
+
+        Parameters
+        ----------
+        database: str. 数据库名
+        backend: str. 副本类型, 见get_backend
+        replica_dir: str. 副本目录, 默认为None, 即config.ini中[replica]的replica_dir
+        """
+        self.database = database
+        self.path = get_replica_path(database, backend, replica_dir)
+        if not os.path.exists(self.path):
+            raise FileNotFoundError(f"副本{self.path}不存在, 请先运行python main.py --sync-replica")
+        self.store = open_store(self.path, backend, read_only=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def query(self, sql):
+        """
+        在副本上执行查询
+
+        Parameters
+        ----------
+        sql: str. 查询语句, DuckDB副本使用DuckDB的SQL语法
+
+        Returns
+        -------
+        pandas.DataFrame
+        """
+        return self.store.query(sql)
+
+    def read_table(self, table_name, columns=None, start_date=None, end_date=None):
+        """
+        读取数据表, 可以按水位字段(如trade_date)筛选日期
+
+        Parameters
+        ----------
+        table_name: str. 表名
+        columns: List[str]. 字段, 默认为None, 即全部字段
+        start_date: str. 开始日期(含), 如'20230101'. 默认为None, 即不限制
+        end_date: str. 结束日期(含). 默认为None, 即不限制
+
+        Returns
+        -------
+        pandas.DataFrame
+        """
+        col_str = "*" if columns is None else ", ".join(columns)
+        sql = f"select {col_str} from {table_name}"
+        if (start_date is not None) or (end_date is not None):
+            spec = replica_spec_dct.get((self.database, table_name))
+            if (spec is None) or (spec.watermark_col is None):
+                raise ValueError(f"{table_name}没有日期字段, 不能按日期筛选")
+            cond_lst = []
+            if start_date is not None:
+                cond_lst.append(f"{spec.watermark_col}>={int(start_date)}")
+            if end_date is not None:
+                cond_lst.append(f"{spec.watermark_col}<={int(end_date)}")
+            sql += " where " + " and ".join(cond_lst)
+        return self.query(sql + ";")
+
+    def get_table_lst(self):
+        """
+        副本中的数据表
+        """
+        return [i for i in self.store.get_table_lst() if i != meta_table_name]
+
+    def get_meta(self):
+        """
+        各表最近一次同步的状态, 字段见meta_columns
+        """
+        return self.query(f"select * from {meta_table_name} order by table_name;")
+
+    def close(self):
+        self.store.close()
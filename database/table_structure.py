@@ -3,11 +3,12 @@ Author: dkl
 Date: 2023-01-23 22:49:27
 Description: 拉取表结构
 '''
+from database.catalog import reload_catalog
 from database.database import DataBase
 import os
 import datetime
 import pandas as pd
-from utils.conf import Config
+from utils.conf import get_settings
 from utils.logger import logger_decorator, Logger
 
 # 获取日志记录器
@@ -18,15 +19,13 @@ class TableStructure(DataBase):
     def __init__(self):
         super().__init__("information_schema")
         # 获取配置文件路径
-        conf = Config("table_structure")
-        self.table_structure_path = conf.get_config("table_structure_path")
-        self.table_index_path = conf.get_config("table_index_path")
-        self.table_comment_path = conf.get_config("table_comment_path")
+        conf = get_settings().table_structure
+        self.table_structure_path = conf.table_structure_path
+        self.table_index_path = conf.table_index_path
+        self.table_comment_path = conf.table_comment_path
+        self.table_partition_path = conf.table_partition_path
         # 数据库字符串
-        conf_db_str = conf.get_config("database_lst")
-        conf_db_str = conf_db_str.replace(" ", "")
-        db_lst = conf_db_str.split(',')
-        db_lst = ['"' + i + '"' for i in db_lst]
+        db_lst = ['"' + i + '"' for i in conf.database_lst]
         self.db_string = ",".join(db_lst)
 
     @logger_decorator(logger)
@@ -39,8 +38,8 @@ class TableStructure(DataBase):
                   IS_NULLABLE, COLUMN_TYPE, COLUMN_KEY, COLUMN_COMMENT
                   from COLUMNS
                   where TABLE_SCHEMA in ({self.db_string});"""
-        df = pd.read_sql(sql=sql, con=self.engine)
-        df.to_csv(self.table_structure_path, index=False)
+        # 流式读取, 逐批写入csv
+        self.read_sql_to_csv(sql, self.table_structure_path)
         return pd.read_csv(self.table_structure_path)
 
     @logger_decorator(logger)
@@ -53,8 +52,8 @@ class TableStructure(DataBase):
                   INDEX_NAME, COLUMN_NAME, SEQ_IN_INDEX, INDEX_TYPE
                   from STATISTICS
                   where TABLE_SCHEMA in ({self.db_string});"""
-        df = pd.read_sql(sql=sql, con=self.engine)
-        df.to_csv(self.table_index_path, index=False)
+        # 流式读取, 逐批写入csv
+        self.read_sql_to_csv(sql, self.table_index_path)
         return pd.read_csv(self.table_index_path)
 
     @logger_decorator(logger)
@@ -66,8 +65,8 @@ class TableStructure(DataBase):
         sql = f"""select TABLE_SCHEMA, TABLE_NAME, TABLE_COMMENT
                   from TABLES
                   where TABLE_SCHEMA in ({self.db_string});"""
-        df = pd.read_sql(sql=sql, con=self.engine)
-        df.to_csv(self.table_comment_path, index=False)
+        # 流式读取, 逐批写入csv
+        self.read_sql_to_csv(sql, self.table_comment_path)
         return pd.read_csv(self.table_comment_path)
 
     @logger_decorator(logger)
@@ -100,6 +99,8 @@ class TableStructure(DataBase):
         tb_struct_df = self.pull_table_structure()
         tb_ind_df = self.pull_table_index()
         tb_comm_df = self.pull_table_comment()
+        # 表结构文件已更新, 重新读取表结构目录
+        reload_catalog()
         return tb_struct_df, tb_ind_df, tb_comm_df
 
     @logger_decorator(logger)
@@ -143,6 +144,7 @@ class TableStructure(DataBase):
             self.table_structure_path,
             self.table_index_path,
             self.table_comment_path,
+            self.table_partition_path,
         ]
         # 现在的文件名
         now_name_lst = [os.path.basename(path) for path in now_path_lst]
@@ -0,0 +1,247 @@
+'''
+Author: dkl
+Date: 2026-10-20 18:40:15
+Description: 入库前的数据校验. 每张数据表的规则(非空、取值范围、有限值、OHLC一致性、主键唯一)
+以声明方式登记, 对整个批次用NumPy掩码一次性检查, 不合格的行写入隔离表dataquarantine
+'''
+import json
+import numpy as np
+import pandas as pd
+from database.catalog import get_catalog
+
+# 隔离表
+quarantine_table_name = "dataquarantine"
+
+
+class NotNull(object):
+    """
+    字段不能为空. 只检查df中存在的字段
+    """
+    partial = True
+
+    def __init__(self, columns):
+        self.cols = list(columns)
+        self.name = "not_null"
+
+    def check(self, df):
+        col_lst = [col for col in self.cols if col in df.columns]
+        return df[col_lst].isna().values.any(axis=1)
+
+
+class Finite(object):
+    """
+    数值字段不能为正负无穷, 如除以0得到的比率. 空值不在此检查. 只检查df中存在的字段
+    """
+    partial = True
+
+    def __init__(self, columns):
+        self.cols = list(columns)
+        self.name = "finite"
+
+    def check(self, df):
+        col_lst = [col for col in self.cols if col in df.columns]
+        values = df[col_lst].to_numpy(dtype=float, na_value=np.nan)
+        return np.isinf(values).any(axis=1)
+
+
+class Range(object):
+    """
+    字段取值范围[lower, upper], 为None时不限制. 空值不在此检查
+    """
+
+    def __init__(self, column, lower=None, upper=None, strict=False):
+        """
+        Parameters
+        ----------
+        column: str. 字段名
+        lower: float. 下限
+        upper: float. 上限
+        strict: bool. 是否不含边界, 默认为False
+        """
+        self.cols = [column]
+        self.lower = lower
+        self.upper = upper
+        self.strict = strict
+        self.name = f"range_{column}"
+
+    def check(self, df):
+        values = df[self.cols[0]].to_numpy(dtype=float, na_value=np.nan)
+        mask = np.zeros(len(values), dtype=bool)
+        with np.errstate(invalid="ignore"):
+            if self.lower is not None:
+                mask |= (values <= self.lower) if self.strict else (values < self.lower)
+            if self.upper is not None:
+                mask |= (values >= self.upper) if self.strict else (values > self.upper)
+        return mask
+
+
+class OHLC(object):
+    """
+    价格一致性: 最高价不低于最低价, 开盘价和收盘价在最低价和最高价之间. 空值不在此检查
+    """
+
+    def __init__(self, open_col="open", high_col="high", low_col="low", close_col="close",
+                 tol=1e-6):
+        self.cols = [open_col, high_col, low_col, close_col]
+        self.tol = tol
+        self.name = "ohlc"
+
+    def check(self, df):
+        values = df[self.cols].to_numpy(dtype=float, na_value=np.nan)
+        open_arr, high_arr, low_arr, close_arr = values.T
+        # 相对误差, 避免浮点数舍入造成误报
+        tol = self.tol * np.abs(high_arr)
+        with np.errstate(invalid="ignore"):
+            mask = low_arr > high_arr + tol
+            for arr in [open_arr, close_arr]:
+                mask |= (arr > high_arr + tol) | (arr < low_arr - tol)
+        return mask
+
+
+class Unique(object):
+    """
+    主键唯一. 批次中主键重复的行只保留最后一条
+    """
+
+    def __init__(self, columns):
+        self.cols = list(columns)
+        self.name = "duplicate_key"
+
+    def check(self, df):
+        return df.duplicated(self.cols, keep="last").values
+
+
+def _price_rule_lst(extra_lst=None):
+    rule_lst = [
+        Range("open", 0),
+        Range("high", 0),
+        Range("low", 0),
+        Range("close", 0, strict=True),
+        # 新股上市首日和部分指数的pre_close为0, 只有负数才是异常
+        Range("pre_close", 0),
+        Range("vol", 0),
+        Range("amount", 0),
+        OHLC(),
+    ]
+    return rule_lst + (extra_lst or [])
+
+
+# 各数据表的业务规则. 非空、有限值和主键唯一由表结构自动生成, 见get_rule_lst
+table_rule_dct = {
+    ("stk_data", "asharedailyprices"): _price_rule_lst([Range("adj_factor", 0, strict=True)]),
+    ("stk_data", "asharemonthlyprices"): _price_rule_lst([Range("adj_factor", 0, strict=True)]),
+    ("stk_data", "ashareindexdaily"): _price_rule_lst(),
+    ("stk_data", "ashareindexmonthly"): _price_rule_lst(),
+    ("stk_data", "asharedailybasic"): [
+        Range("turnover_rate", 0),
+        Range("total_share", 0),
+        Range("float_share", 0),
+        Range("free_share", 0),
+        Range("total_mv", 0),
+        Range("circ_mv", 0),
+    ],
+    ("stk_data", "ashareindexweight"): [Range("weight", 0, 100)],
+    ("stk_data", "ashareindexweightdaily"): [Range("weight", 0, 100)],
+    # 期货无成交时开高低收可能为0, 只检查成交量、成交额和持仓量
+    ("fut_data", "futdailyprices"): [Range("vol", 0), Range("amount", 0), Range("oi", 0)],
+}
+# 进程内缓存的规则, 键为(数据库, 表名)
+_rule_cache = {}
+
+
+def get_rule_lst(database, table_name):
+    """
+    获取数据表的校验规则: 非空字段和主键由表结构生成NotNull和Unique,
+    浮点数字段生成Finite, 再加上table_rule_dct中的业务规则
+
+    Parameters
+    ----------
+    database: str. 数据库名
+    table_name: str. 表名
+
+    Returns
+    -------
+    List. 校验规则
+    """
+    key = (database, table_name)
+    if key not in _rule_cache:
+        table_schema = get_catalog().get_table(database, table_name)
+        tb_df = table_schema.tb_df
+        ind_df = table_schema.ind_df
+        rule_lst = []
+        not_null_lst = tb_df.loc[tb_df["IS_NULLABLE"] == "NO", "COLUMN_NAME"].tolist()
+        if len(not_null_lst) > 0:
+            rule_lst.append(NotNull(not_null_lst))
+        float_flag = tb_df["COLUMN_TYPE"].str.lower().str.match(r"^(double|float|decimal)")
+        float_lst = tb_df.loc[float_flag, "COLUMN_NAME"].tolist()
+        if len(float_lst) > 0:
+            rule_lst.append(Finite(float_lst))
+        key_lst = ind_df.loc[ind_df["INDEX_NAME"] == "PRIMARY", "COLUMN_NAME"].tolist()
+        if len(key_lst) > 0:
+            rule_lst.append(Unique(key_lst))
+        rule_lst.extend(table_rule_dct.get(key, []))
+        _rule_cache[key] = rule_lst
+    return _rule_cache[key]
+
+
+def validate_df(df, rule_lst):
+    """
+    用校验规则检查整个批次
+
+    Parameters
+    ----------
+    df: pandas.DataFrame. 待写入的数据
+    rule_lst: List. 校验规则, 每个规则有字段列表cols、规则名name和返回不合格掩码的check(df).
+        规则涉及的字段不在df中时跳过该规则; partial为True的规则只要有一个字段在df中就检查
+
+    Returns
+    -------
+    (pandas.DataFrame, pandas.DataFrame). 合格的数据, 以及不合格的数据(多一列rule_name,
+    为不满足的规则名, 以逗号分隔)
+    """
+    columns = set(df.columns)
+    name_lst = []
+    mask_lst = []
+    for rule in rule_lst:
+        if getattr(rule, "partial", False):
+            if len(columns & set(rule.cols)) == 0:
+                continue
+        elif not set(rule.cols) <= columns:
+            continue
+        name_lst.append(rule.name)
+        mask_lst.append(rule.check(df))
+    if len(mask_lst) == 0:
+        return df, df.iloc[0:0].assign(rule_name="")
+    mask_arr = np.column_stack(mask_lst)
+    bad_flag = mask_arr.any(axis=1)
+    if not bad_flag.any():
+        return df, df.iloc[0:0].assign(rule_name="")
+    name_arr = np.array(name_lst)
+    bad_df = df[bad_flag].copy()
+    bad_df["rule_name"] = [",".join(name_arr[row]) for row in mask_arr[bad_flag]]
+    good_df = df[~bad_flag].reset_index(drop=True)
+    return good_df, bad_df.reset_index(drop=True)
+
+
+def get_quarantine_df(bad_df, table_name, data_name):
+    """
+    将不合格的数据转为隔离表的格式, 原始数据以JSON保存
+
+    Parameters
+    ----------
+    bad_df: pandas.DataFrame. validate_df返回的不合格数据
+    table_name: str. 原本要写入的表名
+    data_name: str. 数据名称
+
+    Returns
+    -------
+    pandas.DataFrame
+    """
+    record_lst = bad_df.drop(columns=["rule_name"]).to_dict("records")
+    return pd.DataFrame({
+        "table_name": table_name,
+        "rule_name": bad_df["rule_name"].values,
+        "data_name": data_name[:255],
+        "row_data": [json.dumps(record, ensure_ascii=False, default=str) for record in record_lst],
+        "quarantine_time": pd.Timestamp.now().floor("s"),
+    })
@@ -0,0 +1,164 @@
+'''
+Author: dkl
+Date: 2026-10-19 16:02:17
+Description: 缓冲写入器. 将多次小的store_data合并成一个大事务批量写入,
+减少追数据时成千上万次的小提交
+'''
+import threading
+import time
+import pandas as pd
+from utils import metrics
+from utils.conf import get_settings
+from utils.logger import Logger
+
+# 获取日志记录器
+logger = Logger("writer")
+# SQLite单条语句最多允许的参数个数
+sqlite_max_variables = 32766
+
+
+class BufferedWriter(object):
+    """
+    按表缓冲数据, 达到行数、字节数或时间阈值后, 在一个事务中批量写入
+
+    失败语义: 一个批次在同一个事务中写入, 写入失败时整个批次回滚,
+    该批次中的任何数据都不会被记为已下载(下次运行时会重新下载)
+
+    使用方法:
+        with db.buffered_writer("asharedailyprices", dtype=sql_dtype) as writer:
+            writer.write(df, "股票日频数据_20230103")
+    """
+
+    def __init__(self, engine, table_name, dtype=None, max_rows=None,
+                 max_bytes=None, flush_seconds=None, chunksize=None, retries=5,
+                 validator=None):
+        """
+        构造函数. 阈值参数为None时读取config.ini中[writer]的对应配置
+
+        Parameters
+        ----------
+        engine: sqlalchemy.engine.Engine. 数据库连接
+        table_name: str. 要存入的数据表名称
+        dtype: dict. 指定存入sql的数据类型. {columns_name: sql_type}
+        max_rows: int. 缓冲的最大行数
+        max_bytes: int. 缓冲的最大字节数
+        flush_seconds: float. 距离上次写入的最长时间(秒)
+        chunksize: int. 批量insert时每条语句的行数
+        retries: int. 重试次数，默认为5
+        validator: Callable. 入库前对整个批次的校验函数validator(data, data_name),
+            返回合格的数据. 默认为None, 即不校验
+        """
+        conf = get_settings().writer
+
+        def _get(value, option):
+            if value is None:
+                return getattr(conf, option)
+            return value
+
+        self.engine = engine
+        self.table_name = table_name
+        self.dtype = dtype
+        self.max_rows = _get(max_rows, "max_rows")
+        self.max_bytes = _get(max_bytes, "max_bytes")
+        self.flush_seconds = _get(flush_seconds, "flush_seconds")
+        self.chunksize = _get(chunksize, "chunksize")
+        self.retries = retries
+        self.validator = validator
+        # 缓冲区
+        self._df_lst = []
+        self._name_lst = []
+        self._rows = 0
+        self._bytes = 0
+        self._last_flush_time = time.time()
+        self._lock = threading.Lock()
+        # 写入失败的数据名称
+        self.failed_lst = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # 缓冲区中都是完整的工作单元，出错时也写入
+        self.close()
+
+    def write(self, data, data_name):
+        """
+        将数据写入缓冲区, 达到阈值后自动写入数据库
+
+        Parameters
+        ----------
+        data : pd.DataFrame. 存入的数据
+        data_name : str. 数据名称
+        """
+        if (data is None) or (len(data) == 0):
+            logger.warning(f'{data_name}数据为空, 取消存储')
+            return
+        with self._lock:
+            self._df_lst.append(data)
+            self._name_lst.append(data_name)
+            self._rows += len(data)
+            self._bytes += int(data.memory_usage(index=False, deep=True).sum())
+            if self._should_flush():
+                self._flush()
+
+    def _should_flush(self):
+        flag1 = self._rows >= self.max_rows
+        flag2 = self._bytes >= self.max_bytes
+        flag3 = (time.time() - self._last_flush_time) >= self.flush_seconds
+        return flag1 | flag2 | flag3
+
+    def flush(self):
+        """
+        将缓冲区中的数据写入数据库
+        """
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        self._last_flush_time = time.time()
+        if len(self._df_lst) == 0:
+            return
+        data = pd.concat(self._df_lst, axis=0, ignore_index=True)
+        name_lst = self._name_lst
+        self._df_lst = []
+        self._name_lst = []
+        self._rows = 0
+        self._bytes = 0
+        batch_name = f"{name_lst[0]}等{len(name_lst)}批"
+        if self.validator is not None:
+            data = self.validator(data, batch_name)
+            if len(data) == 0:
+                return
+        chunksize = self.chunksize
+        if self.engine.dialect.name == "sqlite":
+            # 多行insert的参数个数为行数*列数, 不能超过SQLite的上限
+            chunksize = min(chunksize, max(sqlite_max_variables // data.shape[1], 1))
+        for i in range(self.retries):
+            try:
+                start_time = time.perf_counter()
+                # 整个批次一个事务，失败即回滚
+                with self.engine.begin() as conn:
+                    data.to_sql(
+                        name=self.table_name,
+                        con=conn,
+                        index=False,
+                        if_exists="append",
+                        dtype=self.dtype,
+                        method="multi",
+                        chunksize=chunksize,
+                    )
+                labels = {"table": self.table_name, "method": "writer"}
+                metrics.store_rows.inc(len(data), **labels)
+                metrics.store_batch_rows.observe(len(data), **labels)
+                metrics.store_commit.observe(time.perf_counter() - start_time, **labels)
+                logger.info(f"{batch_name}数据({len(data)}行)已经存入{self.table_name}!")
+                return
+            except Exception as e:
+                metrics.store_failures.inc(table=self.table_name, method="writer")
+                logger.warning(e)
+                logger.warning(batch_name + "数据存储失败，重试%d次" % (i + 1))
+        self.failed_lst.extend(name_lst)
+        logger.error(f"{batch_name}数据存储失败，重试结束. 该批次均未写入: {name_lst}")
+
+    def close(self):
+        self.flush()
@@ -5,24 +5,38 @@ Description: 日频数据下载
 '''
 import datetime
 import pandas as pd
-import tushare as ts
 from database.database import DataBase
-from utils.conf import Config
+from database.panel import PanelCacheBuilder
+from utils.client import LazyProApi
+from utils.conf import get_settings
 from utils.downloader import TushareDownloader
 from utils.logger import logger_decorator, Logger
 from typing import List
-from tqdm import tqdm
-from sqlalchemy.types import VARCHAR, DECIMAL
+from utils.transform import normalize_df
+from download.pipeline import Pipeline, join_units
+from download.plan import PlanItem, get_range_note, select_missing_lst
 
-# 获取token
-tstoken = Config("tushare").get_config("tstoken")
-pro = ts.pro_api(tstoken)
+# 获取tushare客户端, 第一次调用接口时才创建
+pro = LazyProApi()
 # 获取downloader
 downloader = TushareDownloader()
 # 获取日志记录器
 logger = Logger("asharedaily")
 
 
+def _transform_dailyprices(price_df, adj_df, columns):
+    """
+    日频行情数据清洗: 计算涨跌幅, 合并复权因子, 重命名并筛选列.
+    pre_close为0(如新股上市首日)时涨跌幅为空, 保留这一行的行情
+    """
+    pre_close = price_df["pre_close"].where(price_df["pre_close"] > 0)
+    price_df["pct_chg"] = 100 * (price_df["close"] / pre_close - 1)
+    df = pd.merge(price_df, adj_df, on=["trade_date", "ts_code"])
+    df = df.rename(columns={"ts_code": "stock_code"})
+    df = df[columns].copy()
+    return df
+
+
 class AshareDailyDownload(DataBase):
     """
     每天的交易数据下载
@@ -52,13 +66,21 @@ class AshareDailyDownload(DataBase):
             raise ValueError("self.trade_date_lst is not None!")
         # 获取table_name的交易日列表
         sql1 = f"""select distinct a.trade_date from {table_name} a;"""
-        trade_date_lst1 = pd.read_sql(sql=sql1, con=self.engine)["trade_date"].tolist()
+        trade_date_lst1 = [str(i) for i in self.read_sql_lst(sql1)]
 
         trade_date_lst2 = self._get_daily_trade_date_lst()
-        trade_date_set = set(trade_date_lst2) - set(trade_date_lst1)
-        self.trade_date_lst = sorted(list(trade_date_set))
+        self.trade_date_lst = select_missing_lst(trade_date_lst2, trade_date_lst1)
         return
 
+    def _plan_trade_date(self, table_name, calls_per_unit):
+        """
+        按交易日下载的数据表的下载计划
+        """
+        self._set_trade_date_lst(table_name)
+        trade_date_lst, self.trade_date_lst = self.trade_date_lst, None
+        return PlanItem(table_name, "trade_date", trade_date_lst, calls_per_unit,
+                        note=get_range_note(trade_date_lst))
+
     def _get_daily_trade_date_lst(self):
         """
         获取从历史到昨天的日频交易日列表
@@ -77,7 +99,7 @@ class AshareDailyDownload(DataBase):
         sql = f"""select a.cal_date as trade_date from asharetradecal a
                   where a.cal_date<='{last_dt}' and a.is_open=1;"""
         trade_cal_df = pd.read_sql(sql=sql, con=self.engine)
-        trade_date_lst = trade_cal_df["trade_date"].tolist()
+        trade_date_lst = trade_cal_df["trade_date"].astype(str).tolist()
         return trade_date_lst
 
     @logger_decorator(logger)
@@ -86,113 +108,127 @@ class AshareDailyDownload(DataBase):
         self.download_dailyprices()
         self.download_dailybasic()
 
+    def plan_main(self):
+        """
+        下载计划, 只读取数据库, 不调用接口
+
+        Returns
+        -------
+        List[download.plan.PlanItem]
+        """
+        return [
+            # 上市、退市、暂停上市三种状态各调用一次
+            PlanItem("asharestockbasic", "list_status", ["L", "D", "P"]),
+            # 行情和复权因子各调用一次
+            self._plan_trade_date("asharedailyprices", 2),
+            self._plan_trade_date("asharedailybasic", 1),
+        ]
+
     @logger_decorator(logger)
     def download_dailyprices(self):
         self._set_trade_date_lst("asharedailyprices")
-        # 日频数据下载
-        for trade_date in tqdm(self.trade_date_lst):
-            # 日频数据
-            fields_lst = [
-                "trade_date",
-                "ts_code",
-                "open",
-                "high",
-                "low",
-                "close",
-                "pre_close",
-                "vol",
-                "amount",
-            ]
-            fields = ",".join(fields_lst)
-            df1 = downloader.download(pro.daily, trade_date=trade_date, fields=fields)
-            df1["pct_chg"] = 100 * (df1["close"] / df1["pre_close"] - 1)
+        # 日频数据
+        fields_lst = [
+            "trade_date",
+            "ts_code",
+            "open",
+            "high",
+            "low",
+            "close",
+            "pre_close",
+            "vol",
+            "amount",
+        ]
+        fields = ",".join(fields_lst)
+        sql_dtype = self.get_sql_dtype("asharedailyprices")
+        columns = list(sql_dtype.keys())
+
+        def fetch(trade_date):
+            df1 = downloader.download(
+                pro.daily, trade_date=trade_date, fields=fields
+            )
             # 复权因子
             df2 = downloader.download(pro.adj_factor, trade_date=trade_date)
-            df = pd.merge(df1, df2, on=["trade_date", "ts_code"])
-            df = df.rename(columns={"ts_code": "stock_code"})
-            sql_dtype = {
-                "trade_date": VARCHAR(255),
-                "stock_code": VARCHAR(255),
-                "open": DECIMAL(20, 4),
-                "high": DECIMAL(20, 4),
-                "low": DECIMAL(20, 4),
-                "close": DECIMAL(20, 4),
-                "pre_close": DECIMAL(20, 4),
-                "pct_chg": DECIMAL(20, 4),
-                "vol": DECIMAL(20, 4),
-                "amount": DECIMAL(20, 4),
-                "adj_factor": DECIMAL(20, 4),
-            }
-            df = df[list(sql_dtype.keys())].copy()
-            self.store_data(
-                data=df,
-                data_name="股票日频数据_" + trade_date,
-                table_name="asharedailyprices",
-                dtype=sql_dtype,
-            )
+            return df1, df2, columns
+
+        writer = self.buffered_writer("asharedailyprices", dtype=sql_dtype)
+
+        def store(trade_date_lst, df):
+            writer.write(df, "股票日频数据_" + join_units(trade_date_lst))
+
+        # 下载、清洗和存储三个阶段同时进行
+        pipeline = Pipeline(
+            fetch, _transform_dailyprices, store, name="asharedailyprices"
+        )
+        with writer:
+            pipeline.run(self.trade_date_lst)
         self.trade_date_lst = None
+        self.update_panel("asharedailyprices")
         return
 
     @logger_decorator(logger)
     def download_dailybasic(self):
         self._set_trade_date_lst("asharedailybasic")
-        # 日度数据下载
-        for trade_date in tqdm(self.trade_date_lst):
-            # 日频数据
-            fields_lst = [
-                "trade_date",
-                "ts_code",
-                "turnover_rate",
-                "turnover_rate_f",
-                "volume_ratio",
-                "pe",
-                "pe_ttm",
-                "pb",
-                "ps",
-                "ps_ttm",
-                "dv_ratio",
-                "dv_ttm",
-                "total_share",
-                "float_share",
-                "free_share",
-                "total_mv",
-                "circ_mv",
-            ]
-            fields = ",".join(fields_lst)
+        # 日频数据
+        fields_lst = [
+            "trade_date",
+            "ts_code",
+            "turnover_rate",
+            "turnover_rate_f",
+            "volume_ratio",
+            "pe",
+            "pe_ttm",
+            "pb",
+            "ps",
+            "ps_ttm",
+            "dv_ratio",
+            "dv_ttm",
+            "total_share",
+            "float_share",
+            "free_share",
+            "total_mv",
+            "circ_mv",
+        ]
+        fields = ",".join(fields_lst)
+        sql_dtype = self.get_sql_dtype("asharedailybasic")
+        columns = list(sql_dtype.keys())
+
+        def fetch(trade_date):
             df = downloader.download(
                 pro.daily_basic, trade_date=trade_date, fields=fields
             )
-            df = df.rename(columns={"ts_code": "stock_code"})
-            sql_dtype = {
-                "trade_date": VARCHAR(255),
-                "stock_code": VARCHAR(255),
-                "turnover_rate": DECIMAL(20, 4),
-                "turnover_rate_f": DECIMAL(20, 4),
-                "volume_ratio": DECIMAL(20, 4),
-                "pe": DECIMAL(20, 4),
-                "pe_ttm": DECIMAL(20, 4),
-                "pb": DECIMAL(20, 4),
-                "ps": DECIMAL(20, 4),
-                "ps_ttm": DECIMAL(20, 4),
-                "dv_ratio": DECIMAL(20, 4),
-                "dv_ttm": DECIMAL(20, 4),
-                "total_share": DECIMAL(20, 4),
-                "float_share": DECIMAL(20, 4),
-                "free_share": DECIMAL(20, 4),
-                "total_mv": DECIMAL(20, 4),
-                "circ_mv": DECIMAL(20, 4),
-            }
-            df = df[list(sql_dtype.keys())].copy()
-            self.store_data(
-                data=df,
-                data_name="股票日频指标_" + trade_date,
-                table_name="asharedailybasic",
-                dtype=sql_dtype,
-            )
+            return df, columns, {"ts_code": "stock_code"}
+
+        writer = self.buffered_writer("asharedailybasic", dtype=sql_dtype)
+
+        def store(trade_date_lst, df):
+            writer.write(df, "股票日频指标_" + join_units(trade_date_lst))
+
+        # 日度数据下载
+        pipeline = Pipeline(fetch, normalize_df, store, name="asharedailybasic")
+        with writer:
+            pipeline.run(self.trade_date_lst)
         # 将self.trade_date_lst重设为None
         self.trade_date_lst = None
+        self.update_panel("asharedailybasic")
         return
 
+    def update_panel(self, table_name):
+        """
+        将新下载的交易日写入常用字段的面板缓存(config.ini中[cache]的build_panel为True时).
+        更新失败只输出ERROR日志, 不影响下载
+
+        Parameters
+        ----------
+        table_name: str. 数据表名
+        """
+        if not get_settings().cache.build_panel:
+            return
+        try:
+            PanelCacheBuilder().update([table_name])
+        except Exception as e:
+            logger.error(f"{table_name}面板缓存更新失败: {e}")
+
     @logger_decorator(logger)
     def download_stockbasic(self):
         # 拉取数据
@@ -213,21 +249,12 @@ class AshareDailyDownload(DataBase):
             df = pd.concat([df, tempdf])
         df = df.reset_index(drop=True)
         df = df.rename(columns={"ts_code": "stock_code"})
-        sql_dtype = {
-            "stock_code": VARCHAR(255),
-            "name": VARCHAR(255),
-            "area": VARCHAR(255),
-            "market": VARCHAR(255),
-            "exchange": VARCHAR(255),
-            "list_date": VARCHAR(255),
-            "delist_date": VARCHAR(255),
-        }
+        sql_dtype = self.get_sql_dtype("asharestockbasic")
         df = df[list(sql_dtype.keys())].copy()
-        self.store_data(
+        self.refresh_data(
             data=df,
             data_name="股票基本情况表数据",
             table_name="asharestockbasic",
-            flag_replace=True,
             dtype=sql_dtype,
         )
         return
@@ -4,18 +4,18 @@ Date: 2023-08-14 20:13:54
 Description: 指数数据下载
 '''
 import pandas as pd
-import tushare as ts
 from database.database import DataBase
-from utils.conf import Config
+from database.indexweight import IndexWeightDaily
+from utils.client import LazyProApi
 from utils.downloader import TushareDownloader
 from utils.logger import logger_decorator, Logger
 import datetime
 from tqdm import tqdm
-from sqlalchemy.types import VARCHAR, DECIMAL
+from download.pipeline import Pipeline, join_units
+from download.plan import PlanItem, get_range_note, select_missing_lst
 
-# 获取token
-tstoken = Config("tushare").get_config("tstoken")
-pro = ts.pro_api(tstoken)
+# 获取tushare客户端, 第一次调用接口时才创建
+pro = LazyProApi()
 # 获取downloader
 downloader = TushareDownloader()
 
@@ -40,6 +40,38 @@ index_basic_dct = {
     '399311.SZ': '国证1000',
     '399303.SZ': '国证2000',
 }
+# 成分股权重数据的起始日期
+weight_start_date_dct = {
+    '000001.SH': '19901219',
+    '399001.SZ': '19940720',
+    '399006.SZ': '20100531',
+    '899050.BJ': '20220429',
+    '000688.SH': '20191231',
+    '000698.SH': '20191231',
+    '000016.SH': '20031231',
+    '399850.SZ': '20021231',
+    '399330.SZ': '20021231',
+    '000300.SH': '20041231',
+    '000905.SH': '20041231',
+    '000906.SH': '20041231',
+    '000852.SH': '20041231',
+    '932000.CSI': '20131231',
+    '399311.SZ': '20021231',
+    '399303.SZ': '20091231',
+}
+
+
+def _transform_index(df, trade_date_lst, columns):
+    """
+    指数行情数据清洗: 修正前收盘价, 计算涨跌幅, 筛选交易日, 重命名并筛选列
+    """
+    df.loc[df['pre_close'] < 1e-2, 'pre_close'] = df['close']
+    df["pct_chg"] = 100 * (df["close"] / df["pre_close"] - 1)
+    df = df.loc[df['trade_date'].isin(trade_date_lst), :].copy()
+    df = df.rename(columns={'ts_code': 'index_code'})
+    df = df.reset_index(drop=True)
+    df = df[columns].copy()
+    return df
 
 
 class AshareIndexDownload(DataBase):
@@ -77,7 +109,7 @@ class AshareIndexDownload(DataBase):
         sql = f"""select a.cal_date as trade_date from asharetradecal a
                   where a.cal_date<='{last_dt}' and a.is_open=1;"""
         trade_cal_df = pd.read_sql(sql=sql, con=self.engine)
-        trade_date_lst = trade_cal_df["trade_date"].tolist()
+        trade_date_lst = trade_cal_df["trade_date"].astype(str).tolist()
         return trade_date_lst
 
     def _get_monthly_trade_date_lst(self):
@@ -111,9 +143,9 @@ class AshareIndexDownload(DataBase):
         # 输出年和月，根据年和月筛出每年每月最后一天
         trade_cal_df = trade_cal_df.sort_values("trade_date")
         trade_cal_df = trade_cal_df.reset_index(drop=True)
-        trade_cal_df["ym"] = trade_cal_df["trade_date"].apply(lambda x: x[0:6])
+        trade_cal_df["ym"] = trade_cal_df["trade_date"].astype(str).str[0:6]
         trade_cal_df = trade_cal_df.drop_duplicates(subset=["ym"], keep="last")
-        trade_date_lst = trade_cal_df["trade_date"].tolist()
+        trade_date_lst = trade_cal_df["trade_date"].astype(str).tolist()
         return trade_date_lst
 
     def _set_trade_date_lst(self, table_name, date_type='daily'):
@@ -130,24 +162,65 @@ class AshareIndexDownload(DataBase):
             raise ValueError("self.trade_date_lst is not None!")
         # 获取table_name的交易日列表
         sql1 = f"""select distinct a.trade_date from {table_name} a;"""
-        trade_date_df1 = pd.read_sql(sql=sql1, con=self.engine)
-        trade_date_lst1 = trade_date_df1["trade_date"].tolist()
+        trade_date_lst1 = [str(i) for i in self.read_sql_lst(sql1)]
         if date_type == 'daily':
             trade_date_lst2 = self._get_daily_trade_date_lst()
         elif date_type == 'monthly':
             trade_date_lst2 = self._get_monthly_trade_date_lst()
         else:
             raise ValueError('date_type must be daily or monthly.')
-        trade_date_set = set(trade_date_lst2) - set(trade_date_lst1)
-        self.trade_date_lst = sorted(list(trade_date_set))
+        self.trade_date_lst = select_missing_lst(trade_date_lst2, trade_date_lst1)
         return
 
+    def _get_weight_unit_lst(self):
+        """
+        成分股权重数据的工作单元列表[(指数代码, 交易日)], 跳过指数起始日期之前的交易日
+        """
+        unit_lst = []
+        for index_code in index_basic_dct.keys():
+            start_date = weight_start_date_dct[index_code]
+            for trade_date in self.trade_date_lst:
+                if trade_date < start_date:
+                    continue
+                unit_lst.append((index_code, trade_date))
+        return unit_lst
+
     @logger_decorator(logger)
     def download_main(self):
         self.download_indexbasic()
         self.download_daily()
         self.download_monthly()
         self.download_weight()
+        self.update_weight_daily()
+
+    def plan_main(self):
+        """
+        下载计划, 只读取数据库, 不调用接口
+
+        Returns
+        -------
+        List[download.plan.PlanItem]
+        """
+        plan_lst = []
+        # 日频和月频数据按指数下载, 每个指数调用一次接口取缺失日期的范围
+        for table_name, date_type in [('ashareindexdaily', 'daily'),
+                                      ('ashareindexmonthly', 'monthly')]:
+            self._set_trade_date_lst(table_name=table_name, date_type=date_type)
+            trade_date_lst, self.trade_date_lst = self.trade_date_lst, None
+            index_code_lst = list(index_basic_dct.keys()) if len(trade_date_lst) > 0 else []
+            plan_lst.append(PlanItem(table_name, "index_code", index_code_lst,
+                                     note=get_range_note(trade_date_lst)))
+        self._set_trade_date_lst(table_name='ashareindexweight', date_type='monthly')
+        unit_lst = self._get_weight_unit_lst()
+        plan_lst.append(PlanItem('ashareindexweight', "index_code,trade_date", unit_lst,
+                                 note=get_range_note(self.trade_date_lst)))
+        self.trade_date_lst = None
+        # 日频权重由月末权重向前填充, 不调用接口
+        update_dct = IndexWeightDaily().get_update_dct(list(index_basic_dct.keys()))
+        date_lst = [str(i) for date_arr in update_dct.values() for i in date_arr[[0, -1]]]
+        plan_lst.append(PlanItem('ashareindexweightdaily', "index_code", list(update_dct.keys()),
+                                 calls_per_unit=0, note=get_range_note(date_lst)))
+        return plan_lst
 
     def _check_indexbasic(self):
         sql = 'select count(*) from asharesw2021basic;'
@@ -163,15 +236,11 @@ class AshareIndexDownload(DataBase):
             'index_code': list(index_basic_dct.keys()),
             'name': list(index_basic_dct.values())
         })
-        sql_dtype = {
-            "index_code": VARCHAR(255),
-            "name": VARCHAR(255),
-        }
-        self.store_data(
+        sql_dtype = self.get_sql_dtype("ashareindexbasic")
+        self.refresh_data(
             data=index_basic,
             data_name="指数基本情况表数据",
             table_name="ashareindexbasic",
-            flag_replace=True,
             dtype=sql_dtype,
         )
         return
@@ -185,50 +254,39 @@ class AshareIndexDownload(DataBase):
             return
         start_date = self.trade_date_lst[0]
         end_date = self.trade_date_lst[-1]
-        # 日频数据下载
-        for index_code in tqdm(list(index_basic_dct.keys())):
-            # 日频数据
-            fields_lst = [
-                "trade_date",
-                "ts_code",
-                "open",
-                "high",
-                "low",
-                "close",
-                "pre_close",
-                "vol",
-                "amount",
-            ]
-            fields = ",".join(fields_lst)
+        # 日频数据
+        fields_lst = [
+            "trade_date",
+            "ts_code",
+            "open",
+            "high",
+            "low",
+            "close",
+            "pre_close",
+            "vol",
+            "amount",
+        ]
+        fields = ",".join(fields_lst)
+        sql_dtype = self.get_sql_dtype("ashareindexdaily")
+        columns = list(sql_dtype.keys())
+
+        def fetch(index_code):
             df = downloader.download(pro.index_daily,
                                      ts_code=index_code,
                                      start_date=start_date,
                                      end_date=end_date,
                                      fields=fields)
-            df.loc[df['pre_close']<1e-2, 'pre_close'] = df['close']
-            df["pct_chg"] = 100 * (df["close"] / df["pre_close"] - 1)
-            df = df.loc[df['trade_date'].isin(self.trade_date_lst), :].copy()
-            df = df.rename(columns={'ts_code': 'index_code'})
-            df = df.reset_index(drop=True)
-            sql_dtype = {
-                "trade_date": VARCHAR(255),
-                "index_code": VARCHAR(255),
-                "open": DECIMAL(20, 4),
-                "high": DECIMAL(20, 4),
-                "low": DECIMAL(20, 4),
-                "close": DECIMAL(20, 4),
-                "pre_close": DECIMAL(20, 4),
-                "pct_chg": DECIMAL(20, 4),
-                "vol": DECIMAL(30, 4),
-                "amount": DECIMAL(30, 4),
-            }
-            df = df[list(sql_dtype.keys())].copy()
-            self.store_data(
-                data=df,
-                data_name="指数日频数据_" + index_code,
-                table_name="ashareindexdaily",
-                dtype=sql_dtype,
-            )
+            return df, self.trade_date_lst, columns
+
+        writer = self.buffered_writer("ashareindexdaily", dtype=sql_dtype)
+
+        def store(index_code_lst, df):
+            writer.write(df, "指数日频数据_" + join_units(index_code_lst))
+
+        # 日频数据下载
+        pipeline = Pipeline(fetch, _transform_index, store, name="ashareindexdaily")
+        with writer:
+            pipeline.run(list(index_basic_dct.keys()))
         self.trade_date_lst = None
         return
 
@@ -241,50 +299,39 @@ class AshareIndexDownload(DataBase):
             return
         start_date = self.trade_date_lst[0]
         end_date = self.trade_date_lst[-1]
-        # 月频数据下载
-        for index_code in tqdm(list(index_basic_dct.keys())):
-            # 月频数据
-            fields_lst = [
-                "trade_date",
-                "ts_code",
-                "open",
-                "high",
-                "low",
-                "close",
-                "pre_close",
-                "vol",
-                "amount",
-            ]
-            fields = ",".join(fields_lst)
+        # 月频数据
+        fields_lst = [
+            "trade_date",
+            "ts_code",
+            "open",
+            "high",
+            "low",
+            "close",
+            "pre_close",
+            "vol",
+            "amount",
+        ]
+        fields = ",".join(fields_lst)
+        sql_dtype = self.get_sql_dtype("ashareindexmonthly")
+        columns = list(sql_dtype.keys())
+
+        def fetch(index_code):
             df = downloader.download(pro.index_monthly,
                                      ts_code=index_code,
                                      start_date=start_date,
                                      end_date=end_date,
                                      fields=fields)
-            df.loc[df['pre_close']<1e-2, 'pre_close'] = df['close']
-            df["pct_chg"] = 100 * (df["close"] / df["pre_close"] - 1)
-            df = df.loc[df['trade_date'].isin(self.trade_date_lst), :].copy()
-            df = df.rename(columns={'ts_code': 'index_code'})
-            df = df.reset_index(drop=True)
-            sql_dtype = {
-                "trade_date": VARCHAR(255),
-                "index_code": VARCHAR(255),
-                "open": DECIMAL(20, 4),
-                "high": DECIMAL(20, 4),
-                "low": DECIMAL(20, 4),
-                "close": DECIMAL(20, 4),
-                "pre_close": DECIMAL(20, 4),
-                "pct_chg": DECIMAL(20, 4),
-                "vol": DECIMAL(30, 4),
-                "amount": DECIMAL(30, 4),
-            }
-            df = df[list(sql_dtype.keys())].copy()
-            self.store_data(
-                data=df,
-                data_name="指数月频数据_" + index_code,
-                table_name="ashareindexmonthly",
-                dtype=sql_dtype,
-            )
+            return df, self.trade_date_lst, columns
+
+        writer = self.buffered_writer("ashareindexmonthly", dtype=sql_dtype)
+
+        def store(index_code_lst, df):
+            writer.write(df, "指数月频数据_" + join_units(index_code_lst))
+
+        # 月频数据下载
+        pipeline = Pipeline(fetch, _transform_index, store, name="ashareindexmonthly")
+        with writer:
+            pipeline.run(list(index_basic_dct.keys()))
         self.trade_date_lst = None
         return
 
@@ -295,51 +342,31 @@ class AshareIndexDownload(DataBase):
         # 拉取数据
         df = pd.DataFrame()
         fields = ["index_code", "con_code", "trade_date", "weight"]
-        # 起始日期
-        start_date_dct = {
-            '000001.SH': '19901219',
-            '399001.SZ': '19940720',
-            '399006.SZ': '20100531',
-            '899050.BJ': '20220429',
-            '000688.SH': '20191231',
-            '000698.SH': '20191231',
-            '000016.SH': '20031231',
-            '399850.SZ': '20021231',
-            '399330.SZ': '20021231',
-            '000300.SH': '20041231',
-            '000905.SH': '20041231',
-            '000906.SH': '20041231',
-            '000852.SH': '20041231',
-            '932000.CSI': '20131231',
-            '399311.SZ': '20021231',
-            '399303.SZ': '20091231',
-        }
-        for index_code in tqdm(list(index_basic_dct.keys())):
-            start_date = start_date_dct[index_code] 
-            for trade_date in self.trade_date_lst:
-                if trade_date < start_date:
-                    continue
-                tempdf = downloader.download(
-                    pro.index_weight, trade_date=trade_date,
-                    index_code=index_code, fields=fields
-                )
-                logger.info(f'存储指数{index_code}成分股权重数据, 日期{trade_date}')
-                df = pd.concat([df, tempdf])
-            df = df.sort_values(["con_code", "trade_date"])
+        for index_code, trade_date in tqdm(self._get_weight_unit_lst()):
+            tempdf = downloader.download(
+                pro.index_weight, trade_date=trade_date,
+                index_code=index_code, fields=fields
+            )
+            logger.debug(f'存储指数{index_code}成分股权重数据, 日期{trade_date}')
+            df = pd.concat([df, tempdf])
+        # 只下载了缺失的月份, 所有指数下载完后一次性追加存储
+        sql_dtype = self.get_sql_dtype("ashareindexweight")
+        if len(df) > 0:
+            df = df.sort_values(["index_code", "con_code", "trade_date"])
             df = df.reset_index(drop=True)
-            sql_dtype = {
-                "index_code": VARCHAR(255),
-                "con_code": VARCHAR(255),
-                "trade_date": VARCHAR(255),
-                "weight": DECIMAL(20, 4)
-            }
             df = df[list(sql_dtype.keys())].copy()
-            self.store_data(
-                data=df,
-                data_name="指数成分股权重数据_" + index_code,
-                table_name="ashareindexweight",
-                flag_replace=True,
-                dtype=sql_dtype,
-            )
+        self.store_data(
+            data=df,
+            data_name="指数成分股权重数据",
+            table_name="ashareindexweight",
+            dtype=sql_dtype,
+        )
         self.trade_date_lst = None
         return
+
+    @logger_decorator(logger)
+    def update_weight_daily(self):
+        """
+        将新增月份的成分股权重向前填充到日频权重表ashareindexweightdaily
+        """
+        IndexWeightDaily().update(list(index_basic_dct.keys()))
@@ -5,24 +5,34 @@ Description: 月频数据下载
 '''
 import datetime
 import pandas as pd
-import tushare as ts
 from database.database import DataBase
-from utils.conf import Config
+from utils.client import LazyProApi
 from utils.downloader import TushareDownloader
 from utils.logger import logger_decorator, Logger
 from typing import List
-from tqdm import tqdm
-from sqlalchemy.types import VARCHAR, DECIMAL
+from download.pipeline import Pipeline, join_units
+from download.plan import PlanItem, get_range_note, select_missing_lst
 
-# 获取token
-tstoken = Config("tushare").get_config("tstoken")
-pro = ts.pro_api(tstoken)
+# 获取tushare客户端, 第一次调用接口时才创建
+pro = LazyProApi()
 # 获取downloader
 downloader = TushareDownloader()
 # 获取日志记录器
 logger = Logger("asharemonthly")
 
 
+def _transform_monthlyprices(price_df, adj_df, columns):
+    """
+    月频行情数据清洗: 合并复权因子, 重命名, 计算涨跌幅并筛选列
+    """
+    df = pd.merge(price_df, adj_df, on=["trade_date", "ts_code"])
+    df = df.rename(columns={"ts_code": "stock_code"})
+    # 计算涨跌幅, pre_close为0时为空
+    df["pct_chg"] = 100 * (df["close"] / df["pre_close"].where(df["pre_close"] > 0) - 1)
+    df = df[columns].copy()
+    return df
+
+
 class AshareMonthlyDownload(DataBase):
     """
     每月的交易数据下载
@@ -52,12 +62,11 @@ class AshareMonthlyDownload(DataBase):
             raise ValueError("self.trade_date_lst is not None!")
         # 获取table的交易日列表
         sql = f"""select distinct a.trade_date from {table} a;"""
-        trade_date_lst1 = pd.read_sql(sql=sql, con=self.engine)["trade_date"].tolist()
+        trade_date_lst1 = [str(i) for i in self.read_sql_lst(sql)]
 
         # 获取从历史至昨天的交易日列表
         trade_date_lst2 = self._get_monthly_trade_date_lst()
-        trade_date_set = set(trade_date_lst2) - set(trade_date_lst1)
-        self.trade_date_lst = sorted(list(trade_date_set))
+        self.trade_date_lst = select_missing_lst(trade_date_lst2, trade_date_lst1)
         return
 
     def _get_monthly_trade_date_lst(self):
@@ -91,59 +100,68 @@ class AshareMonthlyDownload(DataBase):
         # 输出年和月，根据年和月筛出每年每月最后一天
         trade_cal_df = trade_cal_df.sort_values("trade_date")
         trade_cal_df = trade_cal_df.reset_index(drop=True)
-        trade_cal_df["ym"] = trade_cal_df["trade_date"].apply(lambda x: x[0:6])
+        trade_cal_df["ym"] = trade_cal_df["trade_date"].astype(str).str[0:6]
         trade_cal_df = trade_cal_df.drop_duplicates(subset=["ym"], keep="last")
-        trade_date_lst = trade_cal_df["trade_date"].tolist()
+        trade_date_lst = trade_cal_df["trade_date"].astype(str).tolist()
         return trade_date_lst
 
     @logger_decorator(logger)
     def download_main(self):
         self.download_monthlyprices()
 
+    def plan_main(self):
+        """
+        下载计划, 只读取数据库, 不调用接口
+
+        Returns
+        -------
+        List[download.plan.PlanItem]
+        """
+        self._set_trade_date_lst("asharemonthlyprices")
+        trade_date_lst, self.trade_date_lst = self.trade_date_lst, None
+        # 行情和复权因子各调用一次
+        return [
+            PlanItem("asharemonthlyprices", "trade_date", trade_date_lst, 2,
+                     note=get_range_note(trade_date_lst))
+        ]
+
     @logger_decorator(logger)
     def download_monthlyprices(self):
         self._set_trade_date_lst("asharemonthlyprices")
-        # 月频数据下载
-        for trade_date in tqdm(self.trade_date_lst):
-            # 月频数据
-            fields_lst = [
-                "trade_date",
-                "ts_code",
-                "open",
-                "high",
-                "low",
-                "close",
-                "pre_close",
-                "vol",
-                "amount",
-            ]
-            fields = ",".join(fields_lst)
-            df1 = downloader.download(pro.monthly, trade_date=trade_date, fields=fields)
+        # 月频数据
+        fields_lst = [
+            "trade_date",
+            "ts_code",
+            "open",
+            "high",
+            "low",
+            "close",
+            "pre_close",
+            "vol",
+            "amount",
+        ]
+        fields = ",".join(fields_lst)
+        sql_dtype = self.get_sql_dtype("asharemonthlyprices")
+        columns = list(sql_dtype.keys())
+
+        def fetch(trade_date):
+            df1 = downloader.download(
+                pro.monthly, trade_date=trade_date, fields=fields
+            )
             # 复权因子
             df2 = downloader.download(pro.adj_factor, trade_date=trade_date)
-            df = pd.merge(df1, df2, on=["trade_date", "ts_code"])
-            df = df.rename(columns={"ts_code": "stock_code"})
-            # 计算涨跌幅
-            df["pct_chg"] = 100 * (df["close"] / df["pre_close"] - 1)
-            sql_dtype = {
-                "trade_date": VARCHAR(255),
-                "stock_code": VARCHAR(255),
-                "open": DECIMAL(20, 4),
-                "high": DECIMAL(20, 4),
-                "low": DECIMAL(20, 4),
-                "close": DECIMAL(20, 4),
-                "pre_close": DECIMAL(20, 4),
-                "pct_chg": DECIMAL(20, 4),
-                "vol": DECIMAL(20, 4),
-                "amount": DECIMAL(20, 4),
-                "adj_factor": DECIMAL(20, 4),
-            }
-            df = df[list(sql_dtype.keys())].copy()
-            self.store_data(
-                data=df,
-                data_name="月频数据_" + trade_date,
-                table_name="asharemonthlyprices",
-                dtype=sql_dtype,
-            )
+            return df1, df2, columns
+
+        writer = self.buffered_writer("asharemonthlyprices", dtype=sql_dtype)
+
+        def store(trade_date_lst, df):
+            writer.write(df, "月频数据_" + join_units(trade_date_lst))
+
+        # 月频数据下载
+        pipeline = Pipeline(
+            fetch, _transform_monthlyprices, store, name="asharemonthlyprices"
+        )
+        with writer:
+            pipeline.run(self.trade_date_lst)
         self.trade_date_lst = None
         return
@@ -5,20 +5,18 @@ Description: 申万行业指数(2021年版)日频数据下载
 '''
 import pandas as pd
 import os
-import tushare as ts
 from database.database import DataBase
-from utils.conf import Config
+from utils.client import LazyProApi
 from spyder.swindex import SWDataSpyder
 from utils.downloader import TushareDownloader
 from utils.logger import logger_decorator, Logger
 from utils.utils import divide_lst
+from download.plan import PlanItem, get_range_note, select_missing_lst
 import datetime
-from sqlalchemy.types import VARCHAR, DECIMAL, SMALLINT
 import threading
 
-# 获取token
-tstoken = Config("tushare").get_config("tstoken")
-pro = ts.pro_api(tstoken)
+# 获取tushare客户端, 第一次调用接口时才创建
+pro = LazyProApi()
 # 获取downloader
 downloader = TushareDownloader()
 
@@ -62,7 +60,7 @@ class AshareSW2021DailyDownload(DataBase):
         sql = f"""select a.cal_date as trade_date from asharetradecal a
                   where a.cal_date<='{last_dt}' and a.is_open=1;"""
         trade_cal_df = pd.read_sql(sql=sql, con=self.engine)
-        trade_date_lst = trade_cal_df["trade_date"].tolist()
+        trade_date_lst = trade_cal_df["trade_date"].astype(str).tolist()
         return trade_date_lst
 
     def _set_trade_date_lst(self, table_name):
@@ -78,11 +76,9 @@ class AshareSW2021DailyDownload(DataBase):
             raise ValueError("self.trade_date_lst is not None!")
         # 获取table_name的交易日列表
         sql1 = f"""select distinct a.trade_date from {table_name} a;"""
-        trade_date_df1 = pd.read_sql(sql=sql1, con=self.engine)
-        trade_date_lst1 = trade_date_df1["trade_date"].tolist()
+        trade_date_lst1 = [str(i) for i in self.read_sql_lst(sql1)]
         trade_date_lst2 = self._get_daily_trade_date_lst()
-        trade_date_set = set(trade_date_lst2) - set(trade_date_lst1)
-        self.trade_date_lst = sorted(list(trade_date_set))
+        self.trade_date_lst = select_missing_lst(trade_date_lst2, trade_date_lst1)
         return
 
     @logger_decorator(logger)
@@ -91,6 +87,26 @@ class AshareSW2021DailyDownload(DataBase):
         self.download_member()
         self.download_dailyprices()
 
+    def plan_main(self):
+        """
+        下载计划, 只读取数据库, 不调用接口. 行业指数共31个
+
+        Returns
+        -------
+        List[download.plan.PlanItem]
+        """
+        basic_calls = 0 if self._check_indexbasic() else 1
+        self._set_trade_date_lst("asharesw2021daily")
+        trade_date_lst, self.trade_date_lst = self.trade_date_lst, None
+        return [
+            PlanItem("asharesw2021basic", "refresh", [], fixed_calls=basic_calls),
+            # 先取行业列表, 再按31个行业逐个下载成分股
+            PlanItem("asharesw2021member", "refresh", [], fixed_calls=32),
+            # 日频数据从申万官网爬取, 只调用一次tushare取行业列表
+            PlanItem("asharesw2021daily", "trade_date", trade_date_lst, 0, fixed_calls=1,
+                     note=get_range_note(trade_date_lst)),
+        ]
+
     def _check_indexbasic(self):
         sql = 'select count(*) from asharesw2021basic;'
         if self.execute_sql(sql)[0][0]!=31:
@@ -104,15 +120,11 @@ class AshareSW2021DailyDownload(DataBase):
         index_basic = pro.index_classify(src='SW2021', level='L1')
         index_basic = index_basic[['index_code', 'industry_name']].copy()
         index_basic.columns = ["index_code", "name"]
-        sql_dtype = {
-            "index_code": VARCHAR(255),
-            "name": VARCHAR(255),
-        }
-        self.store_data(
+        sql_dtype = self.get_sql_dtype("asharesw2021basic")
+        self.refresh_data(
             data=index_basic,
             data_name="申万行业指数(2021年版)基本情况表数据",
             table_name="asharesw2021basic",
-            flag_replace=True,
             dtype=sql_dtype,
         )
         return
@@ -132,19 +144,12 @@ class AshareSW2021DailyDownload(DataBase):
             tempdf = tempdf.sort_values(["con_code", "in_date"])
             df = pd.concat([df, tempdf])
         df = df.reset_index(drop=True)
-        sql_dtype = {
-            "index_code": VARCHAR(255),
-            "con_code": VARCHAR(255),
-            "in_date": VARCHAR(255),
-            "out_date": VARCHAR(255),
-            "is_new": SMALLINT,
-        }
+        sql_dtype = self.get_sql_dtype("asharesw2021member")
         df = df[list(sql_dtype.keys())].copy()
-        self.store_data(
+        self.refresh_data(
             data=df,
             data_name="申万行业指数(2021年版)成分股数据",
             table_name="asharesw2021member",
-            flag_replace=True,
             dtype=sql_dtype,
         )
         return
@@ -171,7 +176,7 @@ class AshareSW2021DailyDownload(DataBase):
                     bigdf = pd.concat([bigdf, tempdf])
                     bigdf.to_csv('./tmp/sw_daily.csv', index=False)
                 self.lock.release()
-                logger.info(f'SW2021DAILY Finished code: {code}')
+                logger.debug(f'SW2021DAILY Finished code: {code}')
         try:
             # 创建线程并启动
             threads = []
@@ -186,15 +191,7 @@ class AshareSW2021DailyDownload(DataBase):
 
             df = pd.read_csv('./tmp/sw_daily.csv')
             df = df.drop_duplicates()
-            sql_dtype = {
-                "trade_date": VARCHAR(255),
-                "index_code": VARCHAR(255),
-                "open": DECIMAL(20, 4),
-                "high": DECIMAL(20, 4),
-                "low": DECIMAL(20, 4),
-                "close": DECIMAL(20, 4),
-                "pct_chg": DECIMAL(20, 4),
-            }
+            sql_dtype = self.get_sql_dtype("asharesw2021daily")
             self.store_data(
                 data=df,
                 data_name="申万行业指数(2021年版)日频数据",
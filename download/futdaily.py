@@ -5,21 +5,59 @@ Description: 日频期货数据下载
 '''
 import datetime
 import pandas as pd
-import tushare as ts
 from database.database import DataBase
-from utils.conf import Config
+from utils.client import LazyProApi
 from utils.downloader import TushareDownloader
 from utils.logger import logger_decorator, Logger
-from tqdm import tqdm
-from sqlalchemy.types import VARCHAR, DECIMAL, INT
+from utils.transform import normalize_df
+from download.pipeline import Pipeline, join_units
+from download.plan import PlanItem, get_range_note, select_missing_lst
 
-# 获取token
-tstoken = Config("tushare").get_config("tstoken")
-pro = ts.pro_api(tstoken)
+# 获取tushare客户端, 第一次调用接口时才创建
+pro = LazyProApi()
 # 获取downloader
 downloader = TushareDownloader()
 # 获取日志记录器
 logger = Logger("futdaily")
+# 合约信息表的交易所
+basic_exchange_lst = ["CFFEX", "DCE", "CZCE", "SHFE", "INE", "GFEX"]
+# 每日持仓数据的交易所及起始日期
+holding_start_date_dct = {
+    "CFFEX": "20100416",
+    "CZCE": "20050429",
+    "DCE": "20060104",
+    "SHFE": "20020107",
+}
+
+
+def _select_trading_contract(df):
+    """
+    筛选实际进行交易的合约，如'A0001',而不是'AL','A'等主力或者连续合约
+    """
+
+    def _select_code_func(code):
+        symbol = code.split(".")[0]
+        return (symbol[-4:]).isdigit()
+
+    if "fut_code" not in df.columns:
+        raise ValueError("fut_code must be in columns.")
+    select_flag = df["fut_code"].apply(_select_code_func)
+    df = df.loc[select_flag, :].copy()
+    df = df.reset_index(drop=True)
+    return df
+
+
+def _transform_dailyprices(df, columns):
+    """
+    期货日频数据清洗: 计算涨跌幅, 重命名, 筛选实际交易的合约并筛选列.
+    pre_close为0(如新合约首日)时涨跌幅为空
+    """
+    df["pct_chg"] = 100 * (df["close"] / df["pre_close"].where(df["pre_close"] > 0) - 1)
+    df = df.rename(columns={"ts_code": "fut_code"})
+    # 筛选实际交易的合约,如'A0001.DCF'
+    df = _select_trading_contract(df)
+    df = df[columns].copy()
+    return df
 
 
 class FutDailyDownload(DataBase):
@@ -63,13 +101,21 @@ class FutDailyDownload(DataBase):
             raise ValueError("self.trade_date_lst is not None!")
         # 获取table的交易日列表
         sql1 = f"""select distinct a.trade_date from {table} a;"""
-        trade_date_lst1 = pd.read_sql(sql=sql1, con=self.engine)["trade_date"].tolist()
+        trade_date_lst1 = [str(i) for i in self.read_sql_lst(sql1)]
 
         trade_date_lst2 = self._get_daily_trade_date_lst(start_date)
-        trade_date_set = set(trade_date_lst2) - set(trade_date_lst1)
-        self.trade_date_lst = sorted(list(trade_date_set))
+        self.trade_date_lst = select_missing_lst(trade_date_lst2, trade_date_lst1)
         return
 
+    def _plan_trade_date(self, table, start_date):
+        """
+        按交易日下载的数据表的下载计划, 每个交易日调用一次接口
+        """
+        self._set_trade_date_lst(table, start_date)
+        trade_date_lst, self.trade_date_lst = self.trade_date_lst, None
+        return PlanItem(table, "trade_date", trade_date_lst,
+                        note=get_range_note(trade_date_lst))
+
     def _get_daily_trade_date_lst(self, start_date="19950417"):
         """
         Description
@@ -91,7 +137,7 @@ class FutDailyDownload(DataBase):
                   where a.cal_date>='{start_date}' and a.cal_date <='{end_date}'
                   and a.is_open=1;"""
         trade_cal_df = pd.read_sql(sql=sql, con=self.engine)
-        trade_date_lst = trade_cal_df["trade_date"].tolist()
+        trade_date_lst = trade_cal_df["trade_date"].astype(str).tolist()
         return trade_date_lst
 
     def _select_trading_contract(self, df):
@@ -108,17 +154,7 @@ class FutDailyDownload(DataBase):
         ----------
         pandas.DataFrame. 筛选后的数据
         """
-
-        def _select_code_func(code):
-            symbol = code.split(".")[0]
-            return (symbol[-4:]).isdigit()
-
-        if "fut_code" not in df.columns:
-            raise ValueError("fut_code must be in columns.")
-        select_flag = df["fut_code"].apply(_select_code_func)
-        df = df.loc[select_flag, :].copy()
-        df = df.reset_index(drop=True)
-        return df
+        return _select_trading_contract(df)
 
     @logger_decorator(logger)
     def download_main(self):
@@ -127,58 +163,63 @@ class FutDailyDownload(DataBase):
         self.download_futwsr()
         self.download_futholding()
 
+    def plan_main(self):
+        """
+        下载计划, 只读取数据库, 不调用接口
+
+        Returns
+        -------
+        List[download.plan.PlanItem]
+        """
+        plan_lst = [
+            PlanItem("futbasic", "exchange", basic_exchange_lst.copy()),
+            self._plan_trade_date("futdailyprices", "19950417"),
+            self._plan_trade_date("futwsr", "20060106"),
+        ]
+        for exchange, start_date in holding_start_date_dct.items():
+            plan_lst.append(self._plan_trade_date("futholding" + exchange.lower(), start_date))
+        return plan_lst
+
     @logger_decorator(logger)
     def download_dailyprices(self):
         self._set_trade_date_lst("futdailyprices", "19950417")
-        for trade_date in tqdm(self.trade_date_lst):
-            # 日频数据
-            fields_lst = [
-                "trade_date",
-                "ts_code",
-                "open",
-                "high",
-                "low",
-                "close",
-                "settle",
-                "pre_close",
-                "pre_settle",
-                "vol",
-                "amount",
-                "oi",
-                "delv_settle",
-            ]
-            fields = ",".join(fields_lst)
+        # 日频数据
+        fields_lst = [
+            "trade_date",
+            "ts_code",
+            "open",
+            "high",
+            "low",
+            "close",
+            "settle",
+            "pre_close",
+            "pre_settle",
+            "vol",
+            "amount",
+            "oi",
+            "delv_settle",
+        ]
+        fields = ",".join(fields_lst)
+        sql_dtype = self.get_sql_dtype("futdailyprices")
+        columns = list(sql_dtype.keys())
+
+        def fetch(trade_date):
             df = downloader.download(
                 pro.fut_daily, trade_date=trade_date, fields=fields
             )
-            df["pct_chg"] = 100 * (df["close"] / df["pre_close"] - 1)
-            df = df.rename(columns={"ts_code": "fut_code"})
-            # 筛选实际交易的合约,如'A0001.DCF'
-            df = self._select_trading_contract(df)
+            return df, columns
+
+        writer = self.buffered_writer("futdailyprices", dtype=sql_dtype)
+
+        def store(trade_date_lst, df):
             # 存储
-            sql_dtype = {
-                "trade_date": VARCHAR(255),
-                "fut_code": VARCHAR(255),
-                "open": DECIMAL(20, 4),
-                "high": DECIMAL(20, 4),
-                "low": DECIMAL(20, 4),
-                "close": DECIMAL(20, 4),
-                "settle": DECIMAL(20, 4),
-                "pre_close": DECIMAL(20, 4),
-                "pre_settle": DECIMAL(20, 4),
-                "pct_chg": DECIMAL(20, 4),
-                "vol": DECIMAL(20, 4),
-                "amount": DECIMAL(20, 4),
-                "oi": DECIMAL(20, 4),
-                "delv_settle": DECIMAL(20, 4),
-            }
-            df = df[list(sql_dtype.keys())].copy()
-            self.store_data(
-                data=df,
-                data_name="期货日频数据_" + trade_date,
-                table_name="futdailyprices",
-                dtype=sql_dtype,
-            )
+            writer.write(df, "期货日频数据_" + join_units(trade_date_lst))
+
+        pipeline = Pipeline(
+            fetch, _transform_dailyprices, store, name="futdailyprices"
+        )
+        with writer:
+            pipeline.run(self.trade_date_lst)
         self.trade_date_lst = None
         return
 
@@ -202,8 +243,7 @@ class FutDailyDownload(DataBase):
             "trade_time_desc",
         ]
         df = pd.DataFrame()
-        exchange_lst = ["CFFEX", "DCE", "CZCE", "SHFE", "INE", "GFEX"]
-        for exchange in exchange_lst:
+        for exchange in basic_exchange_lst:
             tempdf = downloader.download(
                 pro.fut_basic, exchange=exchange, fields=fields
             )
@@ -215,28 +255,12 @@ class FutDailyDownload(DataBase):
             tempdf = tempdf.drop(columns=["trade_time_desc"])
             df = pd.concat([df, tempdf])
         df = df.reset_index(drop=True)
-        sql_dtype = {
-            "fut_code": VARCHAR(255),
-            "exchange": VARCHAR(255),
-            "name": VARCHAR(255),
-            "multiplier": INT(),
-            "trade_unit": VARCHAR(255),
-            "per_unit": INT(),
-            "quote_unit": VARCHAR(255),
-            "quote_unit_desc": VARCHAR(255),
-            "d_mode_desc": VARCHAR(255),
-            "list_date": VARCHAR(255),
-            "delist_date": VARCHAR(255),
-            "d_month": VARCHAR(255),
-            "last_ddate": VARCHAR(255),
-            "is_after_hours_trading": VARCHAR(255),
-        }
+        sql_dtype = self.get_sql_dtype("futbasic")
         df = df[list(sql_dtype.keys())].copy()
-        self.store_data(
+        self.refresh_data(
             data=df,
             data_name="期货合约信息表数据",
             table_name="futbasic",
-            flag_replace=True,
             dtype=sql_dtype,
         )
         return
@@ -244,89 +268,89 @@ class FutDailyDownload(DataBase):
     @logger_decorator(logger)
     def download_futwsr(self):
         self._set_trade_date_lst("futwsr", "20060106")
-        # 日度数据下载
-        for trade_date in tqdm(self.trade_date_lst):
-            # 日频数据
-            fields_lst = [
-                "trade_date",
-                "symbol",
-                "exchange",
-                "warehouse",
-                "vol",
-                "pre_vol",
-                "area",
-                "year",
-                "unit",
-            ]
-            fields = ",".join(fields_lst)
-            df = downloader.download(pro.fut_wsr, trade_date=trade_date, fields=fields)
-            df = df.drop_duplicates(["trade_date", "symbol", "warehouse"])
-            df = df.reset_index(drop=True)
-            sql_dtype = {
-                "trade_date": VARCHAR(255),
-                "symbol": VARCHAR(255),
-                "exchange": VARCHAR(255),
-                "warehouse": VARCHAR(255),
-                "vol": DECIMAL(20, 4),
-                "pre_vol": DECIMAL(20, 4),
-                "area": VARCHAR(255),
-                "year": VARCHAR(255),
-                "unit": VARCHAR(255),
-            }
-            df = df[list(sql_dtype.keys())].copy()
-            self.store_data(
-                data=df,
-                data_name="期货仓单日报_" + trade_date,
-                table_name="futwsr",
-                dtype=sql_dtype,
+        # 日频数据
+        fields_lst = [
+            "trade_date",
+            "symbol",
+            "exchange",
+            "warehouse",
+            "vol",
+            "pre_vol",
+            "area",
+            "year",
+            "unit",
+        ]
+        fields = ",".join(fields_lst)
+        sql_dtype = self.get_sql_dtype("futwsr")
+        columns = list(sql_dtype.keys())
+        dedup_subset = ["trade_date", "symbol", "warehouse"]
+
+        def fetch(trade_date):
+            df = downloader.download(
+                pro.fut_wsr, trade_date=trade_date, fields=fields
             )
+            return df, columns, None, None, dedup_subset, "first"
+
+        writer = self.buffered_writer("futwsr", dtype=sql_dtype)
+
+        def store(trade_date_lst, df):
+            writer.write(df, "期货仓单日报_" + join_units(trade_date_lst))
+
+        # 日度数据下载
+        pipeline = Pipeline(fetch, normalize_df, store, name="futwsr")
+        with writer:
+            pipeline.run(self.trade_date_lst)
         # 将self.trade_date_lst重设为None
         self.trade_date_lst = None
         return
 
     @logger_decorator(logger)
-    def download_futholding(self):
-        exchange_lst = ["CFFEX", "CZCE", "DCE", "SHFE"]
-        start_date_dct = {
-            "CFFEX": "20100416",
-            "CZCE": "20050429",
-            "DCE": "20060104",
-            "SHFE": "20020107",
-        }
+    def download_futholding(self, exchange_lst=None):
+        """
+        每日持仓数据下载
+
+        Parameters
+        ----------
+        exchange_lst: List[str]. 交易所, 如['CFFEX'], 默认为None, 即holding_start_date_dct中的全部交易所.
+            任务队列和缺口修复按交易所分表下载, 只下载对应的表
+        """
+        if exchange_lst is None:
+            exchange_lst = list(holding_start_date_dct.keys())
+        # 日频数据
+        fields_lst = [
+            "trade_date",
+            "symbol",
+            "broker",
+            "vol",
+            "long_hld",
+            "short_hld",
+        ]
+        fields = ",".join(fields_lst)
         for exchange in exchange_lst:
+            start_date = holding_start_date_dct[exchange]
             db_name = "futholding" + exchange.lower()
-            start_date = start_date_dct[exchange]
+            sql_dtype = self.get_sql_dtype(db_name)
+            columns = list(sql_dtype.keys())
             self._set_trade_date_lst(db_name, start_date)
-            for trade_date in tqdm(self.trade_date_lst):
-                # 日频数据
-                fields_lst = [
-                    "trade_date",
-                    "symbol",
-                    "broker",
-                    "vol",
-                    "long_hld",
-                    "short_hld",
-                ]
-                fields = ",".join(fields_lst)
+
+            def fetch(trade_date):
                 df = downloader.download(
                     pro.fut_holding,
                     trade_date=trade_date,
                     exchange=exchange,
                     fields=fields,
                 )
-                sql_dtype = {
-                    "trade_date": VARCHAR(255),
-                    "symbol": VARCHAR(255),
-                    "broker": VARCHAR(255),
-                    "vol": DECIMAL(20, 4),
-                    "long_hld": DECIMAL(20, 4),
-                    "short_hld": DECIMAL(20, 4),
-                }
-                df = df[list(sql_dtype.keys())].copy()
-                data_name = "期货每日持仓" + exchange + "_" + trade_date
-                self.store_data(
-                    data=df, data_name=data_name, table_name=db_name, dtype=sql_dtype
-                )
-                # 将self.trade_date_lst重设为None
+                return df, columns
+
+            writer = self.buffered_writer(db_name, dtype=sql_dtype)
+
+            def store(trade_date_lst, df):
+                data_name = "期货每日持仓" + exchange + "_" + join_units(trade_date_lst)
+                writer.write(df, data_name)
+
+            pipeline = Pipeline(fetch, normalize_df, store, name=db_name)
+            with writer:
+                pipeline.run(self.trade_date_lst)
+            # 将self.trade_date_lst重设为None
             self.trade_date_lst = None
         return
@@ -0,0 +1,321 @@
+'''
+Author: dkl
+Date: 2026-10-21 16:40:12
+Description: 分布式下载任务队列. 下载计划中缺失的工作单元(数据表+交易日或报告期)写入任务表downloadjob,
+任意台机器上的任意个工作进程用SELECT ... FOR UPDATE SKIP LOCKED领取, 同一个工作单元不会被重复领取.
+每个工作进程使用自己的tushare token和限流器, 历史回填可以水平扩展, 只依赖已有的MySQL
+'''
+import datetime
+import os
+import socket
+import time
+import pandas as pd
+from database.audit import audit_spec_lst, run_repair
+from database.database import DataBase
+from download.plan import get_window, set_window
+from utils.conf import get_settings
+from utils.logger import Logger, logger_decorator
+
+# 获取日志记录器
+logger = Logger("jobqueue")
+# 任务表
+job_table_name = "downloadjob"
+# 可以拆分到任务队列的工作单元类型. 按指数、按股票代码或全量刷新的数据表仍由任务直接下载
+queue_unit_lst = ["trade_date", "period"]
+# 数据表的日期字段和下载方法, 与数据缺口修复相同: 下载方法只下载下载窗口中的日期, 且只写入该数据表
+job_spec_dct = {spec.table_name: spec for spec in audit_spec_lst}
+
+
+def _now_str(delta_seconds=0):
+    now = datetime.datetime.now() - datetime.timedelta(seconds=delta_seconds)
+    return now.strftime(r"%Y-%m-%d %H:%M:%S")
+
+
+def _format_unit_lst(unit_lst):
+    return ", ".join(f"'{unit}'" for unit in unit_lst)
+
+
+def get_worker_name():
+    """
+    工作进程名, 如'host1:12345'
+    """
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class JobQueue(DataBase):
+    """
+    下载任务队列, 任务表在stk_data中
+
+    使用方法:
+        queue = JobQueue()
+        queue.enqueue_plan(plan_lst)
+        spec, unit_lst = queue.claim(get_worker_name())
+    """
+
+    def __init__(self):
+        super().__init__("stk_data")
+        self.conf = get_settings().jobqueue
+
+    def _get_key_sql(self, spec):
+        return f"table_schema='{spec.database}' and table_name='{spec.table_name}'"
+
+    def _get_claimable_sql(self):
+        # 等待中的, 以及领取后超时未完成的工作单元
+        expire_time = _now_str(self.conf.lease_seconds)
+        return f"(status='pending' or (status='running' and claimed_time<'{expire_time}'))"
+
+    def _get_lock_sql(self):
+        # SKIP LOCKED需要MySQL 8.0. SQLite写入时锁住整个库, 由领取时的条件更新保证不重复
+        return " for update skip locked" if self.engine.dialect.name == "mysql" else ""
+
+    @logger_decorator(logger)
+    def enqueue(self, table_name, unit_lst, batch_id=None):
+        """
+        写入一张数据表的工作单元. 已有的工作单元(如上次失败的)重置为pending, 正在运行的不变
+
+        Parameters
+        ----------
+        table_name: str. 数据表名, 必须在job_spec_dct中
+        unit_lst: List[str]. 工作单元, 如交易日或报告期
+        batch_id: str. 计划批次, 默认为None, 即当前时间
+
+        Returns
+        -------
+        int. 写入的工作单元个数
+        """
+        spec = job_spec_dct[table_name]
+        if batch_id is None:
+            batch_id = datetime.datetime.now().strftime(r"%Y%m%d%H%M%S")
+        if not self._check_table_exists(job_table_name):
+            self.create_table(job_table_name)
+        key_sql = self._get_key_sql(spec)
+        with self.engine.begin() as conn:
+            sql = f"select unit from {job_table_name} where {key_sql} and status='running';"
+            running_set = {str(row[0]) for row in conn.execute(sql).fetchall()}
+            unit_lst = sorted(set(str(i) for i in unit_lst) - running_set)
+            for i in range(0, len(unit_lst), 1000):
+                conn.execute(f"""delete from {job_table_name} where {key_sql}
+                                 and unit in ({_format_unit_lst(unit_lst[i:i + 1000])});""")
+            df = pd.DataFrame({
+                "table_schema": spec.database,
+                "table_name": table_name,
+                "unit": unit_lst,
+                "batch_id": batch_id,
+                "status": "pending",
+                "attempts": 0,
+            })
+            df.to_sql(job_table_name, conn, index=False, if_exists="append",
+                      dtype=self.get_sql_dtype(job_table_name))
+        return len(unit_lst)
+
+    def enqueue_plan(self, plan_lst, batch_id=None):
+        """
+        将下载计划中按交易日或报告期下载的工作单元写入任务队列
+
+        Parameters
+        ----------
+        plan_lst: List[download.plan.PlanItem]. 下载计划
+        batch_id: str. 计划批次, 默认为None, 即当前时间
+
+        Returns
+        -------
+        pandas.DataFrame. 每张数据表写入的工作单元个数, 包括table_name, unit_name, n_units, note.
+        不能拆分的数据表n_units为0, note说明原因
+        """
+        if batch_id is None:
+            batch_id = datetime.datetime.now().strftime(r"%Y%m%d%H%M%S")
+        row_lst = []
+        for item in plan_lst:
+            if (item.unit_name not in queue_unit_lst) or (item.table_name not in job_spec_dct):
+                if item.api_calls > 0:
+                    row_lst.append((item.table_name, item.unit_name, 0, "不能拆分, 需要直接运行任务"))
+                continue
+            n_units = self.enqueue(item.table_name, item.unit_lst, batch_id)
+            row_lst.append((item.table_name, item.unit_name, n_units, item.note))
+        return pd.DataFrame(row_lst, columns=["table_name", "unit_name", "n_units", "note"])
+
+    def claim(self, worker, claim_size=None):
+        """
+        领取一张数据表的一批工作单元. 交易日每次最多领取claim_size个, 报告期一次领取整张表
+
+        Parameters
+        ----------
+        worker: str. 工作进程名
+        claim_size: int. 最多领取的交易日个数, 默认为None, 即config.ini中[jobqueue]的claim_size
+
+        Returns
+        -------
+        (database.audit.AuditSpec, List[str]). 数据表和工作单元, 没有可领取的工作单元时为(None, [])
+        """
+        if claim_size is None:
+            claim_size = self.conf.claim_size
+        claimable_sql = self._get_claimable_sql()
+        lock_sql = self._get_lock_sql()
+        claimed_time = _now_str()
+        with self.engine.begin() as conn:
+            row = conn.execute(f"""select table_schema, table_name from {job_table_name}
+                                   where {claimable_sql} order by table_schema, table_name, unit
+                                   limit 1{lock_sql};""").fetchone()
+            if row is None:
+                return None, []
+            spec = job_spec_dct[row[1]]
+            key_sql = self._get_key_sql(spec)
+            limit_sql = "" if spec.freq == "period" else f" limit {claim_size}"
+            row_lst = conn.execute(f"""select unit, status, attempts from {job_table_name}
+                                       where {key_sql} and {claimable_sql}
+                                       order by unit{limit_sql}{lock_sql};""").fetchall()
+            unit_lst = []
+            for unit, status, attempts in row_lst:
+                # 条件更新: 其他进程已经领取时影响行数为0
+                res = conn.execute(f"""update {job_table_name} set status='running',
+                                       worker='{worker}', claimed_time='{claimed_time}',
+                                       attempts=attempts+1
+                                       where {key_sql} and unit='{unit}' and status='{status}'
+                                       and attempts={attempts};""")
+                if res.rowcount == 1:
+                    unit_lst.append(str(unit))
+        return spec, unit_lst
+
+    def finish(self, spec, unit_lst, worker, done_lst, message=None):
+        """
+        记录一批工作单元的结果. 未完成的重新设为pending, 领取次数达到max_attempts的设为failed
+
+        Parameters
+        ----------
+        spec: database.audit.AuditSpec. 数据表
+        unit_lst: List[str]. 领取的工作单元
+        worker: str. 工作进程名
+        done_lst: List[str]. 已完成的工作单元
+        message: str. 未完成的原因, 默认为None
+        """
+        key_sql = self._get_key_sql(spec) + f" and worker='{worker}' and status='running'"
+        done_set = set(done_lst)
+        rest_lst = [unit for unit in unit_lst if unit not in done_set]
+        message = "未下载到数据" if message is None else message
+        message = message[:255].replace("'", "''")
+        with self.engine.begin() as conn:
+            if len(done_set) > 0:
+                conn.execute(f"""update {job_table_name} set status='done',
+                                 finished_time='{_now_str()}', message=null
+                                 where {key_sql} and unit in ({_format_unit_lst(sorted(done_set))});""")
+            if len(rest_lst) > 0:
+                conn.execute(f"""update {job_table_name} set message='{message}',
+                                 status=case when attempts>={self.conf.max_attempts}
+                                 then 'failed' else 'pending' end
+                                 where {key_sql} and unit in ({_format_unit_lst(rest_lst)});""")
+
+    def count_unfinished(self):
+        """
+        等待中和正在运行的工作单元个数
+        """
+        sql = f"select count(*) from {job_table_name} where status in ('pending', 'running');"
+        with self.engine.connect() as conn:
+            return int(conn.execute(sql).fetchone()[0])
+
+    def get_status_df(self):
+        """
+        各数据表各状态的工作单元个数
+
+        Returns
+        -------
+        pandas.DataFrame. 包括table_schema, table_name, status, n_units, start_unit, end_unit
+        """
+        sql = f"""select table_schema, table_name, status, count(*) as n_units,
+                  min(unit) as start_unit, max(unit) as end_unit from {job_table_name}
+                  group by table_schema, table_name, status
+                  order by table_schema, table_name, status;"""
+        return pd.read_sql(sql, self.engine)
+
+
+class JobWorker(object):
+    """
+    工作进程. 循环领取工作单元, 将下载窗口设为这些日期后运行数据表的下载方法,
+    再按数据表中实际存在的日期标记完成, 直到队列中没有等待中和正在运行的工作单元
+
+    使用方法:
+        JobWorker().run()
+    """
+
+    def __init__(self, queue=None, worker=None):
+        """
+        构造函数
+
+        Parameters
+        ----------
+        queue: JobQueue. 任务队列, 默认为None, 即新建
+        worker: str. 工作进程名, 默认为None, 即'主机名:进程号'
+        """
+        self.queue = JobQueue() if queue is None else queue
+        self.worker = get_worker_name() if worker is None else worker
+        self.conf = get_settings().jobqueue
+
+    def _get_engine(self, database):
+        return DataBase(database).engine
+
+    def run_job(self, spec, unit_lst):
+        """
+        下载一批工作单元
+
+        Parameters
+        ----------
+        spec: database.audit.AuditSpec. 数据表
+        unit_lst: List[str]. 交易日或报告期
+        """
+        origin_window = get_window()
+        set_window(date_lst=unit_lst)
+        try:
+            run_repair(spec)
+        finally:
+            set_window(*origin_window)
+
+    def get_done_lst(self, spec, unit_lst):
+        """
+        数据表中已有数据的工作单元
+        """
+        sql = f"""select distinct {spec.date_col} from {spec.table_name}
+                  where {spec.date_col} in ({", ".join(str(int(i)) for i in unit_lst)});"""
+        with self._get_engine(spec.database).connect() as conn:
+            return [str(row[0]) for row in conn.execute(sql).fetchall()]
+
+    @logger_decorator(logger)
+    def run(self, max_jobs=None):
+        """
+        运行工作进程
+
+        Parameters
+        ----------
+        max_jobs: int. 最多领取的批数, 默认为None, 即直到队列清空
+
+        Returns
+        -------
+        int. 完成的工作单元个数
+        """
+        n_jobs = 0
+        n_done = 0
+        while (max_jobs is None) or (n_jobs < max_jobs):
+            spec, unit_lst = self.queue.claim(self.worker)
+            if len(unit_lst) == 0:
+                if spec is not None:
+                    # 与其他进程同时领取, 没有领到
+                    continue
+                if self.queue.count_unfinished() == 0:
+                    break
+                # 其他进程仍在运行, 它们失败或超时的工作单元之后可以重新领取
+                time.sleep(self.conf.poll_seconds)
+                continue
+            n_jobs += 1
+            name = f"{spec.database}.{spec.table_name}({unit_lst[0]}-{unit_lst[-1]}, {len(unit_lst)}个)"
+            logger.info(f"{self.worker}领取{name}")
+            message = None
+            try:
+                self.run_job(spec, unit_lst)
+            except Exception as e:
+                logger.error(f"{self.worker}下载{name}失败: {e}")
+                message = str(e)
+            done_lst = self.get_done_lst(spec, unit_lst)
+            self.queue.finish(spec, unit_lst, self.worker, done_lst, message)
+            n_done += len(done_lst)
+            if len(done_lst) < len(unit_lst):
+                logger.warning(f"{name}中{len(unit_lst) - len(done_lst)}个工作单元未完成")
+        logger.info(f"{self.worker}共完成{n_done}个工作单元")
+        return n_done
@@ -0,0 +1,292 @@
+'''
+Author: dkl
+Date: 2026-10-19 14:03:52
+Description: 下载流水线. 下载(fetch) -> 清洗(transform) -> 存储(store)三个阶段
+由有界队列连接, 各阶段并发执行, 内存占用有上限, 整体吞吐由最慢的阶段决定
+'''
+import queue
+import threading
+from collections import deque
+import time
+import pandas as pd
+from tqdm import tqdm
+from utils.conf import get_settings
+from utils.logger import Logger
+from utils.transform import ProcessTransformer
+
+# 获取日志记录器
+logger = Logger("pipeline")
+# 队列结束标记
+_STOP = object()
+# 最近运行的流水线统计信息(名称, 各阶段统计, 总用时), 供基准测试等汇总使用
+stats_history = deque(maxlen=256)
+
+
+def join_units(unit_lst):
+    """
+    将微批次中的工作单元拼接成名称, 用于日志. 如['20230103', '20230104']->'20230103-20230104'
+    """
+    if len(unit_lst) == 1:
+        return str(unit_lst[0])
+    return f"{unit_lst[0]}-{unit_lst[-1]}"
+
+
+class _StageStat(object):
+    """
+    单个阶段的统计信息: 处理数量和累计耗时
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, seconds, count=1):
+        with self._lock:
+            self.count += count
+            self.seconds += seconds
+
+    def __repr__(self):
+        return f"{self.name}: {self.count}个, 共用时{self.seconds:.2f}s"
+
+
+class Pipeline(object):
+    """
+    流式下载流水线
+
+    使用方法:
+        pipeline = Pipeline(fetch=fetch, transform=_transform, store=store)
+        pipeline.run(self.trade_date_lst)
+
+    fetch(unit): 下载一个工作单元(如一个交易日)的原始数据, 返回transform的参数元组
+    transform(*args): 模块级清洗函数, 在进程池中执行, 返回pandas.DataFrame.
+        为None时, fetch的返回值直接作为数据
+    store(unit_lst, df): 存储一个微批次, unit_lst为该批次包含的工作单元
+    """
+
+    def __init__(self, fetch, transform=None, store=None, fetch_workers=None,
+                 transform_workers=None, store_workers=None, queue_size=None,
+                 batch_size=None, name="pipeline", progress=True):
+        """
+        构造函数. 参数为None时读取config.ini中[pipeline]的对应配置
+
+        Parameters
+        ----------
+        fetch: 函数. 下载函数
+        transform: 函数. 清洗函数, 默认为None
+        store: 函数. 存储函数, 默认为None, 即不存储
+        fetch_workers: int. 下载线程数
+        transform_workers: int. 清洗进程数, 为0时在线程中直接执行
+        store_workers: int. 存储线程数
+        queue_size: int. 阶段之间队列的最大长度
+        batch_size: int. 存储阶段的微批次大小, 即多少个工作单元合并存储一次
+        name: str. 流水线名称, 用于日志
+        progress: bool. 是否显示进度条, 默认为True
+        """
+        conf = get_settings().pipeline
+
+        def _get(value, option):
+            if value is None:
+                return getattr(conf, option)
+            return value
+
+        self.fetch = fetch
+        self.transform = transform
+        self.store = store
+        self.fetch_workers = max(_get(fetch_workers, "fetch_workers"), 1)
+        self.transform_workers = _get(transform_workers, "transform_workers")
+        self.store_workers = max(_get(store_workers, "store_workers"), 1)
+        self.queue_size = max(_get(queue_size, "queue_size"), 1)
+        self.batch_size = max(_get(batch_size, "batch_size"), 1)
+        self.name = name
+        self.progress = progress
+        self.stats = {}
+        self._error = None
+        self._error_lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+    def _set_error(self, unit, err):
+        with self._error_lock:
+            if self._error is None:
+                logger.error(f"流水线{self.name}处理{unit}出错: {err}")
+                self._error = err
+        self._stop_event.set()
+
+    def _put(self, q, item):
+        """
+        向有界队列中放入元素. 出错停止时不再阻塞
+        """
+        while not self._stop_event.is_set():
+            try:
+                q.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce(self, units, out_q):
+        """
+        生产工作单元. 迭代器是惰性的, 队列满了就等待
+        """
+        try:
+            if self.progress:
+                units = tqdm(units)
+            for unit in units:
+                if not self._put(out_q, (unit, None)):
+                    break
+        except Exception as e:
+            self._set_error("units", e)
+        finally:
+            for _ in range(self.fetch_workers):
+                out_q.put(_STOP)
+
+    def _run_stage(self, in_q, out_q, func, stat, n_next, done_counter):
+        """
+        通用阶段: 从in_q取出元素, 处理后放入out_q.
+        最后一个退出的线程负责给下一个阶段发送结束标记
+        """
+        while True:
+            item = in_q.get()
+            if item is _STOP:
+                break
+            # 出错后只消费不处理, 避免上游阻塞
+            if self._stop_event.is_set():
+                continue
+            unit, value = item
+            start_time = time.time()
+            try:
+                result = func(unit, value)
+            except Exception as e:
+                self._set_error(unit, e)
+                continue
+            stat.add(time.time() - start_time)
+            self._put(out_q, (unit, result))
+        with done_counter["lock"]:
+            done_counter["n"] -= 1
+            last = done_counter["n"] == 0
+        if last:
+            for _ in range(n_next):
+                out_q.put(_STOP)
+
+    def _store_stage(self, in_q):
+        """
+        存储阶段: 按batch_size合并成微批次后存储
+        """
+        unit_lst = []
+        df_lst = []
+
+        def flush():
+            if len(unit_lst) == 0:
+                return
+            start_time = time.time()
+            if len(df_lst) == 1:
+                df = df_lst[0]
+            else:
+                df = pd.concat(df_lst, axis=0, ignore_index=True)
+            try:
+                if self.store is not None:
+                    self.store(list(unit_lst), df)
+            except Exception as e:
+                self._set_error(unit_lst, e)
+            else:
+                self.stats["store"].add(time.time() - start_time, len(unit_lst))
+            unit_lst.clear()
+            df_lst.clear()
+
+        while True:
+            item = in_q.get()
+            if item is _STOP:
+                break
+            if self._stop_event.is_set():
+                continue
+            unit, df = item
+            if df is None:
+                continue
+            unit_lst.append(unit)
+            df_lst.append(df)
+            if len(unit_lst) >= self.batch_size:
+                flush()
+        if not self._stop_event.is_set():
+            flush()
+
+    def run(self, units):
+        """
+        运行流水线
+
+        Parameters
+        ----------
+        units: Iterable. 工作单元, 如交易日列表或生成器
+
+        Returns
+        -------
+        dict. 各阶段的统计信息
+        """
+        self._error = None
+        self._stop_event.clear()
+        self.stats = {
+            "fetch": _StageStat("fetch"),
+            "transform": _StageStat("transform"),
+            "store": _StageStat("store"),
+        }
+        unit_q = queue.Queue(maxsize=self.queue_size)
+        raw_q = queue.Queue(maxsize=self.queue_size)
+        data_q = queue.Queue(maxsize=self.queue_size)
+        transformer = None
+        if self.transform is not None:
+            transformer = ProcessTransformer(n_workers=self.transform_workers)
+        n_transform_threads = max(self.transform_workers, 1)
+        start_time = time.time()
+        threads = []
+        # 生产者
+        threads.append(threading.Thread(
+            target=self._produce, args=(units, unit_q), daemon=True
+        ))
+
+        # 下载
+        def fetch_func(unit, _):
+            return self.fetch(unit)
+
+        fetch_counter = {"n": self.fetch_workers, "lock": threading.Lock()}
+        for _ in range(self.fetch_workers):
+            threads.append(threading.Thread(
+                target=self._run_stage,
+                args=(unit_q, raw_q, fetch_func, self.stats["fetch"],
+                      n_transform_threads, fetch_counter),
+                daemon=True,
+            ))
+
+        # 清洗
+        def transform_func(unit, raw):
+            if transformer is None:
+                return raw
+            return transformer.submit(self.transform, *raw).result()
+
+        transform_counter = {"n": n_transform_threads, "lock": threading.Lock()}
+        for _ in range(n_transform_threads):
+            threads.append(threading.Thread(
+                target=self._run_stage,
+                args=(raw_q, data_q, transform_func, self.stats["transform"],
+                      self.store_workers, transform_counter),
+                daemon=True,
+            ))
+        # 存储
+        for _ in range(self.store_workers):
+            threads.append(threading.Thread(
+                target=self._store_stage, args=(data_q,), daemon=True
+            ))
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            if transformer is not None:
+                transformer.shutdown()
+        cost_time = time.time() - start_time
+        stats_history.append((self.name, self.stats, cost_time))
+        logger.info(f"流水线{self.name}完成, 共用时: {cost_time:.2f}s, "
+                    + ", ".join([repr(stat) for stat in self.stats.values()]))
+        if self._error is not None:
+            raise self._error
+        return self.stats
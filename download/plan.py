@@ -0,0 +1,124 @@
+'''
+Author: dkl
+Date: 2026-10-20 15:10:22
+Description: 下载窗口和下载计划. 命令行指定的日期范围和下载模式在进程内共享,
+各下载模块计算缺失的工作单元时统一按窗口筛选; 计划用于只统计工作单元和接口调用次数而不下载
+'''
+import threading
+from typing import NamedTuple, Optional
+
+# 下载模式: backfill为补齐历史上所有缺失的日期, incremental为只下载表中最新日期之后的日期
+mode_lst = ["backfill", "incremental"]
+
+
+class DownloadWindow(NamedTuple):
+    """
+    下载窗口. start_date和end_date为None时不限制. date_lst不为None时只下载其中的日期,
+    用于修复数据检查发现的缺口
+    """
+    start_date: Optional[str] = None
+    end_date: Optional[str] = None
+    mode: str = "backfill"
+    date_lst: Optional[tuple] = None
+
+
+class PlanItem(NamedTuple):
+    """
+    一张数据表的下载计划
+
+    table_name: 数据表名
+    unit_name: 工作单元类型, 如trade_date、period、stock_code
+    unit_lst: 工作单元列表
+    calls_per_unit: 每个工作单元调用接口的次数
+    fixed_calls: 与工作单元无关的接口调用次数, 如下载基本信息表
+    note: 说明, 如下载的日期范围
+    """
+    table_name: str
+    unit_name: str
+    unit_lst: list
+    calls_per_unit: int = 1
+    fixed_calls: int = 0
+    note: str = ""
+
+    @property
+    def api_calls(self):
+        return len(self.unit_lst) * self.calls_per_unit + self.fixed_calls
+
+
+# 进程内共享的下载窗口
+_window = DownloadWindow()
+_window_lock = threading.Lock()
+
+
+def set_window(start_date=None, end_date=None, mode="backfill", date_lst=None):
+    """
+    设置进程内共享的下载窗口
+
+    Parameters
+    ----------
+    start_date: str. 开始日期, 如'20230101'. 默认为None, 即不限制
+    end_date: str. 结束日期, 如'20231231'. 默认为None, 即不限制
+    mode: str. 下载模式, 'backfill'或'incremental'. 默认为'backfill'
+    date_lst: List[str]. 只下载其中的日期. 默认为None, 即不限制
+
+    Returns
+    -------
+    DownloadWindow
+    """
+    global _window
+    if mode not in mode_lst:
+        raise ValueError(f"mode必须为{mode_lst}之一, 而不是{mode}")
+    if start_date is not None and end_date is not None and start_date > end_date:
+        raise ValueError(f"开始日期{start_date}晚于结束日期{end_date}")
+    with _window_lock:
+        if date_lst is not None:
+            date_lst = tuple(sorted(str(i) for i in date_lst))
+        _window = DownloadWindow(start_date, end_date, mode, date_lst)
+        return _window
+
+
+def get_window():
+    """
+    获取进程内共享的下载窗口
+    """
+    return _window
+
+
+def select_missing_lst(all_lst, exist_lst, window=None):
+    """
+    按下载窗口筛选需要下载的日期: 在all_lst中但不在exist_lst中, 且在窗口的日期范围内.
+    incremental模式下只保留晚于exist_lst中最新日期的日期
+
+    Parameters
+    ----------
+    all_lst: List[str]. 全部日期, 如交易日历中的交易日
+    exist_lst: List[str]. 数据表中已有的日期
+    window: DownloadWindow. 下载窗口, 默认为None, 即进程内共享的下载窗口
+
+    Returns
+    -------
+    List[str]. 排序后的日期列表
+    """
+    if window is None:
+        window = get_window()
+    exist_set = set(exist_lst)
+    missing_set = set(all_lst) - exist_set
+    if window.mode == "incremental" and len(exist_set) > 0:
+        last_date = max(exist_set)
+        missing_set = {i for i in missing_set if i > last_date}
+    if window.start_date is not None:
+        missing_set = {i for i in missing_set if i >= window.start_date}
+    if window.end_date is not None:
+        missing_set = {i for i in missing_set if i <= window.end_date}
+    if window.date_lst is not None:
+        missing_set = missing_set & set(window.date_lst)
+    return sorted(missing_set)
+
+
+def get_range_note(date_lst):
+    """
+    日期列表的范围说明, 如'20230103-20230301'
+    """
+    if len(date_lst) == 0:
+        return ""
+    return f"{min(date_lst)}-{max(date_lst)}"
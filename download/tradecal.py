@@ -4,16 +4,14 @@ Date: 2023-01-14 20:13:54
 Description: 股票日期下载
 '''
 import datetime
-import tushare as ts
 from database.database import DataBase
-from utils.conf import Config
+from utils.client import LazyProApi
 from utils.logger import Logger, logger_decorator
 from utils.downloader import TushareDownloader
-from sqlalchemy.types import VARCHAR, INT
+from download.plan import PlanItem
 
-# 获取token
-tstoken = Config("tushare").get_config("tstoken")
-pro = ts.pro_api(tstoken)
+# 获取tushare客户端, 第一次调用接口时才创建
+pro = LazyProApi()
 # 获取downloader
 downloader = TushareDownloader()
 # 获取日志记录器
@@ -35,14 +33,12 @@ class TradecalDownload(DataBase):
         logger.info("检查数据库中交易日历的最后一天是否距离昨天不到30天...")
         # 读取数据库中交易日历的最后一天
         sql = "select cal_date from asharetradecal order by cal_date desc limit 1;"
-        conn = self.engine.connect()
-        res = conn.execute(sql).fetchall()
+        with self.engine.connect() as conn:
+            res = conn.execute(sql).fetchall()
         if len(res) == 0:
-            conn.close()
             return True
         else:
-            db_last_date = datetime.datetime.strptime(res[0][0], r"%Y%m%d")
-            conn.close()
+            db_last_date = datetime.datetime.strptime(str(res[0][0]), r"%Y%m%d")
             # 昨天
             yester_date = datetime.datetime.now() - datetime.timedelta(days=1)
             # 检查数据库最后一天离昨天是否在30天内
@@ -50,6 +46,17 @@ class TradecalDownload(DataBase):
             logger.info("检查完成!")
             return flag
 
+    def plan_main(self):
+        """
+        下载计划, 只读取数据库, 不调用接口. 交易日历整表刷新, 不受下载窗口限制
+
+        Returns
+        -------
+        List[download.plan.PlanItem]
+        """
+        fixed_calls = 1 if self._check_flag_download() else 0
+        return [PlanItem("asharetradecal", "refresh", [], fixed_calls=fixed_calls)]
+
     @logger_decorator(logger)
     def download_main(self):
         download_flag = self._check_flag_download()
@@ -67,14 +74,13 @@ class TradecalDownload(DataBase):
             # 转化成datetime格式，排序，重置索引后，存入数据库
             trade_cal_df = trade_cal_df.sort_values("cal_date", ascending=True)
             trade_cal_df = trade_cal_df.reset_index(drop=True)
-            sql_dtype = {"cal_date": VARCHAR(255), "is_open": INT()}
+            sql_dtype = self.get_sql_dtype("asharetradecal")
             trade_cal_df = trade_cal_df[list(sql_dtype.keys())].copy()
             # 存储数据
-            self.store_data(
+            self.refresh_data(
                 data=trade_cal_df,
                 data_name="交易日历",
                 table_name="asharetradecal",
-                flag_replace=True,
                 dtype=sql_dtype,
             )
             return
@@ -7,7 +7,11 @@ import os
 os.chdir(os.path.dirname(__file__))
 # from main_func.initialize import initialize_main
 # from main_func.pull_table_structure import pull_table_structure_main
-from main_func.run_daily import run_daily_main
+# from main_func.migrate_schema import migrate_schema_main
+# from main_func.maintain_partition import maintain_partition_main
+# from main_func.check_schema_drift import check_schema_drift_main
+# from main_func.run_benchmark import run_benchmark_main
+from main_func.cli import cli_main
 # from test.test_main import test_all_cases
 
 
@@ -17,7 +21,16 @@ if __name__ == '__main__':
     # pull_table_structure_main()
     # # 是否创建数据库和数据表进行初始化
     # initialize_main()
-    # 每日运行下载存储程序
-    run_daily_main()
+    # # 是否将旧格式的表(VARCHAR日期和代码)在线迁移为紧凑格式
+    # migrate_schema_main()
+    # # 是否为分区表追加未来年份的分区
+    # maintain_partition_main()
+    # # 是否检测数据库表结构与本地表结构文件的差异(apply=True时执行修复)
+    # check_schema_drift_main(apply=False)
+    # # 是否运行下载入库基准测试(使用本地的tushare替身和一次性数据库)
+    # run_benchmark_main()
+    # 每日运行下载存储程序, 命令行参数见main_func/cli.py, 如:
+    # python main.py --tasks futdaily --start-date 20230101 --dry-run
+    cli_main()
     # # 测试函数
     # test_all_cases(report_html=True)
\ No newline at end of file
@@ -0,0 +1,48 @@
+'''
+Author: dkl
+Date: 2026-10-20 17:42:10
+Description: 检查数据表中缺失的日期和行数异常少的日期, 并可选择只重新下载这些日期
+'''
+from main_func.tasks import task_dct
+from utils.logger import Logger
+
+
+def audit_data_main(repair=False, task_lst=None, start_date=None, end_date=None):
+    """
+    检查数据缺口. 发现异常时输出ERROR日志, 每日运行的check_main会发送邮件
+
+    Parameters
+    ----------
+    repair: bool. 是否重新下载异常的日期, 默认为False, 只检查不修复
+    task_lst: List[str]. 只检查这些任务下载的数据表, 默认为None, 即全部数据表
+    start_date: str. 只检查不早于该日期的数据, 默认为None, 即不限制
+    end_date: str. 只检查不晚于该日期的数据, 默认为None, 即不限制
+
+    Returns
+    -------
+    pandas.DataFrame. 检查结果, 见DataAudit.audit
+    """
+    # 运行时才导入, 只导入run_daily时不加载pandas和数据库模块
+    import pandas as pd
+    from database.audit import DataAudit, audit_columns, select_spec_lst
+    logger = Logger('audit')
+    spec_lst = None
+    if task_lst is not None:
+        spec_lst = select_spec_lst([task_dct[task_name].module for task_name in task_lst])
+        if len(spec_lst) == 0:
+            logger.info(f'任务{task_lst}没有需要检查的数据表')
+            return pd.DataFrame(columns=audit_columns)
+    audit = DataAudit(spec_lst, start_date, end_date)
+    audit_df = audit.audit()
+    if len(audit_df) == 0:
+        logger.info('数据检查完成, 没有发现缺口')
+        return audit_df
+    if not repair:
+        logger.error(f'数据检查发现{len(audit_df)}个异常的日期, 可运行python main.py --repair修复')
+        return audit_df
+    audit.repair(audit_df)
+    # 修复后再检查一次, 仍有异常时报错
+    audit_df = audit.audit()
+    if len(audit_df) > 0:
+        logger.error(f'修复后仍有{len(audit_df)}个异常的日期')
+    return audit_df
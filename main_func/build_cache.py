@@ -0,0 +1,48 @@
+'''
+Author: dkl
+Date: 2026-10-20 20:48:19
+Description: 每日下载完成后生成查询用的缓存, 如股票池和申万行业成分的时点索引、常用日频字段的面板缓存
+'''
+from utils.logger import Logger
+
+
+def build_membership_main():
+    """
+    生成股票池和申万行业成分的时点索引, 索引目录见config.ini中[cache]的cache_dir.
+    生成失败时输出ERROR日志, 不影响后续步骤
+
+    Returns
+    -------
+    dict. 索引的元数据, 生成失败时为None
+    """
+    # 运行时才导入, 只导入run_daily时不加载pandas和数据库模块
+    from database.membership import MembershipBuilder
+    logger = Logger('cache')
+    try:
+        return MembershipBuilder().build()
+    except Exception as e:
+        logger.error(f'生成成分索引失败: {e}')
+        return None
+
+
+def build_panel_main(rebuild=False):
+    """
+    更新常用日频字段的面板缓存, 缓存目录见config.ini中[cache]的cache_dir.
+    每日下载日频数据后会自动更新, 修复历史数据后可以重新生成
+
+    Parameters
+    ----------
+    rebuild: bool. 是否重新生成全部缓存, 默认为False, 只写入行数有变化的交易日
+
+    Returns
+    -------
+    bool. 是否成功
+    """
+    from database.panel import PanelCacheBuilder
+    logger = Logger('cache')
+    try:
+        PanelCacheBuilder().update(rebuild=rebuild)
+        return True
+    except Exception as e:
+        logger.error(f'更新面板缓存失败: {e}')
+        return False
@@ -0,0 +1,22 @@
+'''
+Author: dkl
+Date: 2026-10-19 23:18:27
+Description: 检测数据库中的表结构是否与本地表结构文件一致, 并可选择修复
+'''
+from database.drift import SchemaDrift
+
+
+def check_schema_drift_main(apply=False, online=True, drop_extra=False):
+    """
+    对比本地表结构文件与数据库中的字段、索引和注释, 输出漂移结果和ALTER语句
+
+    Parameters
+    ----------
+    apply: bool. 是否执行ALTER语句, 默认为False, 只输出不执行
+    online: bool. 是否在线执行, 默认为True. 见SchemaDrift.apply
+    drop_extra: bool. 是否删除数据库中多出的字段和索引, 默认为False
+    """
+    drift = SchemaDrift()
+    drift_df = drift.diff(drop_extra=drop_extra)
+    drift.apply(drift_df, online=online, dry_run=not apply)
+    return drift_df
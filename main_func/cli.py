@@ -0,0 +1,198 @@
+'''
+Author: dkl
+Date: 2026-10-20 15:48:36
+Description: 命令行入口. 可以选择任务、日期范围、下载线程数和下载模式,
+--dry-run时只打印每个任务需要下载的工作单元和估计的接口调用次数, 不下载数据.
+--audit只检查数据缺口, --repair检查后只重新下载异常的日期, --build-cache只重新生成查询用的缓存,
+--sync-replica只将数据表同步到本地的嵌入式分析副本,
+--enqueue将下载计划写入任务队列, --worker领取任务队列中的工作单元下载, 可在多台机器上同时运行
+
+使用方法:
+    python main.py                                   # 每日运行全部默认任务
+    python main.py --tasks futdaily asharefinance    # 只运行部分任务
+    python main.py --start-date 20230101 --end-date 20230331 --mode backfill --dry-run
+    python main.py --repair                          # 检查数据缺口并修复
+    python main.py --audit --tasks asharedaily --start-date 20230101  # 只检查部分数据表和日期
+    python main.py --build-cache                     # 重新生成时点索引和面板缓存
+    python main.py --sync-replica                    # 增量同步DuckDB/SQLite副本
+    python main.py --enqueue --start-date 20100101   # 将回填计划写入任务队列
+    python main.py --worker --token xxx              # 在每台机器上运行工作进程
+    python main.py --worker --processes 4            # 在本机启动4个工作进程
+'''
+import argparse
+import datetime
+import os
+from download.plan import mode_lst, set_window
+from main_func.audit_data import audit_data_main
+from main_func.build_cache import build_membership_main, build_panel_main
+from main_func.run_daily import run_daily_main
+from main_func.run_worker import enqueue_main, job_status_main, run_worker_main, run_workers_main
+from main_func.sync_replica import sync_replica_main
+from main_func.tasks import get_daily_task_lst, plan_task, task_dct
+from utils.conf import env_prefix, reload_settings
+from utils.downloader import TushareDownloader
+
+# 打印工作单元时最多显示的数量
+max_show_units = 6
+
+
+def _date_type(value):
+    """
+    检查命令行中的日期格式为YYYYMMDD
+    """
+    try:
+        datetime.datetime.strptime(value, r"%Y%m%d")
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"日期格式应为YYYYMMDD, 而不是{value}")
+    return value
+
+
+def get_parser():
+    """
+    命令行参数解析器
+    """
+    parser = argparse.ArgumentParser(description="QuantDatabase每日下载入库")
+    parser.add_argument(
+        "--tasks", nargs="+", choices=list(task_dct.keys()), default=None,
+        help="运行的任务, 默认为每日运行的全部任务",
+    )
+    parser.add_argument("--start-date", type=_date_type, default=None,
+                        help="只下载该日期(含)之后缺失的数据, 格式YYYYMMDD")
+    parser.add_argument("--end-date", type=_date_type, default=None,
+                        help="只下载该日期(含)之前缺失的数据, 格式YYYYMMDD")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="下载线程数, 默认为config.ini中[pipeline]的fetch_workers")
+    parser.add_argument(
+        "--mode", choices=mode_lst, default="backfill",
+        help="backfill: 补齐历史上所有缺失的日期; incremental: 只下载表中最新日期之后的日期",
+    )
+    parser.add_argument("--dry-run", action="store_true",
+                        help="只打印下载计划和估计的接口调用次数, 不下载数据")
+    parser.add_argument("--verbose", action="store_true",
+                        help="--dry-run时打印全部工作单元")
+    parser.add_argument("--audit", action="store_true",
+                        help="只检查数据表中缺失的日期和行数异常少的日期, 不下载数据")
+    parser.add_argument("--repair", action="store_true",
+                        help="检查数据缺口, 并只重新下载异常的日期")
+    parser.add_argument("--build-cache", action="store_true",
+                        help="只重新生成股票池和申万行业成分的时点索引、常用日频字段的面板缓存, "
+                             "不下载数据")
+    parser.add_argument("--sync-replica", action="store_true",
+                        help="只将数据表增量同步到本地的DuckDB/SQLite副本, 不下载数据, "
+                             "副本设置见config.ini中的[replica]")
+    parser.add_argument("--enqueue", action="store_true",
+                        help="将各任务按交易日和报告期下载的工作单元写入任务队列downloadjob, 不下载数据")
+    parser.add_argument("--worker", action="store_true",
+                        help="领取任务队列中的工作单元并下载, 直到队列清空. 需要MySQL 8.0")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="--worker时在本机启动的工作进程数, 依次使用config.ini中[jobqueue]的token_lst")
+    parser.add_argument("--token", default=None,
+                        help="--worker时使用的tushare token, 默认为config.ini中[tushare]的tstoken")
+    parser.add_argument("--job-status", action="store_true",
+                        help="只打印任务队列中各数据表各状态的工作单元个数")
+    return parser
+
+
+def _format_units(unit_lst, verbose=False):
+    if verbose or len(unit_lst) <= max_show_units:
+        return ", ".join(str(i) for i in unit_lst)
+    half = max_show_units // 2
+    head = ", ".join(str(i) for i in unit_lst[:half])
+    tail = ", ".join(str(i) for i in unit_lst[-half:])
+    return f"{head}, ..., {tail}"
+
+
+def get_plan_lines(task_lst, verbose=False):
+    """
+    计算各任务的下载计划, 生成打印的文本行. 只读取数据库, 不调用接口
+
+    Parameters
+    ----------
+    task_lst: List[str]. 任务列表
+    verbose: bool. 是否打印全部工作单元
+
+    Returns
+    -------
+    List[str]
+    """
+    # 按配置的限流参数估计休眠时间. 各下载模块的请求计数相互独立, 按任务分别估计
+    downloader = TushareDownloader()
+    line_lst = []
+    total_calls = 0
+    total_sleep = 0.0
+    for task_name in task_lst:
+        plan_lst = plan_task(task_name)
+        task_calls = 0
+        line_lst.append(f"[{task_name}]")
+        for item in plan_lst:
+            task_calls += item.api_calls
+            line = f"  {item.table_name}: {len(item.unit_lst)}个{item.unit_name}, "
+            line += f"调用接口{item.api_calls}次"
+            if item.note:
+                line += f", 范围{item.note}"
+            line_lst.append(line)
+            if len(item.unit_lst) > 0:
+                line_lst.append("    " + _format_units(item.unit_lst, verbose))
+        n_sleep, sleep_seconds = downloader.estimate_sleep(task_calls)
+        line_lst.append(
+            f"  合计调用接口{task_calls}次, 限流休眠{n_sleep}次, 约{sleep_seconds:.0f}秒"
+        )
+        total_calls += task_calls
+        total_sleep += sleep_seconds
+    line_lst.append(f"全部任务合计调用接口{total_calls}次, 限流休眠约{total_sleep:.0f}秒")
+    return line_lst
+
+
+def cli_main(argv=None):
+    """
+    命令行主函数
+
+    Parameters
+    ----------
+    argv: List[str]. 命令行参数, 默认为None, 即sys.argv[1:]
+    """
+    parser = get_parser()
+    args = parser.parse_args(argv)
+    if args.workers is not None:
+        if args.workers < 1:
+            parser.error("--workers必须大于0")
+        # 通过环境变量覆盖配置, 清洗子进程也能读到
+        os.environ[env_prefix + "PIPELINE_FETCH_WORKERS"] = str(args.workers)
+        reload_settings()
+    set_window(args.start_date, args.end_date, args.mode)
+    if args.build_cache:
+        meta = build_membership_main()
+        if meta is not None:
+            print(meta)
+        build_panel_main(rebuild=True)
+        return
+    if args.sync_replica:
+        sync_replica_main()
+        return
+    if args.worker:
+        if args.processes < 1:
+            parser.error("--processes必须大于0")
+        if args.processes == 1:
+            run_worker_main(args.token)
+        else:
+            run_workers_main(args.processes, None if args.token is None else [args.token])
+        print(job_status_main().to_string(index=False))
+        return
+    if args.job_status:
+        print(job_status_main().to_string(index=False))
+        return
+    if args.audit or args.repair:
+        audit_df = audit_data_main(repair=args.repair, task_lst=args.tasks,
+                                   start_date=args.start_date, end_date=args.end_date)
+        if len(audit_df) > 0:
+            print(audit_df.to_string(index=False))
+        return
+    task_lst = args.tasks if args.tasks is not None else get_daily_task_lst()
+    if args.enqueue:
+        print(enqueue_main(task_lst).to_string(index=False))
+        return
+    if args.dry_run:
+        for line in get_plan_lines(task_lst, args.verbose):
+            print(line)
+        return
+    run_daily_main(task_lst)
@@ -0,0 +1,25 @@
+'''
+Author: dkl
+Date: 2026-10-19 20:46:52
+Description: 分区维护. 为本地分区配置中的所有分区表追加未来年份的分区
+'''
+import pandas as pd
+from database.partition_maintenance import PartitionMaintenance
+from utils.conf import get_settings
+
+
+def maintain_partition_main(future_years=None):
+    """
+    为table_partition.csv中所有已分区的表追加未来年份的分区.
+    提前的年数默认由config.ini的partition_future_years决定.
+    每年运行一次即可, 重复运行不会有影响
+
+    Parameters
+    ----------
+    future_years: int. 提前创建多少年的分区
+    """
+    df = pd.read_csv(get_settings().table_structure.table_partition_path)
+    for db_name in df['TABLE_SCHEMA'].drop_duplicates().tolist():
+        maintenance = PartitionMaintenance(db_name)
+        maintenance.maintain_all(future_years=future_years)
+    return
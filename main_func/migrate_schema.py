@@ -0,0 +1,24 @@
+'''
+Author: dkl
+Date: 2026-10-19 19:12:45
+Description: 将数据库中的旧格式表迁移为紧凑表结构
+'''
+import pandas as pd
+from database.migration import SchemaMigration
+from utils.conf import get_settings
+
+
+def migrate_schema_main(drop_old=False):
+    """
+    将数据库中VARCHAR(255)日期、代码和DECIMAL行情字段的旧格式表,
+    按本地表结构文件在线分块重写为紧凑格式
+
+    Parameters
+    ----------
+    drop_old: bool. 切换后是否删除原表, 默认为False, 即保留为{table_name}_old
+    """
+    df = pd.read_csv(get_settings().table_structure.table_comment_path)
+    for db_name in df['TABLE_SCHEMA'].drop_duplicates().tolist():
+        migration = SchemaMigration(db_name)
+        migration.migrate_all(drop_old=drop_old)
+    return
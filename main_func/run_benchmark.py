@@ -0,0 +1,23 @@
+'''
+Author: dkl
+Date: 2026-10-19 23:58:12
+Description: 下载入库基准测试
+'''
+from benchmark.harness import Benchmark
+
+
+def run_benchmark_main(scenario_lst=None, backend=None):
+    """
+    使用本地的tushare替身和一次性数据库运行基准测试, 结果追加到config.ini中的result_path
+
+    Parameters
+    ----------
+    scenario_lst: List[str]. 场景列表, 默认为None, 即读取config.ini中的scenario_lst.
+        可选daily(一个交易日), backfill(约一年追数据), finance_period(按报告期下载财务数据),
+        finance_code(按股票代码下载财务数据, 只能在mysql上运行)
+    backend: str. 'mysql'或'sqlite', 默认为None, 即读取config.ini
+    """
+    bench = Benchmark(backend=backend)
+    result_df = bench.run(scenario_lst)
+    print(result_df.to_string(index=False))
+    return result_df
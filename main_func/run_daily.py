@@ -5,17 +5,15 @@ Description: 每天运行的函数
 '''
 import os
 import datetime
-from download import (
-    tradecal,
-    asharedaily,
-    asharemonthly,
-    asharefinance,
-    asharesw2021daily,
-    ashareindex,
-    futdaily
-)
-from utils.logger import Logger
-from utils.conf import Config
+from main_func.audit_data import audit_data_main
+from main_func.build_cache import build_membership_main
+from main_func.sync_replica import sync_replica_main
+from main_func.tasks import get_daily_task_lst, run_task
+from download.plan import get_window
+from utils import metrics
+from utils.logger import Logger, close_logs, flush_logs
+from utils.conf import get_settings
+from utils.profiler import get_profiler
 
 
 def clear_past_log_main():
@@ -23,8 +21,7 @@ def clear_past_log_main():
     清除过去几天的日志，清除天数由config.ini的clean_past_log_days决定
     """
     try:
-        conf = Config('log')
-        remove_past_days = int(conf.get_config('clear_past_log_days'))
+        remove_past_days = get_settings().log.clear_past_log_days
         log_dir = './log/'
         for file_name in os.listdir(log_dir):
             flag1 = ((file_name[-4:] == '.log') & (len(file_name) == 12))
@@ -36,38 +33,30 @@ def clear_past_log_main():
                 log_datetime = datetime.datetime.strptime(log_date, r'%Y%m%d')
                 today_datetime = datetime.datetime.today()
                 if (today_datetime - log_datetime).days >= remove_past_days:
+                    # 跨天运行的进程可能仍打开着旧的日志文件
+                    close_logs(log_dir + file_name)
                     os.remove(log_dir + file_name)
     except Exception as e:
         raise ValueError('清除日志失败，请检查log文件夹是否在当前项目下!\n' + e)
 
 
-def download_main():
+def download_main(task_lst=None):
     """
-    下载主函数
+    下载主函数. 按任务注册表依次运行任务, 任务对应的下载模块在运行时才导入.
+    config.ini中[profile]的enabled为True时, 对每个任务进行性能剖析
+
+    Parameters
+    ----------
+    task_lst: List[str]. 任务列表, 默认为None, 即每日默认运行的任务, 见main_func.tasks
     """
-    # 交易日历
-    asharetradecal_dl = tradecal.TradecalDownload()
-    asharetradecal_dl.download_main()
-    # A股日频
-    asharedaily_dl = asharedaily.AshareDailyDownload()
-    asharedaily_dl.download_main()
-    # A股月频
-    asharemonthly_dl = asharemonthly.AshareMonthlyDownload()
-    asharemonthly_dl.download_main()
-    # 指数
-    ashareindex_dl = ashareindex.AshareIndexDownload()
-    ashareindex_dl.download_main()
-    # 申万2021行业指数
-    asharesw2021daily_dl = asharesw2021daily.AshareSW2021DailyDownload()
-    asharesw2021daily_dl.download_main()
-    # 期货数据
-    futdaily_dl = futdaily.FutDailyDownload()
-    futdaily_dl.download_main()
-    # 财务数据
-    asharefinance_dl = asharefinance.AshareFinanceDownload()
-    asharefinance_dl.download_main()
-    # # 如果积分只有2k，那就注释掉上面这行，运行以下函数(时间可能要一个多小时)
-    # asharefinance_dl.download_main_code()
+    if task_lst is None:
+        task_lst = get_daily_task_lst()
+    profiler = get_profiler()
+    try:
+        for task_name in task_lst:
+            run_task(task_name, profiler)
+    finally:
+        profiler.close()
     return
 
 
@@ -77,6 +66,8 @@ def check_main():
     """
     today_date = datetime.datetime.today().strftime(r'%Y%m%d')
     log_dir = './log/' + today_date + '.log'
+    # 日志由后台线程写出, 读取前先写完队列中的日志
+    flush_logs()
     flag_error = False
     with open(log_dir, 'r', encoding='utf-8') as log:
         for line in log:
@@ -87,16 +78,86 @@ def check_main():
         logger.send_error_email()
 
 
-def run_daily_main():
+def start_metrics_server_main():
+    """
+    如果config.ini中[metrics]的http_port大于0, 在本地端口提供Prometheus格式的指标
     """
-    每日运行主函数，包括以下步骤:
+    http_port = get_settings().metrics.http_port
+    if http_port > 0:
+        metrics.registry.start_http_server(http_port)
+
+
+def metrics_summary_main():
+    """
+    汇总本次运行各接口的调用次数、耗时和各数据表的写入情况, 输出到日志,
+    并写入Prometheus文本文件, 文件位置由config.ini中[metrics]的textfile_path决定
+    """
+    logger = Logger('metrics')
+    for line in metrics.get_summary_lst():
+        logger.info(line)
+    textfile_path = get_settings().metrics.textfile_path
+    if textfile_path:
+        metrics.registry.write_textfile(textfile_path)
+
+
+def is_partial_run(task_lst=None, window=None):
+    """
+    是否只运行了部分任务或部分日期, 如命令行指定了--tasks、--start-date或--end-date
+
+    Parameters
+    ----------
+    task_lst: List[str]. 任务列表, 默认为None, 即每日运行的全部任务
+    window: download.plan.DownloadWindow. 下载窗口, 默认为None, 即进程内共享的下载窗口
+
+    Returns
+    -------
+    bool
+    """
+    if window is None:
+        window = get_window()
+    if (window.start_date is not None) or (window.end_date is not None) \
+            or (window.date_lst is not None):
+        return True
+    return (task_lst is not None) and (not set(get_daily_task_lst()) <= set(task_lst))
+
+
+def run_daily_main(task_lst=None):
+    """
+    每日运行主函数，task_lst为运行的任务列表, 默认为None, 即每日运行的全部任务. 包括以下步骤:
     1. 清除过去7天日志
     2. 下载数据
-    3. 检查日志是否有错误，如果有则发送到邮箱
+    3. 汇总接口和写入指标
+    4. 生成股票池和申万行业成分的时点索引(config.ini中[cache]的build_membership为True时)
+    5. 检查数据表中缺失的日期和行数异常少的日期(config.ini中[audit]的daily为True时)
+    6. 同步嵌入式分析副本(config.ini中[replica]的daily为True时)
+    7. 检查日志是否有错误，如果有则发送到邮箱
+    只运行部分任务或部分日期时, 跳过第4步和第6步, 第5步只检查这些任务的数据表和下载窗口内的日期
     """
     # step1: 清除过去7天日志
     clear_past_log_main()
+    start_metrics_server_main()
     # step2: 下载数据
-    download_main()
-    # step3: 检查是否有error，有的话，发送到邮箱
+    try:
+        download_main(task_lst)
+    finally:
+        # step3: 汇总接口和写入指标
+        metrics_summary_main()
+    flag_partial = is_partial_run(task_lst)
+    if flag_partial:
+        Logger('root').info('只运行了部分任务或部分日期, 不生成成分索引和同步副本')
+    # step4: 生成成分索引
+    if get_settings().cache.build_membership and (not flag_partial):
+        build_membership_main()
+    # step5: 检查数据缺口
+    if get_settings().audit.daily:
+        if flag_partial:
+            window = get_window()
+            audit_data_main(task_lst=task_lst, start_date=window.start_date,
+                            end_date=window.end_date)
+        else:
+            audit_data_main()
+    # step6: 同步副本
+    if get_settings().replica.daily and (not flag_partial):
+        sync_replica_main()
+    # step7: 检查是否有error，有的话，发送到邮箱
     check_main()
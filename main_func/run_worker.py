@@ -0,0 +1,104 @@
+'''
+Author: dkl
+Date: 2026-10-21 17:25:36
+Description: 分布式回填. 计划进程将缺失的交易日和报告期写入任务队列, 任意台机器上的工作进程领取并下载,
+每个工作进程可以使用自己的tushare token
+'''
+import multiprocessing
+import os
+from utils.conf import env_prefix, get_settings, reload_settings
+from utils.logger import Logger
+
+
+def enqueue_main(task_lst=None):
+    """
+    计算任务的下载计划(按命令行的下载窗口), 将按交易日和报告期下载的工作单元写入任务队列.
+    基本信息表等不能拆分的数据表需要直接运行任务
+
+    Parameters
+    ----------
+    task_lst: List[str]. 任务列表, 默认为None, 即每日运行的全部任务
+
+    Returns
+    -------
+    pandas.DataFrame. 每张数据表写入的工作单元个数
+    """
+    # 运行时才导入, 只导入run_daily时不加载pandas和数据库模块
+    import pandas as pd
+    from download.jobqueue import JobQueue
+    from main_func.tasks import get_daily_task_lst, plan_task
+    if task_lst is None:
+        task_lst = get_daily_task_lst()
+    queue = JobQueue()
+    df_lst = [queue.enqueue_plan(plan_task(task_name)) for task_name in task_lst]
+    return pd.concat(df_lst, axis=0, ignore_index=True)
+
+
+def _setup_worker(token=None):
+    """
+    工作进程的配置: 使用自己的tushare token, 不更新本机的面板缓存(队列清空后用--build-cache生成)
+    """
+    os.environ[env_prefix + "CACHE_BUILD_PANEL"] = "False"
+    if token:
+        os.environ[env_prefix + "TUSHARE_TSTOKEN"] = token
+    reload_settings()
+
+
+def run_worker_main(token=None, max_jobs=None):
+    """
+    在当前进程中运行一个工作进程, 直到任务队列清空
+
+    Parameters
+    ----------
+    token: str. tushare token, 默认为None, 即config.ini中[tushare]的tstoken
+    max_jobs: int. 最多领取的批数, 默认为None, 即直到队列清空
+
+    Returns
+    -------
+    int. 完成的工作单元个数
+    """
+    _setup_worker(token)
+    from download.jobqueue import JobWorker
+    return JobWorker().run(max_jobs)
+
+
+def _worker_process(token):
+    try:
+        run_worker_main(token)
+    except Exception as e:
+        Logger('jobqueue').error(f'工作进程退出: {e}')
+
+
+def run_workers_main(n_processes, token_lst=None):
+    """
+    在本机启动多个工作进程, 依次使用token_lst中的token, 等待全部退出
+
+    Parameters
+    ----------
+    n_processes: int. 工作进程数
+    token_lst: List[str]. tushare token列表, 默认为None, 即config.ini中[jobqueue]的token_lst,
+        为空时都使用[tushare]的tstoken
+    """
+    if token_lst is None:
+        token_lst = list(get_settings().jobqueue.token_lst)
+    ctx = multiprocessing.get_context("spawn")
+    process_lst = []
+    for i in range(n_processes):
+        token = token_lst[i % len(token_lst)] if len(token_lst) > 0 else None
+        process = ctx.Process(target=_worker_process, args=(token,))
+        process.start()
+        process_lst.append(process)
+    for process in process_lst:
+        process.join()
+
+
+def job_status_main():
+    """
+    任务队列中各数据表各状态的工作单元个数
+
+    Returns
+    -------
+    pandas.DataFrame
+    """
+    from download.jobqueue import JobQueue
+    return JobQueue().get_status_df()
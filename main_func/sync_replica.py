@@ -0,0 +1,38 @@
+'''
+Author: dkl
+Date: 2026-10-21 15:31:40
+Description: 将MySQL中的数据表同步到本地的嵌入式分析副本(DuckDB或SQLite), 供离线研究和CI使用
+'''
+from utils.logger import Logger
+
+# 同步的数据库
+replica_database_lst = ["stk_data", "fut_data"]
+
+
+def sync_replica_main(database_lst=None, rebuild=False):
+    """
+    同步嵌入式分析副本, 副本类型、目录和数据表见config.ini中的[replica].
+    同步失败时输出ERROR日志, 不影响后续步骤
+
+    Parameters
+    ----------
+    database_lst: List[str]. 数据库列表, 默认为None, 即stk_data和fut_data
+    rebuild: bool. 是否全量重新复制, 默认为False
+
+    Returns
+    -------
+    bool. 是否成功
+    """
+    # 运行时才导入, 只导入run_daily时不加载pandas和数据库模块
+    from database.replica import ReplicaSync
+    logger = Logger('replica')
+    if database_lst is None:
+        database_lst = replica_database_lst
+    flag = True
+    for database in database_lst:
+        try:
+            ReplicaSync(database).sync(rebuild=rebuild)
+        except Exception as e:
+            logger.error(f'同步{database}的副本失败: {e}')
+            flag = False
+    return flag
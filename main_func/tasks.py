@@ -0,0 +1,99 @@
+'''
+Author: dkl
+Date: 2026-10-20 11:42:30
+Description: 下载任务注册表. 只登记任务所在的模块、类和方法, 运行任务时才导入对应的下载模块,
+只运行部分任务时不需要导入全部下载模块
+'''
+import importlib
+from collections import namedtuple
+
+# module: 模块路径, class_name: 下载类, method: 运行的方法, daily: 是否为每日默认运行的任务,
+# plan: 只计算下载计划而不下载的方法
+Task = namedtuple("Task", ["module", "class_name", "method", "daily", "plan"])
+# 任务注册表, 每日运行时按此顺序执行
+task_dct = {
+    # 交易日历
+    "tradecal": Task("download.tradecal", "TradecalDownload", "download_main", True, "plan_main"),
+    # A股日频
+    "asharedaily": Task("download.asharedaily", "AshareDailyDownload", "download_main", True, "plan_main"),
+    # A股月频
+    "asharemonthly": Task(
+        "download.asharemonthly", "AshareMonthlyDownload", "download_main", True, "plan_main"
+    ),
+    # 指数
+    "ashareindex": Task("download.ashareindex", "AshareIndexDownload", "download_main", True, "plan_main"),
+    # 申万2021行业指数
+    "asharesw2021daily": Task(
+        "download.asharesw2021daily", "AshareSW2021DailyDownload", "download_main", True, "plan_main"
+    ),
+    # 期货数据
+    "futdaily": Task("download.futdaily", "FutDailyDownload", "download_main", True, "plan_main"),
+    # 财务数据
+    "asharefinance": Task(
+        "download.asharefinance", "AshareFinanceDownload", "download_main", True, "plan_main"
+    ),
+    # 如果积分只有2k，用按股票列表下载代替asharefinance(时间可能要一个多小时)
+    "asharefinance_code": Task(
+        "download.asharefinance", "AshareFinanceDownload", "download_main_code", False,
+        "plan_main_code"
+    ),
+}
+
+
+def get_daily_task_lst():
+    """
+    每日默认运行的任务列表
+    """
+    return [task_name for task_name, task in task_dct.items() if task.daily]
+
+
+def get_task(task_name):
+    """
+    获取任务的下载类实例和要运行的方法, 此时才导入下载模块
+
+    Parameters
+    ----------
+    task_name: str. 任务名, 见task_dct
+
+    Returns
+    -------
+    (下载类实例, 方法名)
+    """
+    if task_name not in task_dct:
+        raise ValueError(f"没有任务{task_name}, 可选任务: {list(task_dct.keys())}")
+    task = task_dct[task_name]
+    module = importlib.import_module(task.module)
+    return getattr(module, task.class_name)(), task.method
+
+
+def run_task(task_name, profiler=None):
+    """
+    运行一个任务
+
+    Parameters
+    ----------
+    task_name: str. 任务名, 见task_dct
+    profiler: utils.profiler.TaskProfiler. 性能剖析器, 默认为None, 即不剖析
+    """
+    obj, method = get_task(task_name)
+    if profiler is None:
+        getattr(obj, method)()
+        return
+    with profiler.task(task_name, obj):
+        getattr(obj, method)()
+
+
+def plan_task(task_name):
+    """
+    计算任务的下载计划, 只读取数据库, 不调用接口
+
+    Parameters
+    ----------
+    task_name: str. 任务名, 见task_dct
+
+    Returns
+    -------
+    List[download.plan.PlanItem]
+    """
+    obj, _ = get_task(task_name)
+    return getattr(obj, task_dct[task_name].plan)()
@@ -0,0 +1,123 @@
+'''
+Author: dkl
+Description: 数据缺口检查测试
+Date: 2026-10-20 18:02:37
+'''
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine, inspect
+from database.audit import (AuditSpec, DataAudit, audit_spec_lst, audit_table, get_active_count,
+                            get_calendar_dct, get_count_sql, select_spec_lst)
+from download.plan import get_window
+
+
+class FakeDownload(object):
+    """
+    按下载窗口写入数据的下载类, skip_lst中的日期下载不到数据
+    """
+
+    def download(self, engine, skip_lst=(), fail=False):
+        date_lst = [date for date in get_window().date_lst if date not in skip_lst]
+        pd.DataFrame({'trade_date': date_lst, 'stock_code': 'new'}).to_sql(
+            'repairtest', engine, index=False, if_exists='append')
+        if fail:
+            raise ValueError('下载失败')
+
+
+class SQLiteAudit(DataAudit):
+    """
+    使用SQLite数据库的数据缺口检查
+    """
+
+    def __init__(self, engine, spec_lst):
+        self.database = 'stk_data'
+        self.engine = engine
+        self.spec_lst = spec_lst
+
+
+class TestAudit(unittest.TestCase):
+
+    def test_count_sql(self):
+        sql = get_count_sql(audit_spec_lst[:2])
+        self.assertEqual(sql.count('union all'), 1)
+        self.assertIn('group by trade_date', sql)
+
+    def test_select_spec(self):
+        spec_lst = select_spec_lst(['download.asharedaily'])
+        self.assertEqual([spec.table_name for spec in spec_lst], ['asharedailyprices', 'asharedailybasic'])
+        self.assertEqual(len(select_spec_lst(['download.futdaily'])), 6)
+        self.assertEqual(select_spec_lst(['download.tradecal']), [])
+
+    def test_calendar(self):
+        trade_date_lst = ['20230130', '20230131', '20230227', '20230228', '20230301']
+        calendar_dct = get_calendar_dct(trade_date_lst, '20230301')
+        self.assertEqual(calendar_dct['monthly'], ['20230131', '20230228'])
+        self.assertEqual(calendar_dct['period'][0], '19910331')
+        self.assertEqual(calendar_dct['period'][-1], '20221231')
+
+    def test_active_count(self):
+        date_arr = np.array([20230101, 20230201, 20230301])
+        list_date_arr = np.array([20220101, 20230115, 20230201])
+        delist_date_arr = np.array([20230201])
+        self.assertEqual(get_active_count(date_arr, list_date_arr, delist_date_arr).tolist(),
+                         [1, 2, 2])
+
+    def test_audit_table(self):
+        calendar_lst = ['20230103', '20230104', '20230105', '20230106', '20230109']
+        count_df = pd.DataFrame({
+            'date': ['20230103', '20230104', '20230106', '20230109'],
+            'n_rows': [5000, 40, 5000, 5000],
+        })
+        active_arr = np.array([5000] * 5)
+        df = audit_table(count_df, calendar_lst, 'universe', active_arr=active_arr)
+        self.assertEqual(df['DATE'].tolist(), ['20230104', '20230105'])
+        self.assertEqual(df['ISSUE'].tolist(), ['low_rows', 'missing'])
+        df = audit_table(count_df, calendar_lst, 'peer')
+        self.assertEqual(df['DATE'].tolist(), ['20230104', '20230105'])
+        # 最后几期不检查行数
+        df = audit_table(count_df.iloc[:2], calendar_lst[:2], 'peer', skip_last=1)
+        self.assertEqual(len(df), 0)
+
+    def test_repair(self):
+        tmp_dir = tempfile.mkdtemp()
+        engine = create_engine('sqlite:///' + os.path.join(tmp_dir, 'test.db'))
+        try:
+            pd.DataFrame({'trade_date': ['20230103', '20230104', '20230104'],
+                          'stock_code': ['old', 'old', 'old2']}).to_sql('repairtest', engine, index=False)
+            audit_df = pd.DataFrame({
+                'TABLE_SCHEMA': 'stk_data', 'TABLE_NAME': 'repairtest',
+                'DATE': ['20230103', '20230104', '20230105'],
+                'ROWS': [1, 2, 0], 'EXPECTED': 10, 'ISSUE': ['low_rows', 'low_rows', 'missing'],
+            })
+
+            def get_df():
+                sql = 'select * from repairtest order by trade_date, stock_code'
+                return pd.read_sql(sql, engine)
+
+            # 没有下载到20230104时放回原有的数据
+            # 用类所在的模块名, 不论以何种路径导入测试模块都不会重复导入
+            repair = (FakeDownload.__module__, 'FakeDownload', 'download',
+                      {'engine': engine, 'skip_lst': ['20230104']})
+            spec = AuditSpec('stk_data', 'repairtest', 'trade_date', 'daily', 'peer', repair)
+            SQLiteAudit(engine, [spec]).repair(audit_df)
+            df = get_df()
+            self.assertEqual(df['trade_date'].tolist(), ['20230103', '20230104', '20230104', '20230105'])
+            self.assertEqual(df['stock_code'].tolist(), ['new', 'old', 'old2', 'new'])
+            self.assertFalse(inspect(engine).has_table('repairtest_repair'))
+            # 下载失败时已经写入的日期保留新数据, 其余日期放回原有的数据
+            repair = (FakeDownload.__module__, 'FakeDownload', 'download',
+                      {'engine': engine, 'skip_lst': ['20230103'], 'fail': True})
+            spec = spec._replace(repair=repair)
+            SQLiteAudit(engine, [spec]).repair(audit_df.iloc[:2])
+            df = get_df()
+            self.assertEqual(df['trade_date'].tolist(), ['20230103', '20230104', '20230105'])
+            self.assertEqual(df['stock_code'].tolist(), ['new', 'new', 'new'])
+            self.assertFalse(inspect(engine).has_table('repairtest_repair'))
+            self.assertIsNone(get_window().date_lst)
+        finally:
+            engine.dispose()
+            shutil.rmtree(tmp_dir)
@@ -0,0 +1,36 @@
+'''
+Author: dkl
+Description: 基准测试的tushare替身测试
+Date: 2026-10-20 00:06:31
+'''
+import unittest
+from benchmark.fakepro import FakeProApi, get_period_lst
+
+
+class TestFakeProApi(unittest.TestCase):
+
+    def test_query(self):
+        pro = FakeProApi(n_stocks=10)
+        df1 = pro.daily(trade_date='20230103', fields='ts_code,trade_date,close')
+        df2 = pro.daily(trade_date='20230103', fields='ts_code,trade_date,close')
+        self.assertEqual(pro.daily.args[0], 'daily')
+        self.assertEqual(list(df1.columns), ['ts_code', 'trade_date', 'close'])
+        self.assertEqual(len(df1), 10)
+        self.assertTrue((df1['trade_date'] == '20230103').all())
+        self.assertTrue(df1.equals(df2))
+        self.assertEqual(pro.calls, 2)
+        self.assertEqual(pro.rows, 20)
+
+    def test_query_by_code(self):
+        pro = FakeProApi(n_stocks=10, n_periods=4)
+        df = pro.income(ts_code='000001.SZ', fields='ts_code,end_date,revenue',
+                        end_date='20231018')
+        self.assertEqual(df['end_date'].tolist(), get_period_lst('20231018', 4))
+        self.assertEqual(df['end_date'].tolist()[-1], '20230930')
+
+    def test_quota_error(self):
+        pro = FakeProApi(n_stocks=10, error_every=2)
+        pro.adj_factor(trade_date='20230103')
+        with self.assertRaises(Exception):
+            pro.adj_factor(trade_date='20230103')
+        self.assertEqual(pro.errors, 1)
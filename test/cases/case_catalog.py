@@ -0,0 +1,36 @@
+'''
+Author: dkl
+Description: 表结构目录测试
+Date: 2026-10-19 21:58:40
+'''
+import unittest
+from sqlalchemy import types
+from database.catalog import get_catalog, parse_sql_type
+
+
+class TestCatalog(unittest.TestCase):
+
+    def test_parse_sql_type(self):
+        sql_type = parse_sql_type('decimal(20,4)')
+        self.assertIsInstance(sql_type, types.DECIMAL)
+        self.assertEqual((sql_type.precision, sql_type.scale), (20, 4))
+        self.assertEqual(parse_sql_type('char(9)').length, 9)
+        self.assertIsInstance(parse_sql_type('int(11) unsigned'), types.INT)
+        with self.assertRaises(ValueError):
+            parse_sql_type('geometry')
+
+    def test_get_sql_dtype(self):
+        catalog = get_catalog()
+        sql_dtype = catalog.get_sql_dtype('stk_data', 'asharetradecal')
+        self.assertEqual(list(sql_dtype.keys()), ['cal_date', 'is_open'])
+        self.assertIs(get_catalog(), catalog)
+
+    def test_get_create_table_sql(self):
+        table_schema = get_catalog().get_table('stk_data', 'asharedailyprices')
+        sql = table_schema.get_create_table_sql('asharedailyprices_shadow')
+        print(sql)
+        self.assertTrue(sql.startswith('CREATE TABLE asharedailyprices_shadow ('))
+        self.assertIn('PRIMARY KEY (trade_date, stock_code)', sql)
+        self.assertIn('PARTITION BY RANGE (trade_date)', sql)
+        with self.assertRaises(ValueError):
+            get_catalog().get_table('stk_data', 'not_exists')
@@ -0,0 +1,44 @@
+'''
+Author: dkl
+Description: 配置对象测试
+Date: 2026-10-20 14:26:40
+'''
+import unittest
+from utils.conf import Config, get_settings, load_settings
+
+
+class TestConf(unittest.TestCase):
+
+    def test_types(self):
+        settings = get_settings()
+        self.assertIsInstance(settings.mysql.pool_size, int)
+        self.assertIsInstance(settings.mysql.pool_pre_ping, bool)
+        self.assertIsInstance(settings.writer.flush_seconds, float)
+        self.assertIsInstance(settings.table_structure.database_lst, tuple)
+        self.assertIs(settings, get_settings())
+        # 与Config共用同一次解析的结果
+        self.assertEqual(Config('mysql').get_config('host'), settings.mysql.host)
+
+    def test_environ(self):
+        environ = {
+            'QDB_MYSQL_POOL_SIZE': '20',
+            'QDB_TABLE_STRUCTURE_INIT_WORKERS': '8',
+            'QDB_DOWNLOADER_MAXREQS': '100',
+            'OTHER_MYSQL_POOL_SIZE': '30',
+        }
+        settings = load_settings(environ=environ)
+        self.assertEqual(settings.mysql.pool_size, 20)
+        self.assertEqual(settings.table_structure.init_workers, 8)
+        self.assertEqual(settings.downloader.maxreqs, 100)
+        self.assertEqual(settings.raw['mysql']['pool_size'], '20')
+
+    def test_immutable(self):
+        settings = get_settings()
+        with self.assertRaises(AttributeError):
+            settings.mysql.pool_size = 1
+        with self.assertRaises(TypeError):
+            settings.raw['mysql']['pool_size'] = '1'
+
+    def test_type_error(self):
+        with self.assertRaises(ValueError):
+            load_settings(environ={'QDB_WRITER_MAX_ROWS': 'abc'})
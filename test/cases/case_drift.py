@@ -0,0 +1,47 @@
+'''
+Author: dkl
+Description: 表结构漂移检测测试
+Date: 2026-10-19 23:10:52
+'''
+import unittest
+import pandas as pd
+from database.catalog import get_catalog
+from database.drift import diff_table, drift_columns, get_alter_sql_dct
+
+
+class TestDrift(unittest.TestCase):
+
+    def setUp(self):
+        self.table_schema = get_catalog().get_table('stk_data', 'ashareindexweight')
+
+    def test_no_drift(self):
+        live_tb_df = self.table_schema.tb_df.copy()
+        live_tb_df['COLUMN_TYPE'] = live_tb_df['COLUMN_TYPE'].replace({'int': 'int(11)'})
+        drift_lst = diff_table(self.table_schema, live_tb_df,
+                               self.table_schema.ind_df, self.table_schema.tb_comm)
+        self.assertEqual(drift_lst, [])
+
+    def test_drift(self):
+        # 数据库中weight被改宽, 缺少一个索引, 多出一个字段
+        live_tb_df = self.table_schema.tb_df.copy()
+        live_tb_df.loc[live_tb_df['COLUMN_NAME'] == 'weight', 'COLUMN_TYPE'] = 'decimal(30,4)'
+        extra_df = live_tb_df.iloc[[0]].copy()
+        extra_df['COLUMN_NAME'] = 'extra_col'
+        extra_df['ORDINAL_POSITION'] = 99
+        live_tb_df = pd.concat([live_tb_df, extra_df])
+        live_ind_df = self.table_schema.ind_df.iloc[0:0]
+        drift_lst = diff_table(self.table_schema, live_tb_df, live_ind_df,
+                               self.table_schema.tb_comm)
+        drift_df = pd.DataFrame(drift_lst, columns=drift_columns)
+        print(drift_df)
+        action_set = set(zip(drift_df['OBJECT_TYPE'], drift_df['OBJECT_NAME'],
+                             drift_df['ACTION']))
+        self.assertIn(('COLUMN', 'weight', 'MODIFY'), action_set)
+        self.assertIn(('COLUMN', 'extra_col', 'EXTRA'), action_set)
+        self.assertIn(('INDEX', 'PRIMARY', 'ADD'), action_set)
+        alter_sql = get_alter_sql_dct(drift_df)[('stk_data', 'ashareindexweight')]
+        print(alter_sql)
+        self.assertIn('MODIFY COLUMN weight double', alter_sql)
+        self.assertIn('ADD PRIMARY KEY', alter_sql)
+        # 默认不删除多出的字段
+        self.assertNotIn('DROP COLUMN', alter_sql)
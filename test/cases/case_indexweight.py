@@ -0,0 +1,32 @@
+'''
+Author: dkl
+Description: 指数成分股日频权重测试
+Date: 2026-10-20 22:10:44
+'''
+import unittest
+import numpy as np
+import pandas as pd
+from database.indexweight import expand_weight
+
+
+class TestIndexWeight(unittest.TestCase):
+
+    def test_expand_weight(self):
+        weight_df = pd.DataFrame({
+            'index_code': ['000300.SH', '000300.SH', '000300.SH', '000016.SH'],
+            'con_code': ['600000.SH', '000001.SZ', '600000.SH', '600000.SH'],
+            'trade_date': [20230131, 20230131, 20230228, 20230228],
+            'weight': [1.0, 2.0, 1.5, 3.0],
+        })
+        trade_date_arr = np.array([20230130, 20230131, 20230201, 20230228, 20230301])
+        df = expand_weight(weight_df, trade_date_arr)
+        # 早于最早一期权重的交易日没有数据
+        self.assertEqual(df.loc[df['index_code'] == '000016.SH', 'trade_date'].tolist(),
+                         [20230228, 20230301])
+        df = df[df['index_code'] == '000300.SH']
+        self.assertEqual(df['trade_date'].tolist(),
+                         [20230131, 20230131, 20230201, 20230201, 20230228, 20230301])
+        self.assertEqual(df['con_code'].tolist()[:2], ['000001.SZ', '600000.SH'])
+        self.assertEqual(df['weight'].tolist(), [2.0, 1.0, 2.0, 1.0, 1.5, 1.5])
+        self.assertEqual(df['weight_date'].tolist()[-2:], [20230228, 20230228])
+        self.assertEqual(len(expand_weight(weight_df, np.array([20230101]))), 0)
@@ -0,0 +1,128 @@
+'''
+Author: dkl
+Description: 分布式下载任务队列测试
+Date: 2026-10-21 17:52:08
+'''
+import multiprocessing
+import os
+import shutil
+import tempfile
+import unittest
+from sqlalchemy import create_engine
+from database.catalog import build_embedded_create_table_sql, get_catalog
+from download.jobqueue import JobQueue, JobWorker, job_spec_dct, job_table_name
+from download.plan import PlanItem
+from utils.conf import JobQueueSettings
+
+# 测试用的队列配置
+test_conf = JobQueueSettings(claim_size=5, max_attempts=2, poll_seconds=0.01)
+
+
+class SQLiteQueue(JobQueue):
+    """
+    使用SQLite数据库的任务队列
+    """
+
+    def __init__(self, db_path):
+        self.database = 'stk_data'
+        self.engine = create_engine('sqlite:///' + db_path, connect_args={'timeout': 60})
+        self.conf = test_conf
+
+    def _check_table_exists(self, table_name):
+        return True
+
+
+class FakeWorker(JobWorker):
+    """
+    不下载数据的工作进程, 领取的工作单元都视为完成
+    """
+
+    def __init__(self, queue, worker, claimed_q=None):
+        self.queue = queue
+        self.worker = worker
+        self.conf = test_conf
+        self.claimed_q = claimed_q
+
+    def run_job(self, spec, unit_lst):
+        if self.claimed_q is not None:
+            for unit in unit_lst:
+                self.claimed_q.put((spec.table_name, unit))
+
+    def get_done_lst(self, spec, unit_lst):
+        return unit_lst
+
+
+def _worker_process(db_path, worker, claimed_q):
+    queue = SQLiteQueue(db_path)
+    FakeWorker(queue, worker, claimed_q).run()
+    queue.engine.dispose()
+
+
+class TestJobQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmp_dir, 'stk_data.db')
+        self.queue = SQLiteQueue(self.db_path)
+        table_schema = get_catalog().get_table('stk_data', job_table_name)
+        with self.queue.engine.connect() as conn:
+            for sql in build_embedded_create_table_sql(table_schema):
+                conn.execute(sql)
+        self.date_lst = [str(20230101 + i) for i in range(12)]
+
+    def tearDown(self):
+        self.queue.engine.dispose()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_claim_finish(self):
+        plan_lst = [
+            PlanItem('asharedailyprices', 'trade_date', self.date_lst, 2),
+            PlanItem('ashareincome', 'period', ['20221231', '20230331']),
+            PlanItem('asharestockbasic', 'list_status', ['L', 'D', 'P']),
+        ]
+        df = self.queue.enqueue_plan(plan_lst)
+        self.assertEqual(df['n_units'].tolist(), [12, 2, 0])
+        # 交易日每次最多领取claim_size个
+        spec, unit_lst = self.queue.claim('w1')
+        self.assertEqual(spec.table_name, 'asharedailyprices')
+        self.assertEqual(unit_lst, self.date_lst[:5])
+        self.queue.finish(spec, unit_lst, 'w1', unit_lst[:3], 'error')
+        # 未完成的重新领取, 达到max_attempts后标记为failed
+        spec, unit_lst = self.queue.claim('w2')
+        self.assertEqual(unit_lst, self.date_lst[3:8])
+        self.queue.finish(spec, unit_lst, 'w2', unit_lst[2:])
+        df = self.queue.get_status_df().set_index('status')
+        self.assertEqual(df.loc['failed', 'n_units'], 2)
+        self.assertEqual(df.loc['done', 'n_units'], 6)
+        # 重新写入时失败的工作单元重置为pending
+        self.queue.enqueue('asharedailyprices', self.date_lst[3:5])
+        spec, unit_lst = self.queue.claim('w3')
+        self.assertEqual(unit_lst, self.date_lst[3:5] + self.date_lst[8:11])
+
+    def test_spec_one_table(self):
+        # 每个持仓表只下载对应交易所, 不会写入其他工作进程领取的表
+        for exchange in ['cffex', 'czce', 'dce', 'shfe']:
+            spec = job_spec_dct['futholding' + exchange]
+            self.assertEqual(spec.repair[2], 'download_futholding')
+            self.assertEqual(spec.repair[3], {'exchange_lst': [exchange.upper()]})
+
+    def test_workers(self):
+        self.queue.enqueue('asharedailyprices', self.date_lst)
+        self.queue.enqueue('ashareincome', ['20221231', '20230331'])
+        ctx = multiprocessing.get_context('spawn')
+        claimed_q = ctx.Queue()
+        process_lst = [
+            ctx.Process(target=_worker_process, args=(self.db_path, f'w{i}', claimed_q))
+            for i in range(3)
+        ]
+        for process in process_lst:
+            process.start()
+        for process in process_lst:
+            process.join(60)
+        claimed_lst = []
+        while not claimed_q.empty():
+            claimed_lst.append(claimed_q.get())
+        # 每个工作单元只被领取一次
+        self.assertEqual(len(claimed_lst), 14)
+        self.assertEqual(len(set(claimed_lst)), 14)
+        self.assertEqual(self.queue.count_unfinished(), 0)
@@ -6,7 +6,7 @@ Date: 2023-04-07 14:14:48
 import unittest
 import os
 import logging
-from utils.logger import Logger
+from utils.logger import Logger, close_logs, flush_logs
 path = './log/test.log'
 
 
@@ -15,6 +15,7 @@ class TestLogger(unittest.TestCase):
         '''
         每次创建前，先检查下有没有test.log文件，有的话删掉
         '''
+        close_logs(path)
         if os.path.exists(path):
             os.remove(path)
 
@@ -22,6 +23,7 @@ class TestLogger(unittest.TestCase):
         '''
         每次运行完函数都把test.log删除
         '''
+        close_logs(path)
         logging.shutdown()
         if os.path.exists(path):
             os.remove(path)
@@ -40,3 +42,24 @@ class TestLogger(unittest.TestCase):
         logger.error('This is an error message')
         logger.critical('This is a critical message')
         logger.send_error_email()
+
+    def test_handler_once(self):
+        logger1 = Logger('test_handler_once', file_dir=path)
+        logger2 = Logger('test_handler_once', file_dir=path)
+        self.assertEqual(len(logger2.logger.handlers), 1)
+        logger1.info('This is an info message')
+        flush_logs()
+        with open(path, 'r', encoding='utf-8') as log:
+            self.assertEqual(len(log.readlines()), 1)
+
+    def test_close_logs(self):
+        logger = Logger('test_close_logs', file_dir=path)
+        logger.info('This is an info message')
+        close_logs(path)
+        os.remove(path)
+        # 关闭后再写日志时重新打开文件
+        logger.info('This is another info message')
+        flush_logs()
+        with open(path, 'r', encoding='utf-8') as log:
+            self.assertEqual(len(log.readlines()), 1)
+        self.assertEqual(len(logger.logger.handlers), 1)
@@ -0,0 +1,70 @@
+'''
+Author: dkl
+Description: 股票池和申万行业成分时点索引测试
+Date: 2026-10-20 21:05:52
+'''
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from database.membership import MembershipBuilder, MembershipIndex
+
+
+class FakeBuilder(MembershipBuilder):
+    """
+    不连接数据库, 用给定的数据生成索引
+    """
+
+    def __init__(self, index_dir):
+        self.index_dir = index_dir
+
+    def _read_data(self):
+        date_arr = np.array([20230103, 20230104, 20230105, 20230106, 20230109], dtype=np.int32)
+        stock_df = pd.DataFrame({
+            'stock_code': ['000001.SZ', '000002.SZ', '600000.SH'],
+            'list_date': [19910403, 20230104, 19991110],
+            'delist_date': [np.nan, np.nan, 20230106],
+        })
+        member_df = pd.DataFrame({
+            'index_code': ['801780.SI', '801180.SI', '801780.SI'],
+            'con_code': ['000001.SZ', '000002.SZ', '600000.SH'],
+            'in_date': [20230101, 20230105, 20230101],
+            'out_date': [np.nan, np.nan, 20230105],
+        })
+        return date_arr, stock_df, member_df
+
+
+class TestMembership(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.index_dir = tempfile.mkdtemp()
+        FakeBuilder(cls.index_dir).build()
+        cls.membership = MembershipIndex(cls.index_dir)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.index_dir)
+
+    def test_universe(self):
+        self.assertEqual(self.membership.get_universe('20230103'), ['000001.SZ', '600000.SH'])
+        # 退市日当天不在股票池中
+        self.assertEqual(self.membership.get_universe('20230106'), ['000001.SZ', '000002.SZ'])
+        # 非交易日取之前最近的交易日
+        self.assertEqual(self.membership.get_universe('20230108'), ['000001.SZ', '000002.SZ'])
+        with self.assertRaises(ValueError):
+            self.membership.get_universe('20221230')
+
+    def test_industry(self):
+        self.assertEqual(self.membership.get_industry('20230104', '801780.SI'),
+                         ['000001.SZ', '600000.SH'])
+        industry_sr = self.membership.get_industry('20230105')
+        self.assertEqual(industry_sr.to_dict(), {'000001.SZ': '801780.SI', '000002.SZ': '801180.SI'})
+
+    def test_panel(self):
+        universe_df = self.membership.get_universe_panel('20230104', '20230106')
+        self.assertEqual(universe_df.index.tolist(), ['20230104', '20230105', '20230106'])
+        self.assertEqual(universe_df.sum(axis=1).tolist(), [3, 3, 2])
+        industry_df = self.membership.get_industry_panel(index_code='801180.SI')
+        self.assertEqual(industry_df['000002.SZ'].tolist(), [False, False, True, True, True])
@@ -0,0 +1,33 @@
+'''
+Author: dkl
+Description: 结构化指标测试
+Date: 2026-10-20 09:40:18
+'''
+import unittest
+from utils.metrics import MetricsRegistry
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_counter(self):
+        registry = MetricsRegistry()
+        counter = registry.counter('calls_total', '调用次数', ['endpoint'])
+        counter.inc(endpoint='daily')
+        counter.inc(2, endpoint='daily')
+        self.assertEqual(counter.get(endpoint='daily'), 3)
+        self.assertIs(registry.counter('calls_total', '调用次数', ['endpoint']), counter)
+        self.assertIn('calls_total{endpoint="daily"} 3', registry.to_text())
+
+    def test_histogram(self):
+        registry = MetricsRegistry()
+        hist = registry.histogram('latency_seconds', '耗时', ['endpoint'],
+                                  buckets=(0.1, 1.0))
+        for value in [0.05, 0.5, 0.5, 2.0]:
+            hist.observe(value, endpoint='daily')
+        self.assertEqual(hist.get(endpoint='daily'), (3.05, 4))
+        self.assertEqual(hist.quantile(0.5, endpoint='daily'), 1.0)
+        text = registry.to_text()
+        self.assertIn('latency_seconds_bucket{endpoint="daily",le="0.1"} 1', text)
+        self.assertIn('latency_seconds_bucket{endpoint="daily",le="1.0"} 3', text)
+        self.assertIn('latency_seconds_bucket{endpoint="daily",le="+Inf"} 4', text)
+        self.assertIn('latency_seconds_count{endpoint="daily"} 4', text)
@@ -0,0 +1,39 @@
+'''
+Author: dkl
+Description: 紧凑表结构迁移测试
+Date: 2026-10-21 18:12:40
+'''
+import unittest
+from types import SimpleNamespace
+from database.migration import SchemaMigration, compact_column_type
+
+
+def _get_conn(version_info, is_mariadb=False):
+    dialect = SimpleNamespace(server_version_info=version_info, is_mariadb=is_mariadb)
+    return SimpleNamespace(dialect=dialect)
+
+
+class TestMigration(unittest.TestCase):
+
+    def test_compact_column_type(self):
+        self.assertEqual(compact_column_type('asharedailyprices', 'trade_date', 'varchar(8)'), 'int')
+        self.assertEqual(compact_column_type('asharedailyprices', 'stock_code', 'varchar(20)'), 'char(9)')
+        self.assertEqual(compact_column_type('asharedailyprices', 'close', 'decimal(20,4)'), 'double')
+        self.assertEqual(compact_column_type('ashareincome', 'revenue', 'decimal(20,4)'), 'decimal(20,4)')
+
+    def test_chunk_where(self):
+        migration = SchemaMigration.__new__(SchemaMigration)
+        bound_lst = ['20230103', '20230201']
+        self.assertEqual(migration._get_chunk_where('trade_date', bound_lst, 0),
+                         "where (trade_date<'20230201' or trade_date is null)")
+        self.assertEqual(migration._get_chunk_where('trade_date', bound_lst, 1),
+                         "where trade_date>='20230201'")
+        self.assertEqual(migration._get_chunk_where(None, [None], 0), '')
+
+    def test_locked_rename(self):
+        migration = SchemaMigration.__new__(SchemaMigration)
+        self.assertTrue(migration._check_locked_rename(_get_conn((8, 0, 13))))
+        self.assertTrue(migration._check_locked_rename(_get_conn((8, 4, 0))))
+        self.assertFalse(migration._check_locked_rename(_get_conn((8, 0, 12))))
+        self.assertFalse(migration._check_locked_rename(_get_conn((5, 7, 44))))
+        self.assertFalse(migration._check_locked_rename(_get_conn((10, 11, 6), is_mariadb=True)))
@@ -0,0 +1,103 @@
+'''
+Author: dkl
+Description: 常用日频字段面板缓存测试
+Date: 2026-10-20 23:20:16
+'''
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+from database import panel
+from database.panel import PanelCache, PanelCacheBuilder
+
+
+class SQLiteBuilder(PanelCacheBuilder):
+    """
+    使用SQLite数据库的面板缓存生成器
+    """
+
+    def __init__(self, engine, panel_dir):
+        self.database = "stk_data"
+        self.engine = engine
+        self.panel_dir = panel_dir
+        self.start_date = 20230101
+        self.meta = None
+        self.dates = None
+        self.codes = None
+        self.code_dct = None
+        self._arr_dct = {}
+        self._count_dct = {}
+
+
+def _insert_prices(engine, date_lst, code_lst):
+    df = pd.DataFrame([(d, c) for d in date_lst for c in code_lst],
+                      columns=['trade_date', 'stock_code'])
+    df['close'] = np.arange(len(df), dtype=float)
+    for col in ['adj_factor', 'vol', 'amount']:
+        df[col] = 1.0
+    df.to_sql('asharedailyprices', engine, if_exists='append', index=False)
+    df = df[['trade_date', 'stock_code']].assign(total_mv=1.0, turnover_rate=1.0)
+    df.to_sql('asharedailybasic', engine, if_exists='append', index=False)
+
+
+class TestPanel(unittest.TestCase):
+
+    def setUp(self):
+        self.panel_dir = tempfile.mkdtemp()
+        # 流式读取在后台线程中预取, 使用数据库文件而不是每个线程各自一份的内存数据库
+        self.engine = create_engine('sqlite:///' + os.path.join(self.panel_dir, 'stk_data.db'))
+        self.code_slack = panel.code_slack
+        # 预留的列很少, 测试新增股票时扩容
+        panel.code_slack = 1
+        pd.DataFrame({'cal_date': [20230103, 20230104, 20230105], 'is_open': 1}).to_sql(
+            'asharetradecal', self.engine, index=False)
+
+    def tearDown(self):
+        panel.code_slack = self.code_slack
+        self.engine.dispose()
+        shutil.rmtree(self.panel_dir)
+
+    def test_update(self):
+        _insert_prices(self.engine, [20230103, 20230104], ['000001.SZ', '000002.SZ'])
+        SQLiteBuilder(self.engine, self.panel_dir).update()
+        cache = PanelCache(self.panel_dir)
+        close_df = cache.get_panel('close')
+        self.assertEqual(close_df.index.tolist(), ['20230103', '20230104'])
+        self.assertEqual(close_df.values.tolist(), [[0.0, 1.0], [2.0, 3.0]])
+        self.assertTrue(np.shares_memory(close_df.values, cache.get_array('close')))
+        # 新增交易日、新股票和延长的交易日历
+        pd.DataFrame({'cal_date': [20240102], 'is_open': 1}).to_sql(
+            'asharetradecal', self.engine, if_exists='append', index=False)
+        _insert_prices(self.engine, [20230105, 20240102], ['000001.SZ', '600000.SH'])
+        SQLiteBuilder(self.engine, self.panel_dir).update(['asharedailyprices'])
+        cache = PanelCache(self.panel_dir)
+        close_df = cache.get_panel('close', start_date='20230104')
+        self.assertEqual(close_df.columns.tolist(), ['000001.SZ', '000002.SZ', '600000.SH'])
+        self.assertEqual(close_df.index.tolist(), ['20230104', '20230105', '20240102'])
+        self.assertEqual(close_df.loc['20240102'].tolist()[0], 2.0)
+        self.assertTrue(np.isnan(close_df.loc['20230105', '000002.SZ']))
+        # asharedailybasic没有更新, 只包括已写入的交易日
+        self.assertEqual(len(cache.get_panel('total_mv')), 2)
+
+    def test_update_history(self):
+        _insert_prices(self.engine, [20230105], ['000001.SZ'])
+        SQLiteBuilder(self.engine, self.panel_dir).update(['asharedailyprices'])
+        # 回填早于已写入日期的交易日, 并修复行数过少的交易日
+        _insert_prices(self.engine, [20230103], ['000001.SZ'])
+        _insert_prices(self.engine, [20230105], ['000002.SZ'])
+        SQLiteBuilder(self.engine, self.panel_dir).update(['asharedailyprices'])
+        close_df = PanelCache(self.panel_dir).get_panel('close')
+        self.assertEqual(close_df.index.tolist(), ['20230103', '20230104', '20230105'])
+        self.assertEqual(close_df.loc['20230103', '000001.SZ'], 0.0)
+        self.assertEqual(close_df.loc['20230105'].tolist(), [0.0, 0.0])
+        self.assertTrue(close_df.loc['20230104'].isna().all())
+        # 表中删除的交易日在面板中清空
+        with self.engine.connect() as conn:
+            conn.execute('delete from asharedailyprices where trade_date=20230103')
+        SQLiteBuilder(self.engine, self.panel_dir).update(['asharedailyprices'])
+        close_df = PanelCache(self.panel_dir).get_panel('close')
+        self.assertTrue(close_df.loc['20230103'].isna().all())
+        self.assertEqual(close_df.loc['20230105'].tolist(), [0.0, 0.0])
@@ -0,0 +1,32 @@
+'''
+Author: dkl
+Description: 分区子句测试
+Date: 2026-10-19 20:58:13
+'''
+import unittest
+from database.partition import get_partition_clause, get_year_partition_sql
+
+
+class TestPartition(unittest.TestCase):
+
+    def test_get_year_partition_sql(self):
+        self.assertEqual(get_year_partition_sql(2023),
+                         'PARTITION p2023 VALUES LESS THAN (20240101)')
+
+    def test_get_partition_clause(self):
+        part_spec = {'PARTITION_METHOD': 'RANGE',
+                     'PARTITION_EXPRESSION': 'trade_date',
+                     'START_YEAR': 2021}
+        clause = get_partition_clause(part_spec, end_year=2023)
+        print(clause)
+        self.assertIn('PARTITION BY RANGE (trade_date)', clause)
+        self.assertIn('PARTITION p2023 VALUES LESS THAN (20240101)', clause)
+        self.assertTrue(clause.endswith('PARTITION pmax VALUES LESS THAN MAXVALUE\n)'))
+        self.assertEqual(clause.count('PARTITION p'), 4)
+
+    def test_unsupported_method(self):
+        part_spec = {'PARTITION_METHOD': 'HASH',
+                     'PARTITION_EXPRESSION': 'stock_code',
+                     'START_YEAR': 2021}
+        with self.assertRaises(ValueError):
+            get_partition_clause(part_spec, end_year=2023)
@@ -0,0 +1,48 @@
+'''
+Author: dkl
+Description: 下载流水线测试
+Date: 2026-10-19 15:20:41
+'''
+import unittest
+import pandas as pd
+from download.pipeline import Pipeline, join_units
+from utils.transform import normalize_df
+
+
+def fetch(unit):
+    df = pd.DataFrame({'trade_date': [unit, unit], 'ts_code': ['A', 'A']})
+    return df, ['trade_date', 'stock_code'], {'ts_code': 'stock_code'}, \
+        None, ['trade_date', 'stock_code']
+
+
+class TestPipeline(unittest.TestCase):
+
+    def test_run(self):
+        res_lst = []
+
+        def store(unit_lst, df):
+            res_lst.append(df)
+
+        pipeline = Pipeline(fetch, normalize_df, store, fetch_workers=2,
+                            transform_workers=2, batch_size=3, progress=False)
+        stats = pipeline.run([str(i) for i in range(10)])
+        df = pd.concat(res_lst)
+        print(stats)
+        self.assertEqual(len(df), 10)
+        self.assertEqual(stats['store'].count, 10)
+
+    def test_fetch_error(self):
+        def bad_fetch(unit):
+            if unit == 3:
+                raise TimeoutError('The exception count has reached maxtries')
+            return fetch(str(unit))
+
+        pipeline = Pipeline(bad_fetch, normalize_df, None,
+                            transform_workers=0, progress=False)
+        with self.assertRaises(TimeoutError):
+            pipeline.run(range(100))
+
+    def test_join_units(self):
+        self.assertEqual(join_units(['20230103']), '20230103')
+        self.assertEqual(join_units(['20230103', '20230104']),
+                         '20230103-20230104')
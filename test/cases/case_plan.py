@@ -0,0 +1,52 @@
+'''
+Author: dkl
+Description: 下载窗口、下载计划和命令行测试
+Date: 2026-10-20 16:21:05
+'''
+import unittest
+from download.plan import DownloadWindow, PlanItem, select_missing_lst, set_window
+from main_func.cli import get_parser
+from utils.downloader import TushareDownloader
+
+
+class TestPlan(unittest.TestCase):
+
+    def test_select_missing(self):
+        all_lst = ['20230103', '20230104', '20230105', '20230106', '20230109']
+        exist_lst = ['20230104', '20230105']
+        window = DownloadWindow()
+        self.assertEqual(select_missing_lst(all_lst, exist_lst, window),
+                         ['20230103', '20230106', '20230109'])
+        window = DownloadWindow(mode='incremental')
+        self.assertEqual(select_missing_lst(all_lst, exist_lst, window),
+                         ['20230106', '20230109'])
+        # 表为空时incremental与backfill相同
+        self.assertEqual(select_missing_lst(all_lst, [], window), all_lst)
+        window = DownloadWindow(start_date='20230104', end_date='20230106')
+        self.assertEqual(select_missing_lst(all_lst, exist_lst, window), ['20230106'])
+
+    def test_set_window(self):
+        with self.assertRaises(ValueError):
+            set_window(mode='full')
+        with self.assertRaises(ValueError):
+            set_window('20230201', '20230101')
+        set_window()
+
+    def test_estimate_sleep(self):
+        item = PlanItem('asharedailyprices', 'trade_date', ['20230103', '20230104'], 2,
+                        fixed_calls=1)
+        self.assertEqual(item.api_calls, 5)
+        downloader = TushareDownloader(sleeptime=60, maxreqs=300)
+        self.assertEqual(downloader.estimate_sleep(301), (0, 0))
+        self.assertEqual(downloader.estimate_sleep(302), (1, 60))
+        self.assertEqual(downloader.estimate_sleep(0), (0, 0))
+
+    def test_parser(self):
+        parser = get_parser()
+        args = parser.parse_args(['--tasks', 'futdaily', '--start-date', '20230101',
+                                  '--mode', 'incremental', '--dry-run'])
+        self.assertEqual(args.tasks, ['futdaily'])
+        self.assertEqual(args.start_date, '20230101')
+        self.assertTrue(args.dry_run)
+        with self.assertRaises(SystemExit):
+            parser.parse_args(['--start-date', '2023-01-01'])
@@ -0,0 +1,35 @@
+'''
+Author: dkl
+Description: 性能剖析测试
+Date: 2026-10-20 10:48:52
+'''
+import os
+import tempfile
+import time
+import unittest
+import pandas as pd
+from utils.profiler import TaskProfiler, hotpath_seconds
+
+
+class TestProfiler(unittest.TestCase):
+
+    def test_task(self):
+        origin_concat = pd.concat
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            profiler = TaskProfiler(enabled=True, mode='sampling', interval=0.001,
+                                    output_dir=tmp_dir)
+            with profiler.task('case_profiler'):
+                pd.concat([pd.DataFrame({'a': [1]}), pd.DataFrame({'a': [2]})])
+                time.sleep(0.05)
+            profiler.close()
+            path = os.path.join(profiler.output_dir, 'case_profiler')
+            self.assertTrue(os.path.exists(path + '.folded'))
+            self.assertTrue(os.path.exists(path + '_top.txt'))
+        self.assertIs(pd.concat, origin_concat)
+        self.assertEqual(hotpath_seconds.get(task='case_profiler', op='pd.concat')[1], 1)
+
+    def test_disabled(self):
+        origin_concat = pd.concat
+        profiler = TaskProfiler(enabled=False)
+        with profiler.task('case_profiler_disabled'):
+            self.assertIs(pd.concat, origin_concat)
@@ -0,0 +1,66 @@
+'''
+Author: dkl
+Description: 流式读取测试
+Date: 2026-10-21 10:02:13
+'''
+import os
+import shutil
+import tempfile
+import unittest
+import pandas as pd
+from sqlalchemy import create_engine
+from database.database import DataBase
+from database.reader import prefetch_iter, stream_query
+
+
+class SQLiteDataBase(DataBase):
+
+    def __init__(self, engine):
+        self.database = 'stk_data'
+        self.engine = engine
+
+
+class TestReader(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.engine = create_engine('sqlite:///' + os.path.join(self.tmp_dir, 'test.db'))
+        pd.DataFrame({'trade_date': range(20230101, 20230111), 'close': 1.5}).to_sql(
+            'asharedailyprices', self.engine, index=False)
+
+    def tearDown(self):
+        self.engine.dispose()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_stream_query(self):
+        df_lst = list(stream_query(self.engine, 'select * from asharedailyprices', chunksize=4))
+        self.assertEqual([len(df) for df in df_lst], [4, 4, 2])
+        self.assertEqual(df_lst[0].columns.tolist(), ['trade_date', 'close'])
+        # 结果为空时返回只有列名的空表
+        df_lst = list(stream_query(self.engine, 'select close from asharedailyprices where 1=0'))
+        self.assertEqual(len(df_lst), 1)
+        self.assertEqual(df_lst[0].columns.tolist(), ['close'])
+
+    def test_prefetch(self):
+        sql = 'select * from asharedailyprices'
+        df = pd.concat(prefetch_iter(stream_query(self.engine, sql, chunksize=3), 2))
+        self.assertEqual(df['trade_date'].tolist(), list(range(20230101, 20230111)))
+        # 提前结束遍历
+        for df in prefetch_iter(stream_query(self.engine, sql, chunksize=3), 1):
+            break
+        self.assertEqual(len(df), 3)
+        with self.assertRaises(Exception):
+            list(prefetch_iter(stream_query(self.engine, 'select * from nosuch'), 1))
+
+    def test_read_sql_to_csv(self):
+        path = os.path.join(self.tmp_dir, 'out.csv')
+        pd.DataFrame({'a': [1]}).to_csv(path, index=False)
+        db = SQLiteDataBase(self.engine)
+        # 读取失败时原文件不变, 也不留下临时文件
+        with self.assertRaises(Exception):
+            db.read_sql_to_csv('select * from nosuch', path)
+        self.assertEqual(pd.read_csv(path)['a'].tolist(), [1])
+        self.assertFalse(os.path.exists(path + '.tmp'))
+        db.read_sql_to_csv('select * from asharedailyprices', path, chunksize=3)
+        self.assertEqual(pd.read_csv(path)['trade_date'].tolist(), list(range(20230101, 20230111)))
+        self.assertFalse(os.path.exists(path + '.tmp'))
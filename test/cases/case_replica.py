@@ -0,0 +1,81 @@
+'''
+Author: dkl
+Description: 嵌入式分析副本测试
+Date: 2026-10-21 15:06:52
+'''
+import os
+import shutil
+import tempfile
+import unittest
+import pandas as pd
+from sqlalchemy import create_engine
+from database.catalog import build_embedded_create_table_sql, get_catalog
+from database.replica import ReplicaReader, ReplicaSync
+
+
+class SQLiteSync(ReplicaSync):
+    """
+    以SQLite数据库代替MySQL的副本同步
+    """
+
+    def __init__(self, engine, replica_dir):
+        self.database = 'stk_data'
+        self.engine = engine
+        self.backend = 'sqlite'
+        self.path = os.path.join(replica_dir, 'stk_data.sqlite')
+
+
+def _insert_prices(engine, date_lst, code_lst):
+    df = pd.DataFrame([(d, c) for d in date_lst for c in code_lst],
+                      columns=['trade_date', 'stock_code'])
+    df['close'] = 10.0
+    df.to_sql('asharedailyprices', engine, if_exists='append', index=False)
+
+
+class TestReplica(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.engine = create_engine('sqlite:///' + os.path.join(self.tmp_dir, 'source.db'))
+        table_schema = get_catalog().get_table('stk_data', 'asharedailyprices')
+        with self.engine.connect() as conn:
+            for sql in build_embedded_create_table_sql(table_schema):
+                conn.execute(sql)
+        _insert_prices(self.engine, [20230103, 20230105], ['000001.SZ', '600000.SH'])
+        self.sync = SQLiteSync(self.engine, self.tmp_dir)
+
+    def tearDown(self):
+        self.engine.dispose()
+        shutil.rmtree(self.tmp_dir)
+
+    def _read(self):
+        with ReplicaReader('stk_data', 'sqlite', self.tmp_dir) as reader:
+            return reader.read_table('asharedailyprices', ['trade_date', 'stock_code', 'close'])
+
+    def test_sync(self):
+        meta_df = self.sync.sync(['asharedailyprices'], verify=False)
+        self.assertEqual(meta_df['n_rows'].tolist(), [4])
+        self.assertEqual(meta_df['watermark'].tolist(), ['20230105'])
+        # 增量同步只复制最新水位及之后的日期
+        _insert_prices(self.engine, [20230106], ['000001.SZ', '600000.SH'])
+        meta_df = self.sync.sync(['asharedailyprices'], verify=False)
+        self.assertEqual(meta_df['n_rows'].tolist(), [4])
+        self.assertEqual(len(self._read()), 6)
+        # 水位之前补下载的日期只在verify时复制
+        _insert_prices(self.engine, [20230104], ['000001.SZ'])
+        self.sync.sync(['asharedailyprices'], verify=False)
+        self.assertEqual(len(self._read()), 6)
+        meta_df = self.sync.sync(['asharedailyprices'], verify=True)
+        self.assertEqual(meta_df['n_rows'].tolist(), [3])
+        df = self._read()
+        self.assertEqual(len(df), 7)
+        self.assertFalse(df.duplicated(['trade_date', 'stock_code']).any())
+        with ReplicaReader('stk_data', 'sqlite', self.tmp_dir) as reader:
+            df = reader.read_table('asharedailyprices', start_date='20230104', end_date='20230105')
+            self.assertEqual(sorted(df['trade_date'].unique()), [20230104, 20230105])
+            self.assertEqual(reader.get_table_lst(), ['asharedailyprices'])
+            self.assertEqual(reader.get_meta()['watermark'].tolist(), ['20230106'])
+
+    def test_missing_replica(self):
+        with self.assertRaises(FileNotFoundError):
+            ReplicaReader('fut_data', 'sqlite', self.tmp_dir)
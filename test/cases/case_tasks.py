@@ -0,0 +1,32 @@
+'''
+Author: dkl
+Description: 下载任务注册表测试
+Date: 2026-10-20 12:03:15
+'''
+import importlib
+import unittest
+from download.plan import DownloadWindow
+from main_func.run_daily import is_partial_run
+from main_func.tasks import get_daily_task_lst, get_task, task_dct
+
+
+class TestTasks(unittest.TestCase):
+
+    def test_registry(self):
+        for task_name, task in task_dct.items():
+            cls = getattr(importlib.import_module(task.module), task.class_name)
+            self.assertTrue(callable(getattr(cls, task.method)), task_name)
+        self.assertNotIn('asharefinance_code', get_daily_task_lst())
+        self.assertEqual(get_daily_task_lst()[0], 'tradecal')
+
+    def test_unknown_task(self):
+        with self.assertRaises(ValueError):
+            get_task('unknown')
+
+    def test_partial_run(self):
+        window = DownloadWindow()
+        self.assertFalse(is_partial_run(None, window))
+        self.assertFalse(is_partial_run(get_daily_task_lst() + ['asharefinance_code'], window))
+        self.assertTrue(is_partial_run(['futdaily'], window))
+        self.assertTrue(is_partial_run(None, DownloadWindow(start_date='20230101')))
+        self.assertTrue(is_partial_run(None, DownloadWindow(date_lst=('20230103',))))
@@ -0,0 +1,73 @@
+'''
+Author: dkl
+Description: 入库校验测试
+Date: 2026-10-20 19:26:41
+'''
+import json
+import unittest
+import numpy as np
+import pandas as pd
+from download.asharedaily import _transform_dailyprices
+from database.validation import OHLC, NotNull, Range, Unique, get_quarantine_df, get_rule_lst, validate_df
+
+
+class TestValidation(unittest.TestCase):
+
+    def setUp(self):
+        self.df = pd.DataFrame({
+            'trade_date': [20230103, 20230103, 20230103, 20230103],
+            'stock_code': ['000001.SZ', '000002.SZ', None, '000002.SZ'],
+            'open': [10.0, 10.0, 10.0, 10.0],
+            'high': [11.0, 9.0, 11.0, 11.0],
+            'low': [9.0, 8.0, 9.0, 9.0],
+            'close': [10.5, 8.5, 10.5, -1.0],
+        })
+
+    def test_rules(self):
+        self.assertEqual(NotNull(['stock_code']).check(self.df).tolist(),
+                         [False, False, True, False])
+        self.assertEqual(OHLC().check(self.df).tolist(), [False, True, False, True])
+        self.assertEqual(Range('close', 0, strict=True).check(self.df).tolist(),
+                         [False, False, False, True])
+        self.assertEqual(Unique(['trade_date', 'stock_code']).check(self.df).tolist(),
+                         [False, True, False, False])
+
+    def test_validate_df(self):
+        rule_lst = [NotNull(['stock_code']), OHLC(), Range('close', 0), Range('vol', 0)]
+        good_df, bad_df = validate_df(self.df, rule_lst)
+        self.assertEqual(good_df['stock_code'].tolist(), ['000001.SZ'])
+        self.assertEqual(bad_df['rule_name'].tolist(), ['ohlc', 'not_null', 'ohlc,range_close'])
+        good_df, bad_df = validate_df(self.df.iloc[:1], rule_lst)
+        self.assertEqual(len(good_df), 1)
+        self.assertEqual(len(bad_df), 0)
+
+    def test_rule_lst(self):
+        name_lst = [rule.name for rule in get_rule_lst('stk_data', 'asharedailyprices')]
+        for name in ['not_null', 'finite', 'duplicate_key', 'ohlc', 'range_adj_factor']:
+            self.assertIn(name, name_lst)
+        df = pd.DataFrame({'trade_date': [20230103], 'stock_code': ['000001.SZ'],
+                           'pct_chg': [np.inf]})
+        _, bad_df = validate_df(df, get_rule_lst('stk_data', 'asharedailyprices'))
+        self.assertEqual(bad_df['rule_name'].tolist(), ['finite'])
+
+    def test_zero_pre_close(self):
+        # 新股上市首日pre_close为0, 涨跌幅为空, 行情仍然写入
+        price_df = pd.DataFrame({
+            'trade_date': [20230103], 'ts_code': ['301000.SZ'], 'open': [10.0], 'high': [12.0],
+            'low': [9.5], 'close': [11.0], 'pre_close': [0.0], 'vol': [100.0], 'amount': [1100.0],
+        })
+        adj_df = pd.DataFrame({'trade_date': [20230103], 'ts_code': ['301000.SZ'], 'adj_factor': [1.0]})
+        columns = ['trade_date', 'stock_code', 'open', 'high', 'low', 'close', 'pre_close',
+                   'pct_chg', 'vol', 'amount', 'adj_factor']
+        df = _transform_dailyprices(price_df, adj_df, columns)
+        self.assertTrue(np.isnan(df['pct_chg'].iloc[0]))
+        good_df, bad_df = validate_df(df, get_rule_lst('stk_data', 'asharedailyprices'))
+        self.assertEqual(len(good_df), 1)
+        self.assertEqual(len(bad_df), 0)
+
+    def test_quarantine(self):
+        _, bad_df = validate_df(self.df, [OHLC()])
+        df = get_quarantine_df(bad_df, 'asharedailyprices', '股票日频数据_20230103')
+        self.assertEqual(df.columns.tolist(),
+                         ['table_name', 'rule_name', 'data_name', 'row_data', 'quarantine_time'])
+        self.assertEqual(json.loads(df['row_data'].iloc[0])['close'], 8.5)
@@ -0,0 +1,44 @@
+'''
+Author: dkl
+Date: 2026-10-20 11:20:09
+Description: 惰性的tushare客户端. 第一次调用接口时才读取token并创建ts.pro_api,
+进程内只创建一次. 只导入下载模块不会读取配置, 也不会导入tushare
+'''
+import threading
+from utils.conf import get_settings
+
+# 进程内共享的ts.pro_api
+_pro = None
+_pro_lock = threading.Lock()
+
+
+def get_pro():
+    """
+    获取进程内共享的ts.pro_api, 第一次调用时创建
+
+    Returns
+    -------
+    tushare.pro.client.DataApi
+    """
+    global _pro
+    with _pro_lock:
+        if _pro is None:
+            import tushare as ts
+            tstoken = get_settings().tushare.tstoken
+            _pro = ts.pro_api(tstoken)
+        return _pro
+
+
+class LazyProApi(object):
+    """
+    ts.pro_api的惰性代理. pro.daily等属性在第一次访问时才创建真正的客户端
+
+    使用方法:
+        pro = LazyProApi()
+        df = downloader.download(pro.daily, trade_date='20230103')
+    """
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(get_pro(), name)
@@ -1,18 +1,317 @@
 '''
 Author: dkl
 Date: 2023-12-18 22:27:07
-Description: 配置文件读取
+Description: 配置文件读取. config.ini在进程内只解析一次, 生成不可变的带类型配置对象Settings,
+可以用环境变量QDB_<SECTION>_<OPTION>覆盖, 如QDB_MYSQL_PASSWORD
 '''
 from configparser import ConfigParser
 import os
+import threading
+from types import MappingProxyType
+from typing import NamedTuple, Tuple
+
+# 默认的配置文件位置
+default_conf_path = "./config/config.ini"
+# 覆盖配置的环境变量前缀
+env_prefix = "QDB_"
+
+
+class TushareSettings(NamedTuple):
+    tstoken: str = ""
+
+
+class MysqlSettings(NamedTuple):
+    host: str = "localhost"
+    port: str = "3306"
+    user: str = "root"
+    password: str = ""
+    pool_size: int = 5
+    max_overflow: int = 10
+    pool_recycle: int = 3600
+    pool_pre_ping: bool = True
+
+
+class EmailSettings(NamedTuple):
+    sender: str = ""
+    password: str = ""
+    receiver: str = ""
+
+
+class TableStructureSettings(NamedTuple):
+    table_structure_path: str = "./table_structure/table_structure.csv"
+    table_index_path: str = "./table_structure/table_index.csv"
+    table_comment_path: str = "./table_structure/table_comment.csv"
+    table_partition_path: str = "./table_structure/table_partition.csv"
+    clear_past_table_structure_days: int = 7
+    partition_future_years: int = 2
+    init_workers: int = 4
+    database_lst: Tuple[str, ...] = ("stk_data", "fund_data", "bond_data", "fut_data", "opt_data")
+
+
+class LogSettings(NamedTuple):
+    clear_past_log_days: int = 7
+    level: str = "INFO"
+
+
+class DownloaderSettings(NamedTuple):
+    # tushare限流: 每请求maxreqs次休眠sleeptime秒, 连续报错maxtries次后放弃
+    sleeptime: float = 60.0
+    maxreqs: int = 300
+    maxtries: int = 500
+
+
+class PipelineSettings(NamedTuple):
+    transform_workers: int = 2
+    fetch_workers: int = 1
+    store_workers: int = 1
+    queue_size: int = 8
+    batch_size: int = 1
+
+
+class WriterSettings(NamedTuple):
+    max_rows: int = 200000
+    max_bytes: int = 268435456
+    flush_seconds: float = 60.0
+    chunksize: int = 5000
+
+
+class ReaderSettings(NamedTuple):
+    # 流式读取时每批的行数
+    chunksize: int = 50000
+    # 后台线程提前读取的批数, 为0时不预取
+    prefetch: int = 1
+
+
+class JobQueueSettings(NamedTuple):
+    # 每次领取的交易日个数. 报告期按数据表整体领取, 避免多个进程同时刷新最近几期的财务数据
+    claim_size: int = 20
+    # 领取后超过lease_seconds秒未完成的工作单元视为工作进程已退出, 可以被重新领取
+    lease_seconds: int = 7200
+    # 同一个工作单元最多领取的次数, 超过后标记为failed
+    max_attempts: int = 3
+    # 没有可领取的工作单元但其他进程仍在运行时, 等待的秒数
+    poll_seconds: float = 30.0
+    # 本机启动多个工作进程时依次使用的tushare token, 为空时都使用[tushare]的tstoken
+    token_lst: Tuple[str, ...] = ()
+
+
+class CacheSettings(NamedTuple):
+    cache_dir: str = "./tmp/cache"
+    # 每日运行后是否生成股票池和申万行业成分的时点索引
+    build_membership: bool = True
+    # 下载日频数据后是否更新常用字段的面板缓存, 以及面板缓存的起始日期
+    build_panel: bool = True
+    panel_start_date: str = "19901219"
+
+
+class ReplicaSettings(NamedTuple):
+    # 嵌入式副本的类型: duckdb, sqlite, 或auto(安装了duckdb时使用duckdb, 否则使用sqlite)
+    backend: str = "auto"
+    replica_dir: str = "./tmp/replica"
+    # 同步的数据表, 为空时同步database.replica中登记的全部数据表
+    table_lst: Tuple[str, ...] = ()
+    # 是否按日期比较行数, 重新复制水位之前被修复过的日期
+    verify: bool = False
+    # 每日运行后是否同步副本
+    daily: bool = False
+
+
+class AuditSettings(NamedTuple):
+    # 每日运行后是否检查数据缺口
+    daily: bool = True
+    # 股票类数据表每个日期的行数不低于上市股票数的比例
+    min_coverage: float = 0.8
+    # 其他数据表每个日期的行数不低于前后peer_window期行数中位数的比例
+    min_peer_ratio: float = 0.5
+    peer_window: int = 21
+    # 财务数据最近几期每天都会重新下载, 不检查行数
+    skip_last_periods: int = 5
+
+
+class ValidationSettings(NamedTuple):
+    # 入库前是否校验数据
+    enabled: bool = True
+    # 不合格的数据是否写入隔离表dataquarantine
+    quarantine: bool = True
+
+
+class BenchmarkSettings(NamedTuple):
+    backend: str = "sqlite"
+    sqlite_dir: str = "./tmp/benchmark"
+    mysql_prefix: str = "bench_"
+    n_stocks: int = 5000
+    backfill_days: int = 250
+    finance_periods: int = 8
+    finance_code_stocks: int = 500
+    latency: float = 0.0
+    error_every: int = 0
+    retry_sleep: float = 0.01
+    isolate: bool = True
+    scenario_lst: Tuple[str, ...] = ("daily", "backfill", "finance_period", "finance_code")
+    result_path: str = "./benchmark/results.csv"
+
+
+class MetricsSettings(NamedTuple):
+    textfile_path: str = "./log/metrics.prom"
+    http_port: int = 0
+
+
+class ProfileSettings(NamedTuple):
+    enabled: bool = False
+    mode: str = "sampling"
+    top_n: int = 30
+    sample_interval: float = 0.005
+    output_dir: str = "./log/profile"
+
+
+# section与配置类的对应关系
+section_cls_dct = {
+    "tushare": TushareSettings,
+    "mysql": MysqlSettings,
+    "email": EmailSettings,
+    "table_structure": TableStructureSettings,
+    "log": LogSettings,
+    "downloader": DownloaderSettings,
+    "pipeline": PipelineSettings,
+    "writer": WriterSettings,
+    "reader": ReaderSettings,
+    "jobqueue": JobQueueSettings,
+    "cache": CacheSettings,
+    "replica": ReplicaSettings,
+    "audit": AuditSettings,
+    "validation": ValidationSettings,
+    "benchmark": BenchmarkSettings,
+    "metrics": MetricsSettings,
+    "profile": ProfileSettings,
+}
+
+
+def _convert(value, value_type):
+    """
+    将配置文件中的字符串转为字段类型
+    """
+    if value_type is bool:
+        return value.strip().lower() in ["true", "1", "yes", "on"]
+    if value_type == Tuple[str, ...]:
+        return tuple(i.strip() for i in value.split(",") if i.strip() != "")
+    return value_type(value)
+
+
+class Settings(NamedTuple):
+    """
+    不可变的配置对象. 每个section为一个带类型的NamedTuple, 如settings.mysql.pool_size.
+    raw为覆盖后的原始字符串{section: {option: value}}(只读), 供Config使用
+    """
+    tushare: TushareSettings
+    mysql: MysqlSettings
+    email: EmailSettings
+    table_structure: TableStructureSettings
+    log: LogSettings
+    downloader: DownloaderSettings
+    pipeline: PipelineSettings
+    writer: WriterSettings
+    reader: ReaderSettings
+    jobqueue: JobQueueSettings
+    cache: CacheSettings
+    replica: ReplicaSettings
+    audit: AuditSettings
+    validation: ValidationSettings
+    benchmark: BenchmarkSettings
+    metrics: MetricsSettings
+    profile: ProfileSettings
+    raw: MappingProxyType
+
+
+def load_settings(conf_path=default_conf_path, environ=None):
+    """
+    解析配置文件并应用环境变量覆盖, 生成配置对象
+
+    Parameters
+    ----------
+    conf_path: str. 配置文件位置，默认为'./config/config.ini'
+    environ: dict. 环境变量, 默认为None, 即os.environ
+
+    Returns
+    -------
+    Settings
+    """
+    if not os.path.exists(conf_path):
+        raise FileExistsError("conf_path does not exists!")
+    if environ is None:
+        environ = os.environ
+    conf = ConfigParser()
+    conf.read(conf_path)
+    raw = {section: dict(conf.items(section)) for section in conf.sections()}
+    # 环境变量覆盖, 如QDB_MYSQL_PASSWORD覆盖[mysql]的password
+    for key, value in environ.items():
+        if not key.startswith(env_prefix):
+            continue
+        name = key[len(env_prefix):].lower()
+        for section in sorted(set(raw.keys()) | set(section_cls_dct.keys()), key=len, reverse=True):
+            if name.startswith(section + "_"):
+                raw.setdefault(section, {})[name[len(section) + 1:]] = value
+                break
+    section_dct = {}
+    for section, cls in section_cls_dct.items():
+        option_dct = raw.get(section, {})
+        kwargs = {}
+        for field, value_type in cls.__annotations__.items():
+            if field not in option_dct:
+                continue
+            try:
+                kwargs[field] = _convert(option_dct[field], value_type)
+            except ValueError:
+                raise ValueError(f"配置[{section}] {field} = {option_dct[field]}的类型错误")
+        section_dct[section] = cls(**kwargs)
+    raw = MappingProxyType({k: MappingProxyType(v) for k, v in raw.items()})
+    return Settings(raw=raw, **section_dct)
+
+
+# 进程内共享的配置对象, 键为文件位置
+_settings_dct = {}
+_settings_lock = threading.Lock()
+
+
+def get_settings(conf_path=default_conf_path):
+    """
+    获取进程内共享的配置对象, 第一次调用时解析配置文件
+
+    Parameters
+    ----------
+    conf_path: str. 配置文件位置，默认为'./config/config.ini'
+
+    Returns
+    -------
+    Settings
+    """
+    with _settings_lock:
+        settings = _settings_dct.get(conf_path)
+        if settings is None:
+            settings = load_settings(conf_path)
+            _settings_dct[conf_path] = settings
+        return settings
+
+
+def reload_settings(conf_path=default_conf_path):
+    """
+    重新解析配置文件, 用于修改配置文件或环境变量之后
+
+    Returns
+    -------
+    Settings
+    """
+    with _settings_lock:
+        settings = load_settings(conf_path)
+        _settings_dct[conf_path] = settings
+        return settings
 
 
 class Config(object):
     """
-    配置文件读取
+    配置文件读取. 按section和option获取原始字符串, 与Settings共用同一次解析的结果
     """
 
-    def __init__(self, section, conf_path="./config/config.ini"):
+    def __init__(self, section, conf_path=default_conf_path):
         """
         构造函数
 
@@ -46,7 +345,5 @@ class Config(object):
         -------
         Dict. 配置文件信息
         """
-        conf = ConfigParser()
-        conf.read(self.conf_path)
-        conf_dct = dict(conf.items(self.section))
+        conf_dct = get_settings(self.conf_path).raw[self.section]
         return conf_dct[option]
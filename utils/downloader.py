@@ -4,8 +4,13 @@ Date: 2023-12-18 22:27:07
 Description: 下载器
 '''
 import datetime
+import threading
+import time
 from time import sleep
 
+import pandas as pd
+from utils import metrics
+from utils.conf import get_settings
 from utils.logger import Logger
 
 logger = Logger("TushareDownloader")
@@ -34,21 +39,56 @@ class Downloader(object):
         # 报错部分
         self._exceptcount = 0
         self._maxtries = maxtries
+        # 多线程下载时保护计数器
+        self._lock = threading.Lock()
 
 
 class TushareDownloader(Downloader):
-    def __init__(self, sleeptime=60, maxreqs=300, maxtries=500):
+    def __init__(self, sleeptime=None, maxreqs=None, maxtries=None):
         """
-        初始化类
+        初始化类. 参数为None时使用config.ini中[downloader]的配置(默认60s, 300次, 500次),
+        在第一次下载时才读取, 只导入下载模块不会读取配置
 
         Parameters
         ----------
-        sleeptime: int.休眠时间, 达到最大请求次数后休眠时间. 默认60s
-        maxreqs: int.最大允许请求次数，减小服务器压力.默认300
-        maxtries: int.允许连续报错的最大次数，默认为500
+        sleeptime: int.休眠时间, 达到最大请求次数后休眠时间.
+        maxreqs: int.最大允许请求次数，减小服务器压力.
+        maxtries: int.允许连续报错的最大次数.
         """
         super().__init__(sleeptime, maxreqs, maxtries)
 
+    def _resolve_limits(self):
+        """
+        用配置补全未指定的限流参数
+        """
+        if None not in (self._sleeptime, self._maxreqs, self._maxtries):
+            return
+        conf = get_settings().downloader
+        with self._lock:
+            if self._sleeptime is None:
+                self._sleeptime = conf.sleeptime
+            if self._maxreqs is None:
+                self._maxreqs = conf.maxreqs
+            if self._maxtries is None:
+                self._maxtries = conf.maxtries
+
+    def estimate_sleep(self, n_calls):
+        """
+        估计调用n_calls次接口时限流导致的休眠次数和休眠时间, 不考虑报错重试
+
+        Parameters
+        ----------
+        n_calls: int. 接口调用次数
+
+        Returns
+        -------
+        (int, float). 休眠次数和休眠时间(秒)
+        """
+        self._resolve_limits()
+        # 每调用maxreqs+1次后, 下一次调用前休眠
+        n_sleep = max(n_calls - 1, 0) // (self._maxreqs + 1)
+        return n_sleep, n_sleep * self._sleeptime
+
     def download(self, func, *args, **kwargs):
         """
         下载数据, 请求次数不能太多，超过限额就sleep。另外报错的时候也进行sleep
@@ -63,34 +103,51 @@ class TushareDownloader(Downloader):
         -------
         下载的数据。超过报错次数限额退出下载过程
         """
-        # 请求次数超过限额，sleep
-        if self._reqcount > self._maxreqs:
-            logger.warning("请求次数已满，开始sleep")
-            sleep(self._sleeptime)
-            self._reqcount = 0
+        self._resolve_limits()
+        # 请求次数超过限额，sleep. 持有锁休眠, 其他下载线程也一起等待
+        with self._lock:
+            if self._reqcount > self._maxreqs:
+                logger.warning("请求次数已满，开始sleep")
+                sleep(self._sleeptime)
+                metrics.api_sleep.inc(self._sleeptime, reason="quota")
+                self._reqcount = 0
         # 只有在报错次数小于最大允许次数时才会执行
+        # tushare的实际函数是query, 将名称传入args
+        endpoint = func.args[0]
         while self._exceptcount <= self._maxtries:
             start_time = datetime.datetime.now()
-            # tushare的实际函数是query, 将名称传入args 
-            logger.info(f"开始调用函数pro.{func.args[0]}")
+            start_perf = time.perf_counter()
+            logger.debug(f"开始调用函数pro.{endpoint}")
             try:
                 # 如果执行成功, 报错次数归0，请求次数+1，跳出循环
                 res = func(*args, **kwargs)
-                logger.info(f"完成函数pro.{func.args[0]}")
+                metrics.api_latency.observe(time.perf_counter() - start_perf, endpoint=endpoint)
+                metrics.api_calls.inc(endpoint=endpoint, status="ok")
+                if isinstance(res, pd.DataFrame):
+                    metrics.api_rows.inc(len(res), endpoint=endpoint)
+                    metrics.api_bytes.inc(
+                        int(res.memory_usage(index=False, deep=True).sum()), endpoint=endpoint
+                    )
                 end_time = datetime.datetime.now()
                 cost_time = (end_time - start_time).total_seconds()
-                logger.info("共用时: {}s\n".format(cost_time))
-                self._reqcount = self._reqcount + 1
-                self._exceptcount = 0
+                logger.debug(f"完成函数pro.{endpoint}, 共用时: {cost_time}s")
+                with self._lock:
+                    self._reqcount = self._reqcount + 1
+                    self._exceptcount = 0
                 return res
             # 否则就开始打印exception并进行sleep
             # 打印exception的目的在于如果出现函数本身有错误的情况可以及时发现
             except Exception as e:
+                metrics.api_latency.observe(time.perf_counter() - start_perf, endpoint=endpoint)
+                metrics.api_calls.inc(endpoint=endpoint, status="error")
+                metrics.api_retries.inc(endpoint=endpoint)
                 logger.warning(e)
-                self._exceptcount += 1
+                with self._lock:
+                    self._exceptcount += 1
+                    self._reqcount += 1
                 logger.warning("Exception count: %d" % self._exceptcount)
                 logger.warning("Force sleep...")
                 sleep(self._sleeptime)
-                self._reqcount += 1
+                metrics.api_sleep.inc(self._sleeptime, reason="error")
         # 报错次数超过最大允许次数就报错
         raise TimeoutError("The exception count has reached maxtries")
\ No newline at end of file
@@ -3,12 +3,97 @@ Author: dkl
 Date: 2023-12-18 22:27:07
 Description: 日志
 '''
+import atexit
 import logging
 import datetime
+import os
+import queue
+import threading
+from logging.handlers import QueueHandler, QueueListener
 from functools import wraps
+from utils.conf import get_settings
 from utils.sendemail import SendEmail
 
 today_date = datetime.datetime.today().strftime(r"%Y%m%d")
+format_str = "[%(asctime)s] %(name)s - %(levelname)s: %(message)s"
+# 每个日志文件一个队列和监听线程, 键为文件位置, 值为(QueueHandler, QueueListener)
+_queue_dct = {}
+_queue_lock = threading.Lock()
+_logger_lock = threading.Lock()
+
+
+def get_log_level():
+    """
+    读取config.ini中[log]的level, 如INFO、DEBUG. 生产环境用INFO, 每次调用的细节为DEBUG
+    """
+    return logging.getLevelName(get_settings().log.level.upper())
+
+
+def _get_queue_handler(file_dir):
+    """
+    获取日志文件对应的QueueHandler. 第一次获取时创建屏幕和文件两个handler,
+    由后台的QueueListener线程统一写出, 调用logger.info等不会阻塞在文件和屏幕I/O上
+    """
+    with _queue_lock:
+        if file_dir in _queue_dct:
+            return _queue_dct[file_dir][0]
+        level = get_log_level()
+        formatter = logging.Formatter(format_str)
+        # 屏幕输出
+        console_handler = logging.StreamHandler()
+        console_handler.setLevel(level)
+        console_handler.setFormatter(formatter)
+        # 文件输出
+        file_handler = logging.FileHandler(file_dir, encoding="utf-8")
+        file_handler.setLevel(level)
+        file_handler.setFormatter(formatter)
+        log_queue = queue.Queue(-1)
+        queue_handler = QueueHandler(log_queue)
+        listener = QueueListener(
+            log_queue, console_handler, file_handler, respect_handler_level=True
+        )
+        listener.start()
+        _queue_dct[file_dir] = (queue_handler, listener)
+        return queue_handler
+
+
+def flush_logs():
+    """
+    等待队列中的日志全部写出. 读取或发送日志文件之前调用
+    """
+    with _queue_lock:
+        for _, listener in _queue_dct.values():
+            # stop会先处理完队列中剩余的日志
+            listener.stop()
+            listener.start()
+
+
+def close_logs(file_dir=None):
+    """
+    写完队列中的日志后停止监听线程, 关闭日志文件, 并从日志器中移除对应的QueueHandler.
+    删除日志文件之前调用, 之后再写日志时重新打开文件
+
+    Parameters
+    ----------
+    file_dir: str. 日志文件位置, 默认为None, 即全部日志文件
+    """
+    with _queue_lock:
+        key_lst = [
+            key for key in _queue_dct
+            if (file_dir is None) or (os.path.abspath(key) == os.path.abspath(file_dir))
+        ]
+        for key in key_lst:
+            queue_handler, listener = _queue_dct.pop(key)
+            listener.stop()
+            for handler in listener.handlers:
+                handler.close()
+            for logger in list(logging.Logger.manager.loggerDict.values()):
+                if isinstance(logger, logging.Logger) and (queue_handler in logger.handlers):
+                    logger.removeHandler(queue_handler)
+
+
+# 进程退出前写完队列中的日志
+atexit.register(close_logs)
 
 
 class BasicLogger(object):
@@ -18,35 +103,44 @@ class BasicLogger(object):
 
     def __init__(self, name, file_dir=None):
         """
-        基本日志类的构造函数
+        基本日志类的构造函数. 同名日志器的handler只添加一次, 重复创建不会重复输出
 
         Parameters
         ----------
         name: str. 日志器名称
         log_file: str. 文件位置
         """
-        # 设定文件日志器
-        format_str = "[%(asctime)s] %(name)s - %(levelname)s: %(message)s"
-        self.formatter = logging.Formatter(format_str)
-        # 设定logger
-        self.logger = logging.getLogger(name)
-        self.logger.setLevel(logging.DEBUG)
         if file_dir is None:
             # 在log文件夹下创建文件
             self.file_dir = "./log/" + today_date + ".log"
         else:
             self.file_dir = file_dir
         self.file_name = self.file_dir.split("/")[-1]
-        # 屏幕输出
-        self.console_handler = logging.StreamHandler()
-        self.console_handler.setLevel(logging.DEBUG)
-        self.console_handler.setFormatter(self.formatter)
-        self.logger.addHandler(self.console_handler)
-        # 文件输出
-        self.file_handler = logging.FileHandler(self.file_dir, encoding="utf-8")
-        self.file_handler.setLevel(logging.DEBUG)
-        self.file_handler.setFormatter(self.formatter)
-        self.logger.addHandler(self.file_handler)
+        self.name = name
+        self._logger = None
+        self._queue_handler = None
+
+    @property
+    def logger(self):
+        """
+        logging.Logger. 第一次写日志时才设定级别和handler, 只导入模块不会打开日志文件.
+        close_logs关闭日志文件之后, 下次写日志时重新获取handler
+        """
+        if (self._logger is not None) and (self._queue_handler in self._logger.handlers):
+            return self._logger
+        with _logger_lock:
+            logger = logging.getLogger(self.name)
+            logger.setLevel(get_log_level())
+            logger.propagate = False
+            queue_handler = _get_queue_handler(self.file_dir)
+            if queue_handler not in logger.handlers:
+                logger.addHandler(queue_handler)
+            self._queue_handler = queue_handler
+            self._logger = logger
+            return self._logger
+
+    def debug(self, message):
+        self.logger.debug(message)
 
     def info(self, message):
         self.logger.info(message)
@@ -72,6 +166,7 @@ class Logger(BasicLogger, SendEmail):
         self.email_subject = "你数据库炸了-{date}".format(date=today_date)
 
     def send_error_email(self):
+        flush_logs()
         html = "数据库炸了，请查看以下日志!"
         attach = {
             "file": self.file_dir,
@@ -84,7 +179,7 @@ def logger_decorator(logger):
     def decorator(func):
         @wraps(func)
         def inner_wrapper(*args, **kwargs):
-            logger.info(f"开始调用函数{func.__name__}")
+            logger.debug(f"开始调用函数{func.__name__}")
             start_time = datetime.datetime.now()
             try:
                 result = func(*args, **kwargs)
@@ -92,10 +187,9 @@ def logger_decorator(logger):
                 logger.error(f"函数{func.__name__}出了问题，具体报错如下:")
                 logger.error(err_desc)
             else:
-                logger.info(f"完成函数{func.__name__}")
                 end_time = datetime.datetime.now()
                 cost_time = (end_time - start_time).total_seconds()
-                logger.info("共用时: {}s\n".format(cost_time))
+                logger.debug(f"完成函数{func.__name__}, 共用时: {cost_time}s")
                 return result
 
         return inner_wrapper
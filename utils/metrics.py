@@ -0,0 +1,330 @@
+'''
+Author: dkl
+Date: 2026-10-20 09:12:44
+Description: 结构化指标. 进程内的计数器和直方图, 按标签聚合, 导出为Prometheus文本格式
+(写入文件或通过本地HTTP端口提供), 并可汇总到日志中
+'''
+import bisect
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 默认的耗时分桶(秒)
+default_buckets = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+# 默认的行数分桶
+row_buckets = (10, 100, 1000, 5000, 10000, 50000, 100000, 500000, 1000000)
+
+
+def _format_labels(labelnames, labels, extra=None):
+    pair_lst = [f'{name}="{value}"' for name, value in zip(labelnames, labels)]
+    if extra is not None:
+        pair_lst.append(extra)
+    if len(pair_lst) == 0:
+        return ""
+    return "{" + ",".join(pair_lst) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter(object):
+    """
+    计数器, 只增不减
+    """
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._value_dct = {}
+        self._lock = threading.Lock()
+
+    def inc(self, value=1, **labels):
+        """
+        增加计数
+
+        Parameters
+        ----------
+        value: float. 增加的数值, 默认为1
+        labels: 标签, 如endpoint='daily'
+        """
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._value_dct[key] = self._value_dct.get(key, 0) + value
+
+    def get(self, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            return self._value_dct.get(key, 0)
+
+    def items(self):
+        with self._lock:
+            return list(self._value_dct.items())
+
+    def clear(self):
+        with self._lock:
+            self._value_dct.clear()
+
+    def to_text(self):
+        line_lst = [f"# HELP {self.name} {self.documentation}",
+                    f"# TYPE {self.name} counter"]
+        for key, value in sorted(self.items()):
+            line_lst.append(
+                f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            )
+        return line_lst
+
+
+class Histogram(object):
+    """
+    直方图, 记录观测值的分桶计数、总和与个数
+    """
+
+    def __init__(self, name, documentation, labelnames=(), buckets=default_buckets):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # {标签: [各分桶计数, 总和, 个数]}
+        self._value_dct = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        """
+        记录一个观测值
+
+        Parameters
+        ----------
+        value: float. 观测值, 如耗时(秒)或行数
+        labels: 标签, 如endpoint='daily'
+        """
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            if key not in self._value_dct:
+                self._value_dct[key] = [[0] * len(self.buckets), 0.0, 0]
+            value_lst = self._value_dct[key]
+            value_lst[0][idx] += 1
+            value_lst[1] += value
+            value_lst[2] += 1
+
+    def get(self, **labels):
+        """
+        获取某组标签的(总和, 个数)
+        """
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            value_lst = self._value_dct.get(key)
+            if value_lst is None:
+                return 0.0, 0
+            return value_lst[1], value_lst[2]
+
+    def quantile(self, q, **labels):
+        """
+        由分桶估计分位数, 返回所在分桶的上界
+
+        Parameters
+        ----------
+        q: float. 分位数, 如0.95
+        labels: 标签
+        """
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            value_lst = self._value_dct.get(key)
+            if (value_lst is None) or (value_lst[2] == 0):
+                return float("nan")
+            target = q * value_lst[2]
+            cum_count = 0
+            for bound, count in zip(self.buckets, value_lst[0]):
+                cum_count += count
+                if cum_count >= target:
+                    return bound
+        return float("inf")
+
+    def items(self):
+        with self._lock:
+            return [(key, (list(v[0]), v[1], v[2])) for key, v in self._value_dct.items()]
+
+    def clear(self):
+        with self._lock:
+            self._value_dct.clear()
+
+    def to_text(self):
+        line_lst = [f"# HELP {self.name} {self.documentation}",
+                    f"# TYPE {self.name} histogram"]
+        for key, (count_lst, total, count) in sorted(self.items()):
+            cum_count = 0
+            for bound, bucket_count in zip(self.buckets, count_lst):
+                cum_count += bucket_count
+                le = 'le="' + _format_value(bound) + '"'
+                line_lst.append(
+                    f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cum_count}"
+                )
+            labels = _format_labels(self.labelnames, key)
+            line_lst.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            line_lst.append(f"{self.name}_count{labels} {count}")
+        return line_lst
+
+
+class MetricsRegistry(object):
+    """
+    指标注册表. 同名指标只创建一次
+    """
+
+    def __init__(self):
+        self._metric_dct = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metric_dct.get(name)
+            if metric is None:
+                metric = cls(name, *args, **kwargs)
+                self._metric_dct[name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=default_buckets):
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets)
+
+    def clear(self):
+        """
+        清空所有指标的数值
+        """
+        with self._lock:
+            metric_lst = list(self._metric_dct.values())
+        for metric in metric_lst:
+            metric.clear()
+
+    def to_text(self):
+        """
+        导出为Prometheus文本格式
+
+        Returns
+        -------
+        str
+        """
+        with self._lock:
+            metric_lst = list(self._metric_dct.values())
+        line_lst = []
+        for metric in metric_lst:
+            line_lst.extend(metric.to_text())
+        return "\n".join(line_lst) + "\n"
+
+    def write_textfile(self, path):
+        """
+        写入Prometheus文本文件. 先写临时文件再替换, 采集方不会读到写了一半的文件
+
+        Parameters
+        ----------
+        path: str. 文件路径, 如'./log/metrics.prom'
+        """
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.to_text())
+        os.replace(tmp_path, path)
+
+    def start_http_server(self, port, host="127.0.0.1"):
+        """
+        在后台线程中启动本地HTTP端口, GET /metrics返回Prometheus文本格式
+
+        Parameters
+        ----------
+        port: int. 端口
+        host: str. 监听地址, 默认只监听本机
+
+        Returns
+        -------
+        http.server.ThreadingHTTPServer
+        """
+        registry = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = registry.to_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                return
+
+        server = ThreadingHTTPServer((host, port), _Handler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        return server
+
+
+# 进程内共享的指标注册表
+registry = MetricsRegistry()
+
+# tushare接口
+api_calls = registry.counter(
+    "tushare_calls_total", "tushare接口调用次数", ["endpoint", "status"])
+api_latency = registry.histogram(
+    "tushare_latency_seconds", "tushare接口单次调用耗时", ["endpoint"])
+api_rows = registry.counter(
+    "tushare_rows_total", "tushare接口返回的行数", ["endpoint"])
+api_bytes = registry.counter(
+    "tushare_bytes_total", "tushare接口返回数据的内存字节数", ["endpoint"])
+api_retries = registry.counter(
+    "tushare_retries_total", "tushare接口报错后的重试次数", ["endpoint"])
+api_sleep = registry.counter(
+    "tushare_sleep_seconds_total", "下载器休眠的总秒数", ["reason"])
+# 数据库写入
+store_rows = registry.counter(
+    "db_store_rows_total", "写入数据库的行数", ["table", "method"])
+store_batch_rows = registry.histogram(
+    "db_store_batch_rows", "每次提交写入的行数", ["table", "method"], buckets=row_buckets)
+store_commit = registry.histogram(
+    "db_commit_seconds", "每次写入提交的耗时", ["table", "method"])
+store_failures = registry.counter(
+    "db_store_failures_total", "写入失败(含重试)的次数", ["table", "method"])
+validation_rejected = registry.counter(
+    "db_validation_rejected_total", "入库校验不合格的行数", ["table", "rule"])
+validation_seconds = registry.histogram(
+    "db_validation_seconds", "每批数据入库校验的耗时", ["table"])
+
+
+def get_summary_lst():
+    """
+    汇总tushare接口和数据库写入的指标, 按总耗时从大到小排列
+
+    Returns
+    -------
+    List[str]. 汇总信息, 每行一条
+    """
+    line_lst = []
+    endpoint_lst = sorted(set(key[0] for key, _ in api_latency.items()))
+    endpoint_lst = sorted(endpoint_lst, key=lambda x: -api_latency.get(endpoint=x)[0])
+    for endpoint in endpoint_lst:
+        total, count = api_latency.get(endpoint=endpoint)
+        line_lst.append(
+            f"接口{endpoint}: 调用{count}次, 报错{api_calls.get(endpoint=endpoint, status='error')}次, "
+            f"共用时{total:.2f}s, 平均{total / count:.3f}s, "
+            f"p95<={api_latency.quantile(0.95, endpoint=endpoint)}s, "
+            f"返回{api_rows.get(endpoint=endpoint)}行, "
+            f"{api_bytes.get(endpoint=endpoint) / 1024 / 1024:.1f}MB"
+        )
+    for (reason,), seconds in sorted(api_sleep.items()):
+        line_lst.append(f"下载器休眠({reason}): 共{seconds:.2f}s")
+    key_lst = sorted([key for key, _ in store_commit.items()],
+                     key=lambda x: -store_commit.get(table=x[0], method=x[1])[0])
+    for table, method in key_lst:
+        total, count = store_commit.get(table=table, method=method)
+        rows = store_rows.get(table=table, method=method)
+        line_lst.append(
+            f"数据表{table}({method}): 提交{count}次, 写入{rows}行, "
+            f"平均每批{rows / count:.0f}行, 共用时{total:.2f}s, "
+            f"失败{store_failures.get(table=table, method=method)}次"
+        )
+    for (table, rule), rows in sorted(validation_rejected.items()):
+        line_lst.append(f"数据表{table}: 不满足校验规则{rule}{rows}行")
+    return line_lst
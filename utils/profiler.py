@@ -0,0 +1,321 @@
+'''
+Author: dkl
+Date: 2026-10-20 10:05:37
+Description: 性能剖析. 由config.ini中[profile]的enabled开启, 不需要改代码.
+按任务采样所有线程的调用栈(或用cProfile剖析主线程), 并单独统计pd.concat、pd.merge、
+to_sql、read_sql和SQL语句等热点操作的耗时, 结果写入log目录
+'''
+import cProfile
+import datetime
+import functools
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from utils import metrics
+from utils.conf import get_settings
+from utils.logger import Logger
+
+# 获取日志记录器
+logger = Logger("profiler")
+# 热点操作耗时
+hotpath_seconds = metrics.registry.histogram(
+    "hotpath_seconds", "热点操作单次耗时", ["task", "op"])
+# 进程内共享的剖析器
+_profiler = None
+_profiler_lock = threading.Lock()
+
+
+def _get_frame_name(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler(object):
+    """
+    采样剖析器. 后台线程定时读取所有线程的调用栈, 统计每条调用栈出现的次数.
+    与cProfile相比, 可以看到流水线中下载、存储线程的耗时, 开销也更小
+    """
+
+    def __init__(self, interval=0.005):
+        """
+        构造函数
+
+        Parameters
+        ----------
+        interval: float. 采样间隔(秒)
+        """
+        self.interval = interval
+        self.stack_counter = Counter()
+        self.n_samples = 0
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        own_ident = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_get_frame_name(frame))
+                    frame = frame.f_back
+                self.stack_counter[tuple(reversed(stack))] += 1
+            self.n_samples += 1
+
+    def start(self):
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def write_folded(self, path):
+        """
+        写入折叠调用栈, 每行为"栈底;...;栈顶 次数", 可直接用flamegraph.pl或speedscope画火焰图
+        """
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stack_counter.most_common():
+                f.write(";".join(stack) + f" {count}\n")
+
+    def get_top_lst(self, top_n):
+        """
+        按函数汇总采样次数
+
+        Returns
+        -------
+        List[str]. 按自身采样次数和累计采样次数排列的前top_n个函数
+        """
+        self_counter = Counter()
+        total_counter = Counter()
+        for stack, count in self.stack_counter.items():
+            self_counter[stack[-1]] += count
+            for name in set(stack):
+                total_counter[name] += count
+        line_lst = [f"采样{self.n_samples}次, 间隔{self.interval}s", "", "按自身采样次数:"]
+        for name, count in self_counter.most_common(top_n):
+            line_lst.append(f"{count:>8d}  {name}")
+        line_lst.extend(["", "按累计采样次数:"])
+        for name, count in total_counter.most_common(top_n):
+            line_lst.append(f"{count:>8d}  {name}")
+        return line_lst
+
+
+class TaskProfiler(object):
+    """
+    按任务进行性能剖析. 未开启时所有方法都直接返回, 不影响正常运行
+
+    使用方法:
+        profiler = get_profiler()
+        asharedaily_dl = asharedaily.AshareDailyDownload()
+        with profiler.task("asharedaily", asharedaily_dl):
+            asharedaily_dl.download_main()
+    """
+
+    def __init__(self, enabled=None, mode=None, top_n=None, interval=None, output_dir=None):
+        """
+        构造函数. 参数为None时读取config.ini中[profile]的对应配置
+
+        Parameters
+        ----------
+        enabled: bool. 是否开启
+        mode: str. 'sampling'为采样所有线程, 'cprofile'为用cProfile剖析调用任务的线程
+        top_n: int. 报告中列出的函数个数
+        interval: float. 采样间隔(秒)
+        output_dir: str. 输出目录, 其下按日期建立子目录
+        """
+        conf = get_settings().profile
+
+        def _get(value, option):
+            if value is None:
+                return getattr(conf, option)
+            return value
+
+        self.enabled = _get(enabled, "enabled")
+        self.mode = _get(mode, "mode").lower()
+        if self.mode not in ["sampling", "cprofile"]:
+            raise ValueError(f"不支持的剖析方式: {self.mode}")
+        self.top_n = _get(top_n, "top_n")
+        self.interval = _get(interval, "sample_interval")
+        output_dir = _get(output_dir, "output_dir")
+        self.output_dir = os.path.join(output_dir, datetime.datetime.today().strftime(r"%Y%m%d"))
+        self.current_task = ""
+        self._origin_lst = []
+
+    # #############################################################
+    # 热点操作计时
+    # #############################################################
+    @contextmanager
+    def timer(self, op):
+        """
+        记录一次热点操作的耗时
+
+        Parameters
+        ----------
+        op: str. 操作名称, 如'pd.concat'
+        """
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            hotpath_seconds.observe(
+                time.perf_counter() - start_time, task=self.current_task, op=op
+            )
+
+    def _wrap(self, func, op):
+        @functools.wraps(func)
+        def inner_wrapper(*args, **kwargs):
+            with self.timer(op):
+                return func(*args, **kwargs)
+
+        return inner_wrapper
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("profile_start_lst", []).append(time.perf_counter())
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        start_lst = conn.info.get("profile_start_lst")
+        if not start_lst:
+            return
+        verb = statement.lstrip().split(" ", 1)[0].lower()
+        hotpath_seconds.observe(
+            time.perf_counter() - start_lst.pop(), task=self.current_task, op=f"sql.{verb}"
+        )
+
+    def _install(self):
+        """
+        给pandas的合并、读写函数和SQLAlchemy的语句执行加上计时, 在close()时恢复
+        """
+        # 只在开启剖析时才需要, 未开启时不导入
+        import pandas as pd
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+        patch_lst = [
+            (pd, "concat", "pd.concat"),
+            (pd, "merge", "pd.merge"),
+            (pd.DataFrame, "merge", "pd.merge"),
+            (pd.DataFrame, "to_sql", "to_sql"),
+            (pd, "read_sql", "read_sql"),
+        ]
+        for owner, attr, op in patch_lst:
+            func = getattr(owner, attr)
+            self._origin_lst.append((owner, attr, func))
+            setattr(owner, attr, self._wrap(func, op))
+        event.listen(Engine, "before_cursor_execute", self._before_execute)
+        event.listen(Engine, "after_cursor_execute", self._after_execute)
+
+    def close(self):
+        """
+        恢复被替换的函数
+        """
+        for owner, attr, func in reversed(self._origin_lst):
+            setattr(owner, attr, func)
+        if len(self._origin_lst) > 0:
+            from sqlalchemy import event
+            from sqlalchemy.engine import Engine
+            event.remove(Engine, "before_cursor_execute", self._before_execute)
+            event.remove(Engine, "after_cursor_execute", self._after_execute)
+        self._origin_lst = []
+
+    def instrument(self, obj, prefix="download_"):
+        """
+        给对象中以prefix开头的方法加上计时, 每个方法作为一个热点操作
+
+        Parameters
+        ----------
+        obj: 下载类的实例
+        prefix: str. 方法名前缀, 默认为'download_'
+        """
+        if not self.enabled:
+            return obj
+        for name in dir(obj):
+            method = getattr(obj, name)
+            if name.startswith(prefix) and callable(method):
+                setattr(obj, name, self._wrap(method, name))
+        return obj
+
+    # #############################################################
+    # 任务
+    # #############################################################
+    def _get_hotpath_lst(self, task_name):
+        op_lst = [key[1] for key, _ in hotpath_seconds.items() if key[0] == task_name]
+        op_lst = sorted(op_lst, key=lambda x: -hotpath_seconds.get(task=task_name, op=x)[0])
+        line_lst = ["热点操作(可能互相包含, 如to_sql包含sql.insert):"]
+        for op in op_lst:
+            total, count = hotpath_seconds.get(task=task_name, op=op)
+            line_lst.append(f"{total:>10.3f}s  {count:>8d}次  {op}")
+        return line_lst
+
+    @contextmanager
+    def task(self, task_name, obj=None):
+        """
+        剖析一个任务, 结束时在输出目录写入{task_name}_top.txt报告,
+        以及火焰图数据: 采样方式为{task_name}.folded, cProfile方式为{task_name}.prof
+
+        Parameters
+        ----------
+        task_name: str. 任务名称
+        obj: 下载类的实例, 默认为None. 不为None时对其download_*方法计时
+        """
+        if not self.enabled:
+            yield
+            return
+        if len(self._origin_lst) == 0:
+            self._install()
+        os.makedirs(self.output_dir, exist_ok=True)
+        if obj is not None:
+            self.instrument(obj)
+        self.current_task = task_name
+        path = os.path.join(self.output_dir, task_name)
+        start_time = time.perf_counter()
+        if self.mode == "sampling":
+            sampler = StackSampler(self.interval)
+            sampler.start()
+        else:
+            prof = cProfile.Profile()
+            prof.enable()
+        try:
+            yield
+        finally:
+            cost_time = time.perf_counter() - start_time
+            line_lst = [f"任务{task_name}共用时: {cost_time:.2f}s", ""]
+            if self.mode == "sampling":
+                sampler.stop()
+                sampler.write_folded(path + ".folded")
+                line_lst.extend(sampler.get_top_lst(self.top_n))
+            else:
+                prof.disable()
+                prof.dump_stats(path + ".prof")
+                stream = io.StringIO()
+                pstats.Stats(prof, stream=stream).sort_stats("cumulative").print_stats(self.top_n)
+                line_lst.append(stream.getvalue())
+            line_lst.append("")
+            line_lst.extend(self._get_hotpath_lst(task_name))
+            with open(path + "_top.txt", "w", encoding="utf-8") as f:
+                f.write("\n".join(line_lst) + "\n")
+            logger.info(f"任务{task_name}的剖析结果已写入{path}_top.txt")
+            self.current_task = ""
+
+
+def get_profiler():
+    """
+    获取进程内共享的剖析器, 第一次调用时读取config.ini
+
+    Returns
+    -------
+    TaskProfiler
+    """
+    global _profiler
+    with _profiler_lock:
+        if _profiler is None:
+            _profiler = TaskProfiler()
+        return _profiler
@@ -6,7 +6,7 @@ Description: 邮件发送
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from utils.conf import Config
+from utils.conf import get_settings
 
 
 class SendEmail(object):
@@ -15,14 +15,34 @@ class SendEmail(object):
     """
 
     def __init__(self):
-        conf = Config("email")
-        sender = conf.get_config("sender")
-        passwd = conf.get_config("password")
-        receiver = conf.get_config("receiver")
-        self.sender = sender
-        self.passwd = passwd
-        self.receiver = receiver
-        self.smtpserver = "smtp." + self.sender.split("@")[-1]
+        # 邮箱配置在第一次发送邮件时才读取
+        self._email_conf = None
+
+    def _get_email_conf(self):
+        if self._email_conf is None:
+            conf = get_settings().email
+            self._email_conf = {
+                "sender": conf.sender,
+                "passwd": conf.password,
+                "receiver": conf.receiver,
+            }
+        return self._email_conf
+
+    @property
+    def sender(self):
+        return self._get_email_conf()["sender"]
+
+    @property
+    def passwd(self):
+        return self._get_email_conf()["passwd"]
+
+    @property
+    def receiver(self):
+        return self._get_email_conf()["receiver"]
+
+    @property
+    def smtpserver(self):
+        return "smtp." + self.sender.split("@")[-1]
 
     def send_email(self, subject="邮件主题", body="<p>这是个发送邮件的正文</p>", attach=None):
         # 编辑邮件内容
@@ -0,0 +1,151 @@
+'''
+Author: dkl
+Date: 2026-10-19 10:12:31
+Description: 数据清洗阶段. 下载后的pandas处理(合并、重命名、筛选列、去重、排序等)
+是纯CPU操作, 放到进程池中执行, 可以和网络请求、数据库写入交替重叠
+'''
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Dict, List
+from utils.conf import get_settings
+
+# 报告期月日与end_type的映射
+period_type_dct = {"0331": 1, "0630": 2, "0930": 3, "1231": 4}
+
+
+def normalize_df(df, columns: List[str], rename: Dict[str, str] = None,
+                 sort_by: List[str] = None, dedup_subset: List[str] = None,
+                 keep="last"):
+    """
+    通用的数据规整函数: 重命名 -> 筛选列 -> 排序 -> 去重 -> 重置索引
+
+    Parameters
+    ----------
+    df: pandas.DataFrame. 原始数据
+    columns: List[str]. 需要保留的列(按顺序)
+    rename: Dict[str, str]. 列重命名. 默认为None
+    sort_by: List[str]. 排序字段. 默认为None, 即不排序
+    dedup_subset: List[str]. 去重字段. 默认为None, 即不去重
+    keep: str. 去重时保留的记录, 默认为'last'
+
+    Returns
+    -------
+    pandas.DataFrame. 规整后的数据
+    """
+    if rename is not None:
+        df = df.rename(columns=rename)
+    df = df[columns].copy()
+    if sort_by is not None:
+        df = df.sort_values(sort_by)
+    if dedup_subset is not None:
+        df = df.drop_duplicates(dedup_subset, keep=keep)
+    df = df.reset_index(drop=True)
+    return df
+
+
+def fill_end_type(df):
+    """
+    因为tushare的end_type数据不全，根据end_date的月日手动补上
+
+    Parameters
+    ----------
+    df: pandas.DataFrame. 必须包含end_date和end_type两列
+
+    Returns
+    -------
+    pandas.DataFrame. 补全end_type后的数据
+    """
+    end_type = df["end_date"].astype(str).str[-4:].map(period_type_dct)
+    df["end_type"] = end_type.where(end_type.notna(), df["end_type"])
+    return df
+
+
+def _run_inline(func, *args, **kwargs):
+    """
+    在当前进程中执行函数, 返回已完成的Future
+    """
+    future = Future()
+    try:
+        future.set_result(func(*args, **kwargs))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+class ProcessTransformer(object):
+    """
+    进程池数据清洗器. 将原始数据发送到进程池中进行规整
+
+    使用方法:
+        with ProcessTransformer() as transformer:
+            for key, df in transformer.imap(func, tasks):
+                ...
+    """
+
+    def __init__(self, n_workers=None, max_pending=None):
+        """
+        构造函数
+
+        Parameters
+        ----------
+        n_workers: int. 进程数. 默认为None, 即读取config.ini中[pipeline]的transform_workers
+            如果为0, 则在当前进程中执行(便于调试)
+        max_pending: int. 最多同时在进程池中等待的任务数. 默认为n_workers的2倍
+        """
+        if n_workers is None:
+            n_workers = get_settings().pipeline.transform_workers
+        self.n_workers = n_workers
+        if max_pending is None:
+            max_pending = max(2 * n_workers, 1)
+        self.max_pending = max_pending
+        self._executor = None
+        if self.n_workers > 0:
+            self._executor = ProcessPoolExecutor(max_workers=self.n_workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+
+    def submit(self, func, *args, **kwargs):
+        """
+        提交一个清洗任务. func必须是模块级函数, 以便在进程间传递
+
+        Returns
+        -------
+        concurrent.futures.Future
+        """
+        if self._executor is None:
+            return _run_inline(func, *args, **kwargs)
+        return self._executor.submit(func, *args, **kwargs)
+
+    def imap(self, func, tasks):
+        """
+        按顺序返回清洗结果. tasks是惰性迭代器时(例如边下载边产出),
+        下载下一份数据的同时, 前面的数据已经在进程池中清洗
+
+        Parameters
+        ----------
+        func: 函数. 清洗函数
+        tasks: Iterable[tuple]. 每个元素为(key, args), args为func的参数元组
+
+        Yields
+        ------
+        tuple. (key, func(*args))
+        """
+        pending = deque()
+        for key, args in tasks:
+            pending.append((key, self.submit(func, *args)))
+            # 等待队列满了，先把最早的结果交出去
+            while len(pending) >= self.max_pending:
+                done_key, future = pending.popleft()
+                yield done_key, future.result()
+        while pending:
+            done_key, future = pending.popleft()
+            yield done_key, future.result()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None